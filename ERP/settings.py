@@ -14,6 +14,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -173,12 +174,68 @@ REMOTE_DATABASE_URL = DATABASE_URL or SUPABASE_DATABASE_URL
 # =========================
 COTIZACION_EDIT_WINDOW_MINUTES = int(os.getenv('COTIZACION_EDIT_WINDOW_MINUTES', '30'))
 
+# Lecturas RFID del lector FX: un renglón de RfidScan por (epc, antena) y
+# ventana, persistido dentro del request. El modo asíncrono (opt-in) sólo llena
+# un buffer en memoria que un hilo vacía cada RFID_FLUSH_SEGUNDOS: responde más
+# rápido pero pierde lo pendiente si el worker muere. Nunca en Vercel, donde el
+# proceso se congela al responder.
+RFID_VENTANA_SEGUNDOS = int(os.getenv('RFID_VENTANA_SEGUNDOS', '5'))
+RFID_FLUSH_SEGUNDOS = float(os.getenv('RFID_FLUSH_SEGUNDOS', '1'))
+RFID_INGESTA_ASINCRONA = config('RFID_INGESTA_ASINCRONA', default=False, cast=bool) and not IS_VERCEL
+RFID_RETENCION_HORAS = int(os.getenv('RFID_RETENCION_HORAS', '72'))
+
+# =========================
+# Caché
+# =========================
+# Sin REDIS_URL cada proceso usa su propio LocMemCache (lo mismo que Django
+# usaba por omisión). Con REDIS_URL el caché es compartido entre workers. La
+# invalidación de catálogos no depende de esto: sus versiones viven en la BD
+# (nucleo.VersionCatalogo).
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'nucleo-erp',
+            'OPTIONS': {'MAX_ENTRIES': 2000},
+        }
+    }
+
+# Respuestas de catálogos de sólo lectura (nucleo/api/cache.py): versión por
+# empresa en BD invalidada con señales, ETag/304 y exentas de NoCacheMiddleware.
+CATALOGO_CACHE_SEGUNDOS = int(os.getenv('CATALOGO_CACHE_SEGUNDOS', '300'))
+# Permisos efectivos y sucursales por usuario (usuarios/permisos.py). Las
+# versiones viven en la BD, así que una revocación vale desde el siguiente
+# request en cualquier worker; el TTL sólo limita cuánto vive lo compilado.
+PERMISOS_CACHE_SEGUNDOS = int(os.getenv('PERMISOS_CACHE_SEGUNDOS', '3600'))
+NO_CACHE_RUTAS_EXENTAS = (
+    '/api/v1/nucleo/monedas/',
+    '/api/v1/nucleo/unidades-medida/',
+    '/api/v1/nucleo/sat/',
+    '/api/v1/catalogo/color/',
+    '/api/v1/catalogo/talla/',
+    '/api/v1/catalogo/tipo-producto/',
+)
+
 # =========================
 # Integración con IA (OpenAI)
 # =========================
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 OPENAI_BASE_URL = config('OPENAI_BASE_URL', default='https://api.openai.com/v1')
 OPENAI_MODEL = config('OPENAI_MODEL', default='gpt-4o-mini')
+# Plazo (segundos) de cada llamada a chat/completions, incluida la lectura del stream.
+OPENAI_TIMEOUT = config('OPENAI_TIMEOUT', default=60, cast=int)
+# URL base de las APIs de Google (Calendar y Gmail); se cambian para probar
+# contra un servidor falso local.
+GOOGLE_API_URL = config('GOOGLE_API_URL', default='https://www.googleapis.com')
+GMAIL_API_URL = config('GMAIL_API_URL', default='https://gmail.googleapis.com')
 GOOGLE_DRIVE_CLIENT_ID = config('GOOGLE_DRIVE_CLIENT_ID', default='')
 GOOGLE_DRIVE_CLIENT_SECRET = config('GOOGLE_DRIVE_CLIENT_SECRET', default='')
 GOOGLE_DRIVE_REDIRECT_URI = config('GOOGLE_DRIVE_REDIRECT_URI', default='')
@@ -204,15 +261,12 @@ REMOTE_POSTGRES_DB_PORT = config('POSTGRESQL_DB_PORT', default='5432')
 
 if USE_REMOTE_DB:
     if REMOTE_DATABASE_URL:
-        REMOTE_CONN_MAX_AGE = 0 if (IS_VERCEL or ENVIRONMENT.lower() == 'production') else 600
         DATABASES = {
             'default': dj_database_url.parse(
                 REMOTE_DATABASE_URL,
-                conn_max_age=REMOTE_CONN_MAX_AGE,
                 ssl_require=True,
             )
         }
-        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
     else:
         DATABASES = {
             'default': {
@@ -222,7 +276,6 @@ if USE_REMOTE_DB:
                 'PASSWORD': REMOTE_POSTGRES_DB_PASSWORD,
                 'HOST': REMOTE_POSTGRES_DB_HOST,
                 'PORT': REMOTE_POSTGRES_DB_PORT,
-                'DISABLE_SERVER_SIDE_CURSORS': True,
                 'OPTIONS': {
                     'sslmode': 'require',
                 },
@@ -237,7 +290,6 @@ else:
             'PASSWORD': LOCAL_POSTGRES_DB_PASSWORD,
             'HOST': LOCAL_POSTGRES_DB_HOST,
             'PORT': LOCAL_POSTGRES_DB_PORT,
-            'DISABLE_SERVER_SIDE_CURSORS': True,
             'OPTIONS': {
                 'sslmode': LOCAL_POSTGRES_SSLMODE,
             },
@@ -245,6 +297,42 @@ else:
     }
 
 
+# Estrategia de conexión a PostgreSQL (DB_CONN_MODE):
+# - 'persistent': cada worker conserva su conexión DB_CONN_MAX_AGE segundos y
+#   CONN_HEALTH_CHECKS la verifica al inicio de cada request (una conexión que
+#   el servidor o el pooler cerró se reabre en vez de fallar).
+# - 'pool': pool de psycopg 3 por proceso (requiere psycopg-pool); cada request
+#   toma una conexión y la devuelve al terminar. Django exige CONN_MAX_AGE=0.
+# - 'none': conexión nueva por request (TLS + autenticación cada vez). Es el
+#   default en Vercel, donde el proceso se congela entre invocaciones.
+# Con un pooler en modo transacción (Supabase :6543) los cursores del lado del
+# servidor no sirven; por eso siguen deshabilitados salvo DB_SERVER_SIDE_CURSORS,
+# y los reportes recorren resultados grandes con nucleo.lotes.iterar_por_lotes.
+DB_CONN_MODE = config('DB_CONN_MODE', default='none' if IS_VERCEL else 'persistent').strip().lower()
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+DB_POOL_MIN_SIZE = config('DB_POOL_MIN_SIZE', default=2, cast=int)
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=10, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=int)
+DB_SERVER_SIDE_CURSORS = config('DB_SERVER_SIDE_CURSORS', default=False, cast=bool)
+
+if DB_CONN_MODE not in ('persistent', 'pool', 'none'):
+    raise ImproperlyConfigured(f"DB_CONN_MODE inválido: {DB_CONN_MODE!r} (persistent, pool o none).")
+
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = not DB_SERVER_SIDE_CURSORS
+if DB_CONN_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = False
+if DB_CONN_MODE == 'pool':
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': DB_POOL_MIN_SIZE,
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': DB_POOL_TIMEOUT,
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -301,6 +389,10 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Keyset sobre (created_at, pk): ver nucleo/pagination.py. Los catálogos
+    # chicos se excluyen con ``pagination_class = None`` en su vista.
+    'DEFAULT_PAGINATION_CLASS': 'nucleo.pagination.CursorPaginacion',
+    'PAGE_SIZE': 50,
 }
 
 SPECTACULAR_SETTINGS = {
@@ -424,6 +516,11 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        # structlog ya entrega la línea JSON completa.
+        'json_line': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'console': {
@@ -439,6 +536,14 @@ LOGGING = {
             'backupCount': 5,
             'formatter': 'verbose',
         },
+        'api_profiling_file': {
+            'level': 'INFO',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': LOGS_DIR / 'api_profiling.log',
+            'maxBytes': 10 * 1024 * 1024,  # 10 MB
+            'backupCount': 5,
+            'formatter': 'json_line',
+        },
     },
     'loggers': {
         'django': {
@@ -456,8 +561,20 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'api_profiling': {
+            'handlers': ['api_profiling_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
+# Perfilado por request de /api/ (nucleo.middleware.APILoggingMiddleware):
+# consultas SQL, tiempo en BD y consulta más lenta por vista, en
+# logs/api_profiling.log. Apagado por defecto; API_PROFILING_MUESTRA (0-1)
+# limita la fracción de requests perfilados en producción.
+API_PROFILING = config('API_PROFILING', default=False, cast=bool)
+API_PROFILING_MUESTRA = config('API_PROFILING_MUESTRA', default=1.0, cast=float)
+
 # ALL CONFIGURATIONS
 # =========================
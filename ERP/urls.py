@@ -3,15 +3,10 @@ from pathlib import Path
 from django.contrib import admin
 from django.http import FileResponse, Http404
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from django.contrib.auth.views import LoginView
 from terceros.views import RfcStatusView, ClientCreateView
 
-from QA.views import (
-    scanner_rfid_clear,
-    scanner_rfid_get,
-    scanner_rfid_receive,
-)
+from nucleo.vistas_diferidas import vista_diferida
 
 
 def serve_favicon(_request):
@@ -26,13 +21,14 @@ urlpatterns = [
     path('favicon.png', serve_favicon, name='favicon-png'),
     # ...
     # Swagger / OpenAPI
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    # (diferidas: drf_spectacular.views arrastra el generador del esquema)
+    path('api/schema/', vista_diferida('drf_spectacular.views.SpectacularAPIView', as_view=True, csrf_exempt=True), name='schema'),
+    path('api/docs/', vista_diferida('drf_spectacular.views.SpectacularSwaggerView', as_view=True, csrf_exempt=True, url_name='schema'), name='swagger-ui'),
+    path('api/redoc/', vista_diferida('drf_spectacular.views.SpectacularRedocView', as_view=True, csrf_exempt=True, url_name='schema'), name='redoc'),
     # Compat Scanner-Zebra-RFID simulation (FX reader ya configurado con estas rutas)
-    path('api/receive-scan/', scanner_rfid_receive, name='simulation_receive_scan'),
-    path('api/get-scans/', scanner_rfid_get, name='simulation_get_scans'),
-    path('api/clear-scans/', scanner_rfid_clear, name='simulation_clear_scans'),
+    path('api/receive-scan/', vista_diferida('QA.views.scanner_rfid_receive', csrf_exempt=True), name='simulation_receive_scan'),
+    path('api/get-scans/', vista_diferida('QA.views.scanner_rfid_get'), name='simulation_get_scans'),
+    path('api/clear-scans/', vista_diferida('QA.views.scanner_rfid_clear'), name='simulation_clear_scans'),
     # login
     path('', LoginView.as_view(template_name='registration/login.html', redirect_authenticated_user=True), name='login'),
     path('api/auth/', include('auth_kit.urls')),
@@ -10,7 +10,6 @@ from django.db import transaction
 from django.db.models import Q
 from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.template.defaultfilters import truncatechars
 from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
@@ -31,7 +30,10 @@ from wms.api.serializers import (
     EtiquetaRFIDSerializer,
 )
 from wms.models import EtiquetaRFIDDetalle, EtiquetaRFIDImpresion, RfidScan
+from wms.services.rfid_ingesta_service import BufferRFIDLleno, RFIDIngestaService
 from wms.services.rfid_label_service import RFIDLabelService
+from wms.services.zpl_plantilla_service import LAYOUT_QA, PlantillaZPL
+from wms.utils.epc import normalizar_epc
 
 rfid_scanner_logger = logging.getLogger(__name__)
 
@@ -47,66 +49,11 @@ def _redirect_rfid(encuadre_id):
     return redirect(f"{reverse('qa_recepcion_rfid_workspace')}?encuadre={encuadre_id}")
 
 
-def _build_producto_label_zpl(variante):
-    producto = variante.producto
-    nombre_producto = truncatechars((producto.nombre or "").upper(), 32)
-    sku = (variante.sku or "").upper()
-    color = getattr(variante.color, "nombre", "")
-    talla = getattr(variante.talla, "nombre", "")
-    linea_secundaria = " / ".join(
-        [value for value in [color.upper(), talla.upper()] if value]
-    )
-    codigo = (producto.codigo or producto.cod_proscai or "").upper()
-
-    lines = [
-        "^XA",
-        "^PW799",
-        "^LL400",
-        "^CI28",
-        "^LH0,0",
-        "^FO40,30^A0N,34,34^FDQA RFID - ETIQUETA PRUEBA^FS",
-        f"^FO40,85^A0N,32,32^FD{nombre_producto}^FS",
-        f"^FO40,130^A0N,28,28^FDSKU: {sku}^FS",
-    ]
-    if linea_secundaria:
-        lines.append(f"^FO40,168^A0N,28,28^FD{linea_secundaria}^FS")
-    if codigo:
-        lines.append(f"^FO40,206^A0N,26,26^FDCOD: {codigo}^FS")
-    lines.extend(
-        [
-            f"^FO40,245^BY3,3,90^BCN,90,Y,N,N^FD{sku}^FS",
-            "^FO40,360^A0N,22,22^FDImpresion QA para prueba de escaneo local.^FS",
-            "^XZ",
-        ]
-    )
-    return "\n".join(lines)
-
-
-def _build_producto_base_label_zpl(producto):
-    nombre_producto = truncatechars((producto.nombre or "").upper(), 32)
-    codigo_impresion = (producto.codigo or producto.cod_proscai or f"PROD-{producto.pk}").upper()
-    codigo_auxiliar = (producto.cod_proscai or "").upper()
-
-    lines = [
-        "^XA",
-        "^PW799",
-        "^LL400",
-        "^CI28",
-        "^LH0,0",
-        "^FO40,30^A0N,34,34^FDQA RFID - ETIQUETA PRUEBA^FS",
-        f"^FO40,85^A0N,32,32^FD{nombre_producto}^FS",
-        f"^FO40,130^A0N,28,28^FDCODIGO: {codigo_impresion}^FS",
-    ]
-    if codigo_auxiliar and codigo_auxiliar != codigo_impresion:
-        lines.append(f"^FO40,168^A0N,26,26^FDPROSCAI: {codigo_auxiliar}^FS")
-    lines.extend(
-        [
-            f"^FO40,245^BY3,3,90^BCN,90,Y,N,N^FD{codigo_impresion}^FS",
-            "^FO40,360^A0N,22,22^FDImpresion QA desde catalogo de productos.^FS",
-            "^XZ",
-        ]
-    )
-    return "\n".join(lines)
+def _zpl_etiqueta_qa(variante=None, producto=None):
+    """Etiqueta de prueba (sin RFID) con el layout QA de ``PlantillaZPL``."""
+    return PlantillaZPL.compilar(
+        variante=variante, producto=producto, layout=LAYOUT_QA, rfid=False
+    ).etiqueta()
 
 
 def _build_label_preview(variante=None, producto=None):
@@ -176,6 +123,21 @@ def _lookup_tokens(raw_tag):
     return [token for token in tokens if token]
 
 
+def _etiqueta_por_epc(encuadre, epc_normalizado):
+    """Etiqueta RFID impresa por la empresa del encuadre con ese EPC canónico."""
+    if not epc_normalizado:
+        return None
+    return (
+        EtiquetaRFIDDetalle.objects.select_related(
+            "impresion__producto",
+            "impresion__producto_variante__producto",
+        )
+        .filter(epc_normalizado=epc_normalizado, impresion__empresa=encuadre.empresa)
+        .order_by("id")
+        .first()
+    )
+
+
 def _resolver_tag_recepcion(encuadre, codigo_tag):
     tokens = _lookup_tokens(codigo_tag)
     if not tokens:
@@ -186,16 +148,23 @@ def _resolver_tag_recepcion(encuadre, codigo_tag):
             "metadata": {"resolved": False},
         }
 
-    producto_variante = (
-        ProductoVariante.objects.select_related("producto")
-        .filter(empresa=encuadre.empresa, activo=True, sku__in=tokens)
-        .first()
-    )
+    # Un tag que imprimimos se resuelve por su EPC canónico (la misma
+    # normalización que el scanner) antes de intentar SKU/código.
+    epc_normalizado = normalizar_epc(codigo_tag)
+    etiqueta = _etiqueta_por_epc(encuadre, epc_normalizado)
 
-    producto = None
-    if producto_variante:
-        producto = producto_variante.producto
+    if etiqueta is not None:
+        producto_variante = etiqueta.impresion.producto_variante
+        producto = etiqueta.impresion.producto or getattr(producto_variante, "producto", None)
     else:
+        producto_variante = (
+            ProductoVariante.objects.select_related("producto")
+            .filter(empresa=encuadre.empresa, activo=True, sku__in=tokens)
+            .first()
+        )
+        producto = producto_variante.producto if producto_variante else None
+
+    if producto is None:
         producto = (
             Producto.objects.filter(empresa=encuadre.empresa, activo=True)
             .filter(Q(codigo__in=tokens) | Q(cod_proscai__in=tokens))
@@ -219,6 +188,8 @@ def _resolver_tag_recepcion(encuadre, codigo_tag):
             "resolved": bool(producto),
             "tokens": tokens,
             "source": "QA-RFID",
+            "epc_normalizado": epc_normalizado or None,
+            "etiqueta_rfid_id": getattr(etiqueta, "pk", None),
         },
     }
 
@@ -452,7 +423,13 @@ def recepcion_rfid_workspace(request):
                 messages.error(request, "Debes escanear o capturar un tag.")
                 return _redirect_rfid(encuadre.pk)
 
-            if encuadre.lecturas.filter(codigo_tag=codigo_tag).exists():
+            # El mismo tag puede llegar con otra representación (con PC, sin
+            # ceros a la izquierda...): se compara también por EPC canónico.
+            epc_normalizado = normalizar_epc(codigo_tag)
+            ya_leido = Q(codigo_tag=codigo_tag)
+            if epc_normalizado:
+                ya_leido |= Q(epc_normalizado=epc_normalizado)
+            if encuadre.lecturas.filter(ya_leido).exists():
                 messages.warning(request, f"El tag {codigo_tag} ya fue leído en este encuadre.")
                 return _redirect_rfid(encuadre.pk)
 
@@ -460,6 +437,7 @@ def recepcion_rfid_workspace(request):
             RecepcionRFIDLectura.objects.create(
                 encuadre=encuadre,
                 codigo_tag=codigo_tag,
+                epc_normalizado=epc_normalizado,
                 orden_compra_detalle=resolved["orden_compra_detalle"],
                 producto=resolved["producto"],
                 producto_variante=resolved["producto_variante"],
@@ -533,30 +511,15 @@ def qa_browserprint_asset(request, filename):
 
 def _qa_rfid_success_payload(impresion):
     data = EtiquetaRFIDSerializer(impresion).data
-    zpl_individual = []
     detalles = list(
         EtiquetaRFIDDetalle.objects.filter(impresion=impresion).order_by("id")
     )
+    # Una sola plantilla para todo el lote: por etiqueta sólo cambia el EPC.
+    plantilla = RFIDLabelService.plantilla_impresion(impresion)
     if impresion.rfid_mode and detalles:
-        for d in detalles:
-            zpl_individual.append(
-                RFIDLabelService._build_zpl_rfid(
-                    d.epc,
-                    variante=impresion.producto_variante,
-                    producto=impresion.producto,
-                    barcode_value=d.barcode_value,
-                )
-            )
+        zpl_individual = [plantilla.etiqueta(d.epc) for d in detalles]
     else:
-        preview = RFIDLabelService._build_label_preview(
-            variante=impresion.producto_variante, producto=impresion.producto
-        )
-        zpl_normal = RFIDLabelService._build_zpl_normal(
-            variante=impresion.producto_variante,
-            producto=impresion.producto,
-            barcode_value=preview["barcode_value"] if preview else "",
-        )
-        zpl_individual = [zpl_normal] * max(1, impresion.cantidad)
+        zpl_individual = [plantilla.etiqueta()] * max(1, impresion.cantidad)
 
     data["zpl_individual"] = zpl_individual
     data["zpl_completo"] = "\n".join(zpl_individual)
@@ -601,14 +564,14 @@ def _qa_rfid_guardar_impresion(request, variante_id, producto_id, cantidad, prin
     # NOTA: NO mandamos ``zpl_enviado`` ni ``etiquetas`` al serializer (por lo
     # tanto ``store_impresion`` recibe ``None`` para ambos) porque queremos que
     # el service:
-    #   1) genere EPCs únicos por backend (intento reintento colisión),
+    #   1) genere EPCs únicos por backend (rango de seriales de ``SerieEPC``),
     #   2) cree EtiquetaRFIDDetalle en DB,
     #   3) y después NOSOTROS armamos el ZPL final real (el que Browser Print
-    #      va a enviar a la impresora) y lo guardamos con update_fields().
+    #      va a enviar a la impresora) con la plantilla de la impresión.
     #
-    # Este paso es OBLIGATORIO: antes store_impresion guardaba ``zpl_enviado``
-    # antes de haber generado los EPCs reales (vacío = NULL), por lo que el
-    # admin mostraba "ZPL enviado: vacío".
+    # El ZPL ya no se copia a ``zpl_enviado``: la impresión guarda su plantilla y
+    # el rango de EPC, y ``RFIDLabelService.iter_zpl_impresion`` (o
+    # ``GET /api/v1/wms/etiquetas-rfid/{id}/zpl/``) lo reconstruye igual.
     payload = {
         "producto_variante": int(variante_id) if variante_id else None,
         "producto": int(producto_id) if producto_id else None,
@@ -672,27 +635,6 @@ def _qa_rfid_guardar_impresion(request, variante_id, producto_id, cantidad, prin
             impresion.folio,
         )
 
-    # Guardar el ZPL REAL generado DESPUÉS de crear los EPCs en EtiquetaRFIDDetalle.
-    # Esto es lo que Browser Print envía a la impresora.
-    try:
-        upd = EtiquetaRFIDImpresion.objects.filter(pk=impresion.pk).update(
-            zpl_enviado=zpl_real if zpl_real else None
-        )
-        rfid_scanner_logger.info(
-            "RFID guardar impresion: zpl_enviado actualizado id=%s rows_updated=%s zpl_len=%d (antes len=%d)",
-            impresion.pk,
-            upd,
-            len(zpl_real),
-            len(impresion.zpl_enviado or ""),
-        )
-    except Exception as exc:
-        # No fallamos la respuesta por esto (ya se crearon impresion+detalles);
-        # solo loggeamos.
-        rfid_scanner_logger.exception(
-            "RFID guardar impresion: fallo update zpl_enviado impresion %s",
-            impresion.pk,
-        )
-
     return {
         "ok": True,
         "impresion": response_payload,
@@ -855,9 +797,9 @@ def imprimir_etiqueta_workspace(request):
         "preview_data": preview_data,
         "cantidad_default": cantidad_default,
         "zpl_preview": (
-            _build_producto_label_zpl(variante_seleccionada)
+            _zpl_etiqueta_qa(variante=variante_seleccionada)
             if variante_seleccionada
-            else _build_producto_base_label_zpl(producto_seleccionado)
+            else _zpl_etiqueta_qa(producto=producto_seleccionado)
             if producto_seleccionado
             else ""
         ),
@@ -918,7 +860,7 @@ def imprimir_orden_compra_workspace(request):
             cantidad_default = int(d.cantidad or d.piezas or 0)
             if cantidad_default <= 0:
                 cantidad_default = 1
-            zpl = _build_producto_base_label_zpl(producto) if producto else ""
+            zpl = _zpl_etiqueta_qa(producto=producto) if producto else ""
             renglones.append({
                 "detalle_id": d.pk,
                 "producto_id": producto.pk if producto else None,
@@ -1236,92 +1178,95 @@ def scanner_rfid_workspace(request):
     )
 
 
+def _parsear_cuerpo_fx(request, raw_body):
+    """Interpreta el cuerpo del POST del FX según su Content-Type.
+
+    El FX puede mandar JSON (con o sin el header correcto), un formulario
+    urlencoded con el JSON dentro de un campo, o texto plano con un EPC por
+    línea. Se prueba primero la forma que anuncia el Content-Type y sólo
+    después las demás. Devuelve ``(data, estrategia)``.
+    """
+    content_type = (request.content_type or "").lower()
+    es_formulario = content_type in ("application/x-www-form-urlencoded", "multipart/form-data")
+
+    def _formulario():
+        if not request.POST:
+            return None
+        qd = request.POST.dict()
+        # Si contiene una key llamada "data"/"payload" con JSON adentro: parsearla
+        for wrapper in ["data", "payload", "body", "json", "tags_json"]:
+            if wrapper in qd and isinstance(qd[wrapper], str):
+                try:
+                    qd[wrapper] = json.loads(qd[wrapper])
+                    break
+                except ValueError:
+                    pass
+        return qd
+
+    def _json():
+        if not raw_body.strip():
+            return None
+        try:
+            return json.loads(raw_body)
+        except ValueError:
+            return None
+
+    def _lista_epcs():
+        # text/plain con EPCs separados por comas o saltos de línea
+        stripped = raw_body.strip()
+        if "\n" not in stripped and "," not in stripped:
+            return None
+        parts = [p.strip() for p in stripped.replace(",", "\n").splitlines() if p.strip()]
+        if parts and all(_es_hexadecimal_epc(p) for p in parts):
+            return [{"epc": p} for p in parts]
+        return None
+
+    estrategias = (
+        (("form", _formulario), ("json", _json))
+        if es_formulario
+        else (("json", _json), ("form", _formulario))
+    ) + (("epc_lines", _lista_epcs),)
+    for nombre, estrategia in estrategias:
+        data = estrategia()
+        if data is not None:
+            return data, nombre
+    return None, None
+
+
 @csrf_exempt
 def scanner_rfid_receive(request):
+    """Recibe un POST del lector FX y lo entrega a ``RFIDIngestaService``.
+
+    Aquí sólo se interpreta el cuerpo y se extraen ``(epc, antena, rssi)``; la
+    agregación por ventana y la escritura en ``RfidScan`` ocurren en el
+    servicio de ingesta (dentro del request salvo con
+    ``RFID_INGESTA_ASINCRONA``). Si el buffer asíncrono está lleno y no se
+    puede vaciar responde 503 con ``Retry-After`` para que el lector reintente
+    en vez de perder lecturas. ``?debug=1`` agrega a la respuesta el detalle
+    por renglón que antes se mandaba siempre al log.
+    """
     if request.method != "POST":
         return JsonResponse({"status": "error", "message": "Method not allowed"}, status=405)
-    # Declarado FUERA del try para que los logger.info/warning de abajo
-    # (fuera del bloque try) no causen NameError si algo falló en medio.
-    body = ""
+    detallar = request.GET.get("debug") in ("1", "true")
+    remote_addr = request.META.get("REMOTE_ADDR")
     debug_payload = {
         "content_type": request.content_type or "",
-        "method": request.method,
-        "remote_addr": request.META.get("REMOTE_ADDR"),
+        "remote_addr": remote_addr,
     }
     try:
-        remote_addr = request.META.get("REMOTE_ADDR")
         raw_body = request.body.decode("utf-8", errors="replace")
-        body = raw_body
         debug_payload["body_len"] = len(raw_body)
-        debug_payload["body_prefix"] = raw_body[:512]
-        rfid_scanner_logger.info(
-            "RFID receive from %s ct=%s body[:4096]=%s",
-            remote_addr,
-            request.content_type,
-            raw_body[:4096],
-        )
-
-        # --- PARSEO MULTI CONTENT-TYPE (porque FX puede mandar text/plain, form, urlencoded, JSON)
-        data = None
-        parse_attempts = []
-
-        # 1) JSON directo (mejor caso)
-        try:
-            if raw_body and raw_body.strip():
-                data = json.loads(raw_body)
-                parse_attempts.append("json_loads:OK")
-        except (json.JSONDecodeError, ValueError, Exception) as e:
-            parse_attempts.append(f"json_loads:FAIL:{type(e).__name__}")
-            data = None
-
-        # 2) request.POST (x-www-form-urlencoded) — FXs viejos a veces usan esto
-        if data is None and request.POST:
-            try:
-                qd = request.POST.dict()
-                # Si contiene una key llamada "data"/"payload" con JSON adentro: intentar parsearla
-                for wrapper in ["data", "payload", "body", "json", "tags_json"]:
-                    if wrapper in qd and isinstance(qd[wrapper], str):
-                        try:
-                            parsed_inner = json.loads(qd[wrapper])
-                            qd[wrapper] = parsed_inner
-                            break
-                        except Exception:
-                            pass
-                data = qd
-                parse_attempts.append("request.POST.dict:OK")
-            except Exception as e:
-                parse_attempts.append(f"request.POST.dict:FAIL:{type(e).__name__}")
-
-        # 3) text/plain pero con EPCs separados por newlines (lista de strings sin corchetes)
-        if data is None and raw_body and raw_body.strip():
-            stripped = raw_body.strip()
-            if "\n" in stripped or "," in stripped:
-                # Lista separada por comas o saltos de línea (posiblemente con espacios)
-                parts = [p.strip() for p in stripped.replace(",", "\n").splitlines() if p.strip()]
-                # Si todo parece hex (chars [0-9a-fA-F: - ])
-                def _looks_hex(s):
-                    if not s or len(s) < 8:
-                        return False
-                    cl = s.replace(" ", "").replace(":", "").replace("-", "")
-                    return all(c in "0123456789abcdefABCDEF" for c in cl)
-                if parts and all(_looks_hex(p) for p in parts):
-                    data = [{"epc": p} for p in parts]
-                    parse_attempts.append("split_newlines_epc:OK")
-
-        # 4) Si sigue None: cuerpo dict vacío {} o [] con intento final limpiar espacios
-        if data is None and raw_body and raw_body.strip():
-            try:
-                cleaned = raw_body.strip()
-                # caso texto plano con objeto JSON (sin header correcto)
-                data = json.loads(cleaned)
-                parse_attempts.append("json_loads_cleaned:OK")
-            except Exception as e:
-                parse_attempts.append(f"json_loads_cleaned:FAIL:{type(e).__name__}")
-                data = None
+        if rfid_scanner_logger.isEnabledFor(logging.DEBUG):
+            rfid_scanner_logger.debug(
+                "RFID receive from %s ct=%s body[:512]=%s",
+                remote_addr,
+                request.content_type,
+                raw_body[:512],
+            )
 
-        debug_payload["parse_attempts"] = parse_attempts
+        data, estrategia = _parsear_cuerpo_fx(request, raw_body)
+        debug_payload["parse"] = estrategia
 
-        # --- Extracción items + fallback (igual que antes)
         items = []
         fallback_antenna = None
         fallback_rssi = None
@@ -1366,172 +1311,67 @@ def scanner_rfid_receive(request):
                 or data.get("signalStrength")
                 or _find_by_key_substr(data, ["rssi", "signal"])
             )
-
-            debug_payload["body_dict_keys"] = sorted(data.keys())
-        else:
-            debug_payload["body_dict_keys"] = None
-            debug_payload["fallback_antenna_raw_type"] = type(data).__name__
-
         if not isinstance(items, list):
             items = []
-        debug_payload["fallback_antenna_final"] = (
-            str(fallback_antenna)[:200] if fallback_antenna is not None else None
-        )
-        debug_payload["fallback_rssi_final"] = (
-            str(fallback_rssi)[:200] if fallback_rssi is not None else None
-        )
         debug_payload["items_raw_len"] = len(items)
 
-        if not isinstance(items, list):
-            debug_payload["error"] = "Invalid data format"
-            return JsonResponse(
-                {"status": "error", "message": "Invalid data format", "debug": debug_payload},
-                status=400,
-            )
-
-        tags_to_create = []
+        lecturas = []
         debug_items = []
-        seen_epcs_in_this_batch = set()
         for idx, item in enumerate(items):
             if isinstance(item, dict) and item.get("isHeartBeat") is True:
                 continue
             epc_raw = _extract_epc_raw(item)
-            if not epc_raw:
-                # Debug: tag item sin EPC, igual guardamos info para saber por qué
-                debug_items.append(
-                    {
-                        "i": idx,
-                        "item_type": type(item).__name__,
-                        "keys_list": sorted(item.keys())[:20] if isinstance(item, dict) else None,
-                        "epc_raw": None,
-                        "antenna_final": None,
-                        "rssi_final": None,
-                        "item_str": (str(item)[:200] if not isinstance(item, (dict, list)) else None),
-                    }
-                )
-                continue
             # limpia / normaliza hex (minusculas, sin separadores)
             epc_norm = (
-                epc_raw.strip()
+                (epc_raw or "")
+                .strip()
                 .replace(" ", "")
                 .replace(":", "")
                 .replace("-", "")
                 .lower()
             )
-            if not epc_norm or len(epc_norm) < 8:
-                debug_items.append(
-                    {
-                        "i": idx,
-                        "epc_raw": epc_raw[:40] if isinstance(epc_raw, str) else epc_raw,
-                        "skip_reason": f"len<8 epc={epc_norm}",
-                    }
-                )
-                continue
-            # Si ya estaba dentro del mismo request (duplicado fx reader), omitimos 2da insert
-            if epc_norm in seen_epcs_in_this_batch:
-                debug_items.append(
-                    {"i": idx, "epc_norm": epc_norm, "skip_reason": "dup_in_batch"}
-                )
+            if len(epc_norm) < 8:
+                if detallar:
+                    debug_items.append(
+                        {
+                            "i": idx,
+                            "keys_top20": sorted(item.keys())[:20] if isinstance(item, dict) else None,
+                            "epc_raw": epc_raw[:40] if isinstance(epc_raw, str) else None,
+                            "skip_reason": "sin_epc" if not epc_raw else "len<8",
+                        }
+                    )
                 continue
-            seen_epcs_in_this_batch.add(epc_norm)
             antenna, rssi = _extract_antenna_rssi(
                 item, fallback_antenna=fallback_antenna, fallback_rssi=fallback_rssi
             )
-            # --- DEEP debug del item (se sube a INFO para que aparezca en Vercel)
-            debug_item_entry = {
-                "i": idx,
-                "item_type": type(item).__name__,
-                "epc_raw_len": (len(epc_raw) if isinstance(epc_raw, (str, bytes)) else None),
-                "epc_raw_head": epc_raw[:32] if isinstance(epc_raw, str) else None,
-                "epc_norm": epc_norm,
-                "antenna_final": antenna,
-                "rssi_final": rssi,
-                "fallback_antenna_used": (
-                    str(fallback_antenna)[:80] if fallback_antenna is not None else None
-                ),
-                "fallback_rssi_used": (
-                    str(fallback_rssi)[:80] if fallback_rssi is not None else None
-                ),
-            }
-            if isinstance(item, dict):
-                debug_item_entry["keys_top20"] = sorted(item.keys())[:20]
-                try:
-                    dump = json.dumps(item, ensure_ascii=False, default=str)
-                except Exception:
-                    dump = "<unserializable>"
-                debug_item_entry["item_json_prefix"] = dump[:300]
-                debug_item_entry["item_json_len"] = len(dump)
-            else:
-                debug_item_entry["item_str_prefix"] = str(item)[:200]
-
-            # Dump a Vercel logs
-            excerpt = dict(debug_item_entry)
-            try:
-                excerpt_json = json.dumps(excerpt, ensure_ascii=False, default=str)
-            except Exception:
-                excerpt_json = f"<excerpt_unserializable keys={list(excerpt.keys())}>"
-            rfid_scanner_logger.info(
-                "RFID receive tag[%s] epc=%s len=%s antenna=%s rssi=%s excerpt=%s",
-                idx,
-                epc_norm,
-                len(epc_norm),
-                antenna,
-                rssi,
-                excerpt_json[:1400],
-            )
-            debug_items.append(debug_item_entry)
-
-            tags_to_create.append(
-                RfidScan(
-                    epc=epc_norm,
-                    reader_ip=remote_addr,
-                    antenna=antenna,
-                    rssi=rssi,
+            lecturas.append((epc_norm, antenna, rssi))
+            if detallar:
+                debug_items.append(
+                    {"i": idx, "epc_norm": epc_norm, "antenna_final": antenna, "rssi_final": rssi}
                 )
-            )
 
-        debug_payload["items"] = debug_items
+        RFIDIngestaService.registrar(lecturas, reader_ip=remote_addr)
 
-        if tags_to_create:
-            # Log resumen DEL REQUEST ENTERO (nivel INFO).
-            summary = {
-                "count": len(tags_to_create),
-                "items_raw_len": len(items),
-                "unique_epcs_sample": sorted([s.epc for s in tags_to_create[:5]]),
-                "antenna_values": sorted({s.antenna for s in tags_to_create if s.antenna is not None}),
-                "rssi_values_sample": sorted([float(s.rssi) for s in tags_to_create if s.rssi is not None])[:10],
-            }
-            rfid_scanner_logger.info(
-                "RFID receive request: created=%s summary=%s body_sample=%s",
-                len(tags_to_create),
-                json.dumps(summary, ensure_ascii=False, default=str),
-                (body[:200] if isinstance(body, str) else "(binary)"),
-            )
-            RfidScan.objects.bulk_create(tags_to_create, batch_size=200)
-            debug_payload["created_epcs_sample"] = summary["unique_epcs_sample"]
-            debug_payload["antenna_values"] = summary["antenna_values"]
-            debug_payload["rssi_values_sample"] = summary["rssi_values_sample"]
-        else:
+        debug_payload["lecturas"] = len(lecturas)
+        debug_payload["epcs_unicos"] = len({epc for epc, _, _ in lecturas})
+        if detallar:
+            debug_payload["items"] = debug_items
+        if not lecturas:
             rfid_scanner_logger.warning(
-                "RFID receive request: 0 tags creadas. Tipo items=%s len_items=%s body_sample=%s",
-                type(items).__name__,
-                len(items) if hasattr(items, "__len__") else "(n/a)",
-                (body[:500] if isinstance(body, str) else "(binary)"),
-            )
-            debug_payload["warn"] = (
-                "0 tags creadas. Tipo items=%s len=%s"
-                % (type(items).__name__, len(items) if hasattr(items, "__len__") else "n/a")
+                "RFID receive sin lecturas: parse=%s items=%s body[:200]=%s",
+                estrategia,
+                len(items),
+                raw_body[:200],
             )
 
         return JsonResponse(
-            {"status": "success", "count": len(tags_to_create), "debug": debug_payload}
-        )
-    except json.JSONDecodeError as e:
-        debug_payload["error"] = f"JSON invalido: {str(e)}"
-        return JsonResponse(
-            {"status": "error", "message": f"JSON invalido: {str(e)}", "debug": debug_payload},
-            status=400,
+            {"status": "success", "count": len(lecturas), "debug": debug_payload}
         )
+    except BufferRFIDLleno as e:
+        rfid_scanner_logger.error("RFID receive rechazado: %s", e)
+        respuesta = JsonResponse({"status": "error", "message": str(e)}, status=503)
+        respuesta["Retry-After"] = "1"
+        return respuesta
     except Exception as e:
         rfid_scanner_logger.exception("RFID receive error")
         debug_payload["error"] = str(e)
@@ -1548,49 +1388,12 @@ def scanner_rfid_get(request):
         .order_by("-created_at", "-id")[:50]
     )
 
-    # JOIN por epc contra EtiquetaRFIDDetalle (incluyendo impresion, producto, variante)
-    epc_list = [s.epc for s in scans if s.epc]
-    epc_lower_set = {e.lower() for e in epc_list if e}
-
-    # Variantes de normalizacion robusta:
-    # - algunos lectores envian EPC con padding (ceros al inicio/fin), hex con longitud 28 o 32
-    # - Etiquetas impresas con EPC 24 hex (96 bits)
-    def _epc_variants(epc):
-        base = (epc or "").strip().lower()
-        if not base:
-            return set()
-        vars = {base}
-        vars.add(base.lstrip("0"))
-        vars.add(base.rstrip("0"))
-        vars.add(base.strip("0"))
-        if len(base) > 24:
-            # FX7500/FX9600 manda 28 chars (96b + 4 CRC/PC) o 32 chars (128b)
-            vars.add(base[:24])
-            vars.add(base[-24:])
-            vars.add(base[:24].lstrip("0"))
-            vars.add(base[-24:].lstrip("0"))
-            for target_len in (28, 32):
-                if len(base) >= target_len:
-                    vars.add(base[:target_len])
-                    vars.add(base[-target_len:])
-        elif len(base) < 24:
-            # Caso raro: FX manda EPC con ceros truncados a izq/der (len < 24)
-            pad_left = base.rjust(24, "0")
-            pad_right = base.ljust(24, "0")
-            vars.add(pad_left)
-            vars.add(pad_right)
-            vars.add(pad_left.lstrip("0"))
-            vars.add(pad_right.rstrip("0"))
-        return {v for v in vars if len(v) >= 8}
-
-    epc_search_set = set()
-    for e in list(epc_lower_set):
-        epc_search_set |= _epc_variants(e)
-
-    # Busqueda lowercase: EtiquetaRFIDDetalle.epc es único, convertimos ambos lados a lower
+    # JOIN por EPC canónico contra EtiquetaRFIDDetalle (impresion, producto,
+    # variante): ambos lados guardan ``normalizar_epc`` al escribirse, así que es
+    # un IN exacto de a lo más 50 valores sobre la columna indexada.
     detalle_qs = (
         EtiquetaRFIDDetalle.objects.filter(
-            epc__in=list(epc_search_set) + list({e.upper() for e in epc_search_set})
+            epc_normalizado__in={s.epc_normalizado for s in scans if s.epc_normalizado}
         )
         .select_related(
             "impresion",
@@ -1601,6 +1404,7 @@ def scanner_rfid_get(request):
         )
         .only(
             "epc",
+            "epc_normalizado",
             "barcode_value",
             "serial",
             "estado",
@@ -1618,25 +1422,15 @@ def scanner_rfid_get(request):
             "impresion__producto_variante__talla__nombre",
         )
     )
-    # Indexamos el detalle con LAS MISMAS variantes de normalizacion que los scans,
-    # para que si detalle viene con 24 upper y scan con 28 lower + padding coincida.
-    detalle_by_epc_variant = {}
+    detalle_by_epc = {}
     for d in detalle_qs:
-        for v in _epc_variants(d.epc):
-            detalle_by_epc_variant.setdefault(v, d)
+        detalle_by_epc.setdefault(d.epc_normalizado, d)
 
     data = []
     for scan in scans:
         epc = scan.epc or ""
         epc_lower = epc.lower()
-        detalle = None
-        variant_used = None
-        variants_tried = list(_epc_variants(epc_lower))
-        for variant in variants_tried:
-            detalle = detalle_by_epc_variant.get(variant)
-            if detalle is not None:
-                variant_used = variant
-                break
+        detalle = detalle_by_epc.get(scan.epc_normalizado) if scan.epc_normalizado else None
 
         item = {
             "id": scan.pk,
@@ -1645,6 +1439,8 @@ def scanner_rfid_get(request):
             "antenna": scan.antenna,
             "rssi": scan.rssi,
             "reader_ip": scan.reader_ip,
+            "lecturas": scan.lecturas,
+            "ultima_lectura": scan.ultima_lectura.isoformat() if scan.ultima_lectura else None,
         }
 
         if detalle is not None:
@@ -1686,11 +1482,9 @@ def scanner_rfid_get(request):
                     "match_debug": {
                         "scan_epc": epc_lower,
                         "scan_epc_len": len(epc_lower),
-                        "variants_tried": variants_tried,
-                        "variant_used": variant_used,
+                        "epc_normalizado": scan.epc_normalizado,
                         "detalle_epc_raw": detalle.epc,
                         "detalle_epc_len": len(detalle.epc or ""),
-                        "detalle_epc_variants": sorted(_epc_variants(detalle.epc)),
                     },
                 }
             )
@@ -1699,26 +1493,25 @@ def scanner_rfid_get(request):
             item["match_debug"] = {
                 "scan_epc": epc_lower,
                 "scan_epc_len": len(epc_lower),
-                "variants_tried": variants_tried,
-                "variant_used": None,
-                "detalle_lookup_count": len(detalle_by_epc_variant),
+                "epc_normalizado": scan.epc_normalizado,
+                "detalle_lookup_count": len(detalle_by_epc),
             }
         # Log por scan en Vercel para depurar match=NO frecuentes
         if not detalle:
             rfid_scanner_logger.debug(
-                "RFID get MATCH=NO scan_id=%s epc=%s len=%s tried=%s lookup_size=%s",
+                "RFID get MATCH=NO scan_id=%s epc=%s len=%s normalizado=%s lookup_size=%s",
                 scan.pk,
                 epc_lower,
                 len(epc_lower),
-                json.dumps(variants_tried),
-                len(detalle_by_epc_variant),
+                scan.epc_normalizado,
+                len(detalle_by_epc),
             )
         else:
-            rfid_scanner_logger.info(
-                "RFID get MATCH=SI scan_id=%s epc=%s variant=%s detalle=%s lab=%s sku=%s talla=%s",
+            rfid_scanner_logger.debug(
+                "RFID get MATCH=SI scan_id=%s epc=%s normalizado=%s detalle=%s lab=%s sku=%s talla=%s",
                 scan.pk,
                 epc_lower,
-                variant_used,
+                scan.epc_normalizado,
                 detalle.id,
                 (impresion.folio if impresion else None),
                 sku,
@@ -1735,17 +1528,15 @@ def scanner_rfid_get(request):
     q_epc = (request.GET.get("epc") or "").strip().lower()
     q_search_debug = None
     if q_epc:
-        q_vars = sorted(_epc_variants(q_epc))
-        hit = None
-        for v in q_vars:
-            if v in epc_all_scans_set:
-                hit = v
-                break
+        q_normalizado = normalizar_epc(q_epc)
+        hit = next(
+            (s.epc.lower() for s in scans if q_normalizado and s.epc_normalizado == q_normalizado),
+            None,
+        )
         q_search_debug = {
             "query_epc": q_epc,
             "query_epc_len": len(q_epc),
-            "variants_count": len(q_vars),
-            "variants_head5": q_vars[:5],
+            "epc_normalizado": q_normalizado,
             "found_in_scans": bool(hit),
             "hit_variant": hit,
         }
@@ -1753,7 +1544,7 @@ def scanner_rfid_get(request):
     debug_get = {
         "scans_returned": len(data),
         "scans_total_max_50": len(scans),
-        "lookup_detalle_count": len(detalle_by_epc_variant),
+        "lookup_detalle_count": len(detalle_by_epc),
         "unique_epc_in_50_scans_count": len(epc_all_scans_set),
         "unique_epc_prefixes_head30": sorted({e[:4] for e in epc_all_scans_lower})[:30],
         "query_epc_search": q_search_debug,
@@ -1762,8 +1553,28 @@ def scanner_rfid_get(request):
 
 
 def scanner_rfid_clear(request):
-    RfidScan.objects.all().delete()
-    return JsonResponse({"status": "success"})
+    """Aplica la retención de lecturas y reinicia el monitor.
+
+    Ya no borra la tabla completa: purga lo que excede ``RFID_RETENCION_HORAS``
+    (``?horas=`` la sobreescribe, siempre positiva) y devuelve ``ultimo_id``
+    para que la pantalla muestre sólo lo que llegue después. Sólo personal
+    staff: el borrado es global. Vaciar la tabla completa queda para
+    ``purgar_lecturas_rfid --horas 0``.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return JsonResponse({"status": "error", "message": "Autenticación requerida"}, status=401)
+    if not (user.is_staff or user.is_superuser):
+        return JsonResponse({"status": "error", "message": "Sólo personal staff"}, status=403)
+    try:
+        horas = float(request.GET["horas"]) if request.GET.get("horas") not in (None, "") else None
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "horas inválido"}, status=400)
+    if horas is not None and horas <= 0:
+        return JsonResponse({"status": "error", "message": "horas debe ser positivo"}, status=400)
+    deleted = RFIDIngestaService.purgar(horas=horas)
+    ultimo = RfidScan.objects.order_by("-id").values_list("id", flat=True).first()
+    return JsonResponse({"status": "success", "deleted": deleted, "ultimo_id": ultimo or 0})
 
 
 def scanner_rfid_stats(request):
@@ -1802,14 +1613,9 @@ def scanner_rfid_stats(request):
     # Mini buscador ?epc=XXXX (igual que el get pero más rápido)
     q_epc = (request.GET.get("epc") or "").strip().lower()
     q_found_samples = []
-    if q_epc:
-        base_vars = {q_epc, q_epc.lstrip("0"), q_epc.rstrip("0"), q_epc.strip("0")}
-        if len(q_epc) > 24:
-            base_vars |= {q_epc[:24], q_epc[-24:]}
-        if len(q_epc) < 24:
-            base_vars |= {q_epc.rjust(24, "0"), q_epc.ljust(24, "0")}
-        q_lookup = list(base_vars) + [v.upper() for v in base_vars]
-        qs_found = RfidScan.objects.filter(epc__in=q_lookup).order_by("-created_at")[:10]
+    q_normalizado = normalizar_epc(q_epc)
+    if q_normalizado:
+        qs_found = RfidScan.objects.filter(epc_normalizado=q_normalizado).order_by("-created_at")[:10]
         for f in qs_found:
             q_found_samples.append({
                 "id": f.id, "epc": f.epc, "epc_len": len(f.epc or ""),
@@ -18,7 +18,7 @@ class LogViewerAPI(LoginRequiredMixin, SuperuserRequiredMixin, TemplateView):
     """
     API para leer las últimas N líneas de un archivo de log.
     Query Params:
-    - type: 'sistema', 'api', 'auditoria'
+    - type: 'sistema', 'api', 'api_profiling', 'auditoria'
     - lines: int (default 100)
     """
     def get(self, request, *args, **kwargs):
@@ -31,6 +31,7 @@ class LogViewerAPI(LoginRequiredMixin, SuperuserRequiredMixin, TemplateView):
         log_map = {
             'sistema': 'sistema.log',
             'api': 'api.log',
+            'api_profiling': 'api_profiling.log',
             'auditoria': 'auditoria.log'
         }
         
@@ -63,6 +64,7 @@ class LogDownloadView(LoginRequiredMixin, SuperuserRequiredMixin, TemplateView):
         log_map = {
             'sistema': 'sistema.log',
             'api': 'api.log',
+            'api_profiling': 'api_profiling.log',
             'auditoria': 'auditoria.log'
         }
         
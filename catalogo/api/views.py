@@ -4,25 +4,33 @@ from rest_framework.exceptions import ValidationError
 from catalogo.models import TipoProducto, CategoriaProducto, Color, Talla, Producto, ProductoVariante
 from catalogo.api.serializers import TipoProductoSerializer, CategoriaProductoSerializer, ColorSerializer, TallaSerializer, ProductoSerializer, ProductoVarianteSerializer
 from produccion.models import ListaMaterialBom
+from nucleo.api.cache import CatalogoCacheMixin
 
-class TipoProductoViewSet(viewsets.ModelViewSet):
+class TipoProductoViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
+    catalogo_cache = 'tipos_producto'
     queryset = TipoProducto.objects.all()
     serializer_class = TipoProductoSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
 
 class CategoriaProductoViewSet(viewsets.ModelViewSet):
     serializer_class = CategoriaProductoSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
 
     def get_queryset(self):
         return CategoriaProducto.objects.filter(activo=True).order_by("-created_at", "-id")
 
-class ColorViewSet(viewsets.ModelViewSet):
+class ColorViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
+    catalogo_cache = 'colores'
     serializer_class = ColorSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
 
     def get_queryset(self):
         return Color.objects.filter(activo=True)
 
-class TallaViewSet(viewsets.ModelViewSet):
+class TallaViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
+    catalogo_cache = 'tallas'
     serializer_class = TallaSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
 
     def get_queryset(self):
         return Talla.objects.filter(activo=True)
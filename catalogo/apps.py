@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class CatalogoConfig(AppConfig):
     name = 'catalogo'
+
+    def ready(self):
+        from catalogo.models import Color, Talla, TipoProducto
+        from nucleo.api.cache import conectar_invalidacion
+
+        # Catálogos servidos desde caché (nucleo/api/cache.py).
+        conectar_invalidacion('colores', Color)
+        conectar_invalidacion('tallas', Talla)
+        conectar_invalidacion('tipos_producto', TipoProducto)
@@ -0,0 +1,75 @@
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.services.importacion_productos_service import ImportacionProductosService
+from nucleo.models import Empresa
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa productos y variantes de un .xlsx (mismas columnas que "
+        "/core/catalogo/productos/importar-excel/) por lotes, cada uno en su "
+        "transacción, reportando avance y renglones con error. Pensado para "
+        "refrescar catálogos completos que no caben en el tiempo de un request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta al .xlsx.")
+        parser.add_argument("--empresa", required=True, help="Código (slug) o id de la empresa.")
+        parser.add_argument("--usuario", help="Email del usuario que queda en el historial.")
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=ImportacionProductosService.TAMANO_LOTE,
+            help="Renglones por lote/transacción.",
+        )
+
+    def handle(self, *args, **options):
+        ruta = Path(options["archivo"])
+        if not ruta.is_file():
+            raise CommandError(f"No existe el archivo {ruta}.")
+        if options["lote"] < 1:
+            raise CommandError("--lote debe ser positivo.")
+
+        clave = options["empresa"]
+        empresa = Empresa.objects.filter(codigo=clave).first()
+        if empresa is None and clave.isdigit():
+            empresa = Empresa.objects.filter(pk=int(clave)).first()
+        if empresa is None:
+            raise CommandError(f"No existe la empresa '{clave}'.")
+
+        usuario = None
+        if options.get("usuario"):
+            usuario = get_user_model().objects.filter(email=options["usuario"]).first()
+            if usuario is None:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        inicio = time.perf_counter()
+
+        def progreso(resumen):
+            segundos = max(time.perf_counter() - inicio, 1e-6)
+            self.stdout.write(
+                f"{resumen['leidos']:>8} renglones  "
+                f"productos +{resumen['productos_creados']} ~{resumen['productos_actualizados']}  "
+                f"variantes +{resumen['variantes_creadas']} ~{resumen['variantes_actualizadas']}  "
+                f"errores {resumen['con_error']}  "
+                f"({resumen['leidos'] / segundos:.0f} renglones/s)"
+            )
+
+        servicio = ImportacionProductosService(empresa, usuario=usuario, tamano_lote=options["lote"])
+        resumen = servicio.importar(ImportacionProductosService.leer_xlsx(ruta), progreso=progreso)
+
+        for error in resumen["errores"]:
+            self.stdout.write(self.style.WARNING(f"Fila {error['fila']}: {error['error']}"))
+        if resumen["con_error"] > len(resumen["errores"]):
+            self.stdout.write(
+                self.style.WARNING(f"... y {resumen['con_error'] - len(resumen['errores'])} errores más.")
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Importación terminada en {time.perf_counter() - inicio:.1f} s: {resumen['leidos']} renglones."
+            )
+        )
@@ -0,0 +1,411 @@
+import itertools
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from catalogo.models import CategoriaProducto, Color, Producto, ProductoVariante, Talla
+from nucleo.models import SatClaveProdServ, normalizar_busqueda
+
+#: Encabezado normalizado -> campo del renglón. Varios alias por columna para
+#: aceptar tanto la plantilla como exportaciones de Proscai.
+ALIAS_COLUMNAS = {
+    "nombre": "nombre",
+    "producto": "nombre",
+    "descripcion": "descripcion",
+    "categoria": "categoria",
+    "clave sat": "sat_prodserv",
+    "clave_sat": "sat_prodserv",
+    "sat_prodserv": "sat_prodserv",
+    "clave prodserv": "sat_prodserv",
+    "precio_base": "precio_base",
+    "precio base": "precio_base",
+    "cod_proscai": "cod_proscai",
+    "codigo": "codigo",
+    "sku": "sku",
+    "color": "color",
+    "talla": "talla",
+    "precio_variante": "precio_variante",
+    "precio variante": "precio_variante",
+}
+
+MAX_ERRORES = 1000
+
+
+class ErrorRenglon(Exception):
+    pass
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _decimal(valor, campo):
+    texto = _texto(valor).replace("$", "").replace(",", "")
+    if not texto:
+        return None
+    try:
+        return Decimal(texto).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ErrorRenglon(f"{campo} '{valor}' no es un número.")
+
+
+class ImportacionProductosService:
+    """Importación de productos y variantes desde un Excel, por lotes.
+
+    El renglón trae el producto (``nombre``, ``descripcion``, ``categoria``,
+    ``clave_sat``, ``precio_base``, ``cod_proscai``, ``codigo``) y, si trae
+    ``sku``, una variante (``color``, ``talla``, ``precio_variante``; sin
+    precio propio toma el del producto). Varios renglones del mismo producto
+    son sus variantes.
+
+    - Los renglones se consumen de un iterable (``leer_xlsx`` lee el archivo en
+      modo ``read_only``) en lotes de ``tamano_lote``; cada lote es su propia
+      transacción, así que un catálogo de 200k renglones no queda en una sola
+      transacción ni en memoria.
+    - Categorías, colores y tallas se resuelven con diccionarios cargados una
+      vez; las claves SAT (52k) se piden por lote sólo las que aparecen y se
+      recuerdan para los lotes siguientes.
+    - ``Producto`` se empata por ``(empresa, nombre)``, el criterio del
+      importador anterior; como la tabla no tiene restricción única en esas
+      columnas, las altas son ``bulk_create`` y los cambios ``bulk_update``
+      sobre lo que ya existía. ``ProductoVariante`` se empata por ``sku``
+      (único) con el mismo reparto: altas con ``bulk_create`` y, para los SKUs
+      de la empresa que ya existían, ``bulk_update`` sólo de lo que cambió.
+    - Un renglón con error se salta y se reporta con su número de fila; el
+      resto del lote sigue. Una celda vacía no borra el valor que ya tiene el
+      producto o la variante. El historial (``simple_history``) se escribe
+      por lote.
+
+    En PostgreSQL dos importaciones de la misma empresa se serializan lote por
+    lote con un ``pg_advisory_xact_lock``: sin él ambas podrían dar de alta el
+    mismo nombre. No se bloquea la fila de ``Empresa`` porque su ``FOR UPDATE``
+    detendría cualquier inserción con FK a la empresa durante el lote.
+    """
+
+    TAMANO_LOTE = 2000
+    #: Primer argumento del advisory lock (espacio de llaves de este módulo).
+    CANDADO = 0x43415431
+
+    def __init__(self, empresa, usuario=None, tamano_lote=None):
+        self.empresa = empresa
+        self.usuario = usuario
+        self.tamano_lote = tamano_lote or self.TAMANO_LOTE
+        self.resumen = {
+            "leidos": 0,
+            "productos_creados": 0,
+            "productos_actualizados": 0,
+            "variantes_creadas": 0,
+            "variantes_actualizadas": 0,
+            "con_error": 0,
+            "errores": [],
+        }
+        self._categorias = None
+        self._colores = None
+        self._nombres_color = None
+        self._tallas = None
+        self._nombres_talla = None
+        self._sat = {}
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    @staticmethod
+    def leer_xlsx(archivo):
+        """Renglones (tuplas) de la hoja activa, sin cargar el libro en memoria."""
+        from openpyxl import load_workbook
+
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            yield from libro.active.iter_rows(values_only=True)
+        finally:
+            libro.close()
+
+    @staticmethod
+    def _columnas(encabezado):
+        columnas = {}
+        for i, valor in enumerate(encabezado or ()):
+            campo = ALIAS_COLUMNAS.get(normalizar_busqueda(_texto(valor)))
+            if campo and campo not in columnas:
+                columnas[campo] = i
+        return columnas if "nombre" in columnas else None
+
+    # ------------------------------------------------------------------
+    # Catálogos
+    # ------------------------------------------------------------------
+    def _precargar(self):
+        self._categorias = {}
+        for pk, nombre, codigo in CategoriaProducto.objects.filter(empresa=self.empresa, activo=True).values_list(
+            "pk", "nombre", "codigo"
+        ):
+            self._categorias.setdefault(normalizar_busqueda(codigo), pk)
+            self._categorias.setdefault(normalizar_busqueda(nombre), pk)
+        self._colores = {}
+        self._nombres_color = {}
+        for pk, nombre, codigo in Color.objects.filter(activo=True).values_list("pk", "nombre", "codigo"):
+            self._colores.setdefault(normalizar_busqueda(nombre), pk)
+            self._colores.setdefault(normalizar_busqueda(codigo), pk)
+            self._nombres_color[pk] = nombre
+        self._tallas = {}
+        self._nombres_talla = {}
+        for pk, nombre in Talla.objects.filter(activo=True).values_list("pk", "nombre"):
+            self._tallas.setdefault(normalizar_busqueda(nombre), pk)
+            self._nombres_talla[pk] = nombre
+
+    def _cargar_sat(self, codigos):
+        faltantes = {c for c in codigos if c and c not in self._sat}
+        if faltantes:
+            encontrados = dict(
+                SatClaveProdServ.objects.filter(codigo__in=faltantes, activo=True).values_list("codigo", "pk")
+            )
+            for codigo in faltantes:
+                self._sat[codigo] = encontrados.get(codigo)
+
+    @staticmethod
+    def _buscar(diccionario, valor, etiqueta):
+        if not valor:
+            return None
+        pk = diccionario.get(normalizar_busqueda(valor))
+        if pk is None:
+            raise ErrorRenglon(f"{etiqueta} '{valor}' no existe.")
+        return pk
+
+    # ------------------------------------------------------------------
+    # Importación
+    # ------------------------------------------------------------------
+    def importar(self, renglones, progreso=None):
+        """Importa ``renglones`` y devuelve ``resumen``.
+
+        El primer renglón es el encabezado. Sin columna ``nombre`` se toma,
+        como el importador anterior, la primera columna como nombre y el
+        primer renglón como dato. ``progreso(resumen)`` se llama al terminar
+        cada lote.
+        """
+        renglones = iter(renglones)
+        primero = next(renglones, None)
+        columnas = self._columnas(primero)
+        inicio = 2  # numeración de Excel: la fila 1 es el encabezado
+        if columnas is None:
+            columnas = {"nombre": 0}
+            renglones = itertools.chain([primero] if primero else [], renglones)
+            inicio = 1
+        self._precargar()
+
+        lote = []
+        for numero, renglon in enumerate(renglones, start=inicio):
+            if not renglon or all(v in (None, "") for v in renglon):
+                continue
+            lote.append((numero, {campo: renglon[i] if i < len(renglon) else None for campo, i in columnas.items()}))
+            if len(lote) >= self.tamano_lote:
+                self._procesar_lote(lote, progreso)
+                lote = []
+        if lote:
+            self._procesar_lote(lote, progreso)
+        return self.resumen
+
+    def _error(self, numero, mensaje):
+        self.resumen["con_error"] += 1
+        if len(self.resumen["errores"]) < MAX_ERRORES:
+            self.resumen["errores"].append({"fila": numero, "error": mensaje})
+
+    def _procesar_lote(self, lote, progreso):
+        self.resumen["leidos"] += len(lote)
+        self._cargar_sat({_texto(datos.get("sat_prodserv")) for _, datos in lote})
+
+        validos = []
+        for numero, datos in lote:
+            try:
+                validos.append((numero, self._validar(datos)))
+            except ErrorRenglon as exc:
+                self._error(numero, str(exc))
+
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [self.CANDADO, self.empresa.pk])
+            productos = self._upsert_productos(validos)
+            self._upsert_variantes(validos, productos)
+
+        if progreso:
+            progreso(self.resumen)
+
+    def _validar(self, datos):
+        nombre = _texto(datos.get("nombre"))
+        if not nombre:
+            raise ErrorRenglon("Falta el nombre.")
+        if len(nombre) > Producto._meta.get_field("nombre").max_length:
+            raise ErrorRenglon("El nombre excede 100 caracteres.")
+
+        producto = {}
+        if _texto(datos.get("descripcion")):
+            producto["descripcion"] = _texto(datos["descripcion"])[:150]
+        if _texto(datos.get("categoria")):
+            producto["categoria_producto_id"] = self._buscar(self._categorias, _texto(datos["categoria"]), "Categoría")
+        clave_sat = _texto(datos.get("sat_prodserv"))
+        if clave_sat:
+            if self._sat.get(clave_sat) is None:
+                raise ErrorRenglon(f"Clave SAT '{clave_sat}' no existe.")
+            producto["sat_prodserv_id"] = self._sat[clave_sat]
+        precio_base = _decimal(datos.get("precio_base"), "precio_base")
+        if precio_base is not None:
+            producto["precio_base"] = precio_base
+        if _texto(datos.get("cod_proscai")):
+            producto["cod_proscai"] = _texto(datos["cod_proscai"])[:50]
+        if _texto(datos.get("codigo")):
+            codigo = _texto(datos["codigo"])
+            if len(codigo) > 4:
+                raise ErrorRenglon(f"El código '{codigo}' excede 4 caracteres.")
+            producto["codigo"] = codigo
+
+        variante = None
+        sku = _texto(datos.get("sku"))
+        if sku:
+            if len(sku) > 50:
+                raise ErrorRenglon(f"El SKU '{sku}' excede 50 caracteres.")
+            color_id = self._buscar(self._colores, _texto(datos.get("color")), "Color")
+            talla_id = self._buscar(self._tallas, _texto(datos.get("talla")), "Talla")
+            if color_id is None or talla_id is None:
+                raise ErrorRenglon("Una variante (sku) requiere color y talla.")
+            variante = {
+                "sku": sku,
+                "color_id": color_id,
+                "talla_id": talla_id,
+                "precio_base": _decimal(datos.get("precio_variante"), "precio_variante"),
+            }
+        return {"nombre": nombre, "producto": producto, "variante": variante}
+
+    def _upsert_productos(self, validos):
+        """``{nombre: Producto}`` del lote, dando de alta y actualizando."""
+        cambios = {}
+        for _, renglon in validos:
+            cambios.setdefault(renglon["nombre"], {}).update(renglon["producto"])
+
+        existentes = {}
+        for producto in Producto.objects.filter(empresa=self.empresa, nombre__in=list(cambios)).order_by("pk"):
+            existentes.setdefault(producto.nombre, producto)
+
+        nuevos = [
+            Producto(empresa=self.empresa, nombre=nombre, **campos)
+            for nombre, campos in cambios.items()
+            if nombre not in existentes
+        ]
+        actualizados = []
+        campos_tocados = set()
+        ahora = timezone.now()
+        for nombre, campos in cambios.items():
+            producto = existentes.get(nombre)
+            if producto is None:
+                continue
+            distintos = {campo: valor for campo, valor in campos.items() if getattr(producto, campo) != valor}
+            if distintos:
+                for campo, valor in distintos.items():
+                    setattr(producto, campo, valor)
+                # bulk_update no toca ``auto_now``.
+                producto.updated_at = ahora
+                campos_tocados.update(distintos)
+                actualizados.append(producto)
+
+        if nuevos:
+            bulk_create_with_history(nuevos, Producto, batch_size=self.tamano_lote, default_user=self.usuario)
+        if actualizados:
+            bulk_update_with_history(
+                actualizados,
+                Producto,
+                sorted(campos_tocados | {"updated_at"}),
+                batch_size=self.tamano_lote,
+                default_user=self.usuario,
+            )
+        self.resumen["productos_creados"] += len(nuevos)
+        self.resumen["productos_actualizados"] += len(actualizados)
+
+        existentes.update({producto.nombre: producto for producto in nuevos})
+        return existentes
+
+    def _upsert_variantes(self, validos, productos):
+        """Alta de SKUs nuevos y cambio de los existentes de la empresa.
+
+        Un SKU que ya existe sólo cambia las columnas que trae el renglón
+        (color, talla y ``precio_variante`` si no viene vacío): no se mueve a
+        otro producto ni se reactiva. Un SKU de otra empresa es error del
+        renglón.
+        """
+        por_sku = {}
+        for _, renglon in validos:
+            variante = renglon["variante"]
+            if variante is not None:
+                # Un SKU repetido en el lote se queda con su último renglón.
+                por_sku[variante["sku"]] = (renglon["nombre"], variante)
+        if not por_sku:
+            return
+
+        previas = {
+            variante.sku: variante
+            for variante in ProductoVariante.objects.filter(sku__in=list(por_sku)).select_related(
+                "producto", "color", "talla"
+            )
+        }
+        ajenas = {sku for sku, variante in previas.items() if variante.empresa_id != self.empresa.pk}
+        for numero, renglon in validos:
+            if renglon["variante"] is not None and renglon["variante"]["sku"] in ajenas:
+                self._error(numero, f"El SKU '{renglon['variante']['sku']}' pertenece a otra empresa.")
+
+        nuevas = []
+        cambiadas = []
+        campos_tocados = set()
+        for sku, (nombre, datos) in por_sku.items():
+            if sku in ajenas:
+                continue
+            variante = previas.get(sku)
+            if variante is None:
+                producto = productos[nombre]
+                precio = datos["precio_base"] if datos["precio_base"] is not None else producto.precio_base
+                variante = ProductoVariante(
+                    producto=producto,
+                    empresa=self.empresa,
+                    color_id=datos["color_id"],
+                    talla_id=datos["talla_id"],
+                    sku=sku,
+                    precio_base=precio or Decimal("0"),
+                )
+                variante.nombre = self._nombre_variante(variante)
+                nuevas.append(variante)
+                continue
+
+            campos = {"color_id": datos["color_id"], "talla_id": datos["talla_id"]}
+            if datos["precio_base"] is not None:
+                campos["precio_base"] = datos["precio_base"]
+            distintos = {campo: valor for campo, valor in campos.items() if getattr(variante, campo) != valor}
+            if not distintos:
+                continue
+            for campo, valor in distintos.items():
+                setattr(variante, campo, valor)
+            if {"color_id", "talla_id"} & distintos.keys():
+                variante.nombre = self._nombre_variante(variante)
+                distintos["nombre"] = variante.nombre
+            campos_tocados.update(distintos)
+            cambiadas.append(variante)
+
+        if nuevas:
+            bulk_create_with_history(nuevas, ProductoVariante, batch_size=self.tamano_lote, default_user=self.usuario)
+        if cambiadas:
+            bulk_update_with_history(
+                cambiadas,
+                ProductoVariante,
+                sorted(campo.removesuffix("_id") for campo in campos_tocados),
+                batch_size=self.tamano_lote,
+                default_user=self.usuario,
+            )
+        self.resumen["variantes_creadas"] += len(nuevas)
+        self.resumen["variantes_actualizadas"] += len(cambiadas)
+
+    def _nombre_variante(self, variante):
+        """Lo que pondría ``ProductoVariante.save``; las escrituras por lote no lo llaman."""
+        # Un SKU existente puede conservar un color o talla ya inactivos.
+        color = self._nombres_color.get(variante.color_id) or variante.color.nombre
+        talla = self._nombres_talla.get(variante.talla_id) or variante.talla.nombre
+        return f"{variante.producto.nombre} - {color} - {talla}"[:150]
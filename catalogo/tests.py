@@ -0,0 +1,144 @@
+"""Tests de la importación de productos y variantes desde Excel.
+
+``ImportacionProductosService.importar`` recibe los renglones ya leídos
+(tuplas, como las da ``leer_xlsx``), así que aquí se le pasan listas: el
+primer renglón es el encabezado.
+
+Ejecutar SIEMPRE con una BD desechable; el ``.env`` del repo apunta a Supabase
+de producción. Ejemplo con un settings de override a SQLite en memoria:
+
+    python manage.py test catalogo --settings=sqlite_settings
+"""
+
+from decimal import Decimal
+
+from django.test import TestCase
+
+from catalogo.models import Color, Producto, ProductoVariante, Talla
+from catalogo.services.importacion_productos_service import ImportacionProductosService
+from nucleo.models import Empresa
+
+ENCABEZADO = ("nombre", "descripcion", "precio_base", "sku", "color", "talla", "precio_variante")
+
+
+class ImportacionProductosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="imp", razon_social="Importaciones SA")
+        cls.negro = Color.objects.create(nombre="Negro", codigo="NEG", codigo_hex="#000000")
+        cls.blanco = Color.objects.create(nombre="Blanco", codigo="BCO", codigo_hex="#FFFFFF")
+        cls.chica = Talla.objects.create(nombre="CH")
+        cls.grande = Talla.objects.create(nombre="G")
+
+    def importar(self, *renglones, empresa=None, tamano_lote=None):
+        servicio = ImportacionProductosService(empresa or self.empresa, tamano_lote=tamano_lote)
+        return servicio.importar([ENCABEZADO, *renglones])
+
+    def test_alta(self):
+        resumen = self.importar(
+            ("Playera", "Algodón", "199.90", "PLA-NEG-CH", "Negro", "CH", ""),
+            ("Playera", "", "", "PLA-BCO-G", "bco", "g", "$1,250.50"),
+        )
+
+        self.assertEqual(resumen["productos_creados"], 1)
+        self.assertEqual(resumen["variantes_creadas"], 2)
+        self.assertEqual(resumen["con_error"], 0)
+        producto = Producto.objects.get(empresa=self.empresa, nombre="Playera")
+        self.assertEqual(producto.descripcion, "Algodón")
+        self.assertEqual(producto.precio_base, Decimal("199.90"))
+        negra = ProductoVariante.objects.get(sku="PLA-NEG-CH")
+        # Sin precio propio toma el del producto.
+        self.assertEqual(negra.precio_base, Decimal("199.90"))
+        self.assertEqual(negra.nombre, "Playera - Negro - CH")
+        self.assertEqual(negra.history.count(), 1)
+        blanca = ProductoVariante.objects.get(sku="PLA-BCO-G")
+        self.assertEqual((blanca.color, blanca.talla), (self.blanco, self.grande))
+        self.assertEqual(blanca.precio_base, Decimal("1250.50"))
+
+    def test_celdas_vacias_no_borran(self):
+        self.importar(("Playera", "Algodón", "199.90", "PLA-NEG-CH", "Negro", "CH", "210"))
+
+        resumen = self.importar(("Playera", "", "", "PLA-NEG-CH", "Negro", "CH", ""))
+
+        self.assertEqual(resumen["productos_actualizados"], 0)
+        self.assertEqual(resumen["variantes_actualizadas"], 0)
+        producto = Producto.objects.get(empresa=self.empresa, nombre="Playera")
+        self.assertEqual((producto.descripcion, producto.precio_base), ("Algodón", Decimal("199.90")))
+        self.assertEqual(ProductoVariante.objects.get(sku="PLA-NEG-CH").precio_base, Decimal("210"))
+
+    def test_reimportar_cambia_solo_lo_que_trae(self):
+        self.importar(("Playera", "Algodón", "199.90", "PLA-NEG-CH", "Negro", "CH", "210"))
+        variante = ProductoVariante.objects.get(sku="PLA-NEG-CH")
+        original = variante.producto
+        variante.activo = False
+        variante.save()
+
+        # El mismo SKU bajo otro nombre de producto, con otra talla y precio.
+        resumen = self.importar(("Sudadera", "", "", "PLA-NEG-CH", "Negro", "G", "250"))
+
+        self.assertEqual(resumen["productos_creados"], 1)
+        self.assertEqual(resumen["variantes_creadas"], 0)
+        self.assertEqual(resumen["variantes_actualizadas"], 1)
+        variante.refresh_from_db()
+        self.assertEqual(variante.producto, original)
+        self.assertFalse(variante.activo)
+        self.assertEqual(variante.talla, self.grande)
+        self.assertEqual(variante.precio_base, Decimal("250"))
+        self.assertEqual(variante.nombre, "Playera - Negro - G")
+        self.assertEqual(variante.history.first().history_type, "~")
+
+        # Reimportar el mismo archivo no cambia nada.
+        resumen = self.importar(("Sudadera", "", "", "PLA-NEG-CH", "Negro", "G", "250"))
+        self.assertEqual(resumen["productos_actualizados"], 0)
+        self.assertEqual(resumen["variantes_actualizadas"], 0)
+
+    def test_sku_de_otra_empresa(self):
+        otra = Empresa.objects.create(codigo="otra", razon_social="Otra SA")
+        ajeno = Producto.objects.create(empresa=otra, nombre="Ajeno", precio_base=Decimal("10"))
+        ProductoVariante.objects.create(
+            producto=ajeno, empresa=otra, color=self.negro, talla=self.chica, sku="AJE-1", precio_base=Decimal("10")
+        )
+
+        resumen = self.importar(
+            ("Playera", "", "100", "AJE-1", "Blanco", "G", "99"),
+            ("Playera", "", "", "PLA-1", "Negro", "CH", ""),
+            tamano_lote=1,
+        )
+
+        self.assertEqual(resumen["errores"], [{"fila": 2, "error": "El SKU 'AJE-1' pertenece a otra empresa."}])
+        self.assertEqual(resumen["variantes_creadas"], 1)
+        ajena = ProductoVariante.objects.get(sku="AJE-1")
+        self.assertEqual((ajena.empresa, ajena.producto, ajena.color), (otra, ajeno, self.negro))
+        self.assertEqual(ajena.precio_base, Decimal("10"))
+        self.assertEqual(ProductoVariante.objects.get(sku="PLA-1").empresa, self.empresa)
+
+    def test_errores_por_renglon(self):
+        resumen = self.importar(
+            ("", "", "", "", "", "", ""),
+            ("Sin nombre", "", "abc", "", "", "", ""),
+            ("Playera", "", "", "PLA-1", "Morado", "CH", ""),
+            ("Playera", "", "", "PLA-2", "Negro", "", ""),
+            ("Playera", "", "", "PLA-3", "Negro", "CH", ""),
+        )
+
+        self.assertEqual(
+            resumen["errores"],
+            [
+                {"fila": 3, "error": "precio_base 'abc' no es un número."},
+                {"fila": 4, "error": "Color 'Morado' no existe."},
+                {"fila": 5, "error": "Una variante (sku) requiere color y talla."},
+            ],
+        )
+        self.assertEqual(resumen["leidos"], 4)
+        # Sin precio en el renglón ni en el producto, la variante queda en 0.
+        self.assertEqual(ProductoVariante.objects.get(sku="PLA-3").precio_base, Decimal("0"))
+
+    def test_sin_encabezado(self):
+        servicio = ImportacionProductosService(self.empresa)
+
+        resumen = servicio.importar([("Gorra",), ("Bufanda",)])
+
+        self.assertEqual(resumen["productos_creados"], 2)
+        self.assertEqual(
+            set(Producto.objects.filter(empresa=self.empresa).values_list("nombre", flat=True)), {"Gorra", "Bufanda"}
+        )
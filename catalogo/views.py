@@ -1,10 +1,9 @@
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
 from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
 from django.middleware.csrf import get_token
 from django.views.decorators.csrf import csrf_protect
 
-from .models import Producto
+from .services.importacion_productos_service import ImportacionProductosService
 
 
 @login_required
@@ -17,7 +16,11 @@ def importar_productos_excel(request):
             <html>
               <body>
                 <h2>Importar Productos (Excel)</h2>
-                <p>Sube un archivo .xlsx con una columna llamada <b>nombre</b> o con el nombre en la primera columna.</p>
+                <p>Sube un archivo .xlsx con encabezados. Requerida: <b>nombre</b>. Opcionales:
+                <b>descripcion</b>, <b>categoria</b>, <b>clave_sat</b>, <b>precio_base</b>, <b>cod_proscai</b>,
+                <b>codigo</b> y, por variante, <b>sku</b>, <b>color</b>, <b>talla</b>, <b>precio_variante</b>.
+                Un renglón por variante; los productos existentes (mismo nombre) se actualizan.
+                Para catálogos grandes usa <code>manage.py importar_productos</code>.</p>
                 <form method="post" enctype="multipart/form-data">
                   <input type="hidden" name="csrfmiddlewaretoken" value="{csrf_token}">
                   <input type="file" name="archivo" accept=".xlsx,.xlsm,.xltx,.xltm" required />
@@ -53,58 +56,21 @@ def importar_productos_excel(request):
     except Exception:
         return HttpResponseBadRequest("No se pudo leer el archivo. Asegúrate que sea un .xlsx válido.")
 
-    rows = ws.iter_rows(values_only=True)
-    first_row = next(rows, None)
-    if not first_row:
-        return HttpResponseBadRequest("El archivo está vacío.")
-
-    header = [
-        str(v).strip().lower() if v is not None else ""
-        for v in first_row
+    # Cada lote confirma por separado: un error a la mitad deja lo anterior
+    # importado, y los renglones con error se reportan sin detener el resto.
+    try:
+        resumen = ImportacionProductosService(empresa, usuario=user).importar(ws.iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+    if not resumen["leidos"]:
+        return HttpResponseBadRequest("No se encontraron productos en el archivo.")
+
+    lineas = [
+        f"Importación completada. Leídos: {resumen['leidos']}. "
+        f"Productos creados: {resumen['productos_creados']}, actualizados: {resumen['productos_actualizados']}. "
+        f"Variantes creadas: {resumen['variantes_creadas']}, actualizadas: {resumen['variantes_actualizadas']}. "
+        f"Con error: {resumen['con_error']}."
     ]
-    if "nombre" in header:
-        nombre_idx = header.index("nombre")
-        has_header = True
-    else:
-        nombre_idx = 0
-        has_header = False
-
-    nombres = []
-
-    def iter_data_rows():
-        if not has_header:
-            yield first_row
-        for r in rows:
-            yield r
-
-    for r in iter_data_rows():
-        if not r or len(r) <= nombre_idx:
-            continue
-        value = r[nombre_idx]
-        if value is None:
-            continue
-        nombre = str(value).strip()
-        if not nombre:
-            continue
-        nombres.append(nombre)
-
-    if not nombres:
-        return HttpResponseBadRequest("No se encontraron nombres de producto en el archivo.")
-
-    nombres = list(dict.fromkeys(nombres))
-
-    with transaction.atomic():
-        existentes = set(
-            Producto.objects.filter(empresa=empresa, nombre__in=nombres).values_list("nombre", flat=True)
-        )
-        nuevos = [
-            Producto(empresa=empresa, nombre=n)
-            for n in nombres
-            if n not in existentes
-        ]
-        if nuevos:
-            Producto.objects.bulk_create(nuevos)
-
-    return HttpResponse(
-        f"Importación completada. Leídos: {len(nombres)}. Creados: {len(nuevos)}. Ya existían: {len(existentes)}."
-    )
+    lineas += [f"Fila {e['fila']}: {e['error']}" for e in resumen["errores"][:100]]
+    return HttpResponse("\n".join(lineas), content_type="text/plain; charset=utf-8")
@@ -121,6 +121,7 @@ class OrdenCompraDetalleSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrdenCompraDetalle
         fields = "__all__"
+        read_only_fields = ["cantidad_recibida"]
 
 
 class RecepcionDetalleResumenSerializer(serializers.ModelSerializer):
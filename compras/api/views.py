@@ -2,7 +2,7 @@ import logging
 from decimal import Decimal
 
 from django.db import transaction
-from django.db.models import Prefetch, Q, Sum
+from django.db.models import Prefetch, Q
 from django.utils import timezone
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
@@ -12,6 +12,7 @@ from rest_framework.response import Response
 from auditoria.models import AuditoriaEvento
 from catalogo.models import Producto
 from compras.models import OrdenCompra, OrdenCompraDetalle, Recepcion, RecepcionDetalle
+from compras.services.recepcion_entrada_service import RecepcionEntradaService
 from compras.api.serializers import (
     OrdenCompraOnboardingSerializer,
     OrdenCompraRetrieveSerializer,
@@ -23,13 +24,7 @@ from compras.api.serializers import (
     RecepcionRetrieveSerializer,
     RecepcionSerializer,
 )
-from inventarios.models import (
-    Almacen,
-    Existencia,
-    MovimientoInventario,
-    MovimientoInventarioDetalle,
-    Ubicacion,
-)
+from inventarios.models import Almacen, MovimientoInventario, Ubicacion
 from nucleo.models import Moneda, SerieFolio, Sucursal
 from produccion.models import OrdenProduccion, OrdenProduccionDetalle
 from terceros.models import Proveedor, Transportista
@@ -39,6 +34,7 @@ logger = logging.getLogger(__name__)
 class OrdenCompraViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = OrdenCompra.objects.filter(activo=True)
     serializer_class = OrdenCompraSerializer
+    cursor_ordering = "fecha_oc"  # mismo orden que get_queryset
 
     def get_queryset(self):
         user = self.request.user
@@ -135,10 +131,7 @@ class OrdenCompraViewSet(viewsets.ReadOnlyModelViewSet):
 
         if serie_folio:
             try:
-                folio_formateado, nuevo_consecutivo, anio_actual = serie_folio.get_siguiente_folio()
-                serie_folio.folio_actual = nuevo_consecutivo
-                serie_folio.ultimo_anio = anio_actual
-                serie_folio.save(update_fields=["folio_actual", "ultimo_anio"])
+                folio_formateado, _, _ = serie_folio.consumir()
                 instance.folio = folio_formateado
                 instance.save(update_fields=["folio"])
                 return
@@ -553,6 +546,7 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
         "usuario",
     )
     serializer_class = RecepcionSerializer
+    cursor_ordering = "fecha_recepcion"  # mismo orden que get_queryset
     http_method_names = ["get", "post"]
 
     def get_queryset(self):
@@ -610,7 +604,9 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
         return RecepcionSerializer
 
     def _serie_folio_recepcion(self, empresa, sucursal, serie_codigo):
-        qs = SerieFolio.objects.select_for_update().filter(
+        # Sin select_for_update: ``SerieFolio.consumir`` bloquea la fila sólo
+        # cuando la serie está en modo FILA.
+        qs = SerieFolio.objects.filter(
             empresa=empresa,
             sucursal=sucursal,
             activo=True,
@@ -648,162 +644,29 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
             )
 
         try:
-            folio_formateado, nuevo_consecutivo, anio_actual = serie_folio.get_siguiente_folio()
+            folio_formateado, _, _ = serie_folio.consumir()
         except Exception:
             raise ValidationError({"folio": "No se pudo generar el folio de la recepción."})
 
-        serie_folio.folio_actual = nuevo_consecutivo
-        serie_folio.ultimo_anio = anio_actual
-        serie_folio.save(update_fields=["folio_actual", "ultimo_anio", "updated_at"])
         recepcion.folio = folio_formateado
 
-    def _cantidad_recibida_oc(self, orden_compra_detalle_id):
-        total = (
-            RecepcionDetalle.objects.filter(
-                orden_compra_detalle_id=orden_compra_detalle_id,
-                recepcion__activo=True,
-            )
-            .exclude(recepcion__estatus=Recepcion.EstatusRecepcion.CANCELADA)
-            .aggregate(total=Sum("cantidad_recibida"))
-            .get("total")
-        )
-        return Decimal(str(total or 0))
-
-    def _cantidad_recibida_op(self, orden_produccion_detalle_id):
-        total = (
-            RecepcionDetalle.objects.filter(
-                orden_produccion_detalle_id=orden_produccion_detalle_id,
-                recepcion__activo=True,
-            )
-            .exclude(recepcion__estatus=Recepcion.EstatusRecepcion.CANCELADA)
-            .aggregate(total=Sum("cantidad_recibida"))
-            .get("total")
-        )
-        return Decimal(str(total or 0))
-
     def _actualizar_existencias(self, recepcion, detalle_payload):
-        movimientos = []
-        for item in detalle_payload:
-            ubicacion = None
-            ubicacion_id = item.get("ubicacion")
-            if recepcion.almacen.requiere_ubicacion and not ubicacion_id:
-                raise ValidationError(
-                    {"ubicacion": "La ubicación es requerida para este almacén."}
-                )
-            if ubicacion_id:
-                ubicacion = Ubicacion.objects.filter(
-                    pk=ubicacion_id,
-                    almacen_id=recepcion.almacen_id,
-                ).first()
-                if not ubicacion:
-                    raise ValidationError(
-                        {"ubicacion": "La ubicación no pertenece al almacén seleccionado."}
-                    )
-
-            cantidad = item["cantidad_recibida"]
-            producto = item["producto"]
-            producto_variante = item.get("producto_variante")
-            producto_id = producto.pk
-
-            existencia = (
-                Existencia.objects.select_for_update()
-                .filter(
-                    producto_id=producto_id,
-                    producto_variante_id=getattr(producto_variante, "pk", None),
-                    almacen_id=recepcion.almacen_id,
-                    ubicacion_id=(ubicacion.pk if ubicacion else None),
-                )
-                .order_by("id")
-                .first()
-            )
-            if not existencia:
-                existencia = Existencia.objects.create(
-                    producto=producto,
-                    producto_variante=producto_variante,
-                    almacen=recepcion.almacen,
-                    ubicacion=ubicacion,
-                    stock=0,
-                    cantidad=Decimal("0"),
-                )
-
-            cantidad_antes = existencia.cantidad or Decimal("0")
-            cantidad_despues = cantidad_antes + cantidad
-            existencia.cantidad = cantidad_despues
-            try:
-                existencia.stock = int(cantidad_despues)
-            except Exception:
-                existencia.stock = existencia.stock or 0
-            existencia.save(update_fields=["cantidad", "stock", "fecha_actualizacion"])
-
-            detalle = RecepcionDetalle.objects.create(
-                recepcion=recepcion,
-                orden_compra_detalle=item.get("orden_compra_detalle"),
-                orden_produccion_detalle=item.get("orden_produccion_detalle"),
-                producto=producto,
-                producto_variante=producto_variante,
-                ubicacion=ubicacion,
-                lote_id=item.get("lote"),
-                serie_id=item.get("serie"),
-                cantidad_recibida=cantidad,
-            )
-
-            movimientos.append(
-                {
-                    "recepcion_detalle_id": detalle.pk,
-                    "orden_compra_detalle_id": item.get("orden_compra_detalle").pk if item.get("orden_compra_detalle") else None,
-                    "orden_produccion_detalle_id": item.get("orden_produccion_detalle").pk if item.get("orden_produccion_detalle") else None,
-                    "producto_id": producto.pk,
-                    "producto_variante_id": getattr(producto_variante, "pk", None),
-                    "ubicacion_id": existencia.ubicacion_id,
-                    "lote_id": detalle.lote_id,
-                    "serie_id": detalle.serie_id,
-                    "cantidad_before": str(cantidad_antes),
-                    "cantidad_after": str(cantidad_despues),
-                    "delta": str(cantidad),
-                }
-            )
-        return movimientos
+        return RecepcionEntradaService.aplicar(recepcion, detalle_payload)
 
     def _crear_movimiento_formal_recepcion(self, recepcion, movimientos):
-        movimiento = MovimientoInventario.objects.create(
-            empresa=recepcion.empresa,
-            sucursal=recepcion.sucursal,
-            pedido_id=None,
-            entrega_id=None,
-            devolucion_id=None,
-            ajuste_inventario_id=None,
-            tipo_movimiento="ENTRADA",
-            usuario=recepcion.usuario,
-            observaciones=recepcion.observaciones,
-            recepcion=recepcion,
-            transferencia_id=None,
-            op_id=recepcion.op_id,
-        )
-
-        for item in movimientos:
-            MovimientoInventarioDetalle.objects.create(
-                movimiento_inventario=movimiento,
-                producto_id=item["producto_id"],
-                ubicacion_origen_id=None,
-                ubicacion_destino_id=item["ubicacion_id"],
-                lote_id=item.get("lote_id"),
-                serie_id=item.get("serie_id"),
-                cantidad=Decimal(str(item["delta"] or 0)),
-                costo_unitario=Decimal("0"),
-            )
-
-        return movimiento
+        return RecepcionEntradaService.crear_movimiento_formal(recepcion, movimientos)
 
     def _actualizar_estatus_oc(self, oc):
-        detalles = OrdenCompraDetalle.objects.filter(orden_compra=oc).only("id", "cantidad")
-        if not detalles.exists():
+        detalles = list(
+            OrdenCompraDetalle.objects.filter(orden_compra=oc).values_list("cantidad", "cantidad_recibida")
+        )
+        if not detalles:
             return
 
         total_pendiente = Decimal("0")
-        for detalle in detalles:
-            ordered = Decimal(str(detalle.cantidad or 0))
-            recibido = self._cantidad_recibida_oc(detalle.pk)
-            pendiente = ordered - recibido
+        for cantidad, recibido in detalles:
+            ordered = Decimal(str(cantidad or 0))
+            pendiente = ordered - Decimal(str(recibido or 0))
             if pendiente > 0:
                 total_pendiente += pendiente
 
@@ -856,23 +719,8 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
             )
             detalles_list = list(detalles_qs)
 
-            detalle_ids = [d.pk for d in detalles_list]
-            recibido_map = {}
-            if detalle_ids:
-                recibido_qs = (
-                    RecepcionDetalle.objects.filter(
-                        orden_compra_detalle_id__in=detalle_ids,
-                        recepcion__activo=True,
-                    )
-                    .exclude(recepcion__estatus=Recepcion.EstatusRecepcion.CANCELADA)
-                    .values("orden_compra_detalle_id")
-                    .annotate(total=Sum("cantidad_recibida"))
-                )
-                for row in recibido_qs:
-                    recibido_map[row["orden_compra_detalle_id"]] = Decimal(str(row["total"] or 0))
-
             for detalle in detalles_list:
-                recibido = recibido_map.get(detalle.pk, Decimal("0"))
+                recibido = Decimal(str(detalle.cantidad_recibida or 0))
                 ordered = Decimal(str(detalle.cantidad or 0))
                 pendiente = ordered - recibido
                 item = {
@@ -939,26 +787,11 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
             )
             op_detalles_list = list(op_detalles_qs)
 
-            op_detalle_ids = [d.pk for d in op_detalles_list]
-            recibido_op_map = {}
-            if op_detalle_ids:
-                recibido_op_qs = (
-                    RecepcionDetalle.objects.filter(
-                        orden_produccion_detalle_id__in=op_detalle_ids,
-                        recepcion__activo=True,
-                    )
-                    .exclude(recepcion__estatus=Recepcion.EstatusRecepcion.CANCELADA)
-                    .values("orden_produccion_detalle_id")
-                    .annotate(total=Sum("cantidad_recibida"))
-                )
-                for row in recibido_op_qs:
-                    recibido_op_map[row["orden_produccion_detalle_id"]] = Decimal(str(row["total"] or 0))
-
             for op_detalle in op_detalles_list:
                 producto_variante = op_detalle.producto_variante
                 producto = getattr(producto_variante, "producto", None)
                 cantidad = Decimal(str(op_detalle.cantidad or 0))
-                recibido = recibido_op_map.get(op_detalle.pk, Decimal("0"))
+                recibido = Decimal(str(op_detalle.cantidad_recibida or 0))
                 pendiente = cantidad - recibido
                 item = {
                     "id": op_detalle.pk,
@@ -1084,6 +917,10 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
                 detalles_oc = {}
                 detalles_op = {}
                 detalle_payload = []
+                # Lo que ya pidieron los renglones anteriores de este mismo
+                # POST: dos renglones del mismo detalle no pueden exceder juntos
+                # el pendiente.
+                en_captura = {}
 
                 if orden_compra_id:
                     oc = (
@@ -1173,7 +1010,8 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
                                 {"detalle": f"El renglón #{idx + 1} debe tener cantidad_recibida > 0."}
                             )
 
-                        recibido = self._cantidad_recibida_oc(oc_detalle.pk)
+                        en_curso = en_captura.get(("oc", oc_detalle.pk), Decimal("0"))
+                        recibido = Decimal(str(oc_detalle.cantidad_recibida or 0)) + en_curso
                         ordered = Decimal(str(oc_detalle.cantidad or 0))
                         pendiente = ordered - recibido
                         if pendiente <= 0:
@@ -1192,6 +1030,7 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
                                     )
                                 }
                             )
+                        en_captura[("oc", oc_detalle.pk)] = en_curso + cantidad
                         detalle_payload.append(
                             {
                                 "orden_compra_detalle": oc_detalle,
@@ -1244,7 +1083,8 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
                                 {"detalle": f"El renglón #{idx + 1} debe tener cantidad_recibida > 0."}
                             )
 
-                        recibido = self._cantidad_recibida_op(op_detalle.pk)
+                        en_curso = en_captura.get(("op", op_detalle.pk), Decimal("0"))
+                        recibido = Decimal(str(op_detalle.cantidad_recibida or 0)) + en_curso
                         ordered = Decimal(str(op_detalle.cantidad or 0))
                         pendiente = ordered - recibido
                         if pendiente <= 0:
@@ -1263,6 +1103,7 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
                                     )
                                 }
                             )
+                        en_captura[("op", op_detalle.pk)] = en_curso + cantidad
                         detalle_payload.append(
                             {
                                 "orden_compra_detalle": None,
@@ -1303,15 +1144,13 @@ class RecepcionViewSet(viewsets.ReadOnlyModelViewSet):
                 movimientos = self._actualizar_existencias(recepcion, detalle_payload)
                 movimiento_formal = self._crear_movimiento_formal_recepcion(recepcion, movimientos)
 
+                # ``_actualizar_existencias`` ya sumó lo recibido a los contadores
+                # de estas mismas instancias (la OC/OP sigue bloqueada).
                 orden_completa = True
                 detalles_origen = detalles_oc.values() if oc else detalles_op.values()
                 for detalle in detalles_origen:
                     ordered = Decimal(str(detalle.cantidad or 0))
-                    recibido = (
-                        self._cantidad_recibida_oc(detalle.pk)
-                        if oc
-                        else self._cantidad_recibida_op(detalle.pk)
-                    )
+                    recibido = Decimal(str(detalle.cantidad_recibida or 0))
                     if recibido < ordered:
                         orden_completa = False
                         break
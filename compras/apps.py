@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class ComprasConfig(AppConfig):
     name = 'compras'
+
+    def ready(self):
+        from compras.services.cantidad_recibida_service import conectar_senales
+
+        conectar_senales()
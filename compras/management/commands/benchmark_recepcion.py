@@ -0,0 +1,168 @@
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from catalogo.models import Producto
+from compras.models import Recepcion, RecepcionDetalle
+from compras.services.recepcion_entrada_service import RecepcionEntradaService
+from inventarios.models import Almacen, Existencia, MovimientoInventarioDetalle, Ubicacion
+from nucleo.models import Sucursal
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la entrada a existencias de una recepción de --lineas renglones "
+        "(por omisión 10k, el tamaño de una recepción RFID grande) con "
+        "RecepcionEntradaService y, con --por-renglon, con el camino anterior "
+        "renglón por renglón. Cada corrida crea su almacén, ubicaciones y "
+        "recepción dentro de una transacción que se revierte al final: no deja "
+        "datos, pero sí necesita productos, una sucursal y un usuario."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lineas", type=int, default=10_000, help="Renglones de la recepción.")
+        parser.add_argument("--productos", type=int, default=500, help="Productos distintos entre los renglones.")
+        parser.add_argument("--ubicaciones", type=int, default=40, help="Ubicaciones del almacén de prueba.")
+        parser.add_argument(
+            "--existentes",
+            type=float,
+            default=0.5,
+            help="Fracción de destinos con Existencia previa (el resto se crea).",
+        )
+        parser.add_argument("--por-renglon", action="store_true", help="Mide también el camino anterior.")
+        parser.add_argument("--semilla", type=int, default=1, help="Semilla del generador.")
+
+    def handle(self, *args, **options):
+        if options["lineas"] < 1 or options["productos"] < 1 or options["ubicaciones"] < 1:
+            raise CommandError("--lineas, --productos y --ubicaciones deben ser positivos.")
+        productos = list(Producto.objects.order_by("pk")[: options["productos"]])
+        sucursal = Sucursal.objects.select_related("empresa").order_by("pk").first()
+        usuario = get_user_model().objects.order_by("pk").first()
+        if not productos or sucursal is None or usuario is None:
+            raise CommandError("Se necesitan productos, una sucursal y un usuario en la base.")
+
+        caminos = [("por lotes", self._por_lotes)]
+        if options["por_renglon"]:
+            caminos.append(("por renglón", self._por_renglon))
+
+        for nombre, camino in caminos:
+            ms, consultas = self._corrida(options, productos, sucursal, usuario, camino)
+            self.stdout.write(
+                f"{nombre:<12} {options['lineas']} renglones: {ms:.0f} ms, {consultas} consultas "
+                f"({ms / options['lineas'] * 1000:.1f} µs/renglón)"
+            )
+
+    def _corrida(self, options, productos, sucursal, usuario, camino):
+        token = uuid.uuid4().hex[:8]
+        azar = random.Random(options["semilla"])
+        with transaction.atomic():
+            almacen = Almacen.objects.create(
+                codigo=f"BENCH-{token}",
+                nombre=f"Benchmark recepción {token}",
+                empresa=sucursal.empresa,
+                sucursal=sucursal,
+                requiere_ubicacion=True,
+            )
+            ubicaciones = Ubicacion.objects.bulk_create(
+                [Ubicacion(almacen=almacen, pasillo="BENCH", rack=str(i)) for i in range(options["ubicaciones"])]
+            )
+            destinos = [(producto, ubicacion) for producto in productos for ubicacion in ubicaciones]
+            previos = azar.sample(destinos, int(len(destinos) * min(max(options["existentes"], 0), 1)))
+            Existencia.objects.bulk_create(
+                [
+                    Existencia(
+                        producto=producto,
+                        almacen=almacen,
+                        ubicacion=ubicacion,
+                        stock=10,
+                        cantidad=Decimal("10"),
+                    )
+                    for producto, ubicacion in previos
+                ],
+                batch_size=RecepcionEntradaService.BATCH_SIZE,
+            )
+            recepcion = Recepcion.objects.create(
+                empresa=sucursal.empresa,
+                sucursal=sucursal,
+                almacen=almacen,
+                usuario=usuario,
+                folio=f"BENCH-{token}",
+                fecha_recepcion=timezone.now(),
+            )
+            payload = []
+            for _ in range(options["lineas"]):
+                producto, ubicacion = azar.choice(destinos)
+                payload.append(
+                    {
+                        "orden_compra_detalle": None,
+                        "orden_produccion_detalle": None,
+                        "producto": producto,
+                        "producto_variante": None,
+                        "cantidad_recibida": Decimal("1"),
+                        "ubicacion": ubicacion.pk,
+                        "lote": None,
+                        "serie": None,
+                    }
+                )
+
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                camino(recepcion, payload)
+                ms = (time.perf_counter() - inicio) * 1000
+            # Nada de la corrida queda en la base.
+            transaction.set_rollback(True)
+        return ms, len(consultas.captured_queries)
+
+    def _por_lotes(self, recepcion, payload):
+        movimientos = RecepcionEntradaService.aplicar(recepcion, payload)
+        RecepcionEntradaService.crear_movimiento_formal(recepcion, movimientos)
+
+    def _por_renglon(self, recepcion, payload):
+        """Referencia: el camino anterior, cinco consultas por renglón."""
+        movimientos = []
+        for item in payload:
+            ubicacion = Ubicacion.objects.filter(pk=item["ubicacion"], almacen_id=recepcion.almacen_id).first()
+            existencia = (
+                Existencia.objects.select_for_update()
+                .filter(
+                    producto_id=item["producto"].pk,
+                    producto_variante_id=None,
+                    almacen_id=recepcion.almacen_id,
+                    ubicacion_id=ubicacion.pk,
+                )
+                .order_by("id")
+                .first()
+            )
+            if not existencia:
+                existencia = Existencia.objects.create(
+                    producto=item["producto"],
+                    almacen=recepcion.almacen,
+                    ubicacion=ubicacion,
+                    stock=0,
+                    cantidad=Decimal("0"),
+                )
+            existencia.cantidad += item["cantidad_recibida"]
+            existencia.stock = int(existencia.cantidad)
+            existencia.save(update_fields=["cantidad", "stock", "fecha_actualizacion"])
+            RecepcionDetalle.objects.create(
+                recepcion=recepcion,
+                producto=item["producto"],
+                ubicacion=ubicacion,
+                cantidad_recibida=item["cantidad_recibida"],
+            )
+            movimientos.append((item, ubicacion))
+        movimiento = RecepcionEntradaService.crear_movimiento_formal(recepcion, [])
+        for item, ubicacion in movimientos:
+            MovimientoInventarioDetalle.objects.create(
+                movimiento_inventario=movimiento,
+                producto=item["producto"],
+                ubicacion_destino=ubicacion,
+                cantidad=item["cantidad_recibida"],
+            )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from compras.models import OrdenCompraDetalle
+from compras.services.cantidad_recibida_service import CantidadRecibidaService
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula cantidad_recibida de los renglones de OC y OP desde el "
+        "historial de RecepcionDetalle (recepciones activas y no canceladas) y "
+        "reporta los que no cuadran con el contador. Con --corregir reescribe "
+        "los contadores de las órdenes con diferencia."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corregir", action="store_true", help="Reescribe los contadores con diferencia.")
+        parser.add_argument("--orden-compra", type=int, action="append", help="Id de OC (repetible).")
+        parser.add_argument("--orden-produccion", type=int, action="append", help="Id de OP (repetible).")
+
+    def handle(self, *args, **options):
+        oc_ids = options.get("orden_compra")
+        op_ids = options.get("orden_produccion")
+        # Acotar a OC sin pedir OP (o al revés) no revisa el otro tipo.
+        if oc_ids and not op_ids:
+            op_ids = []
+        elif op_ids and not oc_ids:
+            oc_ids = []
+
+        diferencias = CantidadRecibidaService.conciliar(
+            corregir=options["corregir"],
+            orden_compra_ids=oc_ids,
+            orden_produccion_ids=op_ids,
+        )
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("Todos los contadores cuadran con el historial."))
+            return
+
+        for modelo, pk, orden_id, contador, historico in diferencias:
+            origen = "OC" if modelo is OrdenCompraDetalle else "OP"
+            self.stdout.write(
+                f"{origen} {orden_id:>8} renglón {pk:>8}: contador={contador} "
+                f"historial={historico} (diferencia {contador - historico})"
+            )
+        ordenes = len({(modelo, orden_id) for modelo, _, orden_id, _, _ in diferencias})
+        resumen = f"{len(diferencias)} renglón(es) con diferencia en {ordenes} orden(es)"
+        if options["corregir"]:
+            self.stdout.write(self.style.SUCCESS(f"{resumen}: corregidos."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{resumen}. Usa --corregir para reescribirlos."))
@@ -0,0 +1,69 @@
+# Generated by Django 6.0.7 on 2026-10-17 15:10
+
+import re
+
+from django.db import migrations, models
+
+LOTE = 2000
+
+_SEPARADORES = re.compile(r"[\s:\-]")
+_HEX = re.compile(r"^[0-9a-f]+$")
+
+
+def _pc_anuncia_96_bits(pc_hex):
+    return int(pc_hex, 16) >> 11 == 6
+
+
+def normalizar_epc(valor):
+    # Copia congelada de ``wms.utils.epc.normalizar_epc`` (la misma de
+    # ``wms.0015``): la migración debe dar el mismo resultado aunque la función
+    # cambie después.
+    if isinstance(valor, bytes):
+        valor = valor.decode("utf-8", errors="replace")
+    epc = _SEPARADORES.sub("", str(valor or "")).lower()
+    if len(epc) < 8 or not _HEX.match(epc):
+        return ""
+
+    if len(epc) < 24:
+        return epc.rjust(24, "0")
+    if len(epc) == 28:
+        return epc[4:] if _pc_anuncia_96_bits(epc[:4]) else epc[:24]
+    if len(epc) == 32:
+        if epc.endswith("0" * 8) and epc.startswith(("30", "a", "b", "00")):
+            return epc[:24]
+        if _pc_anuncia_96_bits(epc[:4]):
+            return epc[4:28]
+    return epc
+
+
+def llenar_epc_normalizado(apps, schema_editor):
+    RecepcionRFIDLectura = apps.get_model("compras", "RecepcionRFIDLectura")
+    pendientes = []
+    for fila in RecepcionRFIDLectura.objects.only("id", "codigo_tag").order_by("id").iterator(chunk_size=LOTE):
+        fila.epc_normalizado = normalizar_epc(fila.codigo_tag)
+        pendientes.append(fila)
+        if len(pendientes) >= LOTE:
+            RecepcionRFIDLectura.objects.bulk_update(pendientes, ["epc_normalizado"])
+            pendientes = []
+    if pendientes:
+        RecepcionRFIDLectura.objects.bulk_update(pendientes, ["epc_normalizado"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compras', '0014_calidadinspeccion_calidadinspecciondetalle_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recepcionrfidlectura',
+            name='epc_normalizado',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(llenar_epc_normalizado, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recepcionrfidlectura',
+            index=models.Index(fields=['encuadre', 'epc_normalizado'], name='recepcion_rfid_lect_epc_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.7 on 2026-10-17 17:05
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+# ``Recepcion.EstatusRecepcion.CANCELADA``
+CANCELADA = 6
+
+
+def llenar_contadores(apps, schema_editor):
+    RecepcionDetalle = apps.get_model("compras", "RecepcionDetalle")
+    OrdenCompraDetalle = apps.get_model("compras", "OrdenCompraDetalle")
+    OrdenProduccionDetalle = apps.get_model("produccion", "OrdenProduccionDetalle")
+
+    for modelo, campo in (
+        (OrdenCompraDetalle, "orden_compra_detalle"),
+        (OrdenProduccionDetalle, "orden_produccion_detalle"),
+    ):
+        total = (
+            RecepcionDetalle.objects.filter(**{campo: OuterRef("pk")}, recepcion__activo=True)
+            .exclude(recepcion__estatus=CANCELADA)
+            .values(campo)
+            .annotate(total=Sum("cantidad_recibida"))
+            .values("total")
+        )
+        modelo.objects.filter(
+            pk__in=RecepcionDetalle.objects.filter(**{f"{campo}__isnull": False}).values(campo)
+        ).update(
+            cantidad_recibida=Coalesce(
+                Subquery(total),
+                Value(Decimal("0")),
+                output_field=models.DecimalField(max_digits=18, decimal_places=4),
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("compras", "0015_recepcionrfidlectura_epc_normalizado"),
+        ("produccion", "0034_ordenproducciondetalle_cantidad_recibida"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ordencompradetalle",
+            name="cantidad_recibida",
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=18),
+        ),
+        migrations.AddField(
+            model_name="historicalordencompradetalle",
+            name="cantidad_recibida",
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=18),
+        ),
+        migrations.RunPython(llenar_contadores, migrations.RunPython.noop),
+    ]
@@ -171,6 +171,10 @@ class OrdenCompraDetalle(models.Model):
     importe = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
     sucursal = models.ForeignKey(Sucursal, on_delete=models.CASCADE, related_name='ordenes_compra_detalle')
     piezas = models.IntegerField(default=0)
+    # Suma de ``RecepcionDetalle.cantidad_recibida`` de recepciones activas y no
+    # canceladas; la mantiene ``CantidadRecibidaService`` (ver
+    # ``conciliar_cantidad_recibida``).
+    cantidad_recibida = models.DecimalField(max_digits=18, decimal_places=4, default=0)
 
     history = HistoricalRecords()
 
@@ -179,6 +183,21 @@ class OrdenCompraDetalle(models.Model):
         verbose_name = 'Orden Compra Detalle'
         verbose_name_plural = 'Ordenes Compra Detalle'
 
+    def save(self, *args, **kwargs):
+        # ``cantidad_recibida`` sólo se mueve con los ``UPDATE`` relativos de
+        # ``CantidadRecibidaService``. Un save completo de una instancia
+        # cargada antes de una recepción escribiría el total viejo, así que
+        # se deja fuera de ``update_fields`` y se relee para que el historial
+        # y quien llama vean el valor vigente.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                campo.attname
+                for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != "cantidad_recibida"
+            ]
+            self.refresh_from_db(fields=["cantidad_recibida"])
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return str(self.id)
 
@@ -351,6 +370,9 @@ class RecepcionRFIDLectura(models.Model):
         related_name="lecturas",
     )
     codigo_tag = models.CharField(max_length=120)
+    # EPC canónico del tag (``wms.utils.epc.normalizar_epc``): el mismo tag
+    # leído con otra representación cuenta como repetido en el encuadre.
+    epc_normalizado = models.CharField(max_length=64, blank=True, default="")
     orden_compra_detalle = models.ForeignKey(
         OrdenCompraDetalle,
         on_delete=models.CASCADE,
@@ -389,6 +411,9 @@ class RecepcionRFIDLectura(models.Model):
                 name="uq_recepcion_rfid_lectura_encuadre_tag",
             )
         ]
+        indexes = [
+            models.Index(fields=["encuadre", "epc_normalizado"], name="recepcion_rfid_lect_epc_idx"),
+        ]
 
     def __str__(self):
         return self.codigo_tag
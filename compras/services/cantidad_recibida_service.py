@@ -0,0 +1,178 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, pre_save
+
+from compras.models import OrdenCompra, OrdenCompraDetalle, Recepcion, RecepcionDetalle
+from produccion.models import OrdenProduccion, OrdenProduccionDetalle
+
+_DECIMAL = DecimalField(max_digits=18, decimal_places=4)
+_ATRIBUTO_CONTABA = "_cantidad_recibida_contaba"
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value or 0))
+    except Exception:
+        return Decimal("0")
+
+
+class CantidadRecibidaService:
+    """Contadores ``cantidad_recibida`` de los renglones de OC y OP.
+
+    Antes cada renglón sumaba su historial de ``RecepcionDetalle`` al validar
+    el POST de recepción, al decidir si la orden quedó completa y otra vez en
+    ``_actualizar_estatus_oc``: una OC de 200 renglones costaba más de 400
+    agregados por recepción. Ahora el renglón guarda el total y se mueve con
+    un ``UPDATE ... SET cantidad_recibida = cantidad_recibida + delta`` por
+    modelo, en la misma transacción que inserta los ``RecepcionDetalle``.
+
+    Cuenta lo mismo que contaba el agregado: renglones de recepciones con
+    ``activo=True`` y estatus distinto de ``CANCELADA``. Cuando una recepción
+    entra o sale de ese conjunto (cancelación, desactivación) la señal de
+    ``conectar_senales`` suma o resta sus renglones. Las escrituras masivas
+    (``update``/``delete`` por queryset) no pasan por aquí; el comando
+    ``conciliar_cantidad_recibida`` recalcula desde el historial y reporta la
+    diferencia. El ``save()`` ordinario de los renglones deja fuera la
+    columna (ver ``OrdenCompraDetalle.save``): una instancia cargada antes de
+    una recepción no puede devolverle un total viejo.
+    """
+
+    BATCH_SIZE = 500
+
+    # (modelo del renglón, FK en RecepcionDetalle, modelo padre, FK del renglón al padre)
+    ORIGENES = (
+        (OrdenCompraDetalle, "orden_compra_detalle", OrdenCompra, "orden_compra_id"),
+        (OrdenProduccionDetalle, "orden_produccion_detalle", OrdenProduccion, "op_id"),
+    )
+
+    @staticmethod
+    def cuenta(recepcion):
+        return bool(recepcion.activo) and recepcion.estatus != Recepcion.EstatusRecepcion.CANCELADA
+
+    @staticmethod
+    def historial():
+        """``RecepcionDetalle`` que suman al contador."""
+        return RecepcionDetalle.objects.filter(recepcion__activo=True).exclude(
+            recepcion__estatus=Recepcion.EstatusRecepcion.CANCELADA
+        )
+
+    @classmethod
+    def _incrementar(cls, modelo, deltas):
+        """Un ``UPDATE`` con ``CASE`` por lote de renglones."""
+        pks = [pk for pk, delta in deltas.items() if delta]
+        for inicio in range(0, len(pks), cls.BATCH_SIZE):
+            lote = pks[inicio : inicio + cls.BATCH_SIZE]
+            modelo.objects.filter(pk__in=lote).update(
+                cantidad_recibida=Case(
+                    *[When(pk=pk, then=F("cantidad_recibida") + Value(deltas[pk])) for pk in lote],
+                    default=F("cantidad_recibida"),
+                    output_field=_DECIMAL,
+                )
+            )
+
+    @classmethod
+    def registrar(cls, detalles, signo=1):
+        """Suma (``signo=1``) o resta (``-1``) los ``RecepcionDetalle`` a sus renglones.
+
+        Si la instancia del renglón de origen ya está cargada en el detalle
+        (``detalle.orden_compra_detalle``), también se actualiza en memoria:
+        el POST de recepción la sigue usando para decidir si la orden quedó
+        completa.
+        """
+        deltas = {campo: defaultdict(Decimal) for _, campo, _, _ in cls.ORIGENES}
+        for detalle in detalles:
+            cantidad = _to_decimal(detalle.cantidad_recibida) * signo
+            for _, campo, _, _ in cls.ORIGENES:
+                origen_id = getattr(detalle, f"{campo}_id")
+                if origen_id is None:
+                    continue
+                deltas[campo][origen_id] += cantidad
+                origen = detalle._state.fields_cache.get(campo)
+                if origen is not None:
+                    origen.cantidad_recibida = _to_decimal(origen.cantidad_recibida) + cantidad
+        for modelo, campo, _, _ in cls.ORIGENES:
+            cls._incrementar(modelo, deltas[campo])
+
+    @classmethod
+    def _total_historico(cls, campo):
+        total = (
+            cls.historial()
+            .filter(**{campo: OuterRef("pk")})
+            .values(campo)
+            .annotate(total=Sum("cantidad_recibida"))
+            .values("total")
+        )
+        return Coalesce(Subquery(total), Value(Decimal("0")), output_field=_DECIMAL)
+
+    @classmethod
+    def conciliar(cls, corregir=False, orden_compra_ids=None, orden_produccion_ids=None):
+        """Compara cada contador con la suma de su historial.
+
+        Devuelve ``[(modelo, renglon_id, orden_id, contador, historico)]`` con
+        los renglones que no cuadran. Con ``corregir`` los reescribe orden por
+        orden, bloqueando antes la OC/OP: el POST de recepción bloquea la misma
+        fila, así que no puede colarse un incremento entre el recálculo y la
+        escritura.
+        """
+        filtros = {OrdenCompraDetalle: orden_compra_ids, OrdenProduccionDetalle: orden_produccion_ids}
+        diferencias = []
+        for modelo, campo, padre, fk_padre in cls.ORIGENES:
+            qs = modelo.objects.annotate(historico=cls._total_historico(campo)).filter(
+                ~Q(cantidad_recibida=F("historico"))
+            )
+            if filtros[modelo] is not None:
+                qs = qs.filter(**{f"{fk_padre}__in": filtros[modelo]})
+            filas = list(qs.order_by(fk_padre, "pk").values_list("pk", fk_padre, "cantidad_recibida", "historico"))
+            diferencias.extend((modelo, pk, orden_id, contador, historico) for pk, orden_id, contador, historico in filas)
+
+            if not corregir:
+                continue
+            for orden_id in sorted({orden_id for _, orden_id, _, _ in filas}):
+                with transaction.atomic():
+                    padre.objects.select_for_update().filter(pk=orden_id).first()
+                    modelo.objects.filter(**{fk_padre: orden_id}).update(
+                        cantidad_recibida=cls._total_historico(campo)
+                    )
+        return diferencias
+
+
+# ----------------------------------------------------------------------
+# Señales
+# ----------------------------------------------------------------------
+def _antes_de_guardar(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not {"activo", "estatus"} & set(update_fields):
+        return
+    previo = Recepcion.objects.filter(pk=instance.pk).values_list("activo", "estatus").first()
+    if previo is not None:
+        activo, estatus = previo
+        setattr(
+            instance,
+            _ATRIBUTO_CONTABA,
+            bool(activo) and estatus != Recepcion.EstatusRecepcion.CANCELADA,
+        )
+
+
+def _al_guardar(sender, instance, created=False, raw=False, **kwargs):
+    """Cancelar/desactivar una recepción resta sus renglones; reactivarla los suma."""
+    contaba = instance.__dict__.pop(_ATRIBUTO_CONTABA, None)
+    if raw or created or contaba is None:
+        return
+    cuenta = CantidadRecibidaService.cuenta(instance)
+    if cuenta != contaba:
+        CantidadRecibidaService.registrar(
+            RecepcionDetalle.objects.filter(recepcion=instance).only(
+                "pk", "orden_compra_detalle_id", "orden_produccion_detalle_id", "cantidad_recibida"
+            ),
+            signo=1 if cuenta else -1,
+        )
+
+
+def conectar_senales():
+    pre_save.connect(_antes_de_guardar, sender=Recepcion, dispatch_uid="cantidad_recibida:recepcion:pre")
+    post_save.connect(_al_guardar, sender=Recepcion, dispatch_uid="cantidad_recibida:recepcion:post")
@@ -0,0 +1,231 @@
+from decimal import Decimal
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from simple_history.utils import bulk_create_with_history
+
+from compras.models import RecepcionDetalle
+from compras.services.cantidad_recibida_service import CantidadRecibidaService
+from inventarios.models import (
+    Existencia,
+    MovimientoInventario,
+    MovimientoInventarioDetalle,
+    TipoMovimiento,
+    Ubicacion,
+)
+from inventarios.services.kardex_service import KardexService
+from wms.services.existencia_service import ExistenciaService
+
+
+class RecepcionEntradaService:
+    """Entrada a existencias de los renglones de una recepción, por lotes.
+
+    El camino anterior hacía, por renglón, la consulta de la ubicación, el
+    ``select_for_update().first()`` de la ``Existencia`` destino, su ``save``
+    (o ``create``), el ``RecepcionDetalle.objects.create`` y el
+    ``MovimientoInventarioDetalle.objects.create``: unas cinco consultas por
+    renglón, y una recepción RFID trae miles. Aquí el número de consultas ya
+    no depende de los renglones sino de ``BATCH_SIZE``:
+
+    1. Todas las ubicaciones en una consulta.
+    2. Todas las existencias destino bloqueadas en un solo ``SELECT ... FOR
+       UPDATE`` en orden de pk (``get_existencia_rows_por_clave``, el mismo
+       criterio de bloqueo que picking y transferencias).
+    3. Los destinos que no tenían fila se insertan con ``ON CONFLICT DO
+       NOTHING`` (``uq_existencia_clave_ubicacion``) y se releen bloqueados:
+       si otra transacción creó la misma fila entre ambos pasos se suma sobre
+       la suya en vez de fallar.
+    4. ``bulk_update`` de existencias; ``bulk_create`` de ``RecepcionDetalle``
+       (con su historial), de ``MovimientoInventarioDetalle`` y del kardex.
+
+    Los renglones se aplican en el orden del payload, así que
+    ``cantidad_before``/``cantidad_after`` de la auditoría son los mismos que
+    daba el camino renglón por renglón, aun con varios renglones al mismo
+    destino.
+    """
+
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def _clave(item):
+        producto_variante = item.get("producto_variante")
+        return (item["producto"].pk, getattr(producto_variante, "pk", None))
+
+    @staticmethod
+    def resolver_ubicaciones(almacen, detalle_payload):
+        """``{ubicacion_id: Ubicacion}`` de los renglones, validadas contra el almacén."""
+        ids = set()
+        for item in detalle_payload:
+            ubicacion_id = item.get("ubicacion")
+            if almacen.requiere_ubicacion and not ubicacion_id:
+                raise ValidationError({"ubicacion": "La ubicación es requerida para este almacén."})
+            if ubicacion_id:
+                ids.add(ubicacion_id)
+        if not ids:
+            return {}
+        ubicaciones = Ubicacion.objects.filter(almacen_id=almacen.pk).in_bulk(list(ids))
+        if len(ubicaciones) != len(ids):
+            raise ValidationError({"ubicacion": "La ubicación no pertenece al almacén seleccionado."})
+        return ubicaciones
+
+    @staticmethod
+    def _leer_destinos(almacen, destinos):
+        """``{(clave, ubicacion_id): Existencia}`` bloqueadas; la de menor pk por destino."""
+        claves = list({clave for clave, _ in destinos})
+        filas = {}
+        for clave, existentes in ExistenciaService.get_existencia_rows_por_clave(
+            claves, lock=True, almacen_id=almacen.pk
+        ).items():
+            for fila in existentes:
+                destino = (clave, fila.ubicacion_id)
+                if destino in destinos:
+                    filas.setdefault(destino, fila)
+        return filas
+
+    @classmethod
+    def bloquear_existencias(cls, almacen, destinos):
+        """Bloquea (y crea en cero si faltan) las existencias de ``destinos``.
+
+        ``destinos`` es un conjunto de ``((producto_id, variante_id), ubicacion_id)``.
+        """
+        destinos = set(destinos)
+        filas = cls._leer_destinos(almacen, destinos)
+        faltantes = destinos - filas.keys()
+        if faltantes:
+            Existencia.objects.bulk_create(
+                [
+                    Existencia(
+                        producto_id=producto_id,
+                        producto_variante_id=variante_id,
+                        almacen_id=almacen.pk,
+                        ubicacion_id=ubicacion_id,
+                        stock=0,
+                        cantidad=Decimal("0"),
+                    )
+                    for (producto_id, variante_id), ubicacion_id in faltantes
+                ],
+                batch_size=cls.BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+            filas.update(cls._leer_destinos(almacen, faltantes))
+        return filas
+
+    @classmethod
+    def aplicar(cls, recepcion, detalle_payload):
+        """Suma los renglones a existencias y crea sus ``RecepcionDetalle``.
+
+        Devuelve la lista de movimientos (un dict por renglón) que consumen
+        auditoría, ``crear_movimiento_formal`` y kardex.
+        """
+        almacen = recepcion.almacen
+        ubicaciones = cls.resolver_ubicaciones(almacen, detalle_payload)
+        filas = cls.bloquear_existencias(
+            almacen, {(cls._clave(item), item.get("ubicacion") or None) for item in detalle_payload}
+        )
+
+        ahora = timezone.now()
+        detalles = []
+        saldos = []
+        tocadas = {}
+        for item in detalle_payload:
+            cantidad = item["cantidad_recibida"]
+            ubicacion_id = item.get("ubicacion") or None
+            existencia = filas[(cls._clave(item), ubicacion_id)]
+
+            cantidad_antes = existencia.cantidad or Decimal("0")
+            cantidad_despues = cantidad_antes + cantidad
+            existencia.cantidad = cantidad_despues
+            try:
+                existencia.stock = int(cantidad_despues)
+            except Exception:
+                existencia.stock = existencia.stock or 0
+            existencia.fecha_actualizacion = ahora
+            tocadas[existencia.pk] = existencia
+            saldos.append((existencia, cantidad_antes, cantidad_despues))
+
+            detalles.append(
+                RecepcionDetalle(
+                    recepcion=recepcion,
+                    orden_compra_detalle=item.get("orden_compra_detalle"),
+                    orden_produccion_detalle=item.get("orden_produccion_detalle"),
+                    producto=item["producto"],
+                    producto_variante=item.get("producto_variante"),
+                    ubicacion=ubicaciones.get(ubicacion_id),
+                    lote_id=item.get("lote"),
+                    serie_id=item.get("serie"),
+                    cantidad_recibida=cantidad,
+                )
+            )
+
+        Existencia.objects.bulk_update(
+            list(tocadas.values()),
+            ["cantidad", "stock", "fecha_actualizacion"],
+            batch_size=cls.BATCH_SIZE,
+        )
+        bulk_create_with_history(
+            detalles,
+            RecepcionDetalle,
+            batch_size=cls.BATCH_SIZE,
+            default_user=recepcion.usuario,
+        )
+        CantidadRecibidaService.registrar(detalles)
+
+        return [
+            {
+                "recepcion_detalle_id": detalle.pk,
+                "existencia_id": existencia.pk,
+                "almacen_id": existencia.almacen_id,
+                "orden_compra_detalle_id": detalle.orden_compra_detalle_id,
+                "orden_produccion_detalle_id": detalle.orden_produccion_detalle_id,
+                "producto_id": detalle.producto_id,
+                "producto_variante_id": detalle.producto_variante_id,
+                "ubicacion_id": existencia.ubicacion_id,
+                "lote_id": detalle.lote_id,
+                "serie_id": detalle.serie_id,
+                "cantidad_before": str(cantidad_antes),
+                "cantidad_after": str(cantidad_despues),
+                "delta": str(detalle.cantidad_recibida),
+            }
+            for detalle, (existencia, cantidad_antes, cantidad_despues) in zip(detalles, saldos)
+        ]
+
+    @classmethod
+    def crear_movimiento_formal(cls, recepcion, movimientos):
+        movimiento = MovimientoInventario.objects.create(
+            empresa=recepcion.empresa,
+            sucursal=recepcion.sucursal,
+            pedido_id=None,
+            entrega_id=None,
+            devolucion_id=None,
+            ajuste_inventario_id=None,
+            tipo_movimiento="ENTRADA",
+            usuario=recepcion.usuario,
+            observaciones=recepcion.observaciones,
+            recepcion=recepcion,
+            transferencia_id=None,
+            op_id=recepcion.op_id,
+        )
+
+        MovimientoInventarioDetalle.objects.bulk_create(
+            [
+                MovimientoInventarioDetalle(
+                    movimiento_inventario=movimiento,
+                    producto_id=item["producto_id"],
+                    ubicacion_origen_id=None,
+                    ubicacion_destino_id=item["ubicacion_id"],
+                    lote_id=item.get("lote_id"),
+                    serie_id=item.get("serie_id"),
+                    cantidad=Decimal(str(item["delta"] or 0)),
+                    costo_unitario=Decimal("0"),
+                )
+                for item in movimientos
+            ],
+            batch_size=cls.BATCH_SIZE,
+        )
+
+        KardexService.registrar(
+            [KardexService.renglon_de_item(item) for item in movimientos],
+            movimiento,
+            TipoMovimiento.ENTRADA,
+        )
+        return movimiento
@@ -0,0 +1,537 @@
+"""Tests de la entrada de recepciones y del contador ``cantidad_recibida``.
+
+Cubren ``CantidadRecibidaService``: el incremento al recibir, la resta/suma
+de la señal al cancelar o reactivar una recepción, la conciliación contra el
+historial y que un ``save()`` ordinario de un renglón cargado antes de una
+recepción no pise el contador. También que ``RecepcionEntradaService`` (por
+lotes) deje lo mismo que el camino renglón por renglón al que reemplazó.
+
+Ejecutar SIEMPRE con una BD desechable; el ``.env`` del repo apunta a Supabase
+de producción. Ejemplo con un settings de override a SQLite en memoria:
+
+    python manage.py test compras --settings=sqlite_settings
+"""
+
+import threading
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import close_old_connections, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from catalogo.models import Color, Producto, ProductoVariante, Talla
+from compras.models import OrdenCompra, OrdenCompraDetalle, Recepcion, RecepcionDetalle
+from compras.services.cantidad_recibida_service import CantidadRecibidaService
+from compras.services.recepcion_entrada_service import RecepcionEntradaService
+from inventarios.models import (
+    Almacen,
+    Existencia,
+    MovimientoInventario,
+    MovimientoInventarioDetalle,
+    MovimientoKardex,
+    TipoMovimiento,
+    Ubicacion,
+)
+from inventarios.services.kardex_service import KardexService
+from nucleo.models import Empresa, Moneda, Sucursal, UnidadMedida
+from produccion.models import ListaMaterialBom, OrdenProduccion, OrdenProduccionDetalle
+from usuarios.models import Usuario
+
+
+class CantidadRecibidaBase:
+    """Una OC de dos renglones y una OP de uno, sin recepciones."""
+
+    @classmethod
+    def crear_datos(cls):
+        cls.empresa = Empresa.objects.create(codigo="rec", razon_social="Recepciones SA")
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, codigo="MTY", nombre="MTY")
+        cls.usuario = Usuario.objects.create(
+            username="almacenista", email="almacenista@rec.test", empresa=cls.empresa
+        )
+        cls.moneda = Moneda.objects.create(codigo_iso="MXN", nombre="Peso")
+        cls.almacen = Almacen.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, codigo="MP", nombre="Materia prima"
+        )
+        cls.tela = Producto.objects.create(empresa=cls.empresa, nombre="Tela")
+        cls.hilo = Producto.objects.create(empresa=cls.empresa, nombre="Hilo")
+
+        cls.oc = OrdenCompra.objects.create(
+            empresa=cls.empresa,
+            sucursal=cls.sucursal,
+            moneda=cls.moneda,
+            usuario=cls.usuario,
+            folio="OC-1",
+            fecha_oc=timezone.localdate(),
+        )
+        cls.renglon_tela = OrdenCompraDetalle.objects.create(
+            orden_compra=cls.oc, producto=cls.tela, sucursal=cls.sucursal, cantidad=100
+        )
+        cls.renglon_hilo = OrdenCompraDetalle.objects.create(
+            orden_compra=cls.oc, producto=cls.hilo, sucursal=cls.sucursal, cantidad=50
+        )
+
+        cls.op = OrdenProduccion.objects.create(empresa=cls.empresa, sucursal=cls.sucursal, folio_op="OP-1")
+        cls.renglon_op = OrdenProduccionDetalle.objects.create(
+            op=cls.op,
+            bom=ListaMaterialBom.objects.create(empresa=cls.empresa),
+            cantidad=Decimal("20"),
+            unidad=UnidadMedida.objects.create(clave="PZA", nombre="Pieza"),
+        )
+
+    def recibir(self, folio, *renglones):
+        """Recepción con ``(renglon, cantidad)``; el contador se mueve como en el POST."""
+        recepcion = Recepcion.objects.create(
+            empresa=self.empresa,
+            sucursal=self.sucursal,
+            almacen=self.almacen,
+            usuario=self.usuario,
+            orden_compra=self.oc,
+            folio=folio,
+            fecha_recepcion=timezone.now(),
+            estatus=Recepcion.EstatusRecepcion.RECIBIDA,
+        )
+        detalles = []
+        for renglon, cantidad in renglones:
+            es_op = isinstance(renglon, OrdenProduccionDetalle)
+            detalles.append(
+                RecepcionDetalle.objects.create(
+                    recepcion=recepcion,
+                    orden_compra_detalle=None if es_op else renglon,
+                    orden_produccion_detalle=renglon if es_op else None,
+                    producto=self.tela if es_op else renglon.producto,
+                    cantidad_recibida=Decimal(cantidad),
+                )
+            )
+        CantidadRecibidaService.registrar(detalles)
+        return recepcion
+
+    def contador(self, renglon):
+        return type(renglon).objects.values_list("cantidad_recibida", flat=True).get(pk=renglon.pk)
+
+
+class CantidadRecibidaServiceTests(CantidadRecibidaBase, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos()
+
+    def test_recepciones_suman_por_renglon_en_oc_y_op(self):
+        self.recibir("R-1", (self.renglon_tela, "30"), (self.renglon_hilo, "5"), (self.renglon_op, "4"))
+        self.recibir("R-2", (self.renglon_tela, "20"), (self.renglon_tela, "1.5"))
+
+        self.assertEqual(self.contador(self.renglon_tela), Decimal("51.5"))
+        self.assertEqual(self.contador(self.renglon_hilo), Decimal("5"))
+        self.assertEqual(self.contador(self.renglon_op), Decimal("4"))
+        self.assertEqual(CantidadRecibidaService.conciliar(), [])
+
+    def test_registrar_actualiza_la_instancia_cargada_en_el_detalle(self):
+        renglon = OrdenCompraDetalle.objects.get(pk=self.renglon_tela.pk)
+        detalle = RecepcionDetalle(orden_compra_detalle=renglon, cantidad_recibida=Decimal("7"))
+
+        CantidadRecibidaService.registrar([detalle])
+
+        self.assertEqual(renglon.cantidad_recibida, Decimal("7"))
+        self.assertEqual(self.contador(renglon), Decimal("7"))
+
+    def test_cancelar_resta_y_reactivar_vuelve_a_sumar(self):
+        self.recibir("R-1", (self.renglon_tela, "30"))
+        recepcion = self.recibir("R-2", (self.renglon_tela, "20"), (self.renglon_op, "3"))
+
+        recepcion.estatus = Recepcion.EstatusRecepcion.CANCELADA
+        recepcion.save()
+        self.assertEqual(self.contador(self.renglon_tela), Decimal("30"))
+        self.assertEqual(self.contador(self.renglon_op), Decimal("0"))
+
+        # Cancelar dos veces no resta dos veces.
+        recepcion.save()
+        self.assertEqual(self.contador(self.renglon_tela), Decimal("30"))
+
+        recepcion.estatus = Recepcion.EstatusRecepcion.RECIBIDA
+        recepcion.save(update_fields=["estatus"])
+        self.assertEqual(self.contador(self.renglon_tela), Decimal("50"))
+        self.assertEqual(self.contador(self.renglon_op), Decimal("3"))
+
+    def test_desactivar_resta_y_otros_campos_no_mueven_el_contador(self):
+        recepcion = self.recibir("R-1", (self.renglon_hilo, "10"))
+
+        recepcion.observaciones = "Llegó mojada"
+        recepcion.save(update_fields=["observaciones"])
+        self.assertEqual(self.contador(self.renglon_hilo), Decimal("10"))
+
+        recepcion.activo = False
+        recepcion.save()
+        self.assertEqual(self.contador(self.renglon_hilo), Decimal("0"))
+        self.assertEqual(CantidadRecibidaService.conciliar(), [])
+
+    def test_save_de_un_renglon_viejo_no_pisa_el_contador(self):
+        viejo_oc = OrdenCompraDetalle.objects.get(pk=self.renglon_tela.pk)
+        viejo_op = OrdenProduccionDetalle.objects.get(pk=self.renglon_op.pk)
+
+        self.recibir("R-1", (self.renglon_tela, "30"), (self.renglon_op, "2"))
+
+        viejo_oc.descripcion = "Tela cruda"
+        viejo_oc.save()
+        viejo_op.observaciones = "Urgente"
+        viejo_op.save()
+
+        self.assertEqual(self.contador(self.renglon_tela), Decimal("30"))
+        self.assertEqual(self.contador(self.renglon_op), Decimal("2"))
+        # La instancia queda con el valor vigente, no con el que traía.
+        self.assertEqual(viejo_oc.cantidad_recibida, Decimal("30"))
+        self.assertEqual(
+            OrdenCompraDetalle.objects.values_list("descripcion", flat=True).get(pk=self.renglon_tela.pk),
+            "Tela cruda",
+        )
+
+    def test_recepciones_intercaladas_con_renglones_viejos(self):
+        """Dos POST que cargaron el renglón antes de que el otro registrara."""
+        visto_por_a = OrdenCompraDetalle.objects.get(pk=self.renglon_tela.pk)
+        visto_por_b = OrdenCompraDetalle.objects.get(pk=self.renglon_tela.pk)
+
+        for folio, renglon, cantidad in (("R-A", visto_por_a, "40"), ("R-B", visto_por_b, "25")):
+            self.recibir(folio, (renglon, cantidad))
+            renglon.save()
+
+        self.assertEqual(self.contador(self.renglon_tela), Decimal("65"))
+        self.assertEqual(CantidadRecibidaService.conciliar(), [])
+
+    def test_conciliar_reporta_y_corrige_desde_el_historial(self):
+        self.recibir("R-1", (self.renglon_tela, "30"), (self.renglon_op, "4"))
+        cancelada = self.recibir("R-2", (self.renglon_tela, "8"))
+        Recepcion.objects.filter(pk=cancelada.pk).update(estatus=Recepcion.EstatusRecepcion.CANCELADA)
+        OrdenCompraDetalle.objects.filter(pk=self.renglon_hilo.pk).update(cantidad_recibida=Decimal("9"))
+
+        diferencias = CantidadRecibidaService.conciliar(corregir=True)
+
+        self.assertEqual(
+            sorted((modelo, pk, contador, historico) for modelo, pk, _, contador, historico in diferencias),
+            sorted(
+                [
+                    (OrdenCompraDetalle, self.renglon_tela.pk, Decimal("38"), Decimal("30")),
+                    (OrdenCompraDetalle, self.renglon_hilo.pk, Decimal("9"), Decimal("0")),
+                ]
+            ),
+        )
+        self.assertEqual(self.contador(self.renglon_tela), Decimal("30"))
+        self.assertEqual(self.contador(self.renglon_hilo), Decimal("0"))
+        self.assertEqual(self.contador(self.renglon_op), Decimal("4"))
+        self.assertEqual(CantidadRecibidaService.conciliar(), [])
+
+
+@skipUnless(connection.vendor == "postgresql", "Necesita transacciones concurrentes reales.")
+class CantidadRecibidaConcurrenciaTests(CantidadRecibidaBase, TransactionTestCase):
+    """Recepciones y una cancelación en hilos con su propia conexión."""
+
+    HILOS = 4
+
+    def setUp(self):
+        self.crear_datos()
+
+    def _en_paralelo(self, tareas):
+        barrera = threading.Barrier(len(tareas))
+        errores = []
+
+        def correr(tarea):
+            try:
+                barrera.wait()
+                with transaction.atomic():
+                    tarea()
+            except Exception as exc:
+                errores.append(exc)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        hilos = [threading.Thread(target=correr, args=(tarea,)) for tarea in tareas]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(errores, [])
+
+    def test_recepciones_concurrentes_suman_todas(self):
+        def recibir(folio):
+            return lambda: self.recibir(folio, (self.renglon_tela, "10"), (self.renglon_op, "1"))
+
+        self._en_paralelo([recibir(f"R-{i}") for i in range(self.HILOS)])
+
+        self.assertEqual(self.contador(self.renglon_tela), Decimal("10") * self.HILOS)
+        self.assertEqual(self.contador(self.renglon_op), Decimal(self.HILOS))
+        self.assertEqual(CantidadRecibidaService.conciliar(), [])
+
+    def test_cancelacion_concurrente_con_recepciones(self):
+        cancelada = self.recibir("R-0", (self.renglon_tela, "30"))
+
+        def cancelar():
+            recepcion = Recepcion.objects.get(pk=cancelada.pk)
+            recepcion.estatus = Recepcion.EstatusRecepcion.CANCELADA
+            recepcion.save()
+
+        def editar_renglon():
+            renglon = OrdenCompraDetalle.objects.get(pk=self.renglon_tela.pk)
+            renglon.descripcion = "Editado"
+            renglon.save()
+
+        self._en_paralelo(
+            [cancelar, editar_renglon]
+            + [lambda i=i: self.recibir(f"R-{i}", (self.renglon_tela, "5")) for i in range(1, self.HILOS)]
+        )
+
+        self.assertEqual(self.contador(self.renglon_tela), Decimal("5") * (self.HILOS - 1))
+        self.assertEqual(CantidadRecibidaService.conciliar(), [])
+
+
+def _entrada_por_renglon(recepcion, detalle_payload):
+    """Referencia: el camino renglón por renglón que reemplazó ``RecepcionEntradaService``."""
+    movimientos = []
+    detalles = []
+    for item in detalle_payload:
+        ubicacion = Ubicacion.objects.filter(pk=item["ubicacion"], almacen_id=recepcion.almacen_id).first()
+        producto_variante = item.get("producto_variante")
+        existencia = (
+            Existencia.objects.select_for_update()
+            .filter(
+                producto_id=item["producto"].pk,
+                producto_variante_id=getattr(producto_variante, "pk", None),
+                almacen_id=recepcion.almacen_id,
+                ubicacion_id=ubicacion.pk,
+            )
+            .order_by("id")
+            .first()
+        )
+        if not existencia:
+            existencia = Existencia.objects.create(
+                producto=item["producto"],
+                producto_variante=producto_variante,
+                almacen=recepcion.almacen,
+                ubicacion=ubicacion,
+                stock=0,
+                cantidad=Decimal("0"),
+            )
+        cantidad_antes = existencia.cantidad or Decimal("0")
+        existencia.cantidad = cantidad_antes + item["cantidad_recibida"]
+        existencia.stock = int(existencia.cantidad)
+        existencia.save(update_fields=["cantidad", "stock", "fecha_actualizacion"])
+
+        detalle = RecepcionDetalle.objects.create(
+            recepcion=recepcion,
+            orden_compra_detalle=item.get("orden_compra_detalle"),
+            producto=item["producto"],
+            producto_variante=producto_variante,
+            ubicacion=ubicacion,
+            cantidad_recibida=item["cantidad_recibida"],
+        )
+        detalles.append(detalle)
+        movimientos.append(
+            {
+                "existencia_id": existencia.pk,
+                "almacen_id": existencia.almacen_id,
+                "producto_id": detalle.producto_id,
+                "producto_variante_id": detalle.producto_variante_id,
+                "ubicacion_id": existencia.ubicacion_id,
+                "cantidad_before": str(cantidad_antes),
+                "cantidad_after": str(existencia.cantidad),
+                "delta": str(item["cantidad_recibida"]),
+            }
+        )
+    CantidadRecibidaService.registrar(detalles)
+
+    movimiento = MovimientoInventario.objects.create(
+        empresa=recepcion.empresa,
+        sucursal=recepcion.sucursal,
+        tipo_movimiento="ENTRADA",
+        usuario=recepcion.usuario,
+        recepcion=recepcion,
+    )
+    for item in movimientos:
+        MovimientoInventarioDetalle.objects.create(
+            movimiento_inventario=movimiento,
+            producto_id=item["producto_id"],
+            ubicacion_destino_id=item["ubicacion_id"],
+            cantidad=Decimal(item["delta"]),
+        )
+    KardexService.registrar(
+        [KardexService.renglon_de_item(item) for item in movimientos], movimiento, TipoMovimiento.ENTRADA
+    )
+    return movimientos
+
+
+def _entrada_por_lotes(recepcion, detalle_payload):
+    movimientos = RecepcionEntradaService.aplicar(recepcion, detalle_payload)
+    RecepcionEntradaService.crear_movimiento_formal(recepcion, movimientos)
+    return movimientos
+
+
+class RecepcionEntradaEquivalenciaTests(TestCase):
+    """``RecepcionEntradaService`` deja la misma base que el camino renglón por renglón.
+
+    Cada camino corre sobre su propio almacén y su propia OC, sembrados igual;
+    se comparan existencias, kardex, detalles del movimiento formal, renglones
+    de la recepción, ``cantidad_recibida`` y el antes/después de la auditoría,
+    con las llaves traducidas a posiciones del escenario.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="lotes", razon_social="Lotes SA")
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, codigo="GDL", nombre="GDL")
+        cls.usuario = Usuario.objects.create(
+            username="receptor", email="receptor@lotes.test", empresa=cls.empresa
+        )
+        cls.moneda = Moneda.objects.create(codigo_iso="MXN", nombre="Peso")
+        cls.tela = Producto.objects.create(empresa=cls.empresa, nombre="Tela")
+        cls.playera = Producto.objects.create(empresa=cls.empresa, nombre="Playera")
+        cls.playera_m = ProductoVariante.objects.create(
+            producto=cls.playera,
+            empresa=cls.empresa,
+            color=Color.objects.create(nombre="Negro", codigo="NEG", codigo_hex="#000000"),
+            talla=Talla.objects.create(nombre="M"),
+            sku="PLAY-NEG-M",
+            precio_base=Decimal("199.00"),
+        )
+
+    def _escenario(self, codigo):
+        """Almacén con dos ubicaciones (la primera con tela previa) y una OC de dos renglones."""
+        almacen = Almacen.objects.create(
+            empresa=self.empresa, sucursal=self.sucursal, codigo=codigo, nombre=codigo, requiere_ubicacion=True
+        )
+        ubicaciones = [Ubicacion.objects.create(almacen=almacen, pasillo=codigo, rack=str(i)) for i in range(2)]
+        Existencia.objects.create(
+            producto=self.tela, almacen=almacen, ubicacion=ubicaciones[0], stock=10, cantidad=Decimal("10")
+        )
+        oc = OrdenCompra.objects.create(
+            empresa=self.empresa,
+            sucursal=self.sucursal,
+            moneda=self.moneda,
+            usuario=self.usuario,
+            folio=f"OC-{codigo}",
+            fecha_oc=timezone.localdate(),
+        )
+        renglones = [
+            OrdenCompraDetalle.objects.create(orden_compra=oc, producto=producto, sucursal=self.sucursal, cantidad=100)
+            for producto in (self.tela, self.playera)
+        ]
+        return {"codigo": codigo, "almacen": almacen, "ubicaciones": ubicaciones, "renglones": renglones}
+
+    def _recibir(self, escenario, camino, folio, lineas):
+        """``lineas``: ``(renglon, ubicacion, cantidad)`` como posiciones del escenario."""
+        recepcion = Recepcion.objects.create(
+            empresa=self.empresa,
+            sucursal=self.sucursal,
+            almacen=escenario["almacen"],
+            usuario=self.usuario,
+            orden_compra=escenario["renglones"][0].orden_compra,
+            folio=f"{escenario['codigo']}-{folio}",
+            fecha_recepcion=timezone.now(),
+            estatus=Recepcion.EstatusRecepcion.PARCIAL,
+        )
+        payload = []
+        for renglon, ubicacion, cantidad in lineas:
+            oc_detalle = escenario["renglones"][renglon]
+            payload.append(
+                {
+                    "orden_compra_detalle": oc_detalle,
+                    "orden_produccion_detalle": None,
+                    "producto": oc_detalle.producto,
+                    "producto_variante": self.playera_m if oc_detalle.producto_id == self.playera.pk else None,
+                    "cantidad_recibida": Decimal(cantidad),
+                    "ubicacion": escenario["ubicaciones"][ubicacion].pk,
+                    "lote": None,
+                    "serie": None,
+                }
+            )
+        with transaction.atomic():
+            movimientos = camino(recepcion, payload)
+        return [(m["cantidad_before"], m["cantidad_after"], m["delta"]) for m in movimientos]
+
+    def _resultado(self, escenario):
+        posicion = {ubicacion.pk: i for i, ubicacion in enumerate(escenario["ubicaciones"])}
+        almacen = escenario["almacen"]
+
+        def decimal(valor):
+            return Decimal(valor).normalize()
+
+        return {
+            "existencias": sorted(
+                (producto_id, variante_id, posicion[ubicacion_id], decimal(cantidad), stock)
+                for producto_id, variante_id, ubicacion_id, cantidad, stock in Existencia.objects.filter(
+                    almacen=almacen
+                ).values_list("producto_id", "producto_variante_id", "ubicacion_id", "cantidad", "stock")
+            ),
+            "kardex": [
+                (producto_id, variante_id, posicion[ubicacion_id], decimal(delta), decimal(saldo))
+                for producto_id, variante_id, ubicacion_id, delta, saldo in MovimientoKardex.objects.filter(
+                    almacen=almacen
+                )
+                .order_by("pk")
+                .values_list("producto_id", "producto_variante_id", "ubicacion_id", "delta", "saldo")
+            ],
+            "movimiento_detalles": [
+                (producto_id, posicion[ubicacion_id], decimal(cantidad))
+                for producto_id, ubicacion_id, cantidad in MovimientoInventarioDetalle.objects.filter(
+                    movimiento_inventario__recepcion__almacen=almacen
+                )
+                .order_by("pk")
+                .values_list("producto_id", "ubicacion_destino_id", "cantidad")
+            ],
+            "recepcion_detalles": [
+                (producto_id, variante_id, posicion[ubicacion_id], decimal(cantidad))
+                for producto_id, variante_id, ubicacion_id, cantidad in RecepcionDetalle.objects.filter(
+                    recepcion__almacen=almacen
+                )
+                .order_by("pk")
+                .values_list("producto_id", "producto_variante_id", "ubicacion_id", "cantidad_recibida")
+            ],
+            "cantidad_recibida": [
+                decimal(OrdenCompraDetalle.objects.values_list("cantidad_recibida", flat=True).get(pk=renglon.pk))
+                for renglon in escenario["renglones"]
+            ],
+        }
+
+    def _comparar(self, recepciones):
+        por_renglon, por_lotes = self._escenario("RENGLON"), self._escenario("LOTES")
+        for folio, lineas in recepciones:
+            self.assertEqual(
+                self._recibir(por_lotes, _entrada_por_lotes, folio, lineas),
+                self._recibir(por_renglon, _entrada_por_renglon, folio, lineas),
+            )
+        resultado = self._resultado(por_lotes)
+        self.assertEqual(resultado, self._resultado(por_renglon))
+        return resultado
+
+    def test_recepcion_de_varios_renglones_y_destinos(self):
+        resultado = self._comparar(
+            [
+                (
+                    "R1",
+                    [
+                        (0, 0, "5"),  # sobre la existencia previa
+                        (0, 1, "3"),  # destino nuevo
+                        (1, 1, "2"),  # variante, destino nuevo
+                        (0, 0, "1.5"),  # mismo destino otra vez: saldo encadenado
+                        (1, 1, "4"),
+                    ],
+                )
+            ]
+        )
+
+        self.assertEqual(resultado["cantidad_recibida"], [Decimal("9.5"), Decimal("6")])
+        self.assertIn((self.tela.pk, None, 0, Decimal("16.5"), 16), resultado["existencias"])
+        self.assertEqual(len(resultado["kardex"]), 5)
+
+    def test_recepciones_parciales_sucesivas(self):
+        resultado = self._comparar(
+            [
+                ("R1", [(0, 0, "40"), (1, 0, "10")]),
+                ("R2", [(0, 1, "25"), (1, 0, "15")]),
+                ("R3", [(0, 0, "35"), (1, 1, "75")]),
+            ]
+        )
+
+        self.assertEqual(resultado["cantidad_recibida"], [Decimal("100"), Decimal("100")])
+        saldos_tela = [
+            saldo
+            for producto_id, _, ubicacion, _, saldo in resultado["kardex"]
+            if (producto_id, ubicacion) == (self.tela.pk, 0)
+        ]
+        self.assertEqual(saldos_tela, [Decimal("50"), Decimal("85")])
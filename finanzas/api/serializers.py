@@ -2,6 +2,7 @@ from decimal import Decimal
 
 from rest_framework import serializers
 from finanzas.models import CuentaPorCobrar, Factura, FacturaDetalle, PolizaDetalle
+from nucleo.api.campos import CamposDinamicosMixin
 
 
 class FacturaDesdePedidoInputSerializer(serializers.Serializer):
@@ -47,7 +48,7 @@ class FacturaPendienteCobroInputSerializer(serializers.Serializer):
         return attrs
 
 
-class CuentaPorCobrarSerializer(serializers.ModelSerializer):
+class CuentaPorCobrarSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     cliente_nombre = serializers.CharField(source="cliente.nombre", read_only=True)
     factura_id = serializers.IntegerField(read_only=True)
     factura_folio = serializers.CharField(source="factura.folio", read_only=True)
@@ -117,7 +118,7 @@ class FacturaDetalleSerializer(serializers.ModelSerializer):
         ]
         fields = '__all__'
 
-class FacturaSerializer(serializers.ModelSerializer):
+class FacturaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     factura_detalles = FacturaDetalleSerializer(many=True)
     moneda_nombre = serializers.CharField(source='moneda.codigo_iso', read_only=True)
     cliente_nombre = serializers.CharField(source='cliente.nombre', read_only=True)
@@ -51,6 +51,7 @@ ClienteViewSet = ClienteViewSetContabilidad
 
 class CuentaPorCobrarViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = CuentaPorCobrarSerializer
+    cursor_ordering = "fecha_emision"  # mismo orden que get_queryset
     http_method_names = ['get']
 
     def get_serializer_class(self):
@@ -100,6 +101,7 @@ class CuentaPorCobrarViewSet(viewsets.ReadOnlyModelViewSet):
 
 class FacturaViewSet(viewsets.ModelViewSet):
     serializer_class = FacturaSerializer
+    cursor_ordering = "fecha_emision"  # mismo orden que get_queryset
     http_method_names = ['delete', 'get', 'post']
 
     def get_queryset(self):
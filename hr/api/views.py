@@ -63,6 +63,7 @@ class PuestoViewSet(
 ):
     queryset = Puesto.objects.all()
     serializer_class = PuestoSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
 
     def get_queryset(self):
         user = self.request.user
@@ -107,6 +108,7 @@ class AreaViewSet(
 ):
     queryset = Area.objects.all()
     serializer_class = AreaSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
 
     def get_queryset(self):
         # ``Area`` no tiene FK ``empresa``: la hereda por ``departamento``.
@@ -152,6 +154,7 @@ class TurnoViewSet(
 ):
     queryset = Turno.objects.all()
     serializer_class = TurnoSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
 
     def get_queryset(self):
         user = self.request.user
@@ -173,6 +176,7 @@ class CalendarioViewSet(
 ):
     queryset = Calendario.objects.all()
     serializer_class = CalendarioSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
 
     def get_queryset(self):
         # ``Calendario`` hereda la empresa por ``turno``.
@@ -1,26 +1,22 @@
 from django.urls import path
 
-from ia.api.views import (
-    AIAssistantAPIView,
-    GoogleCalendarEventsAPIView,
-    GoogleGmailMessageDetailAPIView,
-    GoogleGmailMessagesAPIView,
-    GoogleGmailSendAPIView,
-    GoogleOAuthCallbackAPIView,
-    GoogleOAuthConnectAPIView,
-    GoogleOAuthDisconnectAPIView,
-    GoogleOAuthStatusAPIView,
-)
+from nucleo.vistas_diferidas import vista_diferida
+
+
+def _api(nombre):
+    # El asistente y las integraciones de Google (ia/api/views.py) se importan
+    # hasta su primer request; las APIView de DRF son csrf_exempt.
+    return vista_diferida(f"ia.api.views.{nombre}", as_view=True, csrf_exempt=True)
 
 
 urlpatterns = [
-    path("chat/", AIAssistantAPIView.as_view(), name="ai_chat"),
-    path("google/oauth/connect/", GoogleOAuthConnectAPIView.as_view(), name="ai_google_oauth_connect"),
-    path("google/oauth/callback/", GoogleOAuthCallbackAPIView.as_view(), name="ai_google_oauth_callback"),
-    path("google/oauth/status/", GoogleOAuthStatusAPIView.as_view(), name="ai_google_oauth_status"),
-    path("google/oauth/disconnect/", GoogleOAuthDisconnectAPIView.as_view(), name="ai_google_oauth_disconnect"),
-    path("google/calendar/events/", GoogleCalendarEventsAPIView.as_view(), name="google_calendar_events"),
-    path("google/gmail/messages/", GoogleGmailMessagesAPIView.as_view(), name="google_gmail_messages"),
-    path("google/gmail/messages/<str:msg_id>/", GoogleGmailMessageDetailAPIView.as_view(), name="google_gmail_message_detail"),
-    path("google/gmail/send/", GoogleGmailSendAPIView.as_view(), name="google_gmail_send"),
+    path("chat/", _api("AIAssistantAPIView"), name="ai_chat"),
+    path("google/oauth/connect/", _api("GoogleOAuthConnectAPIView"), name="ai_google_oauth_connect"),
+    path("google/oauth/callback/", _api("GoogleOAuthCallbackAPIView"), name="ai_google_oauth_callback"),
+    path("google/oauth/status/", _api("GoogleOAuthStatusAPIView"), name="ai_google_oauth_status"),
+    path("google/oauth/disconnect/", _api("GoogleOAuthDisconnectAPIView"), name="ai_google_oauth_disconnect"),
+    path("google/calendar/events/", _api("GoogleCalendarEventsAPIView"), name="google_calendar_events"),
+    path("google/gmail/messages/", _api("GoogleGmailMessagesAPIView"), name="google_gmail_messages"),
+    path("google/gmail/messages/<str:msg_id>/", _api("GoogleGmailMessageDetailAPIView"), name="google_gmail_message_detail"),
+    path("google/gmail/send/", _api("GoogleGmailSendAPIView"), name="google_gmail_send"),
 ]
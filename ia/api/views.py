@@ -1,6 +1,6 @@
 from django.conf import settings
 from django.core import signing
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.urls import reverse
 from django.utils.text import slugify
 from rest_framework import permissions, status
@@ -9,7 +9,6 @@ from rest_framework.views import APIView
 import json
 import secrets
 import urllib.error
-import urllib.request
 
 from nucleo.models import Empresa
 from nucleo.api.serializers import EmpresaSerializer
@@ -28,8 +27,28 @@ import base64
 import binascii
 import urllib.parse
 from ia.models import CloudIntegration
+from ia.services.http_service import cliente_http, en_paralelo
 from ia.views import GOOGLE_DRIVE_SCOPE, _google_drive_credentials_configured, _google_drive_refresh_token, _http_json
 
+# Plazo (segundos) para el lote de metadatos de Gmail que se piden en paralelo.
+GMAIL_PLAZO_METADATOS = 15
+
+# Vueltas modelo -> herramientas antes de rendirse.
+MAX_RONDAS_HERRAMIENTAS = 3
+RESPUESTA_SIN_CIERRE = "No pude completar la solicitud en este momento. Intenta reformular la petición."
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _google_api_url(ruta):
+    return (getattr(settings, "GOOGLE_API_URL", "") or "https://www.googleapis.com").rstrip("/") + ruta
+
+
+def _gmail_api_url(ruta):
+    return (getattr(settings, "GMAIL_API_URL", "") or "https://gmail.googleapis.com").rstrip("/") + ruta
+
 
 class AIAssistantAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -76,9 +95,19 @@ class AIAssistantAPIView(APIView):
         messages.append({"role": "user", "content": user_message})
 
         tools = self._tools_schema()
+
+        if self._quiere_stream(request):
+            response = StreamingHttpResponse(
+                self._stream_sse(request, base_url, api_key, model, messages, tools),
+                content_type="text/event-stream",
+            )
+            response["Cache-Control"] = "no-cache"
+            response["X-Accel-Buffering"] = "no"
+            return response
+
         tool_results = []
 
-        for _ in range(3):
+        for _ in range(MAX_RONDAS_HERRAMIENTAS):
             ai = self._openai_chat(base_url=base_url, api_key=api_key, model=model, messages=messages, tools=tools)
             if "error" in ai:
                 return Response(ai, status=status.HTTP_502_BAD_GATEWAY)
@@ -96,35 +125,49 @@ class AIAssistantAPIView(APIView):
                     }
                 )
 
-            for tc in tool_calls:
-                fn = (tc.get("function") or {})
-                name = fn.get("name")
-                raw_args = fn.get("arguments") or "{}"
-                try:
-                    args = json.loads(raw_args) if isinstance(raw_args, str) else (raw_args or {})
-                except Exception:
-                    args = {}
-
-                result = self._execute_tool(request=request, name=name, args=args)
-                tool_results.append({"name": name, "args": args, "result": result})
-                messages.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": tc.get("id"),
-                        "content": json.dumps(result, ensure_ascii=False),
-                    }
-                )
+            tool_results.extend(self._run_tool_calls(request, tool_calls, messages))
 
         return Response(
             {
-                "reply": "No pude completar la solicitud en este momento. Intenta reformular la petición.",
+                "reply": RESPUESTA_SIN_CIERRE,
                 "tool_results": tool_results,
             },
             status=status.HTTP_200_OK,
         )
 
-    def _openai_chat(self, base_url, api_key, model, messages, tools):
-        url = f"{base_url}/chat/completions"
+    def _quiere_stream(self, request):
+        stream = request.data.get("stream")
+        if stream is None:
+            stream = request.query_params.get("stream")
+        if isinstance(stream, str):
+            stream = stream.strip().lower() in ("1", "true", "si", "sí", "yes")
+        if stream:
+            return True
+        return "text/event-stream" in (request.META.get("HTTP_ACCEPT") or "")
+
+    def _run_tool_calls(self, request, tool_calls, messages):
+        results = []
+        for tc in tool_calls:
+            fn = (tc.get("function") or {})
+            name = fn.get("name")
+            raw_args = fn.get("arguments") or "{}"
+            try:
+                args = json.loads(raw_args) if isinstance(raw_args, str) else (raw_args or {})
+            except Exception:
+                args = {}
+
+            result = self._execute_tool(request=request, name=name, args=args)
+            results.append({"name": name, "args": args, "result": result})
+            messages.append(
+                {
+                    "role": "tool",
+                    "tool_call_id": tc.get("id"),
+                    "content": json.dumps(result, ensure_ascii=False),
+                }
+            )
+        return results
+
+    def _openai_payload(self, model, messages, tools, stream=False):
         payload = {
             "model": model,
             "messages": messages,
@@ -132,27 +175,117 @@ class AIAssistantAPIView(APIView):
             "tool_choice": "auto",
             "temperature": 0.2,
         }
-        data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(
-            url,
-            data=data,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}",
-            },
-            method="POST",
-        )
+        if stream:
+            payload["stream"] = True
+        return json.dumps(payload).encode("utf-8")
+
+    def _openai_headers(self, api_key):
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+
+    def _openai_chat(self, base_url, api_key, model, messages, tools):
         try:
-            with urllib.request.urlopen(req, timeout=60) as resp:
-                return json.loads(resp.read().decode("utf-8"))
-        except urllib.error.HTTPError as e:
-            try:
-                body = e.read().decode("utf-8")
-            except Exception:
-                body = ""
-            return {"error": "OpenAI HTTPError", "status_code": e.code, "body": body}
+            with cliente_http.abrir(
+                "POST",
+                f"{base_url}/chat/completions",
+                cuerpo=self._openai_payload(model, messages, tools),
+                headers=self._openai_headers(api_key),
+                plazo=getattr(settings, "OPENAI_TIMEOUT", 60),
+            ) as resp:
+                body = resp.leer().decode("utf-8", errors="replace")
         except Exception:
             return {"error": "OpenAI request failed"}
+        if resp.status >= 400:
+            return {"error": "OpenAI HTTPError", "status_code": resp.status, "body": body}
+        try:
+            return json.loads(body)
+        except Exception:
+            return {"error": "OpenAI request failed"}
+
+    def _openai_chat_stream(self, base_url, api_key, model, messages, tools):
+        """Misma llamada que ``_openai_chat`` con ``stream: true``.
+
+        Entrega ``("token", texto)`` conforme llega cada fragmento del
+        contenido y al final ``("message", msg)`` con el mensaje armado a
+        partir de los deltas (incluidos los ``tool_calls``, que llegan
+        troceados por índice). Un error de OpenAI llega como ``("error", dict)``.
+        """
+        content = []
+        tool_calls = {}
+        try:
+            with cliente_http.abrir(
+                "POST",
+                f"{base_url}/chat/completions",
+                cuerpo=self._openai_payload(model, messages, tools, stream=True),
+                headers=self._openai_headers(api_key),
+                plazo=getattr(settings, "OPENAI_TIMEOUT", 60),
+            ) as resp:
+                if resp.status >= 400:
+                    body = resp.leer().decode("utf-8", errors="replace")
+                    yield "error", {"error": "OpenAI HTTPError", "status_code": resp.status, "body": body}
+                    return
+                for line in resp.lineas():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        continue
+                    try:
+                        chunk = json.loads(data)
+                    except Exception:
+                        continue
+                    delta = ((chunk.get("choices") or [{}])[0]).get("delta") or {}
+                    if delta.get("content"):
+                        content.append(delta["content"])
+                        yield "token", delta["content"]
+                    for tc in delta.get("tool_calls") or []:
+                        actual = tool_calls.setdefault(
+                            tc.get("index", 0),
+                            {"id": None, "type": "function", "function": {"name": "", "arguments": ""}},
+                        )
+                        if tc.get("id"):
+                            actual["id"] = tc["id"]
+                        fn = tc.get("function") or {}
+                        actual["function"]["name"] += fn.get("name") or ""
+                        actual["function"]["arguments"] += fn.get("arguments") or ""
+        except Exception:
+            yield "error", {"error": "OpenAI request failed"}
+            return
+
+        msg = {"role": "assistant", "content": "".join(content) or None}
+        if tool_calls:
+            msg["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+        yield "message", msg
+
+    def _stream_sse(self, request, base_url, api_key, model, messages, tools):
+        """Eventos SSE del modo ``stream``: ``token`` por fragmento de texto,
+        ``tool`` por herramienta ejecutada, y ``done`` (con el mismo cuerpo que
+        la respuesta JSON) o ``error`` al final."""
+        tool_results = []
+        for _ in range(MAX_RONDAS_HERRAMIENTAS):
+            msg = None
+            for kind, value in self._openai_chat_stream(base_url, api_key, model, messages, tools):
+                if kind == "token":
+                    yield _sse_event("token", {"text": value})
+                elif kind == "error":
+                    yield _sse_event("error", value)
+                    return
+                else:
+                    msg = value
+            messages.append(msg)
+
+            tool_calls = msg.get("tool_calls") or []
+            if not tool_calls:
+                yield _sse_event("done", {"reply": (msg.get("content") or "").strip(), "tool_results": tool_results})
+                return
+
+            for result in self._run_tool_calls(request, tool_calls, messages):
+                tool_results.append(result)
+                yield _sse_event("tool", result)
+
+        yield _sse_event("done", {"reply": RESPUESTA_SIN_CIERRE, "tool_results": tool_results})
 
     def _tools_schema(self):
         return [
@@ -730,7 +863,7 @@ class AIAssistantAPIView(APIView):
             }
 
             _http_json(
-                "https://www.googleapis.com/calendar/v3/calendars/primary/events",
+                _google_api_url("/calendar/v3/calendars/primary/events"),
                 method="POST",
                 headers={"Authorization": f"Bearer {access_token}"},
                 json_data=event_body
@@ -767,7 +900,7 @@ class AIAssistantAPIView(APIView):
             encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
 
             _http_json(
-                "https://gmail.googleapis.com/gmail/v1/users/me/messages/send",
+                _gmail_api_url("/gmail/v1/users/me/messages/send"),
                 method="POST",
                 headers={"Authorization": f"Bearer {access_token}"},
                 json_data={"raw": encoded_message}
@@ -792,7 +925,7 @@ class AIAssistantAPIView(APIView):
         # Fetch upcoming events
         try:
             now = timezone.now().isoformat()
-            url = f"https://www.googleapis.com/calendar/v3/calendars/primary/events?timeMin={urllib.parse.quote(now)}&maxResults=5&singleEvents=true&orderBy=startTime"
+            url = _google_api_url(f"/calendar/v3/calendars/primary/events?timeMin={urllib.parse.quote(now)}&maxResults=5&singleEvents=true&orderBy=startTime")
             response = _http_json(
                 url,
                 headers={
@@ -814,14 +947,20 @@ class AIAssistantAPIView(APIView):
         # Fetch recent unread emails
         try:
             response = _http_json(
-                "https://gmail.googleapis.com/gmail/v1/users/me/messages?maxResults=5&q=in:inbox is:unread",
+                _gmail_api_url("/gmail/v1/users/me/messages?maxResults=5&q=in:inbox%20is:unread"),
                 headers={"Authorization": f"Bearer {access_token}"}
             )
-            for msg in response.get("messages", []):
-                msg_detail = _http_json(
-                    f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{msg['id']}?format=metadata&metadataHeaders=Subject&metadataHeaders=From",
+            detalles = en_paralelo(
+                lambda msg: _http_json(
+                    _gmail_api_url(f"/gmail/v1/users/me/messages/{msg['id']}?format=metadata&metadataHeaders=Subject&metadataHeaders=From"),
                     headers={"Authorization": f"Bearer {access_token}"}
-                )
+                ),
+                response.get("messages", []),
+                plazo=GMAIL_PLAZO_METADATOS,
+            )
+            for msg_detail in detalles:
+                if isinstance(msg_detail, Exception):
+                    continue
                 headers = {h['name']: h['value'] for h in msg_detail.get('payload', {}).get('headers', [])}
                 from_header = headers.get('From', '')
                 from_name = from_header.split('<')[0].strip().strip('"\'') if '<' in from_header else from_header
@@ -891,7 +1030,7 @@ class GoogleCalendarEventsAPIView(APIView):
         if page_token:
             qp["pageToken"] = page_token
 
-        url = "https://www.googleapis.com/calendar/v3/calendars/primary/events?" + urllib.parse.urlencode(
+        url = _google_api_url("/calendar/v3/calendars/primary/events?") + urllib.parse.urlencode(
             qp, quote_via=urllib.parse.quote
         )
 
@@ -996,7 +1135,7 @@ class GoogleCalendarEventsAPIView(APIView):
 
         try:
             created = _http_json(
-                "https://www.googleapis.com/calendar/v3/calendars/primary/events",
+                _google_api_url("/calendar/v3/calendars/primary/events"),
                 method="POST",
                 headers={"Authorization": f"Bearer {access_token}", "Accept": "application/json"},
                 json_data=event_body,
@@ -1373,7 +1512,7 @@ class GoogleGmailMessagesAPIView(APIView):
         if page_token:
             qp["pageToken"] = page_token
 
-        url = "https://gmail.googleapis.com/gmail/v1/users/me/messages?" + urllib.parse.urlencode(qp, quote_via=urllib.parse.quote)
+        url = _gmail_api_url("/gmail/v1/users/me/messages?") + urllib.parse.urlencode(qp, quote_via=urllib.parse.quote)
         try:
             response = _http_json(
                 url,
@@ -1384,34 +1523,38 @@ class GoogleGmailMessagesAPIView(APIView):
         except Exception:
             return Response({"ok": False, "error": "Error inesperado al consultar Gmail."}, status=status.HTTP_502_BAD_GATEWAY)
 
-        messages_list = response.get("messages") or []
+        messages_list = [msg for msg in (response.get("messages") or []) if msg.get("id")]
+        # Los metadatos se piden en paralelo (acotado) sobre el pool keep-alive;
+        # antes eran hasta 50 llamadas en serie, cada una con su handshake TLS.
+        detalles = en_paralelo(
+            lambda msg: _http_json(
+                _gmail_api_url(f"/gmail/v1/users/me/messages/{msg['id']}?format=metadata&metadataHeaders=Subject&metadataHeaders=From&metadataHeaders=Date&metadataHeaders=To"),
+                headers={"Authorization": f"Bearer {access_token}", "Accept": "application/json"},
+            ),
+            messages_list,
+            plazo=GMAIL_PLAZO_METADATOS,
+        )
         items = []
-        for msg in messages_list:
-            msg_id = msg.get("id")
-            if not msg_id:
-                continue
-            try:
-                msg_detail = _http_json(
-                    f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{msg_id}?format=metadata&metadataHeaders=Subject&metadataHeaders=From&metadataHeaders=Date&metadataHeaders=To",
-                    headers={"Authorization": f"Bearer {access_token}", "Accept": "application/json"},
-                )
-                headers = _gmail_headers_dict((msg_detail.get("payload") or {}))
-                from_header = headers.get("From") or ""
-                from_name = from_header.split("<")[0].strip().strip('"\'') if "<" in from_header else from_header
-                items.append(
-                    {
-                        "id": msg_detail.get("id") or msg_id,
-                        "threadId": msg_detail.get("threadId"),
-                        "snippet": msg_detail.get("snippet", ""),
-                        "subject": headers.get("Subject", "(Sin asunto)"),
-                        "from": from_name,
-                        "from_full": from_header,
-                        "to": headers.get("To", ""),
-                        "date": headers.get("Date", ""),
-                    }
-                )
-            except Exception:
+        for msg, msg_detail in zip(messages_list, detalles):
+            msg_id = msg["id"]
+            if isinstance(msg_detail, Exception):
                 items.append({"id": msg_id})
+                continue
+            headers = _gmail_headers_dict((msg_detail.get("payload") or {}))
+            from_header = headers.get("From") or ""
+            from_name = from_header.split("<")[0].strip().strip('"\'') if "<" in from_header else from_header
+            items.append(
+                {
+                    "id": msg_detail.get("id") or msg_id,
+                    "threadId": msg_detail.get("threadId"),
+                    "snippet": msg_detail.get("snippet", ""),
+                    "subject": headers.get("Subject", "(Sin asunto)"),
+                    "from": from_name,
+                    "from_full": from_header,
+                    "to": headers.get("To", ""),
+                    "date": headers.get("Date", ""),
+                }
+            )
 
         return Response(
             {
@@ -1434,7 +1577,7 @@ class GoogleGmailMessageDetailAPIView(APIView):
         access_token = _google_drive_refresh_token(integration)
         try:
             msg_detail = _http_json(
-                f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{msg_id}",
+                _gmail_api_url(f"/gmail/v1/users/me/messages/{msg_id}"),
                 headers={"Authorization": f"Bearer {access_token}", "Accept": "application/json"},
             )
         except urllib.error.HTTPError:
@@ -1588,7 +1731,7 @@ class GoogleGmailSendAPIView(APIView):
             encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode("utf-8")
 
             sent = _http_json(
-                "https://gmail.googleapis.com/gmail/v1/users/me/messages/send",
+                _gmail_api_url("/gmail/v1/users/me/messages/send"),
                 method="POST",
                 headers={"Authorization": f"Bearer {access_token}", "Accept": "application/json"},
                 json_data={"raw": encoded_message},
@@ -0,0 +1,223 @@
+import http.client
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+# Plazo por omisión de una llamada completa (conexión, envío y lectura del
+# cuerpo); ``urlopen(timeout=...)`` sólo acotaba cada operación de socket.
+PLAZO_SEGUNDOS = 20
+
+# Conexiones ociosas que se conservan por (esquema, host, puerto).
+MAX_OCIOSAS_POR_HOST = 8
+
+# Llamadas simultáneas en ``en_paralelo`` (Gmail limita por usuario, no conviene más).
+MAX_PARALELO = 8
+
+_TAMANO_BLOQUE = 64 * 1024
+
+# Errores con los que el servidor delata que cerró una conexión keep-alive
+# ociosa; con una conexión reusada se reintenta una vez con una nueva.
+_ERRORES_CONEXION_VENCIDA = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class PlazoVencido(TimeoutError):
+    """La llamada no terminó dentro de su plazo."""
+
+
+class _Plazo:
+    def __init__(self, segundos):
+        self.limite = time.monotonic() + segundos
+
+    def restante(self):
+        restante = self.limite - time.monotonic()
+        if restante <= 0:
+            raise PlazoVencido("Se agotó el plazo de la llamada HTTP.")
+        return restante
+
+
+class RespuestaHTTP:
+    """Respuesta abierta de ``ClienteHTTP.abrir``; cada lectura respeta el plazo."""
+
+    def __init__(self, conexion, respuesta, plazo):
+        self._conexion = conexion
+        self._respuesta = respuesta
+        self._plazo = plazo
+        self.status = respuesta.status
+        self.reason = respuesta.reason
+        self.headers = respuesta.headers
+
+    def _leer(self, lectura):
+        if self._conexion.sock is not None:
+            self._conexion.sock.settimeout(self._plazo.restante())
+        try:
+            return lectura()
+        except TimeoutError as exc:
+            raise PlazoVencido("Se agotó el plazo de la llamada HTTP.") from exc
+
+    def leer(self):
+        partes = []
+        while True:
+            parte = self._leer(lambda: self._respuesta.read(_TAMANO_BLOQUE))
+            if not parte:
+                return b"".join(partes)
+            partes.append(parte)
+
+    def lineas(self):
+        """Renglones decodificados (sin salto de línea) conforme llegan."""
+        while True:
+            linea = self._leer(self._respuesta.readline)
+            if not linea:
+                return
+            yield linea.decode("utf-8").rstrip("\r\n")
+
+
+class ClienteHTTP:
+    """Cliente HTTP/1.1 con conexiones keep-alive reutilizables.
+
+    ``urllib.request.urlopen`` abría una conexión (y un handshake TLS) por
+    llamada; aquí cada conexión que terminó de leerse vuelve a un pool por
+    host y la siguiente llamada al mismo host la reutiliza. El pool es seguro
+    entre hilos: una conexión sólo la usa quien la tomó hasta que la devuelve.
+
+    Las URL base las deciden los llamadores (ver ``OPENAI_BASE_URL`` y
+    ``GOOGLE_API_URL``/``GMAIL_API_URL``), así que en pruebas basta apuntarlas
+    a un servidor falso en ``http://127.0.0.1``.
+    """
+
+    def __init__(self, plazo=PLAZO_SEGUNDOS, max_ociosas=MAX_OCIOSAS_POR_HOST):
+        self.plazo = plazo
+        self.max_ociosas = max_ociosas
+        self._ociosas = {}
+        self._candado = threading.Lock()
+
+    def _tomar(self, clave, timeout):
+        with self._candado:
+            libres = self._ociosas.get(clave)
+            if libres:
+                return libres.pop(), True
+        esquema, host, puerto = clave
+        clase = http.client.HTTPSConnection if esquema == "https" else http.client.HTTPConnection
+        return clase(host, puerto, timeout=timeout), False
+
+    def _devolver(self, clave, conexion):
+        with self._candado:
+            libres = self._ociosas.setdefault(clave, [])
+            if len(libres) < self.max_ociosas:
+                libres.append(conexion)
+                return
+        conexion.close()
+
+    def cerrar(self):
+        with self._candado:
+            ociosas, self._ociosas = self._ociosas, {}
+        for libres in ociosas.values():
+            for conexion in libres:
+                conexion.close()
+
+    @contextmanager
+    def abrir(self, metodo, url, cuerpo=None, headers=None, plazo=None):
+        """``RespuestaHTTP`` de la llamada; al salir, la conexión vuelve al pool
+        si la respuesta se leyó completa y el servidor no pidió cerrarla."""
+        partes = urllib.parse.urlsplit(url)
+        esquema = partes.scheme or "https"
+        clave = (esquema, partes.hostname, partes.port or (443 if esquema == "https" else 80))
+        ruta = (partes.path or "/") + (f"?{partes.query}" if partes.query else "")
+        limite = _Plazo(plazo or self.plazo)
+
+        for intento in (1, 2):
+            conexion, reusada = self._tomar(clave, limite.restante())
+            try:
+                conexion.timeout = limite.restante()
+                if conexion.sock is not None:
+                    conexion.sock.settimeout(conexion.timeout)
+                conexion.request(metodo, ruta, body=cuerpo, headers=headers or {})
+                respuesta = conexion.getresponse()
+            except _ERRORES_CONEXION_VENCIDA:
+                conexion.close()
+                if reusada and intento == 1:
+                    continue
+                raise
+            except TimeoutError as exc:
+                conexion.close()
+                raise PlazoVencido("Se agotó el plazo de la llamada HTTP.") from exc
+            except BaseException:
+                conexion.close()
+                raise
+            break
+
+        try:
+            yield RespuestaHTTP(conexion, respuesta, limite)
+        except BaseException:
+            conexion.close()
+            raise
+        if respuesta.isclosed() and not respuesta.will_close:
+            self._devolver(clave, conexion)
+        else:
+            conexion.close()
+
+    def json(self, url, *, method="GET", data=None, json_data=None, headers=None, plazo=None):
+        """Cuerpo JSON de la respuesta.
+
+        Un status >= 400 se lanza como ``urllib.error.HTTPError`` (con el
+        cuerpo legible vía ``e.read()``), igual que con ``urlopen``, para que
+        los ``except`` de las vistas sigan funcionando sin cambios.
+        """
+        cuerpo = None
+        merged_headers = {"Accept-Encoding": "identity", **(headers or {})}
+        if json_data is not None:
+            cuerpo = json.dumps(json_data).encode("utf-8")
+            merged_headers.setdefault("Content-Type", "application/json")
+        elif data is not None:
+            cuerpo = urllib.parse.urlencode(data).encode("utf-8")
+            merged_headers.setdefault("Content-Type", "application/x-www-form-urlencoded")
+
+        with self.abrir(method, url, cuerpo=cuerpo, headers=merged_headers, plazo=plazo) as respuesta:
+            contenido = respuesta.leer()
+        if respuesta.status >= 400:
+            raise urllib.error.HTTPError(
+                url, respuesta.status, respuesta.reason, respuesta.headers, io.BytesIO(contenido)
+            )
+        return json.loads(contenido.decode("utf-8")) if contenido else {}
+
+
+def en_paralelo(funcion, elementos, max_hilos=MAX_PARALELO, plazo=None):
+    """``[funcion(e) for e in elementos]`` con a lo más ``max_hilos`` llamadas a la vez.
+
+    Se conserva el orden; en cada posición queda el resultado o la excepción
+    que lanzó ``funcion``. Lo que no terminó dentro de ``plazo`` (segundos
+    para todo el lote) queda como ``PlazoVencido``; las llamadas ya en curso
+    terminan por su cuenta, acotadas por su propio plazo.
+    """
+    elementos = list(elementos)
+    if not elementos:
+        return []
+    ejecutor = ThreadPoolExecutor(max_workers=min(max_hilos, len(elementos)))
+    try:
+        futuros = [ejecutor.submit(funcion, elemento) for elemento in elementos]
+        wait(futuros, timeout=plazo)
+        resultados = []
+        for futuro in futuros:
+            if not futuro.done():
+                futuro.cancel()
+                resultados.append(PlazoVencido("Se agotó el plazo del lote."))
+            elif futuro.exception() is not None:
+                resultados.append(futuro.exception())
+            else:
+                resultados.append(futuro.result())
+        return resultados
+    finally:
+        ejecutor.shutdown(wait=False, cancel_futures=True)
+
+
+# Pool compartido por el proceso (cada worker de gunicorn tiene el suyo).
+cliente_http = ClienteHTTP()
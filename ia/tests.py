@@ -0,0 +1,386 @@
+"""Tests del cliente HTTP del asistente (``ia/services/http_service.py``) y del
+modo SSE del chat.
+
+Todo corre contra un ``http.server`` local en ``127.0.0.1``: reutilización de
+conexiones keep-alive, reintento con una conexión vencida, plazo que vence a
+mitad del cuerpo, ``en_paralelo`` (orden, errores y plazo del lote), el mapeo
+de errores de ``_http_json`` y la secuencia de eventos SSE con una ronda de
+herramientas.
+
+Ejecutar SIEMPRE con una BD desechable; el ``.env`` del repo apunta a Supabase
+de producción. Ejemplo con un settings de override a SQLite en memoria:
+
+    python manage.py test ia --settings=sqlite_settings
+"""
+
+import json
+import socket
+import threading
+import time
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ia.api.views import AIAssistantAPIView
+from ia.services.http_service import ClienteHTTP, PlazoVencido, en_paralelo
+from ia.views import _http_json
+from nucleo.models import Empresa
+from usuarios.models import Usuario
+
+
+def _chunk(delta):
+    return {"choices": [{"index": 0, "delta": delta}]}
+
+
+# Respuesta en streaming de OpenAI partida como llega: el ``tool_call`` viene
+# troceado por índice y los argumentos en dos fragmentos.
+RONDA_HERRAMIENTA = [
+    _chunk({"role": "assistant", "tool_calls": [
+        {"index": 0, "id": "call_1", "type": "function", "function": {"name": "get_counts", "arguments": ""}}
+    ]}),
+    _chunk({"tool_calls": [{"index": 0, "function": {"arguments": '{"alcance": '}}]}),
+    _chunk({"tool_calls": [{"index": 0, "function": {"arguments": '"empresa"}'}}]}),
+]
+RONDA_TEXTO = [_chunk({"role": "assistant", "content": "Hay "}), _chunk({"content": "3 empresas."})]
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.candado:
+            self.server.conexiones += 1
+
+    def _json(self, status, datos, cerrar=False):
+        cuerpo = json.dumps(datos).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+        # Cierra sin anunciarlo: el cliente cree que la conexión sigue viva.
+        self.close_connection = cerrar
+
+    def do_GET(self):
+        if self.path.startswith("/json"):
+            self._json(200, {"ruta": self.path})
+        elif self.path == "/cierra":
+            self._json(200, {"ok": True}, cerrar=True)
+        elif self.path == "/lento":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            inicio, resto = b'{"parte": ', b'"dos"}'
+            self.send_header("Content-Length", str(len(inicio + resto)))
+            self.end_headers()
+            self.wfile.write(inicio)
+            self.wfile.flush()
+            time.sleep(self.server.pausa)
+            self.wfile.write(resto)
+        else:
+            self._json(404, {"error": "no existe"})
+
+    def do_POST(self):
+        cuerpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.peticiones.append(cuerpo)
+        if self.server.falla_chat:
+            self._json(500, {"error": {"message": "caído"}})
+            return
+        con_herramienta = any(m.get("role") == "tool" for m in cuerpo["messages"])
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(b": keep-alive\n\n")
+        for chunk in RONDA_TEXTO if con_herramienta else RONDA_HERRAMIENTA:
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def reiniciar(self):
+        self.candado = threading.Lock()
+        self.conexiones = 0
+        self.pausa = 1.0
+        self.peticiones = []
+        self.falla_chat = False
+
+    def handle_error(self, request, client_address):
+        # El cliente que venció su plazo ya cerró; escribirle falla y es lo esperado.
+        pass
+
+
+class ServidorLocalMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = _Servidor(("127.0.0.1", 0), _Manejador)
+        cls.servidor.reiniciar()
+        cls.url = f"http://127.0.0.1:{cls.servidor.server_address[1]}"
+        hilo = threading.Thread(target=cls.servidor.serve_forever, daemon=True)
+        hilo.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.servidor.reiniciar()
+
+
+class ClienteHTTPTests(ServidorLocalMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cliente = ClienteHTTP(plazo=5)
+        self.addCleanup(self.cliente.cerrar)
+
+    def test_reutiliza_la_conexion(self):
+        for i in range(3):
+            self.assertEqual(self.cliente.json(f"{self.url}/json?i={i}"), {"ruta": f"/json?i={i}"})
+
+        self.assertEqual(self.servidor.conexiones, 1)
+
+    def test_conexion_vencida_se_reintenta_una_vez(self):
+        self.cliente.json(f"{self.url}/cierra")
+        # El servidor ya cerró, pero la conexión volvió al pool.
+        self.assertEqual(len(self.cliente._ociosas[("http", "127.0.0.1", self.servidor.server_address[1])]), 1)
+
+        self.assertEqual(self.cliente.json(f"{self.url}/json"), {"ruta": "/json"})
+        self.assertEqual(self.servidor.conexiones, 2)
+
+    def test_plazo_vence_a_mitad_del_cuerpo(self):
+        inicio = time.monotonic()
+        with self.assertRaises(PlazoVencido):
+            with self.cliente.abrir("GET", f"{self.url}/lento", plazo=0.3) as respuesta:
+                self.assertEqual(respuesta.status, 200)
+                respuesta.leer()
+
+        self.assertLess(time.monotonic() - inicio, self.servidor.pausa)
+        # Una conexión con el cuerpo a medias no vuelve al pool.
+        self.assertFalse(any(self.cliente._ociosas.values()))
+
+    def test_status_de_error_es_httperror_con_cuerpo(self):
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            self.cliente.json(f"{self.url}/no-existe")
+
+        self.assertEqual(ctx.exception.code, 404)
+        self.assertEqual(json.loads(ctx.exception.read()), {"error": "no existe"})
+        # El cuerpo se leyó completo: la conexión se reutiliza.
+        self.cliente.json(f"{self.url}/json")
+        self.assertEqual(self.servidor.conexiones, 1)
+
+
+class HttpJsonTests(ServidorLocalMixin, SimpleTestCase):
+    def test_devuelve_el_json(self):
+        self.assertEqual(_http_json(f"{self.url}/json"), {"ruta": "/json"})
+
+    def test_status_de_error_se_registra_y_se_relanza(self):
+        with self.assertLogs("nucleo", "WARNING") as logs:
+            with self.assertRaises(urllib.error.HTTPError) as ctx:
+                _http_json(f"{self.url}/no-existe?token=secreto")
+
+        self.assertEqual(ctx.exception.code, 404)
+        self.assertIn("status=404", logs.output[0])
+        self.assertNotIn("secreto", logs.output[0])
+
+    def test_error_de_red_es_urlerror(self):
+        with socket.socket() as libre:
+            libre.bind(("127.0.0.1", 0))
+            puerto = libre.getsockname()[1]
+
+        with self.assertLogs("nucleo", "WARNING"):
+            with self.assertRaises(urllib.error.URLError) as ctx:
+                _http_json(f"http://127.0.0.1:{puerto}/json")
+
+        self.assertNotIsInstance(ctx.exception, urllib.error.HTTPError)
+
+    def test_plazo_vencido_es_urlerror(self):
+        with self.assertLogs("nucleo", "WARNING"):
+            with self.assertRaises(urllib.error.URLError) as ctx:
+                _http_json(f"{self.url}/lento", timeout=0.3)
+
+        self.assertIsInstance(ctx.exception.reason, PlazoVencido)
+
+
+class EnParaleloTests(SimpleTestCase):
+    def test_conserva_el_orden(self):
+        def funcion(i):
+            time.sleep(0.01 * (5 - i))
+            return i * 10
+
+        self.assertEqual(en_paralelo(funcion, range(5), max_hilos=3), [0, 10, 20, 30, 40])
+
+    def test_acota_los_hilos(self):
+        candado = threading.Lock()
+        estado = {"activos": 0, "maximo": 0}
+
+        def funcion(i):
+            with candado:
+                estado["activos"] += 1
+                estado["maximo"] = max(estado["maximo"], estado["activos"])
+            time.sleep(0.02)
+            with candado:
+                estado["activos"] -= 1
+            return i
+
+        self.assertEqual(en_paralelo(funcion, range(9), max_hilos=3), list(range(9)))
+        self.assertLessEqual(estado["maximo"], 3)
+
+    def test_la_excepcion_queda_en_su_posicion(self):
+        def funcion(i):
+            if i == 1:
+                raise ValueError("uno")
+            return i
+
+        resultados = en_paralelo(funcion, range(3))
+
+        self.assertEqual(resultados[0], 0)
+        self.assertIsInstance(resultados[1], ValueError)
+        self.assertEqual(resultados[2], 2)
+
+    def test_plazo_del_lote(self):
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+
+        def funcion(i):
+            if i == 1:
+                liberar.wait(5)
+            return i
+
+        inicio = time.monotonic()
+        resultados = en_paralelo(funcion, range(3), plazo=0.2)
+
+        self.assertLess(time.monotonic() - inicio, 2)
+        self.assertEqual(resultados[0], 0)
+        self.assertIsInstance(resultados[1], PlazoVencido)
+        self.assertEqual(resultados[2], 2)
+
+    def test_sin_elementos(self):
+        self.assertEqual(en_paralelo(str, []), [])
+
+
+def _eventos(flujo):
+    """``[(evento, datos)]`` de un flujo SSE."""
+    eventos = []
+    for bloque in "".join(flujo).split("\n\n"):
+        if not bloque.strip():
+            continue
+        evento, datos = bloque.split("\n")
+        eventos.append((evento.removeprefix("event: "), json.loads(datos.removeprefix("data: "))))
+    return eventos
+
+
+RESULTADO_HERRAMIENTA = {"empresas": 3}
+ESPERADOS = [
+    (
+        "tool",
+        {"name": "get_counts", "args": {"alcance": "empresa"}, "result": RESULTADO_HERRAMIENTA},
+    ),
+    ("token", {"text": "Hay "}),
+    ("token", {"text": "3 empresas."}),
+    (
+        "done",
+        {
+            "reply": "Hay 3 empresas.",
+            "tool_results": [
+                {"name": "get_counts", "args": {"alcance": "empresa"}, "result": RESULTADO_HERRAMIENTA}
+            ],
+        },
+    ),
+]
+
+
+@patch.object(AIAssistantAPIView, "_execute_tool", return_value=RESULTADO_HERRAMIENTA)
+class StreamSSETests(ServidorLocalMixin, SimpleTestCase):
+    def _stream(self, messages):
+        vista = AIAssistantAPIView()
+        return vista._stream_sse(
+            SimpleNamespace(), f"{self.url}/v1", "sk-test", "gpt-test", messages, vista._tools_schema()
+        )
+
+    def test_secuencia_con_una_ronda_de_herramientas(self, execute_tool):
+        messages = [{"role": "user", "content": "¿Cuántas empresas hay?"}]
+
+        self.assertEqual(_eventos(self._stream(messages)), ESPERADOS)
+
+        execute_tool.assert_called_once()
+        self.assertEqual(execute_tool.call_args.kwargs["args"], {"alcance": "empresa"})
+        primera, segunda = self.servidor.peticiones
+        self.assertTrue(primera["stream"])
+        # La segunda ronda lleva el tool_call reensamblado y su resultado.
+        asistente, herramienta = segunda["messages"][-2:]
+        self.assertEqual(
+            asistente["tool_calls"],
+            [
+                {
+                    "id": "call_1",
+                    "type": "function",
+                    "function": {"name": "get_counts", "arguments": '{"alcance": "empresa"}'},
+                }
+            ],
+        )
+        self.assertEqual(herramienta["tool_call_id"], "call_1")
+        self.assertEqual(json.loads(herramienta["content"]), RESULTADO_HERRAMIENTA)
+
+    def test_chat_stream_entrega_tokens_y_mensaje(self, execute_tool):
+        vista = AIAssistantAPIView()
+        messages = [{"role": "user", "content": "hola"}, {"role": "tool", "tool_call_id": "x", "content": "{}"}]
+
+        partes = list(vista._openai_chat_stream(f"{self.url}/v1", "sk-test", "gpt-test", messages, []))
+
+        self.assertEqual(
+            partes,
+            [
+                ("token", "Hay "),
+                ("token", "3 empresas."),
+                ("message", {"role": "assistant", "content": "Hay 3 empresas."}),
+            ],
+        )
+
+    def test_error_de_openai_termina_el_flujo(self, execute_tool):
+        self.servidor.falla_chat = True
+
+        eventos = _eventos(self._stream([{"role": "user", "content": "hola"}]))
+
+        self.assertEqual(len(eventos), 1)
+        evento, datos = eventos[0]
+        self.assertEqual(evento, "error")
+        self.assertEqual(datos["status_code"], 500)
+        execute_tool.assert_not_called()
+
+
+@patch.object(AIAssistantAPIView, "_execute_tool", return_value=RESULTADO_HERRAMIENTA)
+class ChatEndpointStreamTests(ServidorLocalMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        empresa = Empresa.objects.create(codigo="ia", razon_social="Asistente SA")
+        cls.usuario = Usuario.objects.create(username="ia", email="ia@ia.test", empresa=empresa)
+
+    def test_stream_por_el_endpoint(self, execute_tool):
+        client = APIClient()
+        client.force_authenticate(user=self.usuario)
+
+        with override_settings(OPENAI_API_KEY="sk-test", OPENAI_BASE_URL=f"{self.url}/v1/"):
+            response = client.post(
+                "/api/v1/ai/chat/", {"message": "¿Cuántas empresas hay?", "stream": True}, format="json"
+            )
+            cuerpo = b"".join(response.streaming_content).decode("utf-8")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertEqual(_eventos([cuerpo]), ESPERADOS)
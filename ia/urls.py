@@ -1,8 +1,9 @@
 from django.urls import path
-from . import views
+
+from nucleo.vistas_diferidas import vista_diferida
 
 urlpatterns = [
-    path('creator/', views.creator, name='ia_creator'),
+    path('creator/', vista_diferida('ia.views.creator'), name='ia_creator'),
     # path('drive/', views.drive, name='drive'),
     # path('drive/google/connect/', views.drive_google_connect, name='drive_google_connect'),
     # path('drive/google/callback/', views.drive_google_callback, name='drive_google_callback'),
@@ -1,9 +1,9 @@
+import http.client
 import logging
 import json
 import secrets
 import urllib.error
 import urllib.parse
-import urllib.request
 import base64
 from email.message import EmailMessage
 import mimetypes
@@ -18,6 +18,7 @@ from django.utils import timezone
 from django.views.decorators.http import require_POST
 
 from ia.models import CloudIntegration
+from ia.services.http_service import cliente_http
 
 
 GOOGLE_DRIVE_SCOPE = "https://www.googleapis.com/auth/drive.readonly https://www.googleapis.com/auth/userinfo.email https://www.googleapis.com/auth/gmail.modify https://www.googleapis.com/auth/calendar"
@@ -70,18 +71,12 @@ def _google_drive_credentials_configured():
 
 
 def _http_json(url, *, method="GET", data=None, json_data=None, headers=None, timeout=20):
-    payload = None
-    merged_headers = dict(headers or {})
-    if json_data is not None:
-        payload = json.dumps(json_data).encode("utf-8")
-        merged_headers.setdefault("Content-Type", "application/json")
-    elif data is not None:
-        payload = urllib.parse.urlencode(data).encode("utf-8")
-        merged_headers.setdefault("Content-Type", "application/x-www-form-urlencoded")
-    request = urllib.request.Request(url, data=payload, headers=merged_headers, method=method)
+    # Va por el pool keep-alive de ia.services.http_service; ``timeout`` es el
+    # plazo de la llamada completa y los errores conservan los tipos de urllib.
     try:
-        with urllib.request.urlopen(request, timeout=timeout) as response:
-            return json.loads(response.read().decode("utf-8"))
+        return cliente_http.json(
+            url, method=method, data=data, json_data=json_data, headers=headers, plazo=timeout
+        )
     except urllib.error.HTTPError as e:
         try:
             body = e.read().decode("utf-8")
@@ -90,10 +85,10 @@ def _http_json(url, *, method="GET", data=None, json_data=None, headers=None, ti
         safe_url = (url or "").split("?", 1)[0]
         logger.warning("Drive HTTPError %s %s status=%s body=%s", method, safe_url, getattr(e, "code", ""), body[:600])
         raise
-    except urllib.error.URLError as e:
+    except (OSError, http.client.HTTPException) as e:
         safe_url = (url or "").split("?", 1)[0]
         logger.warning("Drive URLError %s %s detail=%s", method, safe_url, str(e))
-        raise
+        raise urllib.error.URLError(e) from e
 
 
 def _google_drive_refresh_token(integration):
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from nucleo.api.campos import CamposDinamicosMixin
 from inventarios.models import Almacen, Ubicacion, Existencia, MovimientoInventario, MovimientoInventarioDetalle, AjusteInventario
 from nucleo.models import Sucursal
 from auditoria.models import AuditoriaEvento
@@ -167,7 +168,7 @@ class ExistenciaSerializer(serializers.ModelSerializer):
             'producto': getattr(serie, 'producto_id', None),
         }
 
-class MovimientoInventarioSerializer(serializers.ModelSerializer):
+class MovimientoInventarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = MovimientoInventario
         fields = '__all__'
@@ -177,7 +178,7 @@ class MovimientoInventarioDetalleSerializer(serializers.ModelSerializer):
         model = MovimientoInventarioDetalle
         fields = '__all__'
 
-class AjusteInventarioSerializer(serializers.ModelSerializer):
+class AjusteInventarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = AjusteInventario
         fields = '__all__'
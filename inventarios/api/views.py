@@ -1,5 +1,5 @@
 from collections import defaultdict
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 
 from django.db import models, transaction
@@ -21,7 +21,11 @@ from inventarios.models import (
 )
 from catalogo.models import Producto, ProductoVariante
 from auditoria.models import AuditoriaEvento
+from inventarios.services.corte_existencia_service import CorteExistenciaService
+from inventarios.services.kardex_service import KardexService
 from nucleo.models import Empresa, Sucursal
+from nucleo.lotes import iterar_por_lotes
+from nucleo.services.exportacion_service import ExportacionService
 from ventas.models import Pedido
 from .serializers import (
     AlmacenSerializer,
@@ -57,6 +61,7 @@ class IsAuthenticatedAndScoped(permissions.BasePermission):
 class AlmacenViewSet(viewsets.ModelViewSet):
     queryset = Almacen.objects.all().select_related('empresa', 'sucursal')
     serializer_class = AlmacenSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
     permission_classes = [IsAuthenticatedAndScoped]
     lookup_field = 'id_almacen'
 
@@ -148,6 +153,8 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
     )
     serializer_class = ExistenciaSerializer
     permission_classes = [IsAuthenticatedAndScoped]
+    # Sólo pagina con ``limit=all``: con límite el queryset ya llega recortado.
+    cursor_ordering = "fecha_actualizacion"
 
     def get_queryset(self):
         def to_int(v):
@@ -285,33 +292,6 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
         final_dt = timezone.make_aware(datetime.combine(fecha_final, time.max), tz)
         return fecha_inicio, fecha_final, inicio_dt, final_dt
 
-    def _iter_auditoria_items(self, eventos, allowed_almacen_ids, producto_id=None, producto_variante_id=None):
-        for evento in eventos.iterator():
-            payload = evento.despues_json or evento.antes_json or {}
-            evento_almacen_id = self._report_to_int(payload.get("almacen_id"))
-            for item in payload.get("items", []) or []:
-                # Most audit writers (inventarios manual, compras) store almacen_id
-                # only at the event level, not per item; fall back to it so those
-                # movements aren't silently dropped from the period aggregation.
-                almacen_id = self._report_to_int(item.get("almacen_id")) or evento_almacen_id
-                if not almacen_id or almacen_id not in allowed_almacen_ids:
-                    continue
-
-                item_producto_id = self._report_to_int(item.get("producto_id"))
-                item_variante_id = self._report_to_int(item.get("producto_variante_id"))
-
-                if producto_variante_id and item_variante_id != producto_variante_id:
-                    continue
-                if producto_id and item_producto_id != producto_id:
-                    continue
-
-                yield {
-                    "almacen_id": almacen_id,
-                    "producto_id": item_producto_id,
-                    "producto_variante_id": item_variante_id,
-                    "delta": self._report_to_decimal(item.get("delta")),
-                }
-
     def _movement_almacen_ids(self, detalle):
         movimiento = detalle.movimiento_inventario
         origen_id = (
@@ -327,8 +307,40 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
         )
         return origen_id, destino_id
 
-    @action(detail=False, methods=["get"], url_path="reporte-existencias-periodo")
-    def reporte_existencias_periodo(self, request):
+    #: Columnas de ``reporte-existencias-periodo/?exportar=csv|xlsx``.
+    COLUMNAS_EXISTENCIAS_PERIODO = [
+        ("almacen_id", "Almacén ID"),
+        ("almacen_codigo", "Almacén"),
+        ("almacen_nombre", "Nombre almacén"),
+        ("producto_id", "Producto ID"),
+        ("producto_variante_id", "Variante ID"),
+        ("producto_nombre", "Producto"),
+        ("sku", "SKU"),
+        ("color", "Color"),
+        ("talla", "Talla"),
+        ("existencia_inicial", "Existencia inicial"),
+        ("entradas", "Entradas"),
+        ("salidas", "Salidas"),
+        ("existencia_final", "Existencia final"),
+        ("costo_unitario_final", "Costo unitario final"),
+        ("costo_existencia_final", "Costo existencia final"),
+    ]
+    NUMERICAS_EXISTENCIAS_PERIODO = (
+        "existencia_inicial",
+        "entradas",
+        "salidas",
+        "existencia_final",
+        "costo_unitario_final",
+        "costo_existencia_final",
+    )
+
+    def _existencias_periodo_datos(self, request):
+        """Acumulados por ``(almacén, producto, variante)`` del periodo pedido.
+
+        Los comparten la respuesta JSON y la exportación. Ocupan memoria por
+        combinación distinta, no por evento de auditoría ni por renglón de
+        salida: los renglones los arma ``_iter_existencias_periodo`` uno a uno.
+        """
         fecha_inicio, fecha_final, inicio_dt, final_dt = self._parse_report_dates()
         qp = request.query_params
         almacen_id = self._report_to_int(qp.get("almacen") or qp.get("almacen_id"))
@@ -349,30 +361,17 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
         )
         allowed_almacen_ids = {row["id_almacen"] for row in almacenes}
 
+        datos = {
+            "fecha_inicio": fecha_inicio,
+            "fecha_final": fecha_final,
+            "almacen_id": almacen_id,
+            "producto_id": producto_id,
+            "producto_variante_id": producto_variante_id,
+            "almacen_map": {},
+            "keys": set(),
+        }
         if not allowed_almacen_ids:
-            return Response(
-                {
-                    "fecha_inicio": str(fecha_inicio),
-                    "fecha_final": str(fecha_final),
-                    "filtros": {
-                        "producto_id": producto_id,
-                        "producto_variante_id": producto_variante_id,
-                    },
-                    "resumen": {
-                        "existencia_inicial": "0.0000",
-                        "entradas": "0.0000",
-                        "salidas": "0.0000",
-                        "existencia_final": "0.0000",
-                        "costo_total_existencia_final": "0.00",
-                    },
-                    "resumen_por_almacen": [],
-                    "count": 0,
-                    "next": None,
-                    "previous": None,
-                    "results": [],
-                },
-                status=status.HTTP_200_OK,
-            )
+            return datos
 
         almacen_map = {row["id_almacen"]: row for row in almacenes}
         empresa_ids = {row["empresa_id"] for row in almacenes if row["empresa_id"]}
@@ -394,26 +393,21 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
                 | models.Q(producto_variante__producto_id=producto_id)
             )
 
-        current_rows = current_qs.values_list(
+        current_rows = current_qs.values(
+            "id",
             "almacen_id",
             "producto_id",
             "producto_variante_id",
             "producto_variante__producto_id",
             "cantidad",
         )
-        for (
-            row_almacen_id,
-            row_producto_id,
-            row_variante_id,
-            row_variante_producto_id,
-            row_cantidad,
-        ) in current_rows.iterator():
+        for row in iterar_por_lotes(current_rows):
             key = (
-                row_almacen_id,
-                row_producto_id or row_variante_producto_id,
-                row_variante_id,
+                row["almacen_id"],
+                row["producto_id"] or row["producto_variante__producto_id"],
+                row["producto_variante_id"],
             )
-            current_map[key] += self._report_to_decimal(row_cantidad)
+            current_map[key] += self._report_to_decimal(row["cantidad"])
             keys.add(key)
 
         auditoria_base = AuditoriaEvento.objects.filter(
@@ -427,8 +421,45 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
         period_out_map = defaultdict(lambda: Decimal("0"))
         post_end_delta_map = defaultdict(lambda: Decimal("0"))
 
+        # Los días ya consolidados se leen de CorteExistenciaDiario (un GROUP BY
+        # por tramo); sólo los eventos posteriores al último corte —normalmente
+        # los de hoy— se decodifican del JSON de auditoría. Si el periodo empieza
+        # antes de la cobertura se reconstruye todo desde los eventos.
         period_events = auditoria_base.filter(created_at__gte=inicio_dt, created_at__lte=final_dt)
-        for item in self._iter_auditoria_items(
+        post_end_events = auditoria_base.filter(created_at__gt=final_dt)
+        cobertura = CorteExistenciaService.cobertura()
+        if cobertura and cobertura[0] <= fecha_inicio:
+            corte_hasta = cobertura[1]
+            corte_filtros = {
+                "almacen_ids": allowed_almacen_ids,
+                "producto_id": producto_id,
+                "producto_variante_id": producto_variante_id,
+            }
+            cortes_periodo = CorteExistenciaService.sumar(
+                fecha_desde=fecha_inicio,
+                fecha_hasta=min(fecha_final, corte_hasta),
+                **corte_filtros,
+            )
+            for key, (entradas, salidas) in cortes_periodo.items():
+                period_delta_map[key] += entradas - salidas
+                period_in_map[key] += entradas
+                period_out_map[key] += salidas
+                keys.add(key)
+
+            cortes_post = CorteExistenciaService.sumar(
+                fecha_desde=fecha_final + timedelta(days=1),
+                fecha_hasta=corte_hasta,
+                **corte_filtros,
+            )
+            for key, (entradas, salidas) in cortes_post.items():
+                post_end_delta_map[key] += entradas - salidas
+                keys.add(key)
+
+            corte_fin_dt = CorteExistenciaService.fin_del_dia(corte_hasta)
+            period_events = period_events.filter(created_at__gt=corte_fin_dt)
+            post_end_events = post_end_events.filter(created_at__gt=corte_fin_dt)
+
+        for item in CorteExistenciaService.iter_items(
             period_events,
             allowed_almacen_ids=allowed_almacen_ids,
             producto_id=producto_id,
@@ -443,8 +474,7 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
                 period_out_map[key] += abs(delta)
             keys.add(key)
 
-        post_end_events = auditoria_base.filter(created_at__gt=final_dt)
-        for item in self._iter_auditoria_items(
+        for item in CorteExistenciaService.iter_items(
             post_end_events,
             allowed_almacen_ids=allowed_almacen_ids,
             producto_id=producto_id,
@@ -499,7 +529,7 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
             if producto_id:
                 movement_cost_qs = movement_cost_qs.filter(producto_id=producto_id)
 
-            for detalle in movement_cost_qs:
+            for detalle in iterar_por_lotes(movement_cost_qs, "movimiento_inventario__fecha_movimiento", descendente=True):
                 producto_key_id = detalle.producto_id
                 variante_key_id = detalle.producto_variante_id
                 origen_id, destino_id = self._movement_almacen_ids(detalle)
@@ -510,25 +540,35 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
                 if len(cost_map) >= len(keys):
                     break
 
-        detalle = []
-        resumen_por_almacen = defaultdict(
-            lambda: {
-                "existencia_inicial": Decimal("0"),
-                "entradas": Decimal("0"),
-                "salidas": Decimal("0"),
-                "existencia_final": Decimal("0"),
-                "costo_total_existencia_final": Decimal("0"),
-            }
+        datos.update(
+            almacen_map=almacen_map,
+            keys=keys,
+            current_map=current_map,
+            period_delta_map=period_delta_map,
+            period_in_map=period_in_map,
+            period_out_map=period_out_map,
+            post_end_delta_map=post_end_delta_map,
+            cost_map=cost_map,
+            productos_map=productos_map,
+            variantes_map=variantes_map,
         )
-        resumen_total = {
-            "existencia_inicial": Decimal("0"),
-            "entradas": Decimal("0"),
-            "salidas": Decimal("0"),
-            "existencia_final": Decimal("0"),
-            "costo_total_existencia_final": Decimal("0"),
-        }
-
-        for key in sorted(keys, key=lambda row: (row[0], row[1] or 0, row[2] or 0)):
+        return datos
+
+    def _iter_existencias_periodo(self, datos):
+        """``(renglón, acumulados)`` por combinación, en orden de almacén/producto/variante."""
+        if not datos["keys"]:
+            return
+        almacen_map = datos["almacen_map"]
+        current_map = datos["current_map"]
+        period_delta_map = datos["period_delta_map"]
+        period_in_map = datos["period_in_map"]
+        period_out_map = datos["period_out_map"]
+        post_end_delta_map = datos["post_end_delta_map"]
+        cost_map = datos["cost_map"]
+        productos_map = datos["productos_map"]
+        variantes_map = datos["variantes_map"]
+
+        for key in sorted(datos["keys"], key=lambda row: (row[0], row[1] or 0, row[2] or 0)):
             almacen_id, producto_key_id, variante_key_id = key
             current_qty = current_map[key]
             period_delta = period_delta_map[key]
@@ -560,6 +600,75 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
                 "costo_unitario_final": str(self._quantize_money(costo_unitario)),
                 "costo_existencia_final": str(costo_existencia_final),
             }
+            yield row, (existencia_inicial, entradas, salidas, existencia_final, costo_existencia_final)
+
+    @action(detail=False, methods=["get"], url_path="reporte-existencias-periodo")
+    def reporte_existencias_periodo(self, request):
+        formato = ExportacionService.formato(request)
+        datos = self._existencias_periodo_datos(request)
+        fecha_inicio, fecha_final = datos["fecha_inicio"], datos["fecha_final"]
+        producto_id, producto_variante_id = datos["producto_id"], datos["producto_variante_id"]
+
+        if formato:
+            return ExportacionService.respuesta(
+                formato,
+                f"existencias_{fecha_inicio}_{fecha_final}",
+                self.COLUMNAS_EXISTENCIAS_PERIODO,
+                (row for row, _ in self._iter_existencias_periodo(datos)),
+                numericas=self.NUMERICAS_EXISTENCIAS_PERIODO,
+            )
+
+        if not datos["almacen_map"]:
+            return Response(
+                {
+                    "fecha_inicio": str(fecha_inicio),
+                    "fecha_final": str(fecha_final),
+                    "filtros": {
+                        "producto_id": producto_id,
+                        "producto_variante_id": producto_variante_id,
+                    },
+                    "resumen": {
+                        "existencia_inicial": "0.0000",
+                        "entradas": "0.0000",
+                        "salidas": "0.0000",
+                        "existencia_final": "0.0000",
+                        "costo_total_existencia_final": "0.00",
+                    },
+                    "resumen_por_almacen": [],
+                    "count": 0,
+                    "next": None,
+                    "previous": None,
+                    "results": [],
+                },
+                status=status.HTTP_200_OK,
+            )
+
+        detalle = []
+        resumen_por_almacen = defaultdict(
+            lambda: {
+                "existencia_inicial": Decimal("0"),
+                "entradas": Decimal("0"),
+                "salidas": Decimal("0"),
+                "existencia_final": Decimal("0"),
+                "costo_total_existencia_final": Decimal("0"),
+            }
+        )
+        resumen_total = {
+            "existencia_inicial": Decimal("0"),
+            "entradas": Decimal("0"),
+            "salidas": Decimal("0"),
+            "existencia_final": Decimal("0"),
+            "costo_total_existencia_final": Decimal("0"),
+        }
+
+        for row, (
+            existencia_inicial,
+            entradas,
+            salidas,
+            existencia_final,
+            costo_existencia_final,
+        ) in self._iter_existencias_periodo(datos):
+            almacen_id = row["almacen_id"]
             detalle.append(row)
 
             resumen_por_almacen[almacen_id]["existencia_inicial"] += existencia_inicial
@@ -580,7 +689,7 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
 
         resumen_almacenes_payload = []
         for almacen_id, totals in sorted(resumen_por_almacen.items(), key=lambda item: item[0]):
-            almacen = almacen_map.get(almacen_id, {})
+            almacen = datos["almacen_map"].get(almacen_id, {})
             resumen_almacenes_payload.append(
                 {
                     "almacen_id": almacen_id,
@@ -603,7 +712,7 @@ class ExistenciaViewSet(viewsets.ModelViewSet):
         response.data["fecha_inicio"] = str(fecha_inicio)
         response.data["fecha_final"] = str(fecha_final)
         response.data["filtros"] = {
-            "almacen_id": almacen_id,
+            "almacen_id": datos["almacen_id"],
         }
         response.data["resumen"] = {
             "existencia_inicial": str(self._quantize_qty(resumen_total["existencia_inicial"])),
@@ -811,6 +920,15 @@ class OperacionInventarioViewSet(viewsets.ViewSet):
         # Pedido OPCIONAL: validado (y aislado por empresa) antes de tocar la BD.
         pedido = self._get_pedido(request, almacen)
 
+        # Sin empresa y sucursal no hay MovimientoInventario y sin él el kardex
+        # quedaría huérfano (el saldo por pedido no lo vería): se rechaza antes
+        # de tocar existencias.
+        empresa_mov, sucursal_mov = self._resolve_empresa_sucursal(request, almacen)
+        if not empresa_mov or not sucursal_mov:
+            raise ValidationError(
+                {"almacen": "No se pudo determinar la empresa y sucursal del movimiento; envía empresa y sucursal."}
+            )
+
         if tipo in {"ENTRADA", "SALIDA"}:
             for it in items:
                 if it["cantidad"] <= 0:
@@ -851,6 +969,7 @@ class OperacionInventarioViewSet(viewsets.ViewSet):
         results = []
         before_after = []
         detalle_movimientos = []
+        kardex = []
         with transaction.atomic():
             for it in items:
                 ubicacion = None
@@ -926,6 +1045,7 @@ class OperacionInventarioViewSet(viewsets.ViewSet):
                 except Exception:
                     ex.stock = ex.stock or 0
                 ex.save(update_fields=["cantidad", "stock", "fecha_actualizacion"])
+                kardex.append(KardexService.renglon(ex, new_qty - current))
 
                 before_after.append(
                     {
@@ -998,6 +1118,7 @@ class OperacionInventarioViewSet(viewsets.ViewSet):
                 detalle_movimientos=detalle_movimientos,
                 pedido=pedido,
             )
+            KardexService.registrar(kardex, movimiento_formal, tipo)
 
         return Response(
             {
@@ -1103,43 +1224,36 @@ class MovimientoOperacionViewSet(viewsets.ReadOnlyModelViewSet):
         final_dt = timezone.make_aware(datetime.combine(fecha_final, time.max), tz)
         return fecha_inicio, fecha_final, inicio_dt, final_dt
 
-    @action(detail=False, methods=["get"], url_path="reporte-movimientos-periodo")
-    def reporte_movimientos_periodo(self, request):
-        tipo_movimiento = (request.query_params.get("tipo_movimiento") or "").strip().upper()
-        if tipo_movimiento not in {"ENTRADA", "SALIDA", "AJUSTE", "TRANSFERENCIA"}:
-            raise ValidationError(
-                {
-                    "tipo_movimiento": (
-                        "tipo_movimiento es requerido y debe ser ENTRADA, SALIDA, AJUSTE o TRANSFERENCIA."
-                    )
-                }
-            )
-
-        fecha_inicio, fecha_final, inicio_dt, final_dt = self._movement_report_parse_dates(
-            request
-        )
-        allowed_almacen_ids, almacen_id = self._movement_report_allowed_almacen_ids(request)
-
-        if not allowed_almacen_ids:
-            return Response(
-                {
-                    "tipo_movimiento": tipo_movimiento,
-                    "fecha_inicio": str(fecha_inicio),
-                    "fecha_final": str(fecha_final),
-                    "filtros": {"almacen_id": almacen_id},
-                    "resumen": {
-                        "total_movimientos": 0,
-                        "total_registros": 0,
-                        "total_cantidad": "0.0000",
-                    },
-                    "count": 0,
-                    "next": None,
-                    "previous": None,
-                    "results": [],
-                },
-                status=status.HTTP_200_OK,
-            )
-
+    #: Columnas de ``reporte-movimientos-periodo/?exportar=csv|xlsx``.
+    COLUMNAS_MOVIMIENTOS_PERIODO = [
+        ("movimiento_inventario_id", "Movimiento ID"),
+        ("movimiento_detalle_id", "Detalle ID"),
+        ("tipo_movimiento", "Tipo"),
+        ("fecha_movimiento", "Fecha"),
+        ("almacen_codigo", "Almacén"),
+        ("almacen_nombre", "Nombre almacén"),
+        ("ubicacion_nombre", "Ubicación"),
+        ("producto_id", "Producto ID"),
+        ("producto_variante_id", "Variante ID"),
+        ("sku", "SKU"),
+        ("producto_nombre", "Producto"),
+        ("color", "Color"),
+        ("talla", "Talla"),
+        ("cantidad", "Cantidad"),
+        ("costo_unitario", "Costo unitario"),
+        ("costo_total", "Costo total"),
+        ("pedido_folio", "Pedido"),
+        ("transferencia_folio", "Transferencia"),
+        ("recepcion_id", "Recepción ID"),
+        ("ajuste_inventario_id", "Ajuste ID"),
+        ("op_id", "OP ID"),
+        ("usuario_nombre", "Usuario"),
+        ("motivo_ajuste", "Motivo ajuste"),
+        ("comentarios", "Comentarios"),
+    ]
+    NUMERICAS_MOVIMIENTOS_PERIODO = ("cantidad", "costo_unitario", "costo_total")
+
+    def _movimientos_periodo_queryset(self, tipo_movimiento, inicio_dt, final_dt, allowed_almacen_ids):
         detalles_qs = (
             MovimientoInventarioDetalle.objects.select_related(
                 "movimiento_inventario",
@@ -1194,12 +1308,11 @@ class MovimientoOperacionViewSet(viewsets.ReadOnlyModelViewSet):
             detalles_qs = detalles_qs.filter(
                 movimiento_inventario__ajuste_inventario__almacen_id__in=allowed_almacen_ids
             )
+        return detalles_qs
 
-        resultados = []
-        total_cantidad = Decimal("0")
-        movimiento_ids = set()
-
-        for detalle in detalles_qs:
+    def _iter_movimientos_periodo(self, detalles_qs, tipo_movimiento, allowed_almacen_ids):
+        """``(detalle, cantidad, renglón)`` del reporte, leídos por lotes."""
+        for detalle in iterar_por_lotes(detalles_qs, "movimiento_inventario__fecha_movimiento", descendente=True):
             movimiento = detalle.movimiento_inventario
             variante = detalle.producto_variante
             producto = getattr(variante, "producto", None) if variante else detalle.producto
@@ -1242,61 +1355,128 @@ class MovimientoOperacionViewSet(viewsets.ReadOnlyModelViewSet):
             transferencia = getattr(movimiento, "transferencia", None)
             cantidad = self._report_to_decimal(detalle.cantidad)
             costo_unitario = self._report_to_decimal(detalle.costo_unitario)
-            total_cantidad += cantidad
-            movimiento_ids.add(movimiento.pk)
 
-            resultados.append(
+            yield detalle, cantidad, {
+                "movimiento_inventario_id": movimiento.pk,
+                "movimiento_detalle_id": detalle.pk,
+                "tipo_movimiento": movimiento.tipo_movimiento,
+                "fecha_movimiento": movimiento.fecha_movimiento,
+                "almacen_id": getattr(almacen, "pk", None),
+                "almacen_codigo": getattr(almacen, "codigo", None),
+                "almacen_nombre": getattr(almacen, "nombre", None),
+                "ubicacion_id": getattr(ubicacion, "pk", None),
+                "ubicacion_nombre": str(ubicacion) if ubicacion else None,
+                "producto_id": getattr(producto, "pk", None),
+                "producto_variante_id": getattr(variante, "pk", None),
+                "sku": getattr(variante, "sku", None),
+                "producto_nombre": (
+                    getattr(variante, "nombre", None)
+                    or getattr(producto, "nombre", None)
+                ),
+                "producto_base_nombre": getattr(producto, "nombre", None),
+                "color": getattr(getattr(variante, "color", None), "nombre", None)
+                if variante
+                else None,
+                "talla": getattr(getattr(variante, "talla", None), "nombre", None)
+                if variante
+                else None,
+                "cantidad": str(cantidad.quantize(Decimal("0.0001"))),
+                "costo_unitario": str(costo_unitario.quantize(Decimal("0.01"))),
+                "costo_total": str((cantidad * costo_unitario).quantize(Decimal("0.01"))),
+                "pedido_id": getattr(pedido, "pk", None),
+                "pedido_folio": getattr(pedido, "folio", None),
+                "transferencia_id": getattr(transferencia, "pk", None),
+                "transferencia_folio": getattr(transferencia, "folio", None),
+                "recepcion_id": getattr(movimiento, "recepcion_id", None),
+                "ajuste_inventario_id": getattr(movimiento, "ajuste_inventario_id", None),
+                "op_id": getattr(movimiento, "op_id", None),
+                "usuario_id": getattr(usuario, "pk", None),
+                "usuario_nombre": (
+                    usuario.get_full_name().strip() or usuario.email
+                    if usuario
+                    else None
+                ),
+                "observaciones": movimiento.observaciones,
+                "comentarios": (
+                    getattr(getattr(movimiento, "ajuste_inventario", None), "observaciones", None)
+                    or movimiento.observaciones
+                ),
+                "motivo_ajuste": getattr(
+                    getattr(movimiento, "ajuste_inventario", None), "motivo", None
+                ),
+            }
+
+    @action(detail=False, methods=["get"], url_path="reporte-movimientos-periodo")
+    def reporte_movimientos_periodo(self, request):
+        tipo_movimiento = (request.query_params.get("tipo_movimiento") or "").strip().upper()
+        if tipo_movimiento not in {"ENTRADA", "SALIDA", "AJUSTE", "TRANSFERENCIA"}:
+            raise ValidationError(
                 {
-                    "movimiento_inventario_id": movimiento.pk,
-                    "movimiento_detalle_id": detalle.pk,
-                    "tipo_movimiento": movimiento.tipo_movimiento,
-                    "fecha_movimiento": movimiento.fecha_movimiento,
-                    "almacen_id": getattr(almacen, "pk", None),
-                    "almacen_codigo": getattr(almacen, "codigo", None),
-                    "almacen_nombre": getattr(almacen, "nombre", None),
-                    "ubicacion_id": getattr(ubicacion, "pk", None),
-                    "ubicacion_nombre": str(ubicacion) if ubicacion else None,
-                    "producto_id": getattr(producto, "pk", None),
-                    "producto_variante_id": getattr(variante, "pk", None),
-                    "sku": getattr(variante, "sku", None),
-                    "producto_nombre": (
-                        getattr(variante, "nombre", None)
-                        or getattr(producto, "nombre", None)
-                    ),
-                    "producto_base_nombre": getattr(producto, "nombre", None),
-                    "color": getattr(getattr(variante, "color", None), "nombre", None)
-                    if variante
-                    else None,
-                    "talla": getattr(getattr(variante, "talla", None), "nombre", None)
-                    if variante
-                    else None,
-                    "cantidad": str(cantidad.quantize(Decimal("0.0001"))),
-                    "costo_unitario": str(costo_unitario.quantize(Decimal("0.01"))),
-                    "costo_total": str((cantidad * costo_unitario).quantize(Decimal("0.01"))),
-                    "pedido_id": getattr(pedido, "pk", None),
-                    "pedido_folio": getattr(pedido, "folio", None),
-                    "transferencia_id": getattr(transferencia, "pk", None),
-                    "transferencia_folio": getattr(transferencia, "folio", None),
-                    "recepcion_id": getattr(movimiento, "recepcion_id", None),
-                    "ajuste_inventario_id": getattr(movimiento, "ajuste_inventario_id", None),
-                    "op_id": getattr(movimiento, "op_id", None),
-                    "usuario_id": getattr(usuario, "pk", None),
-                    "usuario_nombre": (
-                        usuario.get_full_name().strip() or usuario.email
-                        if usuario
-                        else None
-                    ),
-                    "observaciones": movimiento.observaciones,
-                    "comentarios": (
-                        getattr(getattr(movimiento, "ajuste_inventario", None), "observaciones", None)
-                        or movimiento.observaciones
-                    ),
-                    "motivo_ajuste": getattr(
-                        getattr(movimiento, "ajuste_inventario", None), "motivo", None
-                    ),
+                    "tipo_movimiento": (
+                        "tipo_movimiento es requerido y debe ser ENTRADA, SALIDA, AJUSTE o TRANSFERENCIA."
+                    )
                 }
             )
 
+        formato = ExportacionService.formato(request)
+        fecha_inicio, fecha_final, inicio_dt, final_dt = self._movement_report_parse_dates(
+            request
+        )
+        allowed_almacen_ids, almacen_id = self._movement_report_allowed_almacen_ids(request)
+
+        if formato:
+            filas = ()
+            if allowed_almacen_ids:
+                detalles_qs = self._movimientos_periodo_queryset(
+                    tipo_movimiento, inicio_dt, final_dt, allowed_almacen_ids
+                )
+                filas = (
+                    row
+                    for _, _, row in self._iter_movimientos_periodo(
+                        detalles_qs, tipo_movimiento, allowed_almacen_ids
+                    )
+                )
+            return ExportacionService.respuesta(
+                formato,
+                f"movimientos_{tipo_movimiento.lower()}_{fecha_inicio}_{fecha_final}",
+                self.COLUMNAS_MOVIMIENTOS_PERIODO,
+                filas,
+                numericas=self.NUMERICAS_MOVIMIENTOS_PERIODO,
+            )
+
+        if not allowed_almacen_ids:
+            return Response(
+                {
+                    "tipo_movimiento": tipo_movimiento,
+                    "fecha_inicio": str(fecha_inicio),
+                    "fecha_final": str(fecha_final),
+                    "filtros": {"almacen_id": almacen_id},
+                    "resumen": {
+                        "total_movimientos": 0,
+                        "total_registros": 0,
+                        "total_cantidad": "0.0000",
+                    },
+                    "count": 0,
+                    "next": None,
+                    "previous": None,
+                    "results": [],
+                },
+                status=status.HTTP_200_OK,
+            )
+
+        detalles_qs = self._movimientos_periodo_queryset(
+            tipo_movimiento, inicio_dt, final_dt, allowed_almacen_ids
+        )
+        resultados = []
+        total_cantidad = Decimal("0")
+        movimiento_ids = set()
+        for detalle, cantidad, row in self._iter_movimientos_periodo(
+            detalles_qs, tipo_movimiento, allowed_almacen_ids
+        ):
+            total_cantidad += cantidad
+            movimiento_ids.add(detalle.movimiento_inventario_id)
+            resultados.append(row)
+
         paginator = ReporteMovimientosPeriodoPagination()
         page = paginator.paginate_queryset(resultados, request, view=self)
 
@@ -0,0 +1,178 @@
+import math
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from catalogo.models import Producto, ProductoVariante
+from inventarios.models import Almacen, Existencia, Ubicacion
+from wms.services.existencia_service import ExistenciaService, SaldoExistenciaAlmacen
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    idx = min(len(ordenados) - 1, max(0, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[idx]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el tiempo de los bloqueos de existencia de picking y transferencia "
+        "sobre una tabla grande. Siembra --filas existencias repartidas en "
+        "almacenes y ubicaciones de prueba, toma la clave de stock con el mismo "
+        "select_for_update que SaldoExistenciaAlmacen/get_existencia y reporta "
+        "p50/p95/máx, más el plan de cada consulta. SÓLO para una base desechable: "
+        "escribe y luego borra sus propios almacenes (salvo --conservar). Fuera "
+        "de DEBUG exige --confirmar. Para "
+        "comparar índices correr con 'migrate inventarios 0022' y con 0023."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=100_000, help="Existencias a sembrar.")
+        parser.add_argument("--almacenes", type=int, default=50, help="Almacenes de prueba.")
+        parser.add_argument("--ubicaciones", type=int, default=4, help="Ubicaciones por clave en cada almacén.")
+        parser.add_argument("--repeticiones", type=int, default=200, help="Bloqueos medidos por escenario.")
+        parser.add_argument("--semilla", type=int, default=1, help="Semilla del muestreo de claves.")
+        parser.add_argument("--conservar", action="store_true", help="No borrar los datos sembrados.")
+        parser.add_argument(
+            "--confirmar",
+            action="store_true",
+            help="Confirma que la base es desechable; obligatorio con DEBUG=False.",
+        )
+
+    def _claves(self, total):
+        """Mitad claves con variante y mitad producto-sin-variante: los dos índices."""
+        con_variante = list(
+            ProductoVariante.objects.order_by("pk").values_list("producto_id", "pk")[: total - total // 2]
+        )
+        sin_variante = [
+            (producto_id, None)
+            for producto_id in Producto.objects.order_by("pk").values_list("pk", flat=True)[: total - len(con_variante)]
+        ]
+        return con_variante + sin_variante
+
+    def _sembrar(self, opciones, token):
+        por_almacen = math.ceil(opciones["filas"] / opciones["almacenes"])
+        claves = self._claves(math.ceil(por_almacen / opciones["ubicaciones"]))
+        if not claves:
+            raise CommandError("Se necesitan productos o variantes en el catálogo para sembrar.")
+
+        almacenes = Almacen.objects.bulk_create(
+            [
+                Almacen(codigo=f"BENCH-{token}-{i}", nombre=f"Benchmark {token} {i}")
+                for i in range(opciones["almacenes"])
+            ]
+        )
+        ubicaciones = Ubicacion.objects.bulk_create(
+            [
+                Ubicacion(almacen=almacen, pasillo="BENCH", rack=str(j))
+                for almacen in almacenes
+                for j in range(opciones["ubicaciones"])
+            ]
+        )
+        por_almacen_ubicaciones = {}
+        for ubicacion in ubicaciones:
+            por_almacen_ubicaciones.setdefault(ubicacion.almacen_id, []).append(ubicacion)
+
+        filas = 0
+        lote = []
+        for almacen in almacenes:
+            for ubicacion in por_almacen_ubicaciones[almacen.pk]:
+                for producto_id, variante_id in claves:
+                    lote.append(
+                        Existencia(
+                            almacen=almacen,
+                            ubicacion=ubicacion,
+                            producto_id=producto_id,
+                            producto_variante_id=variante_id,
+                            stock=100,
+                            cantidad=Decimal("100"),
+                        )
+                    )
+                    if len(lote) >= 5000:
+                        Existencia.objects.bulk_create(lote)
+                        filas += len(lote)
+                        lote = []
+        if lote:
+            Existencia.objects.bulk_create(lote)
+            filas += len(lote)
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Existencia._meta.db_table}")
+        return almacenes, claves, filas
+
+    def _medir(self, repeticiones, funcion):
+        tiempos = []
+        for _ in range(repeticiones):
+            with transaction.atomic():
+                inicio = time.perf_counter()
+                funcion()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        return tiempos
+
+    def handle(self, *args, **opciones):
+        if not (settings.DEBUG or opciones["confirmar"]):
+            raise CommandError(
+                f"benchmark_bloqueo_existencias escribe y borra existencias en "
+                f"'{connection.settings_dict['NAME']}'. Con DEBUG=False sólo corre "
+                f"con --confirmar, y sólo contra una base desechable."
+            )
+        if opciones["filas"] <= 0 or opciones["almacenes"] <= 0 or opciones["ubicaciones"] <= 0:
+            raise CommandError("--filas, --almacenes y --ubicaciones deben ser positivos.")
+
+        token = uuid.uuid4().hex[:8]
+        almacenes = []
+        try:
+            inicio = time.perf_counter()
+            almacenes, claves, filas = self._sembrar(opciones, token)
+            self.stdout.write(
+                f"Sembradas {filas} existencias ({len(almacenes)} almacenes, {len(claves)} claves) "
+                f"en {time.perf_counter() - inicio:.1f}s. Total en tabla: {Existencia.objects.count()}."
+            )
+
+            almacen = almacenes[0]
+            azar = random.Random(opciones["semilla"])
+
+            def picking():
+                producto_id, variante_id = azar.choice(claves)
+                SaldoExistenciaAlmacen(almacen, lock=True).filas(producto_id, variante_id)
+
+            def transferencia_destino():
+                producto_id, variante_id = azar.choice(claves)
+                ExistenciaService.get_existencia(almacen, producto_id, variante_id)
+
+            for nombre, funcion in (
+                ("picking (get_existencia_rows lock=True)", picking),
+                ("transferencia destino (get_existencia)", transferencia_destino),
+            ):
+                tiempos = self._medir(opciones["repeticiones"], funcion)
+                self.stdout.write(
+                    f"{nombre}: p50={_percentil(tiempos, 50):.2f}ms "
+                    f"p95={_percentil(tiempos, 95):.2f}ms máx={max(tiempos):.2f}ms"
+                )
+
+            for producto_id, variante_id in (claves[0], claves[-1]):
+                plan = (
+                    Existencia.objects.filter(
+                        almacen_id=almacen.pk,
+                        **ExistenciaService._key_filters(producto_id, variante_id),
+                    )
+                    .order_by("pk")
+                    .explain()
+                )
+                tipo = "con variante" if variante_id else "sin variante"
+                self.stdout.write(f"Plan ({tipo}):\n{plan}")
+        finally:
+            if almacenes and not opciones["conservar"]:
+                ids = [almacen.pk for almacen in almacenes]
+                Existencia.objects.filter(almacen_id__in=ids).delete()
+                Ubicacion.objects.filter(almacen_id__in=ids).delete()
+                Almacen.objects.filter(pk__in=ids).delete()
+                self.stdout.write("Datos de prueba eliminados.")
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventarios.services.corte_existencia_service import CorteExistenciaService
+
+
+class Command(BaseCommand):
+    help = (
+        "Consolida por día los movimientos de existencia auditados en "
+        "existencias_corte_diario. Sin argumentos continúa desde el último día "
+        "consolidado hasta ayer (pensado para correr una vez al día); con "
+        "--desde/--hasta reconstruye ese rango (backfill)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Primer día a reconstruir (YYYY-MM-DD).")
+        parser.add_argument("--hasta", help="Último día a reconstruir (YYYY-MM-DD), como máximo ayer.")
+
+    def _fecha(self, options, nombre):
+        raw = options.get(nombre)
+        if not raw:
+            return None
+        fecha = parse_date(raw)
+        if fecha is None:
+            raise CommandError(f"--{nombre} debe tener formato YYYY-MM-DD.")
+        return fecha
+
+    def handle(self, *args, **options):
+        fecha_desde = self._fecha(options, "desde")
+        fecha_hasta = self._fecha(options, "hasta")
+        try:
+            desde, hasta, dias, filas = CorteExistenciaService.consolidar(
+                fecha_desde=fecha_desde, fecha_hasta=fecha_hasta
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if not dias:
+            self.stdout.write("No hay días pendientes de consolidar.")
+            return
+        self.stdout.write(
+            self.style.SUCCESS(f"Consolidados {dias} día(s) ({desde} a {hasta}): {filas} corte(s).")
+        )
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.7 on 2026-10-17 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0017_historicalcategoriaproducto_historicalproducto_and_more'),
+        ('inventarios', '0019_inventario_reservas_almacen_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorteExistenciaControl',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_desde', models.DateField()),
+                ('fecha_hasta', models.DateField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Control de cortes de existencia',
+                'verbose_name_plural': 'Control de cortes de existencia',
+                'db_table': 'existencias_corte_control',
+            },
+        ),
+        migrations.CreateModel(
+            name='CorteExistenciaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('entradas', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('salidas', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('almacen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cortes_existencia', to='inventarios.almacen')),
+                ('producto', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalogo.producto')),
+                ('producto_variante', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalogo.productovariante')),
+            ],
+            options={
+                'verbose_name': 'Corte diario de existencia',
+                'verbose_name_plural': 'Cortes diarios de existencia',
+                'db_table': 'existencias_corte_diario',
+                'indexes': [models.Index(fields=['almacen', 'fecha'], name='existencias_almacen_3058a4_idx')],
+            },
+        ),
+    ]
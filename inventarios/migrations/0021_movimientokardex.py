@@ -0,0 +1,38 @@
+# Generated by Django 6.0.7 on 2026-10-17 11:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0017_historicalcategoriaproducto_historicalproducto_and_more'),
+        ('inventarios', '0020_corteexistenciacontrol_corteexistenciadiario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoKardex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_movimiento', models.CharField(choices=[('ENTRADA', 'Entrada'), ('SALIDA', 'Salida'), ('AJUSTE', 'Ajuste'), ('TRANSFERENCIA', 'Transferencia')], max_length=50)),
+                ('delta', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('saldo', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('almacen', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='kardex', to='inventarios.almacen')),
+                ('existencia', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='kardex', to='inventarios.existencia')),
+                ('movimiento_inventario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='kardex', to='inventarios.movimientoinventario')),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='kardex', to='catalogo.producto')),
+                ('producto_variante', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='kardex', to='catalogo.productovariante')),
+                ('ubicacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='kardex', to='inventarios.ubicacion')),
+            ],
+            options={
+                'verbose_name': 'Movimiento Kardex',
+                'verbose_name_plural': 'Movimientos Kardex',
+                'db_table': 'movimientos_kardex',
+                'indexes': [models.Index(fields=['almacen', 'fecha'], name='movimientos_almacen_9a08f0_idx'), models.Index(fields=['existencia', 'fecha'], name='movimientos_existen_c8dc54_idx'), models.Index(fields=['producto_variante', 'fecha'], name='movimientos_product_e84b1e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 6.0.7 on 2026-10-17 12:10
+
+from django.db import migrations
+from django.db.models import Count, Max, Min, Sum
+
+
+CLAVE = ("almacen_id", "ubicacion_id", "producto_id", "producto_variante_id")
+
+
+def fusionar_existencias_duplicadas(apps, schema_editor):
+    """Deja una sola fila de ``Existencia`` por (almacén, ubicación, producto, variante).
+
+    Sobrevive la de menor pk —la que ya elegían ``get_existencia`` y el reparto
+    en orden de pk— y absorbe ``cantidad`` y ``stock`` de las demás. Las
+    referencias a las filas sobrantes (reservas, kardex y detalle de conteo
+    cíclico) se reapuntan a la superviviente antes de borrarlas; ninguna se
+    pierde. NULL cuenta como valor igual, igual que en la restricción de 0023.
+    """
+    Existencia = apps.get_model("inventarios", "Existencia")
+    Reserva = apps.get_model("inventarios", "inventario_reservas")
+    MovimientoKardex = apps.get_model("inventarios", "MovimientoKardex")
+    ConteoCiclicoDetalle = apps.get_model("wms", "ConteoCiclicoDetalle")
+
+    grupos = (
+        Existencia.objects.values(*CLAVE)
+        .annotate(n=Count("id"), superviviente_id=Min("id"))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    for grupo in grupos:
+        filtro = {}
+        for campo in CLAVE:
+            if grupo[campo] is None:
+                filtro[f"{campo[:-3]}__isnull"] = True
+            else:
+                filtro[campo] = grupo[campo]
+        filas = Existencia.objects.select_for_update().filter(**filtro)
+        sobrantes = list(
+            filas.exclude(pk=grupo["superviviente_id"]).values_list("pk", flat=True)
+        )
+        if not sobrantes:
+            continue
+        totales = filas.aggregate(
+            cantidad=Sum("cantidad"),
+            stock=Sum("stock"),
+            fecha=Max("fecha_actualizacion"),
+        )
+
+        for modelo in (Reserva, MovimientoKardex, ConteoCiclicoDetalle):
+            modelo.objects.filter(existencia_id__in=sobrantes).update(
+                existencia_id=grupo["superviviente_id"]
+            )
+        # update() y no save(): fecha_actualizacion es auto_now y debe quedar
+        # la del último movimiento real, no la de la migración.
+        Existencia.objects.filter(pk=grupo["superviviente_id"]).update(
+            cantidad=totales["cantidad"],
+            stock=totales["stock"],
+            fecha_actualizacion=totales["fecha"],
+        )
+        Existencia.objects.filter(pk__in=sobrantes).delete()
+
+
+class Migration(migrations.Migration):
+    """Fusiona las existencias duplicadas antes de la restricción única (0023).
+
+    Va en su propia migración: en Postgres las FK son DEFERRABLE y el reapunte
+    deja triggers pendientes en ``existencias``; un ALTER TABLE en la misma
+    transacción fallaría ("pending trigger events"). Irreversible: las filas
+    fusionadas no se pueden volver a separar.
+    """
+
+    dependencies = [
+        ('inventarios', '0021_movimientokardex'),
+        ('wms', '0013_add_rfidscan'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_existencias_duplicadas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.7 on 2026-10-17 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0017_historicalcategoriaproducto_historicalproducto_and_more'),
+        ('inventarios', '0022_fusionar_existencias_duplicadas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='existencia',
+            index=models.Index(fields=['almacen', 'producto_variante'], name='existencias_almacen_8108a6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='existencia',
+            index=models.Index(condition=models.Q(('producto_variante__isnull', True)), fields=['almacen', 'producto'], name='existencia_sin_variante_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='existencia',
+            constraint=models.UniqueConstraint(fields=('almacen', 'ubicacion', 'producto', 'producto_variante'), name='uq_existencia_clave_ubicacion', nulls_distinct=False),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from nucleo.models import Empresa, Sucursal
 from catalogo.models import Producto, ProductoVariante
 from ventas.models import Pedido, Entrega, Devolucion, PedidoDetalle, PedidoDetalleTalla
@@ -162,6 +163,26 @@ class Existencia(models.Model):
         db_table = "existencias"
         verbose_name = "Existencia"
         verbose_name_plural = "Existencia"
+        # Una fila por clave de stock y ubicación. NULLS NOT DISTINCT: sin él
+        # Postgres deja pasar duplicados siempre que ubicación o variante sean
+        # NULL, que es justo el caso de los almacenes sin ubicaciones.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["almacen", "ubicacion", "producto", "producto_variante"],
+                nulls_distinct=False,
+                name="uq_existencia_clave_ubicacion",
+            )
+        ]
+        # Los dos accesos de ExistenciaService._key_filters dentro de un
+        # almacén: por variante, y por producto sin variante (parcial).
+        indexes = [
+            models.Index(fields=["almacen", "producto_variante"]),
+            models.Index(
+                fields=["almacen", "producto"],
+                condition=models.Q(producto_variante__isnull=True),
+                name="existencia_sin_variante_idx",
+            ),
+        ]
 
     def __str__(self):
         producto = self.producto or getattr(self.producto_variante, "producto", None)
@@ -213,6 +234,57 @@ class MovimientoInventarioDetalle(models.Model):
     def __str__(self):
         return str(self.id)
 
+class MovimientoKardex(models.Model):
+    """Kardex: un renglón por cada cambio de cantidad en una fila de ``Existencia``.
+
+    Sólo de inserción. Lo escriben en bloque (``KardexService.registrar``) los
+    mismos caminos que mueven stock, dentro de su transacción: operaciones
+    manuales, transferencias, recepciones, consumo de OP y el descuento/reintegro
+    de pedidos. A diferencia del JSON de ``AuditoriaEvento``, cada renglón es
+    tipado e indexado, así que saldos y totales por clave salen de un ``SUM``
+    agrupado en SQL.
+
+    La clave de stock (almacén, ubicación, producto, variante) se copia de la
+    existencia al momento del movimiento: el renglón sobrevive aunque la fila de
+    ``Existencia`` se borre. El documento origen es el ``MovimientoInventario``
+    formal, que ya enlaza pedido, transferencia, recepción, OP o ajuste.
+    """
+
+    existencia = models.ForeignKey(Existencia, on_delete=models.SET_NULL, related_name="kardex", null=True, blank=True)
+    almacen = models.ForeignKey(Almacen, on_delete=models.PROTECT, related_name="kardex")
+    ubicacion = models.ForeignKey(Ubicacion, on_delete=models.PROTECT, related_name="kardex", null=True, blank=True)
+    producto = models.ForeignKey(Producto, on_delete=models.PROTECT, related_name="kardex", null=True, blank=True)
+    producto_variante = models.ForeignKey(ProductoVariante, on_delete=models.PROTECT, related_name="kardex", null=True, blank=True)
+    movimiento_inventario = models.ForeignKey(
+        MovimientoInventario, on_delete=models.SET_NULL, related_name="kardex", null=True, blank=True
+    )
+
+    tipo_movimiento = models.CharField(max_length=50, choices=TipoMovimiento.choices)
+    delta = models.DecimalField(max_digits=18, decimal_places=4)
+    saldo = models.DecimalField(max_digits=18, decimal_places=4)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "movimientos_kardex"
+        verbose_name = "Movimiento Kardex"
+        verbose_name_plural = "Movimientos Kardex"
+        indexes = [
+            models.Index(fields=["almacen", "fecha"]),
+            models.Index(fields=["existencia", "fecha"]),
+            models.Index(fields=["producto_variante", "fecha"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("El kardex es de sólo inserción.")
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("El kardex es de sólo inserción.")
+
+    def __str__(self):
+        return str(self.id)
+
 class inventario_reservas(models.Model):
     class Estado(models.TextChoices):
         ACTIVA = "ACTIVA", "Activa"
@@ -246,3 +318,61 @@ class inventario_reservas(models.Model):
     def __str__(self):
         return str(self.id)
    
+
+class CorteExistenciaDiario(models.Model):
+    """Entradas y salidas consolidadas de un día por clave de stock.
+
+    Una fila por ``(fecha, almacen, producto, producto_variante)`` con lo que
+    los eventos de auditoría ``tabla="existencias"`` de ese día movieron en la
+    clave. La escribe ``CorteExistenciaService.consolidar`` (comando
+    ``consolidar_cortes_existencia``); el reporte de existencias por periodo
+    suma estos cortes con un solo ``GROUP BY`` en lugar de decodificar el JSON
+    de cada evento desde el inicio del periodo hasta hoy.
+
+    ``producto``/``producto_variante`` vienen de los ids grabados en el JSON de
+    auditoría, que nunca tuvo integridad referencial: se declaran sin
+    constraint en BD para que un id huérfano no tumbe la consolidación.
+    """
+
+    fecha = models.DateField()
+    almacen = models.ForeignKey(Almacen, on_delete=models.CASCADE, related_name="cortes_existencia")
+    producto = models.ForeignKey(
+        Producto, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+", null=True, blank=True
+    )
+    producto_variante = models.ForeignKey(
+        ProductoVariante, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+", null=True, blank=True
+    )
+    entradas = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    salidas = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+
+    class Meta:
+        db_table = "existencias_corte_diario"
+        verbose_name = "Corte diario de existencia"
+        verbose_name_plural = "Cortes diarios de existencia"
+        indexes = [
+            models.Index(fields=["almacen", "fecha"]),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.almacen_id}/{self.producto_id}/{self.producto_variante_id}"
+
+class CorteExistenciaControl(models.Model):
+    """Rango de días ya consolidado en ``CorteExistenciaDiario``.
+
+    Fila única. ``fecha_desde``..``fecha_hasta`` es un rango contiguo y cerrado:
+    todo día dentro tiene sus cortes completos (un día sin movimientos
+    simplemente no tiene filas). Lo que quede fuera se reconstruye desde
+    ``AuditoriaEvento``.
+    """
+
+    fecha_desde = models.DateField()
+    fecha_hasta = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "existencias_corte_control"
+        verbose_name = "Control de cortes de existencia"
+        verbose_name_plural = "Control de cortes de existencia"
+
+    def __str__(self):
+        return f"{self.fecha_desde} - {self.fecha_hasta}"
@@ -0,0 +1,240 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from auditoria.models import AuditoriaEvento
+from inventarios.models import CorteExistenciaControl, CorteExistenciaDiario
+from nucleo.lotes import iterar_por_lotes
+
+
+def _to_int(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except Exception:
+        return None
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value or 0))
+    except Exception:
+        return Decimal("0")
+
+
+class CorteExistenciaService:
+    """Consolidación diaria de los movimientos de existencia auditados.
+
+    Los deltas de inventario sólo viven en el JSON de ``AuditoriaEvento``
+    (``modulo="inventarios"``, ``tabla="existencias"``). El reporte de
+    existencias por periodo necesita, por clave ``(almacen, producto,
+    variante)``, las entradas/salidas del periodo y el delta posterior al cierre
+    —que llega hasta *hoy*—, así que reconstruirlo desde los eventos cuesta más
+    cada día que pasa.
+
+    ``consolidar`` decodifica cada evento una sola vez y guarda por día el
+    acumulado de la clave en ``CorteExistenciaDiario``. El reporte suma los
+    cortes del rango cubierto (``cobertura``) y sólo re-lee eventos de los
+    días que todavía no se consolidan, normalmente el de hoy.
+
+    Los días se cortan en la zona horaria del proyecto, la misma con la que el
+    reporte convierte ``fecha_inicio``/``fecha_final`` a rangos de datetime.
+    """
+
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def _eventos():
+        return AuditoriaEvento.objects.filter(modulo="inventarios", tabla="existencias")
+
+    @staticmethod
+    def inicio_del_dia(fecha):
+        tz = timezone.get_current_timezone()
+        return timezone.make_aware(datetime.combine(fecha, time.min), tz)
+
+    @staticmethod
+    def fin_del_dia(fecha):
+        tz = timezone.get_current_timezone()
+        return timezone.make_aware(datetime.combine(fecha, time.max), tz)
+
+    @staticmethod
+    def items_de_evento(evento):
+        """Renglones ``{almacen_id, producto_id, producto_variante_id, delta}``.
+
+        La mayoría de los escritores de auditoría (inventarios manual, compras)
+        guardan ``almacen_id`` sólo a nivel evento y no por renglón; se usa como
+        respaldo para que esos movimientos no se pierdan. Los renglones sin
+        almacén resoluble se descartan.
+        """
+        payload = evento.despues_json or evento.antes_json or {}
+        evento_almacen_id = _to_int(payload.get("almacen_id"))
+        for item in payload.get("items", []) or []:
+            almacen_id = _to_int(item.get("almacen_id")) or evento_almacen_id
+            if not almacen_id:
+                continue
+            yield {
+                "almacen_id": almacen_id,
+                "producto_id": _to_int(item.get("producto_id")),
+                "producto_variante_id": _to_int(item.get("producto_variante_id")),
+                "delta": _to_decimal(item.get("delta")),
+            }
+
+    @classmethod
+    def iter_items(cls, eventos, allowed_almacen_ids, producto_id=None, producto_variante_id=None):
+        """``items_de_evento`` de un queryset de eventos, filtrado por almacén y clave."""
+        for evento in iterar_por_lotes(eventos, lote=cls.BATCH_SIZE):
+            for item in cls.items_de_evento(evento):
+                if item["almacen_id"] not in allowed_almacen_ids:
+                    continue
+                if producto_variante_id and item["producto_variante_id"] != producto_variante_id:
+                    continue
+                if producto_id and item["producto_id"] != producto_id:
+                    continue
+                yield item
+
+    @staticmethod
+    def cobertura():
+        """``(fecha_desde, fecha_hasta)`` consolidado, o ``None`` si no hay cortes."""
+        control = CorteExistenciaControl.objects.order_by("pk").first()
+        if control is None:
+            return None
+        return control.fecha_desde, control.fecha_hasta
+
+    @staticmethod
+    def sumar(almacen_ids, fecha_desde, fecha_hasta, producto_id=None, producto_variante_id=None):
+        """Entradas y salidas por clave entre dos fechas (inclusive), en una consulta.
+
+        Devuelve ``{(almacen_id, producto_id, producto_variante_id): (entradas, salidas)}``.
+        """
+        if fecha_desde > fecha_hasta or not almacen_ids:
+            return {}
+        qs = CorteExistenciaDiario.objects.filter(
+            almacen_id__in=almacen_ids,
+            fecha__gte=fecha_desde,
+            fecha__lte=fecha_hasta,
+        )
+        if producto_variante_id:
+            qs = qs.filter(producto_variante_id=producto_variante_id)
+        if producto_id:
+            qs = qs.filter(producto_id=producto_id)
+        rows = qs.values("almacen_id", "producto_id", "producto_variante_id").annotate(
+            total_entradas=Sum("entradas"),
+            total_salidas=Sum("salidas"),
+        )
+        return {
+            (row["almacen_id"], row["producto_id"], row["producto_variante_id"]): (
+                _to_decimal(row["total_entradas"]),
+                _to_decimal(row["total_salidas"]),
+            )
+            for row in rows
+        }
+
+    @classmethod
+    def _rango_por_defecto(cls, control):
+        ayer = timezone.localdate() - timedelta(days=1)
+        if control is not None:
+            return control.fecha_hasta + timedelta(days=1), ayer
+        primero = cls._eventos().order_by("created_at").values_list("created_at", flat=True).first()
+        if primero is None:
+            return None, ayer
+        return timezone.localtime(primero).date(), ayer
+
+    @classmethod
+    def consolidar(cls, fecha_desde=None, fecha_hasta=None):
+        """Reconstruye los cortes de ``fecha_desde``..``fecha_hasta`` (inclusive).
+
+        Sin fechas continúa donde se quedó la última corrida hasta ayer; hoy nunca
+        se consolida porque sigue recibiendo eventos. Con fechas explícitas borra
+        y recalcula el rango, que debe tocar o solapar lo ya cubierto para que
+        ``CorteExistenciaControl`` siga describiendo un rango sin huecos.
+
+        Devuelve ``(fecha_desde, fecha_hasta, dias, filas)``; ``dias`` es 0 si no
+        había nada pendiente.
+        """
+        with transaction.atomic():
+            control = CorteExistenciaControl.objects.select_for_update().order_by("pk").first()
+            desde_defecto, hasta_defecto = cls._rango_por_defecto(control)
+            fecha_desde = fecha_desde or desde_defecto
+            fecha_hasta = fecha_hasta or hasta_defecto
+            if fecha_desde is None or fecha_desde > fecha_hasta:
+                return fecha_desde, fecha_hasta, 0, 0
+            if fecha_hasta >= timezone.localdate():
+                raise ValueError("Sólo se pueden consolidar días ya cerrados (anteriores a hoy).")
+            if control is not None and (
+                fecha_desde > control.fecha_hasta + timedelta(days=1)
+                or fecha_hasta < control.fecha_desde - timedelta(days=1)
+            ):
+                raise ValueError(
+                    f"El rango {fecha_desde}..{fecha_hasta} deja un hueco con lo ya consolidado "
+                    f"({control.fecha_desde}..{control.fecha_hasta})."
+                )
+
+            CorteExistenciaDiario.objects.filter(
+                fecha__gte=fecha_desde, fecha__lte=fecha_hasta
+            ).delete()
+
+            eventos = (
+                cls._eventos()
+                .filter(
+                    created_at__gte=cls.inicio_del_dia(fecha_desde),
+                    created_at__lte=cls.fin_del_dia(fecha_hasta),
+                )
+                .only("id_evento", "created_at", "antes_json", "despues_json")
+                .order_by("created_at", "id_evento")
+            )
+
+            filas = 0
+            pendientes = []
+            dia_actual = None
+            acumulado = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+
+            def volcar():
+                for (almacen_id, producto_id, variante_id), (entradas, salidas) in acumulado.items():
+                    pendientes.append(
+                        CorteExistenciaDiario(
+                            fecha=dia_actual,
+                            almacen_id=almacen_id,
+                            producto_id=producto_id,
+                            producto_variante_id=variante_id,
+                            entradas=entradas,
+                            salidas=salidas,
+                        )
+                    )
+                acumulado.clear()
+
+            # Los eventos vienen ordenados por fecha: cada día se acumula en
+            # memoria y se vuelca al cambiar de día, así que la memoria es la de
+            # un día de claves y no la del rango completo.
+            for evento in iterar_por_lotes(eventos, "created_at", lote=cls.BATCH_SIZE):
+                dia = timezone.localtime(evento.created_at).date()
+                if dia != dia_actual:
+                    volcar()
+                    dia_actual = dia
+                for item in cls.items_de_evento(evento):
+                    key = (item["almacen_id"], item["producto_id"], item["producto_variante_id"])
+                    if item["delta"] >= 0:
+                        acumulado[key][0] += item["delta"]
+                    else:
+                        acumulado[key][1] += abs(item["delta"])
+                if len(pendientes) >= cls.BATCH_SIZE:
+                    CorteExistenciaDiario.objects.bulk_create(pendientes, batch_size=cls.BATCH_SIZE)
+                    filas += len(pendientes)
+                    pendientes.clear()
+            volcar()
+            if pendientes:
+                CorteExistenciaDiario.objects.bulk_create(pendientes, batch_size=cls.BATCH_SIZE)
+                filas += len(pendientes)
+
+            if control is None:
+                CorteExistenciaControl.objects.create(fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+            else:
+                control.fecha_desde = min(control.fecha_desde, fecha_desde)
+                control.fecha_hasta = max(control.fecha_hasta, fecha_hasta)
+                control.save(update_fields=["fecha_desde", "fecha_hasta", "updated_at"])
+
+        return fecha_desde, fecha_hasta, (fecha_hasta - fecha_desde).days + 1, filas
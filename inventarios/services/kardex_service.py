@@ -0,0 +1,120 @@
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from inventarios.models import MovimientoKardex
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value or 0))
+    except Exception:
+        return Decimal("0")
+
+
+class KardexService:
+    """Escritura en bloque y consultas agregadas sobre ``MovimientoKardex``.
+
+    Los caminos que mueven stock arman un renglón por fila de ``Existencia``
+    tocada (``renglon`` si tienen la instancia a mano, ``renglon_de_item`` si
+    ya la resumieron en el dict que también va a auditoría) y los persisten con
+    un solo ``registrar`` al final, colgados del ``MovimientoInventario``
+    formal del mismo documento.
+    """
+
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def renglon(existencia, delta):
+        """Renglón para ``existencia`` ya actualizada; ``saldo`` es su cantidad actual."""
+        return MovimientoKardex(
+            existencia_id=existencia.pk,
+            almacen_id=existencia.almacen_id,
+            ubicacion_id=existencia.ubicacion_id,
+            producto_id=existencia.producto_id,
+            producto_variante_id=existencia.producto_variante_id,
+            delta=_to_decimal(delta),
+            saldo=_to_decimal(existencia.cantidad),
+        )
+
+    @staticmethod
+    def renglon_de_item(item):
+        """Renglón desde el dict de consumo/entrada que arman ventas, compras y OP.
+
+        Espera ``existencia_id``, ``almacen_id``, ``ubicacion_id``,
+        ``producto_id``, ``producto_variante_id``, ``delta`` y ``cantidad_after``.
+        """
+        return MovimientoKardex(
+            existencia_id=item.get("existencia_id"),
+            almacen_id=item["almacen_id"],
+            ubicacion_id=item.get("ubicacion_id"),
+            producto_id=item.get("producto_id"),
+            producto_variante_id=item.get("producto_variante_id"),
+            delta=_to_decimal(item.get("delta")),
+            saldo=_to_decimal(item.get("cantidad_after")),
+        )
+
+    @classmethod
+    def registrar(cls, renglones, movimiento_inventario, tipo_movimiento):
+        """Inserta los renglones con un ``bulk_create``; omite los de delta cero.
+
+        ``movimiento_inventario`` (instancia o pk) es obligatorio: es lo que liga
+        el renglón con su documento, y un renglón huérfano no lo ve
+        ``saldo_por_ubicacion_pedido`` ni ningún otro saldo por documento.
+        """
+        movimiento_id = getattr(movimiento_inventario, "pk", movimiento_inventario)
+        if movimiento_id is None:
+            raise ValueError("El kardex exige el MovimientoInventario del documento.")
+        fecha = timezone.now()
+        renglones = [renglon for renglon in renglones if renglon.delta]
+        for renglon in renglones:
+            renglon.movimiento_inventario_id = movimiento_id
+            renglon.tipo_movimiento = tipo_movimiento
+            renglon.fecha = fecha
+        if renglones:
+            MovimientoKardex.objects.bulk_create(renglones, batch_size=cls.BATCH_SIZE)
+        return renglones
+
+    @staticmethod
+    def inicio():
+        """Fecha del primer renglón del kardex, o ``None`` si está vacío.
+
+        Todo movimiento de stock posterior a esta fecha está en el kardex; lo
+        anterior sólo existe en el JSON de auditoría.
+        """
+        return (
+            MovimientoKardex.objects.order_by("pk").values_list("fecha", flat=True).first()
+        )
+
+    @staticmethod
+    def saldo_por_ubicacion_pedido(pedido, claves):
+        """Neto movido por el pedido en cada clave, agrupado por ``(almacen, ubicacion)``.
+
+        Un solo ``GROUP BY`` para todas las claves ``(producto_id,
+        producto_variante_id)`` sobre los renglones cuyos movimientos formales
+        apuntan al pedido. Devuelve ``{clave: {(almacen_id, ubicacion_id):
+        delta_neto}}``; una clave sin movimientos trae ``{}``.
+        """
+        resultado = {clave: {} for clave in claves}
+        variantes = {variante_id for _, variante_id in resultado if variante_id is not None}
+        sin_variante = {producto_id for producto_id, variante_id in resultado if variante_id is None}
+        condicion = Q()
+        if variantes:
+            condicion |= Q(producto_variante_id__in=variantes)
+        if sin_variante:
+            condicion |= Q(producto_id__in=sin_variante, producto_variante__isnull=True)
+        if not condicion:
+            return resultado
+
+        rows = (
+            MovimientoKardex.objects.filter(movimiento_inventario__pedido=pedido)
+            .filter(condicion)
+            .values("producto_id", "producto_variante_id", "almacen_id", "ubicacion_id")
+            .annotate(total=Sum("delta"))
+        )
+        for row in rows:
+            balance = resultado.get((row["producto_id"], row["producto_variante_id"]))
+            if balance is not None:
+                balance[(row["almacen_id"], row["ubicacion_id"])] = _to_decimal(row["total"])
+        return resultado
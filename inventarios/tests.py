@@ -0,0 +1,118 @@
+"""Tests de la exportación del reporte de existencias por periodo.
+
+``reporte-existencias-periodo/?exportar=csv|xlsx`` responde con
+``ExportacionService``: el cuerpo se lee iterando ``streaming_content`` y
+debe traer un renglón por clave de stock de los almacenes visibles para el
+usuario, con separadores y fórmulas escapados.
+
+Ejecutar SIEMPRE con una BD desechable; el ``.env`` del repo apunta a Supabase
+de producción. Ejemplo con un settings de override a SQLite en memoria:
+
+    python manage.py test inventarios --settings=sqlite_settings
+"""
+
+import csv
+from decimal import Decimal
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from catalogo.models import Producto
+from inventarios.models import Almacen, Existencia
+from nucleo.models import Empresa, Sucursal
+from usuarios.models import Usuario
+
+
+class ReporteExistenciasExportacionTests(TestCase):
+    URL = "/api/v1/inventarios/existencias/reporte-existencias-periodo/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="exp", razon_social="Exportaciones SA")
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, codigo="MTY", nombre="MTY")
+        cls.usuario = Usuario.objects.create(username="reportes", email="reportes@exp.test", empresa=cls.empresa)
+        cls.usuario.sucursales.add(cls.sucursal)
+
+        almacen = Almacen.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, codigo="A,1", nombre='Bodega "Norte"'
+        )
+        cls.productos = [
+            Producto.objects.create(empresa=cls.empresa, nombre=nombre)
+            for nombre in ("Tela; cruda, 1.5m", '=HYPERLINK("http://x","clic")', "-Hilo")
+        ]
+        for producto, cantidad in zip(cls.productos, ("12.5", "3", "-2")):
+            Existencia.objects.create(
+                producto=producto, almacen=almacen, cantidad=Decimal(cantidad), stock=int(Decimal(cantidad))
+            )
+
+        # Otra empresa: no debe salir en el archivo.
+        otra = Empresa.objects.create(codigo="exp2", razon_social="Otra SA")
+        ajeno = Almacen.objects.create(
+            empresa=otra, sucursal=Sucursal.objects.create(empresa=otra, codigo="GDL", nombre="GDL"), codigo="B1"
+        )
+        Existencia.objects.create(
+            producto=Producto.objects.create(empresa=otra, nombre="Ajeno"), almacen=ajeno, cantidad=1, stock=1
+        )
+
+    def _exportar(self, formato):
+        client = APIClient()
+        client.force_authenticate(user=self.usuario)
+        hoy = timezone.localdate()
+        return client.get(self.URL, {"fecha_inicio": hoy, "fecha_final": hoy, "exportar": formato})
+
+    def test_csv(self):
+        response = self._exportar("csv")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        hoy = timezone.localdate()
+        self.assertEqual(
+            response["Content-Disposition"], f'attachment; filename="existencias_{hoy}_{hoy}.csv"'
+        )
+
+        cuerpo = b"".join(response.streaming_content).decode("utf-8")
+        self.assertTrue(cuerpo.startswith("\ufeff"))
+        encabezado, *renglones = csv.reader(StringIO(cuerpo[1:]))
+
+        self.assertEqual(encabezado[:3], ["Almacén ID", "Almacén", "Nombre almacén"])
+        self.assertEqual(len(renglones), len(self.productos))
+        por_producto = {r[encabezado.index("Producto")]: r for r in renglones}
+        self.assertEqual(
+            set(por_producto),
+            {"Tela; cruda, 1.5m", '\'=HYPERLINK("http://x","clic")', "'-Hilo"},
+        )
+        tela = por_producto["Tela; cruda, 1.5m"]
+        self.assertEqual(tela[1:3], ["A,1", 'Bodega "Norte"'])
+        self.assertEqual(tela[encabezado.index("Existencia final")], "12.5000")
+        # Una cantidad negativa no se confunde con fórmula.
+        self.assertEqual(por_producto["'-Hilo"][encabezado.index("Existencia final")], "-2.0000")
+
+    @skipUnless(find_spec("openpyxl"), "Requiere openpyxl.")
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self._exportar("xlsx")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["Content-Type"], "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        hoja = load_workbook(BytesIO(b"".join(response.streaming_content))).active
+        encabezado, *renglones = hoja.iter_rows(values_only=True)
+
+        self.assertEqual(len(renglones), len(self.productos))
+        producto = encabezado.index("Producto")
+        final = encabezado.index("Existencia final")
+        por_producto = {r[producto]: r[final] for r in renglones}
+        self.assertEqual(
+            por_producto,
+            {"Tela; cruda, 1.5m": 12.5, '\'=HYPERLINK("http://x","clic")': 3, "'-Hilo": -2},
+        )
+
+    def test_formato_no_soportado(self):
+        self.assertEqual(self._exportar("pdf").status_code, 400)
@@ -68,8 +68,8 @@ class DepartamentoAdmin(admin.ModelAdmin):
 
 @admin.register(SerieFolio)
 class SerieFolioAdmin(admin.ModelAdmin):
-    list_display = ("tipo_documento", "serie", "folio_actual", "empresa", "sucursal", "activo")
-    list_filter = ("empresa", "sucursal", "tipo_documento", "activo", "incluir_anio", "reiniciar_anual")
+    list_display = ("tipo_documento", "serie", "folio_actual", "modo_asignacion", "empresa", "sucursal", "activo")
+    list_filter = ("empresa", "sucursal", "tipo_documento", "activo", "incluir_anio", "reiniciar_anual", "modo_asignacion")
     search_fields = ("serie", "tipo_documento", "empresa__codigo", "empresa__razon_social", "sucursal__codigo", "sucursal__nombre")
     ordering = ("empresa", "tipo_documento", "serie", "id_serie_folio")
     autocomplete_fields = ("empresa", "sucursal")
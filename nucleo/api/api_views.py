@@ -6,7 +6,7 @@ from django.shortcuts import get_object_or_404
 from django.db import models
 from ..choices import StatusChoices
 from ..models import (
-    Empresa, Sucursal, Departamento, Moneda, SerieFolio,
+    Empresa, Sucursal, Departamento, Moneda, SerieFolio, ModoAsignacionFolio,
     SatRegimenFiscal, SatUsoCfdi, SatMetodoPago, SatFormaPago, 
     SatClaveProdServ, SatClaveUnidad,
     EmpresaSatConfig,
@@ -21,6 +21,8 @@ from .serializers import (
     EmpresaSerializer, SucursalSerializer, DepartamentoSerializer, MonedaSerializer, SerieFolioSerializer
 )
 from seguridad.api.api_views import IsSuperUserOrReadOnly
+from .cache import AMBITO_GLOBAL, CatalogoCacheMixin, respuesta_cacheada
+from ..services.sat_catalogo_service import SatCatalogoService
 
 # --- VIEWSETS (Movidios desde views.py para limpiar arquitectura) ---
 
@@ -31,6 +33,7 @@ class EmpresaViewSet(viewsets.ModelViewSet):
     """
     queryset = Empresa.objects.all().order_by('-created_at')
     serializer_class = EmpresaSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
     lookup_field = 'codigo'
     permission_classes = [IsSuperUserOrReadOnly]
 
@@ -57,6 +60,7 @@ class SucursalViewSet(viewsets.ModelViewSet):
     """
     queryset = Sucursal.objects.all()
     serializer_class = SucursalSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
     lookup_field = 'codigo'
     permission_classes = [permissions.IsAuthenticated]
 
@@ -85,6 +89,7 @@ class DepartamentoViewSet(viewsets.ModelViewSet):
     """
     queryset = Departamento.objects.all()
     serializer_class = DepartamentoSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
     lookup_field = 'codigo'
     permission_classes = [IsSuperUserOrReadOnly]
 
@@ -99,13 +104,17 @@ class DepartamentoViewSet(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         instance.soft_delete()
 
-class MonedaViewSet(viewsets.ModelViewSet):
+class MonedaViewSet(CatalogoCacheMixin, viewsets.ModelViewSet):
     """
     API endpoint para ver y editar monedas.
     Admite monedas Globales (System) y Privadas (Empresa).
+    El listado se sirve desde caché por empresa (ver nucleo/api/cache.py).
     """
+    catalogo_cache = 'monedas'
+    catalogo_por_empresa = True
     queryset = Moneda.objects.all()
     serializer_class = MonedaSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
     lookup_field = 'codigo_iso'
     permission_classes = [permissions.IsAuthenticated]
 
@@ -146,6 +155,7 @@ class SerieFolioViewSet(viewsets.ModelViewSet):
     """
     queryset = SerieFolio.objects.all()
     serializer_class = SerieFolioSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -168,15 +178,29 @@ class SerieFolioViewSet(viewsets.ModelViewSet):
              serializer.save(empresa=user.empresa)
         else:
              serializer.save()
+
+    def perform_update(self, serializer):
+        # Al regresar de SECUENCIA a FILA, folio_actual debe alcanzar primero a
+        # la secuencia; si no, el modo FILA repetiría folios ya entregados.
+        instance = serializer.instance
+        if (
+            instance.usa_secuencia
+            and serializer.validated_data.get("modo_asignacion") == ModoAsignacionFolio.FILA
+        ):
+            instance.sincronizar_desde_secuencia()
+        serializer.save()
     
     def perform_destroy(self, instance):
         instance.soft_delete()
 
-class SatClaveProdServViewSet(viewsets.ReadOnlyModelViewSet):
+class SatClaveProdServViewSet(CatalogoCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para buscar Claves de Producto/Servicio SAT.
-    Soporta búsqueda por 'q' (código o descripción).
+    Con 'q' (código o descripción, sin importar acentos) devuelve las 'limit'
+    mejores coincidencias (20 por omisión, máximo 100) sin paginar; sin 'q',
+    el listado paginado de siempre.
     """
+    catalogo_cache = 'sat_prodserv'
     queryset = SatClaveProdServ.objects.filter(activo=True)
     serializer_class = SatClaveProdServSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -184,15 +208,21 @@ class SatClaveProdServViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         qs = super().get_queryset()
         q = self.request.query_params.get('q', None)
-        if q:
-            qs = qs.filter(models.Q(codigo__icontains=q) | models.Q(descripcion__icontains=q))
+        if q and self.action == 'list':
+            # Recortado: CursorPaginacion lo devuelve como lista, ya ordenado.
+            # Sólo en list: retrieve filtra por pk y no admite el recorte.
+            limite = SatCatalogoService.limite(self.request.query_params.get('limit'))
+            qs = SatCatalogoService.buscar(qs, q, limite)
         return qs
 
-class SatClaveUnidadViewSet(viewsets.ReadOnlyModelViewSet):
+class SatClaveUnidadViewSet(CatalogoCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para buscar Claves de Unidad SAT.
-    Soporta búsqueda por 'q' (código o descripción).
+    Con 'q' (código o descripción, sin importar acentos) devuelve las 'limit'
+    mejores coincidencias (20 por omisión, máximo 100) sin paginar; sin 'q',
+    el listado paginado de siempre.
     """
+    catalogo_cache = 'sat_clave_unidad'
     queryset = SatClaveUnidad.objects.filter(activo=True)
     serializer_class = SatClaveUnidadSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -200,16 +230,20 @@ class SatClaveUnidadViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         qs = super().get_queryset()
         q = self.request.query_params.get('q', None)
-        if q:
-            qs = qs.filter(models.Q(codigo__icontains=q) | models.Q(descripcion__icontains=q))
+        if q and self.action == 'list':
+            # Recortado: CursorPaginacion lo devuelve como lista, ya ordenado.
+            limite = SatCatalogoService.limite(self.request.query_params.get('limit'))
+            qs = SatCatalogoService.buscar(qs, q, limite)
         return qs
 
-class UnidadMedidaViewSet(viewsets.ReadOnlyModelViewSet):
+class UnidadMedidaViewSet(CatalogoCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para Unidades de Medida (Sistema CORE).
     """
+    catalogo_cache = 'unidades_medida'
     queryset = UnidadMedida.objects.filter(activo=True)
     serializer_class = UnidadMedidaSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
     permission_classes = [permissions.IsAuthenticated]
 
 class ImpuestoViewSet(viewsets.ReadOnlyModelViewSet):
@@ -218,6 +252,7 @@ class ImpuestoViewSet(viewsets.ReadOnlyModelViewSet):
     """
     queryset = Impuesto.objects.filter(activo=True)
     serializer_class = ImpuestoSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
     permission_classes = [permissions.IsAuthenticated]
 
 # --- API VIEWS CUSTOM ---
@@ -255,11 +290,19 @@ class EmpresaSatConfigUpdateView(APIView):
 
 class SatCatalogosAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    catalogos_cache = ('sat_regimen_fiscal', 'sat_uso_cfdi', 'sat_metodo_pago', 'sat_forma_pago')
 
     def get(self, request):
         """
         Retorna todos los catálogos del SAT para uso en frontend (cacheable).
+        Se sirve desde caché con ETag; cualquier cambio en uno de los cuatro
+        catálogos la invalida.
         """
+        return respuesta_cacheada(
+            request, self.catalogos_cache, [AMBITO_GLOBAL], self._catalogos
+        )
+
+    def _catalogos(self):
         # Regímenes Fiscales
         regimenes = SatRegimenFiscal.objects.filter(activo=True)
         usos = SatUsoCfdi.objects.filter(activo=True)
@@ -0,0 +1,204 @@
+"""Caché de respuestas para catálogos de sólo lectura (SAT, monedas, tallas...).
+
+Estos catálogos casi no cambian y cada pantalla los vuelve a pedir. La
+respuesta serializada se guarda en el caché de Django con una llave que
+incluye la *versión* del catálogo:
+
+- La versión es un token por ``(catálogo, ámbito)``. El ámbito es
+  ``"global"`` para renglones sin empresa, el id de la empresa para los
+  privados (``Moneda.empresa``) y ``"todas"`` para la vista del superusuario
+  sin filtro.
+- Los tokens viven en la BD (``VersionCatalogo``) y se leen con una consulta
+  por request. Con ``LocMemCache`` cada worker tiene su propio caché de
+  respuestas, pero todos leen el mismo token: una escritura en un worker deja
+  sin efecto las respuestas guardadas en los demás desde su siguiente request.
+- ``post_save``/``post_delete`` del modelo cambian el token al confirmar la
+  transacción (``on_commit``), tanto del ámbito nuevo como del anterior si el
+  renglón cambió de empresa. Las llaves viejas dejan de alcanzarse y expiran
+  solas; no se borra nada ni se recorre el caché.
+
+Cada respuesta lleva un ``ETag`` (hash del contenido) y ``Cache-Control:
+private, no-cache``: el navegador revalida con ``If-None-Match`` y recibe
+``304`` sin cuerpo mientras la versión no cambie. Las rutas se exentan de
+``NoCacheMiddleware`` en ``NO_CACHE_RUTAS_EXENTAS``.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+from nucleo.models import VersionCatalogo
+
+AMBITO_GLOBAL = "global"
+AMBITO_TODAS = "todas"
+
+_PREFIJO = "catalogo"
+
+
+def _cache():
+    return caches[getattr(settings, "CATALOGO_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "CATALOGO_CACHE_SEGUNDOS", 300)
+
+
+def _nuevo_token():
+    return format(time.time_ns(), "x")
+
+
+def versiones(catalogos, ambitos):
+    """Token vigente de cada ``(catálogo, ámbito)``, en una sola consulta.
+
+    Un ámbito que nunca se ha invalidado no tiene renglón y vale ``"0"``.
+    """
+    catalogos = [str(c) for c in catalogos]
+    ambitos = [str(a) for a in ambitos]
+    vigentes = {
+        (catalogo, ambito): token
+        for catalogo, ambito, token in VersionCatalogo.objects.filter(
+            catalogo__in=catalogos, ambito__in=ambitos
+        ).values_list("catalogo", "ambito", "token")
+    }
+    return [vigentes.get((c, a), "0") for c in catalogos for a in ambitos]
+
+
+def invalidar_catalogo(catalogo, *empresa_ids):
+    """Cambia la versión de los ámbitos afectados y la de ``"todas"``.
+
+    Sin ``empresa_ids`` (o con ``None``) el ámbito es ``"global"``.
+    """
+    ambitos = {AMBITO_GLOBAL if e is None else str(e) for e in (empresa_ids or (None,))}
+    ambitos.add(AMBITO_TODAS)
+    token = _nuevo_token()
+    VersionCatalogo.objects.bulk_create(
+        [VersionCatalogo(catalogo=catalogo, ambito=ambito, token=token) for ambito in sorted(ambitos)],
+        update_conflicts=True,
+        unique_fields=["catalogo", "ambito"],
+        update_fields=["token", "updated_at"],
+    )
+
+
+def conectar_invalidacion(catalogo, modelo, campo_empresa=None):
+    """Invalida ``catalogo`` en cada alta, cambio o baja de ``modelo``.
+
+    Con ``campo_empresa`` se invalida el ámbito de la empresa del renglón y,
+    si un cambio lo movió de empresa, también el de la anterior (se lee en
+    ``pre_save``). Las escrituras masivas (``bulk_create``/``update``) no
+    disparan señales: quien las haga llama ``invalidar_catalogo`` al terminar.
+    """
+    atributo = f"{campo_empresa}_id" if campo_empresa else None
+
+    def _recordar_empresa(sender, instance, **kwargs):
+        if instance.pk is not None:
+            instance._catalogo_empresas_previas = set(
+                sender._default_manager.filter(pk=instance.pk).values_list(atributo, flat=True)
+            )
+
+    def _invalidar(sender, instance, **kwargs):
+        empresas = {None}
+        if atributo:
+            empresas = {getattr(instance, atributo, None)}
+            empresas |= instance.__dict__.pop("_catalogo_empresas_previas", set())
+        transaction.on_commit(lambda: invalidar_catalogo(catalogo, *empresas))
+
+    uid = f"{_PREFIJO}:{catalogo}:{modelo._meta.label_lower}"
+    if atributo:
+        pre_save.connect(_recordar_empresa, sender=modelo, weak=False, dispatch_uid=uid + ":pre_save")
+    post_save.connect(_invalidar, sender=modelo, weak=False, dispatch_uid=uid + ":save")
+    post_delete.connect(_invalidar, sender=modelo, weak=False, dispatch_uid=uid + ":delete")
+
+
+def _etag(datos):
+    crudo = json.dumps(datos, cls=DjangoJSONEncoder, sort_keys=True, separators=(",", ":"))
+    return '"%s"' % hashlib.sha1(crudo.encode("utf-8")).hexdigest()
+
+
+def _coincide(request, etag):
+    enviados = request.META.get("HTTP_IF_NONE_MATCH", "")
+    if not enviados:
+        return False
+    if enviados.strip() == "*":
+        return True
+    # Un proxy con compresión puede devolverlo como ``W/"..."``.
+    return etag in {e.strip().removeprefix("W/") for e in enviados.split(",")}
+
+
+def _con_cabeceras(response, etag):
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    patch_vary_headers(response, ("Authorization", "Cookie"))
+    return response
+
+
+def respuesta_cacheada(request, catalogos, ambitos, generar):
+    """Devuelve la respuesta de ``generar()`` desde caché cuando se puede.
+
+    ``catalogos``: nombres de los catálogos de los que depende la respuesta.
+    ``ambitos``: ámbitos cuya versión la invalida (p.ej. ``["global", 7]``).
+    Sólo se guardan respuestas 200; la llave incluye host y query string para
+    que ``?q=``, ``?fields=`` y los enlaces del cursor no se crucen, y los
+    catálogos y ámbitos (ids de empresa) de forma explícita: dos empresas no
+    comparten respuesta aunque sus tokens de versión llegaran a coincidir.
+    """
+    ruta = request.build_absolute_uri()
+    alcance = ",".join(map(str, catalogos)) + "@" + ",".join(map(str, ambitos))
+    firma = "|".join(versiones(catalogos, ambitos))
+    llave = f"{_PREFIJO}:r:" + hashlib.sha1(f"{alcance}|{ruta}|{firma}".encode("utf-8")).hexdigest()
+
+    cache = _cache()
+    guardado = cache.get(llave)
+    if guardado is None:
+        response = generar()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        guardado = (_etag(response.data), response.data)
+        cache.set(llave, guardado, timeout=_timeout())
+    etag, datos = guardado
+
+    if _coincide(request, etag):
+        return _con_cabeceras(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+    return _con_cabeceras(Response(datos), etag)
+
+
+def ambitos_empresa(request):
+    """Ámbitos de un catálogo con renglones globales y privados por empresa.
+
+    Replica el filtro de ``MonedaViewSet.get_queryset``: el superusuario sin
+    ``?empresa_id=`` ve todas las empresas.
+    """
+    user = request.user
+    if user.is_superuser:
+        empresa_id = request.query_params.get("empresa_id") or request.query_params.get("empresa")
+        return [AMBITO_TODAS] if not empresa_id else [AMBITO_GLOBAL, str(empresa_id)]
+    if getattr(user, "empresa_id", None):
+        return [AMBITO_GLOBAL, str(user.empresa_id)]
+    return [AMBITO_GLOBAL]
+
+
+class CatalogoCacheMixin:
+    """Cachea el ``list`` de un ViewSet de catálogo (ver módulo).
+
+    ``catalogo_cache``: nombre con el que se conectó la invalidación.
+    ``catalogo_por_empresa``: ``True`` si el queryset depende de la empresa
+    del usuario (globales + privados); si no, el ámbito es sólo ``global``.
+    """
+
+    catalogo_cache = None
+    catalogo_por_empresa = False
+
+    def list(self, request, *args, **kwargs):
+        generar = super().list
+        ambitos = ambitos_empresa(request) if self.catalogo_por_empresa else [AMBITO_GLOBAL]
+        return respuesta_cacheada(
+            request, [self.catalogo_cache], ambitos, lambda: generar(request, *args, **kwargs)
+        )
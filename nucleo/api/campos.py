@@ -0,0 +1,56 @@
+"""``?fields=`` (sparse fieldsets) para los serializers de listado.
+
+``GET /api/v1/ventas/pedidos/?fields=id,folio,estatus`` devuelve sólo esas
+llaves por renglón. Los campos omitidos no se calculan: se quitan del
+serializer antes de representar, así que un anidado o un
+``SerializerMethodField`` caro que la pantalla no pidió no se ejecuta. Para
+además no *cargarlos* de la BD, la vista puede condicionar su
+``prefetch_related`` con ``campo_solicitado``.
+"""
+
+from rest_framework.serializers import ListSerializer
+
+PARAMETRO_CAMPOS = "fields"
+
+
+def campos_solicitados(request):
+    """Conjunto de nombres pedidos en ``?fields=``; ``None`` si no se pidió."""
+    if request is None or request.method not in ("GET", "HEAD"):
+        return None
+    crudo = request.query_params.get(PARAMETRO_CAMPOS)
+    if not crudo:
+        return None
+    campos = {nombre.strip() for nombre in crudo.split(",") if nombre.strip()}
+    return campos or None
+
+
+def campo_solicitado(request, nombre):
+    """``True`` salvo que ``?fields=`` exista y no incluya ``nombre``."""
+    campos = campos_solicitados(request)
+    return campos is None or nombre in campos
+
+
+class CamposDinamicosMixin:
+    """Recorta ``fields`` a lo pedido en ``?fields=``.
+
+    Sólo aplica al serializer raíz de la respuesta (o al ``child`` de su
+    ``ListSerializer``): un serializer anidado conserva todos sus campos aunque
+    comparta nombres con los pedidos arriba. Sólo en lecturas: en escrituras
+    recortar campos desactivaría su validación. Nombres desconocidos se
+    ignoran; si ninguno coincide se devuelve el serializer completo.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        raiz = self.root
+        es_raiz = raiz is self or (isinstance(raiz, ListSerializer) and raiz.child is self)
+        if not es_raiz:
+            return fields
+
+        campos = campos_solicitados(self.context.get("request"))
+        if not campos or not campos & set(fields):
+            return fields
+        for nombre in list(fields):
+            if nombre not in campos:
+                fields.pop(nombre)
+        return fields
@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class NucleoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'nucleo'
+
+    def ready(self):
+        from nucleo.api.cache import conectar_invalidacion
+        from nucleo.models import (
+            Moneda, UnidadMedida,
+            SatClaveProdServ, SatClaveUnidad, SatFormaPago, SatMetodoPago,
+            SatRegimenFiscal, SatUsoCfdi,
+        )
+
+        # Catálogos servidos desde caché (nucleo/api/cache.py).
+        conectar_invalidacion('monedas', Moneda, campo_empresa='empresa')
+        conectar_invalidacion('unidades_medida', UnidadMedida)
+        conectar_invalidacion('sat_prodserv', SatClaveProdServ)
+        conectar_invalidacion('sat_clave_unidad', SatClaveUnidad)
+        conectar_invalidacion('sat_regimen_fiscal', SatRegimenFiscal)
+        conectar_invalidacion('sat_uso_cfdi', SatUsoCfdi)
+        conectar_invalidacion('sat_metodo_pago', SatMetodoPago)
+        conectar_invalidacion('sat_forma_pago', SatFormaPago)
@@ -0,0 +1,55 @@
+from django.db.models import Q
+
+TAMANO_LOTE = 2000
+
+
+def _valor(renglon, ruta):
+    if isinstance(renglon, dict):
+        return renglon[ruta]
+    valor = renglon
+    for parte in ruta.split("__"):
+        valor = getattr(valor, parte)
+    return valor
+
+
+def iterar_por_lotes(qs, campo=None, descendente=False, lote=TAMANO_LOTE):
+    """Recorre ``qs`` ordenado por ``(campo, pk)`` en lotes de ``lote`` renglones.
+
+    Sustituye a ``.iterator()`` en reportes y exportaciones. Con
+    ``DISABLE_SERVER_SIDE_CURSORS`` (obligatorio detrás de un pooler en modo
+    transacción, donde un cursor con nombre no sobrevive entre sentencias) un
+    ``.iterator()`` trae el resultado completo al cliente; aquí cada lote es
+    un ``SELECT ... LIMIT`` independiente que sigue al último renglón del
+    anterior (keyset), así que la memoria no depende del tamaño del resultado
+    y ninguna sentencia necesita la misma conexión que la anterior.
+
+    - Sin ``campo`` se ordena sólo por pk.
+    - ``campo`` puede cruzar relaciones (``"movimiento_inventario__fecha_movimiento"``)
+      y no debe ser NULL en ``qs``.
+    - Reemplaza el ``order_by`` de ``qs``.
+    - Acepta instancias o ``.values()`` (que debe incluir ``campo`` y el pk);
+      ``.values_list()`` no.
+    """
+    pk = qs.model._meta.pk.attname
+    signo = "-" if descendente else ""
+    comparacion = "lt" if descendente else "gt"
+    orden = [f"{signo}{pk}"]
+    if campo:
+        orden.insert(0, f"{signo}{campo}")
+    qs = qs.order_by(*orden)
+
+    ultimo = None
+    while True:
+        pagina = qs
+        if ultimo is not None:
+            valor, pk_valor = ultimo
+            siguientes = Q(**{f"{pk}__{comparacion}": pk_valor})
+            if campo:
+                siguientes = Q(**{f"{campo}__{comparacion}": valor}) | (Q(**{campo: valor}) & siguientes)
+            pagina = qs.filter(siguientes)
+        renglones = list(pagina[:lote])
+        yield from renglones
+        if len(renglones) < lote:
+            return
+        fin = renglones[-1]
+        ultimo = (_valor(fin, campo) if campo else None, _valor(fin, pk))
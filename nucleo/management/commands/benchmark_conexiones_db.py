@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+from nucleo.management.commands.perfil_api import percentil
+
+MODOS = ("none", "persistent", "pool")
+
+
+def _medir(hacer_request, total):
+    """Latencias (ms) de ``total`` requests y cuántas conexiones nuevas abrieron."""
+    nuevas = []
+
+    def contar(sender, connection, **kwargs):
+        nuevas.append(1)
+
+    connection_created.connect(contar, weak=False)
+    try:
+        duraciones = []
+        for _ in range(total):
+            inicio = time.perf_counter()
+            hacer_request()
+            duraciones.append((time.perf_counter() - inicio) * 1000)
+    finally:
+        connection_created.disconnect(contar)
+    return duraciones, len(nuevas)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la latencia por request bajo cada DB_CONN_MODE (none, "
+        "persistent, pool). Cada modo corre en un proceso aparte con su propia "
+        "configuración; cada request pasa por request_started/request_finished "
+        "como en gunicorn, así que incluye abrir, validar o devolver la conexión. "
+        "Sin --url, el request sólo ejecuta --sql; con --url pasa por el "
+        "WSGIHandler completo (middleware, vista y serialización)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modos", default=",".join(MODOS), help="Modos a comparar, separados por coma.")
+        parser.add_argument("--requests", type=int, default=200, help="Requests por modo.")
+        parser.add_argument("--sql", default="SELECT 1", help="Consulta del request sintético.")
+        parser.add_argument("--url", help="Ruta a pedir por GET en vez del request sintético.")
+        parser.add_argument("--host", default="localhost", help="Host del request con --url (debe estar en ALLOWED_HOSTS).")
+        parser.add_argument(
+            "--header",
+            action="append",
+            default=[],
+            help='Encabezado extra con --url, p. ej. "Authorization: Bearer <token>". Repetible.',
+        )
+        parser.add_argument("--json", action="store_true", help="Salida JSON en vez de tabla.")
+        parser.add_argument("--solo-actual", action="store_true", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1:
+            raise CommandError("--requests debe ser positivo.")
+        if options["solo_actual"]:
+            self.stdout.write(json.dumps(self._medir_modo_actual(options)))
+            return
+
+        modos = [m.strip().lower() for m in options["modos"].split(",") if m.strip()]
+        invalidos = [m for m in modos if m not in MODOS]
+        if invalidos:
+            raise CommandError(f"Modos inválidos: {', '.join(invalidos)}.")
+
+        resultados = {}
+        for modo in modos:
+            comando = [
+                sys.executable,
+                str(settings.BASE_DIR / "manage.py"),
+                "benchmark_conexiones_db",
+                "--solo-actual",
+                "--requests", str(options["requests"]),
+                "--sql", options["sql"],
+                "--host", options["host"],
+            ]
+            if options.get("url"):
+                comando += ["--url", options["url"]]
+            for header in options["header"]:
+                comando += ["--header", header]
+            proceso = subprocess.run(
+                comando,
+                env={**os.environ, "DB_CONN_MODE": modo},
+                capture_output=True,
+                text=True,
+            )
+            lineas = proceso.stdout.strip().splitlines()
+            if proceso.returncode != 0 or not lineas:
+                detalle = (proceso.stderr.strip().splitlines() or ["sin salida"])[-1]
+                resultados[modo] = {"error": detalle}
+                continue
+            resultados[modo] = json.loads(lineas[-1])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'modo':<12} {'req':>6} {'conex':>6} {'1er ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'media ms':>9}"
+        )
+        for modo, datos in resultados.items():
+            if "error" in datos:
+                self.stdout.write(self.style.ERROR(f"{modo:<12} {datos['error']}"))
+                continue
+            self.stdout.write(
+                f"{modo:<12} {datos['requests']:>6} {datos['conexiones_nuevas']:>6} "
+                f"{datos['primera']:>9.2f} {datos['p50']:>9.2f} {datos['p95']:>9.2f} "
+                f"{datos['p99']:>9.2f} {datos['media']:>9.2f}"
+            )
+
+    def _medir_modo_actual(self, options):
+        if options.get("url"):
+            handler = WSGIHandler()
+            headers = {}
+            for header in options["header"]:
+                nombre, _, valor = header.partition(":")
+                headers[nombre.strip()] = valor.strip()
+            environ = RequestFactory().get(options["url"], headers=headers, HTTP_HOST=options["host"]).environ
+
+            def hacer_request():
+                # WSGIHandler manda request_started y response.close() manda
+                # request_finished, igual que bajo gunicorn.
+                respuesta = handler(dict(environ), lambda status, headers, exc_info=None: None)
+                try:
+                    for _ in respuesta:
+                        pass
+                finally:
+                    respuesta.close()
+        else:
+            sql = options["sql"]
+
+            def hacer_request():
+                request_started.send(sender=self.__class__, environ={})
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(sql)
+                        cursor.fetchall()
+                finally:
+                    request_finished.send(sender=self.__class__)
+
+        duraciones, nuevas = _medir(hacer_request, options["requests"])
+        ordenadas = sorted(duraciones)
+        return {
+            "modo": settings.DB_CONN_MODE,
+            "requests": len(duraciones),
+            "conexiones_nuevas": nuevas,
+            "primera": duraciones[0],
+            "p50": percentil(ordenadas, 50),
+            "p95": percentil(ordenadas, 95),
+            "p99": percentil(ordenadas, 99),
+            "media": sum(duraciones) / len(duraciones),
+        }
@@ -0,0 +1,120 @@
+import csv
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+
+from nucleo.models import SatClaveProdServ, SatClaveUnidad, normalizar_busqueda
+from nucleo.services.sat_catalogo_service import SatCatalogoService
+
+# catálogo -> (modelo, columna de la clave, columna de la descripción, catálogo de caché)
+CATALOGOS = {
+    "prodserv": (SatClaveProdServ, "c_ClaveProdServ", "Descripción", "sat_prodserv"),
+    "unidad": (SatClaveUnidad, "c_ClaveUnidad", "Nombre", "sat_clave_unidad"),
+}
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        # openpyxl entrega las claves numéricas como float.
+        valor = int(valor)
+    return str(valor).strip()
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga un catálogo SAT de claves (c_ClaveProdServ o c_ClaveUnidad) desde "
+        "el archivo oficial (catCFDI convertido a .xlsx, o la hoja exportada a "
+        ".csv) con COPY y un solo INSERT ... ON CONFLICT. Las claves existentes "
+        "se actualizan; con --desactivar-faltantes las que ya no vienen quedan "
+        "inactivas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta al .xlsx o .csv.")
+        parser.add_argument("--catalogo", choices=sorted(CATALOGOS), required=True)
+        parser.add_argument("--hoja", help="Hoja del .xlsx (por omisión, la que se llama como la columna clave).")
+        parser.add_argument("--encoding", default="utf-8-sig", help="Codificación del .csv.")
+        parser.add_argument("--desactivar-faltantes", action="store_true")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("La carga usa COPY de PostgreSQL.")
+        ruta = Path(options["archivo"])
+        if not ruta.is_file():
+            raise CommandError(f"No existe el archivo {ruta}.")
+        modelo, col_codigo, col_descripcion, catalogo_cache = CATALOGOS[options["catalogo"]]
+
+        if ruta.suffix.lower() == ".csv":
+            renglones = self._renglones_csv(ruta, options["encoding"])
+        elif ruta.suffix.lower() == ".xlsx":
+            renglones = self._renglones_xlsx(ruta, options.get("hoja") or col_codigo)
+        else:
+            raise CommandError("Formato no soportado: usa .xlsx o .csv (el .xls del SAT se abre y guarda como .xlsx).")
+
+        inicio = time.perf_counter()
+        try:
+            resultado = SatCatalogoService.cargar(
+                modelo,
+                self._filas(renglones, col_codigo, col_descripcion),
+                catalogo_cache,
+                desactivar_faltantes=options["desactivar_faltantes"],
+            )
+        except ValidationError as exc:
+            raise CommandError(str(exc.detail))
+        ms = (time.perf_counter() - inicio) * 1000
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{modelo._meta.verbose_name_plural}: {resultado['leidas']} leídas, "
+                f"{resultado['escritas']} nuevas o cambiadas, "
+                f"{resultado['desactivadas']} desactivadas ({ms:.0f} ms)."
+            )
+        )
+
+    @staticmethod
+    def _filas(renglones, col_codigo, col_descripcion):
+        """``(codigo, descripcion)`` a partir del renglón de encabezados.
+
+        El archivo del SAT trae renglones de título y versión antes del
+        encabezado; se salta todo hasta el renglón que contiene la columna de
+        la clave. Los encabezados se comparan sin acentos ni mayúsculas.
+        """
+        buscado = normalizar_busqueda(col_codigo)
+        i_codigo = i_descripcion = None
+        for renglon in renglones:
+            celdas = [_texto(v) for v in renglon]
+            if i_codigo is None:
+                encabezados = [normalizar_busqueda(c) for c in celdas]
+                if buscado in encabezados:
+                    i_codigo = encabezados.index(buscado)
+                    try:
+                        i_descripcion = encabezados.index(normalizar_busqueda(col_descripcion))
+                    except ValueError:
+                        raise CommandError(f"El encabezado no tiene la columna '{col_descripcion}'.")
+                continue
+            if len(celdas) > i_codigo and celdas[i_codigo]:
+                yield celdas[i_codigo], celdas[i_descripcion] if len(celdas) > i_descripcion else ""
+        if i_codigo is None:
+            raise CommandError(f"No se encontró el encabezado '{col_codigo}'.")
+
+    @staticmethod
+    def _renglones_csv(ruta, encoding):
+        with ruta.open(newline="", encoding=encoding) as archivo:
+            yield from csv.reader(archivo)
+
+    @staticmethod
+    def _renglones_xlsx(ruta, hoja):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise CommandError("Dependencia faltante para leer Excel (openpyxl).")
+        libro = load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            hoja_excel = libro[hoja] if hoja in libro.sheetnames else libro.active
+            yield from hoja_excel.iter_rows(values_only=True)
+        finally:
+            libro.close()
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from nucleo.models import FolioConsumido, ModoAsignacionFolio, SerieFolio
+
+
+def _rangos(numeros):
+    """Compacta ``[3, 4, 5, 9]`` en ``"3-5, 9"``."""
+    rangos = []
+    for n in sorted(numeros):
+        if rangos and n == rangos[-1][1] + 1:
+            rangos[-1][1] = n
+        else:
+            rangos.append([n, n])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in rangos)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reporta los huecos de las series de folio en modo SECUENCIA: "
+        "consecutivos que la secuencia entregó y que ningún documento llegó a "
+        "registrar (rollback o bloque reservado por una conexión que ya no "
+        "existe). Con --sincronizar además lleva folio_actual al último valor "
+        "de la secuencia (obligatorio antes de regresar una serie a modo FILA)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--serie", type=int, help="id_serie_folio a revisar (por defecto, todas las de modo SECUENCIA).")
+        parser.add_argument("--sincronizar", action="store_true", help="Actualizar folio_actual desde la secuencia.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("El modo SECUENCIA sólo existe en PostgreSQL.")
+        series = SerieFolio.objects.all()
+        if options.get("serie"):
+            series = series.filter(pk=options["serie"])
+        else:
+            series = series.filter(modo_asignacion=ModoAsignacionFolio.SECUENCIA)
+
+        for serie in series.order_by("id_serie_folio"):
+            etiqueta = f"[{serie.pk}] {serie.tipo_documento} {serie.serie}"
+            estado = serie.estado_secuencia()
+            if estado is None:
+                self.stdout.write(f"{etiqueta}: sin secuencia creada todavía.")
+                continue
+
+            nombre, last_value, is_called = estado
+            entregado_hasta = last_value if is_called else last_value - 1
+            consumidos = set(
+                FolioConsumido.objects.filter(serie_folio=serie, secuencia=nombre)
+                .values_list("consecutivo", flat=True)
+            )
+            if not consumidos:
+                self.stdout.write(f"{etiqueta}: {nombre} sin folios registrados (último entregado {entregado_hasta}).")
+            else:
+                primero, ultimo = min(consumidos), max(consumidos)
+                # Por debajo del último registrado todo lo que falta es hueco
+                # definitivo. Por encima puede ser un bloque CACHE todavía en
+                # manos de una conexión viva o un documento en curso: se
+                # reporta aparte porque puede llenarse.
+                huecos = set(range(primero, ultimo + 1)) - consumidos
+                pendientes = max(0, entregado_hasta - ultimo)
+                linea = (
+                    f"{etiqueta}: {nombre} registrados {len(consumidos)} "
+                    f"({primero}-{ultimo}), huecos {len(huecos)}"
+                )
+                if huecos:
+                    linea += f" [{_rangos(huecos)}]"
+                if pendientes:
+                    linea += f", {pendientes} reservado(s) sin usar por encima de {ultimo}"
+                self.stdout.write(self.style.WARNING(linea) if huecos else linea)
+
+            if options.get("sincronizar") and serie.sincronizar_desde_secuencia():
+                self.stdout.write(self.style.SUCCESS(f"{etiqueta}: folio_actual = {serie.folio_actual}."))
@@ -0,0 +1,143 @@
+import json
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ARCHIVO_POR_DEFECTO = "api_profiling.log"
+
+ORDENES = ("p50", "p95", "p99", "requests", "consultas", "db")
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    rango = max(1, math.ceil(p / 100 * len(valores_ordenados)))
+    return valores_ordenados[rango - 1]
+
+
+def _archivos(base):
+    """``api_profiling.log`` y sus rotaciones (``.1`` ... ``.n``), de la más vieja a la actual."""
+    rotados = sorted(
+        (p for p in base.parent.glob(base.name + ".*") if p.suffix[1:].isdigit()),
+        key=lambda p: int(p.suffix[1:]),
+        reverse=True,
+    )
+    return rotados + ([base] if base.exists() else [])
+
+
+def _leer(archivos, desde=None, vista=None):
+    """Registros válidos de los archivos; las líneas que no son JSON se saltan."""
+    for archivo in archivos:
+        with open(archivo, "r", encoding="utf-8", errors="replace") as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    continue
+                if not isinstance(registro, dict) or registro.get("event") != "api_request":
+                    continue
+                if vista and vista not in (registro.get("vista") or ""):
+                    continue
+                if desde is not None:
+                    try:
+                        instante = datetime.fromisoformat(registro["timestamp"].replace("Z", "+00:00"))
+                    except (KeyError, AttributeError, ValueError):
+                        continue
+                    if instante < desde:
+                        continue
+                yield registro
+
+
+def agregar_por_vista(registros):
+    """``{vista: {requests, p50, p95, p99, consultas_p50, consultas_max, db_p95, ...}}``."""
+    por_vista = defaultdict(lambda: {"duracion": [], "consultas": [], "db": [], "errores": 0, "lenta": (0.0, None)})
+    for registro in registros:
+        datos = por_vista[registro.get("vista") or "(sin resolver)"]
+        datos["duracion"].append(float(registro.get("duracion_ms") or 0))
+        datos["consultas"].append(int(registro.get("consultas") or 0))
+        datos["db"].append(float(registro.get("db_ms") or 0))
+        if int(registro.get("status") or 0) >= 500:
+            datos["errores"] += 1
+        lenta_ms = float(registro.get("consulta_mas_lenta_ms") or 0)
+        if lenta_ms > datos["lenta"][0]:
+            datos["lenta"] = (lenta_ms, registro.get("consulta_mas_lenta"))
+
+    resumen = {}
+    for nombre, datos in por_vista.items():
+        duracion = sorted(datos["duracion"])
+        consultas = sorted(datos["consultas"])
+        db = sorted(datos["db"])
+        resumen[nombre] = {
+            "requests": len(duracion),
+            "errores": datos["errores"],
+            "p50": percentil(duracion, 50),
+            "p95": percentil(duracion, 95),
+            "p99": percentil(duracion, 99),
+            "consultas_p50": percentil(consultas, 50),
+            "consultas_max": consultas[-1],
+            "db_p95": percentil(db, 95),
+            "consulta_mas_lenta_ms": datos["lenta"][0],
+            "consulta_mas_lenta": datos["lenta"][1],
+        }
+    return resumen
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrega logs/api_profiling.log (API_PROFILING=True) en percentiles "
+        "p50/p95/p99 de duración por vista, con consultas SQL por request y "
+        "tiempo en BD. Una vista con muchas consultas por request y poco "
+        "tiempo por consulta es candidata a N+1."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--archivo", help=f"Log a leer (por defecto LOGS_DIR/{ARCHIVO_POR_DEFECTO} y sus rotaciones).")
+        parser.add_argument("--horas", type=float, help="Sólo requests de las últimas N horas.")
+        parser.add_argument("--vista", help="Filtrar vistas cuyo nombre contenga este texto.")
+        parser.add_argument("--orden", choices=ORDENES, default="p95", help="Columna para ordenar (desc).")
+        parser.add_argument("--limite", type=int, default=30, help="Vistas a mostrar.")
+        parser.add_argument("--sql", action="store_true", help="Mostrar la consulta más lenta de cada vista.")
+        parser.add_argument("--json", action="store_true", help="Salida JSON en vez de tabla.")
+
+    def handle(self, *args, **options):
+        if options.get("archivo"):
+            archivos = [Path(options["archivo"])]
+            if not archivos[0].exists():
+                raise CommandError(f"No existe {archivos[0]}.")
+        else:
+            archivos = _archivos(Path(settings.LOGS_DIR) / ARCHIVO_POR_DEFECTO)
+            if not archivos:
+                raise CommandError("No hay registros de perfilado. Activa API_PROFILING y repite.")
+
+        desde = None
+        if options.get("horas"):
+            desde = datetime.now(dt_timezone.utc) - timedelta(hours=options["horas"])
+
+        resumen = agregar_por_vista(_leer(archivos, desde=desde, vista=options.get("vista")))
+        clave = {"requests": "requests", "consultas": "consultas_p50", "db": "db_p95"}.get(options["orden"], options["orden"])
+        filas = sorted(resumen.items(), key=lambda item: item[1][clave], reverse=True)[: options["limite"]]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(dict(filas), ensure_ascii=False, indent=2))
+            return
+        if not filas:
+            self.stdout.write("Sin registros en el periodo.")
+            return
+
+        self.stdout.write(
+            f"{'vista':<48} {'req':>6} {'5xx':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+            f"{'sql p50':>8} {'sql max':>8} {'db p95':>9}"
+        )
+        for nombre, datos in filas:
+            self.stdout.write(
+                f"{nombre[:48]:<48} {datos['requests']:>6} {datos['errores']:>4} "
+                f"{datos['p50']:>9.1f} {datos['p95']:>9.1f} {datos['p99']:>9.1f} "
+                f"{datos['consultas_p50']:>8} {datos['consultas_max']:>8} {datos['db_p95']:>9.1f}"
+            )
+            if options["sql"] and datos["consulta_mas_lenta"]:
+                self.stdout.write(f"    {datos['consulta_mas_lenta_ms']:.1f} ms: {datos['consulta_mas_lenta']}")
@@ -0,0 +1,164 @@
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Script del proceso medido: arranca como gunicorn/Vercel (``ERP.wsgi``), carga
+# el URLconf y opcionalmente atiende un request. Entre fases escribe marcas en
+# stderr con ``os.write`` (sin búfer, igual que las líneas de ``-X importtime``)
+# para atribuir cada import a su fase.
+_SCRIPT = r"""
+import json, os, sys, time
+
+def marca(fase):
+    os.write(2, ("#fase " + fase + "\n").encode())
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ERP.settings")
+tiempos = {}
+inicio = time.perf_counter()
+marca("wsgi")
+from ERP.wsgi import application
+tiempos["wsgi"] = time.perf_counter() - inicio
+
+marca("urls")
+t = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+tiempos["urls"] = time.perf_counter() - t
+
+url = sys.argv[1] if len(sys.argv) > 1 else ""
+if url:
+    marca("herramientas")
+    from django.test import RequestFactory
+    marca("request")
+    t = time.perf_counter()
+    environ = RequestFactory().get(url, HTTP_HOST=sys.argv[2]).environ
+    estado = []
+    respuesta = application(environ, lambda status, headers, exc_info=None: estado.append(status))
+    try:
+        for _ in respuesta:
+            pass
+    finally:
+        respuesta.close()
+    tiempos["request"] = time.perf_counter() - t
+    tiempos["status"] = estado[0] if estado else ""
+
+tiempos["total"] = time.perf_counter() - inicio
+print(json.dumps(tiempos))
+"""
+
+FASES = ("wsgi", "urls", "request")
+
+
+def parsear_importtime(salida):
+    """Renglones de ``-X importtime`` como ``(fase, modulo, propio_us, acumulado_us, nivel)``."""
+    fase = None
+    for linea in salida.splitlines():
+        if linea.startswith("#fase "):
+            fase = linea[6:].strip()
+            continue
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        try:
+            propio, acumulado, modulo = linea[len("import time:"):].split("|", 2)
+            propio_us, acumulado_us = int(propio), int(acumulado)
+        except ValueError:
+            continue  # encabezado "self [us] | cumulative | imported package"
+        nivel = (len(modulo) - len(modulo.lstrip(" "))) // 2
+        yield fase, modulo.strip(), propio_us, acumulado_us, nivel
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el arranque en frío en un proceso nuevo con `python -X importtime`: "
+        "tiempo de ERP.wsgi (settings y apps), del URLconf y, con --url, del primer "
+        "request; y el costo de import por módulo y por paquete, atribuido a su "
+        "fase. Con --presupuesto-ms falla si wsgi + urls lo excede (para CI)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Ruta a pedir por GET después de cargar el URLconf.")
+        parser.add_argument("--host", default="localhost", help="Host del request con --url (debe estar en ALLOWED_HOSTS).")
+        parser.add_argument("--limite", type=int, default=25, help="Módulos a mostrar.")
+        parser.add_argument("--orden", choices=("propio", "acumulado"), default="acumulado")
+        parser.add_argument("--fase", choices=FASES, help="Sólo módulos importados en esta fase.")
+        parser.add_argument("--presupuesto-ms", type=float, help="Máximo de wsgi + urls en ms.")
+        parser.add_argument("--json", action="store_true", help="Salida JSON en vez de tabla.")
+
+    def handle(self, *args, **options):
+        comando = [sys.executable, "-X", "importtime", "-c", _SCRIPT]
+        if options.get("url"):
+            comando += [options["url"], options["host"]]
+        proceso = subprocess.run(
+            comando,
+            cwd=str(settings.BASE_DIR),
+            capture_output=True,
+            text=True,
+        )
+        lineas = proceso.stdout.strip().splitlines()
+        if proceso.returncode != 0 or not lineas:
+            errores = [l for l in proceso.stderr.splitlines() if not l.startswith(("import time:", "#fase "))]
+            raise CommandError("El proceso medido falló: " + (errores[-1] if errores else "sin salida"))
+        tiempos = json.loads(lineas[-1])
+
+        modulos = []
+        por_paquete = defaultdict(int)
+        por_fase = defaultdict(lambda: [0, 0])
+        for fase, modulo, propio_us, acumulado_us, nivel in parsear_importtime(proceso.stderr):
+            por_fase[fase][0] += 1
+            por_fase[fase][1] += propio_us
+            if options.get("fase") and fase != options["fase"]:
+                continue
+            por_paquete[modulo.split(".", 1)[0]] += propio_us
+            modulos.append(
+                {"modulo": modulo, "fase": fase, "propio_ms": propio_us / 1000, "acumulado_ms": acumulado_us / 1000, "nivel": nivel}
+            )
+
+        clave = "propio_ms" if options["orden"] == "propio" else "acumulado_ms"
+        top = sorted(modulos, key=lambda m: m[clave], reverse=True)[: options["limite"]]
+        paquetes = sorted(por_paquete.items(), key=lambda item: item[1], reverse=True)[: options["limite"]]
+        arranque_ms = (tiempos["wsgi"] + tiempos["urls"]) * 1000
+
+        if options["json"]:
+            self.stdout.write(
+                json.dumps(
+                    {
+                        "tiempos_ms": {k: v * 1000 for k, v in tiempos.items() if isinstance(v, float)},
+                        "status": tiempos.get("status"),
+                        "fases": {f: {"modulos": n, "propio_ms": us / 1000} for f, (n, us) in por_fase.items()},
+                        "paquetes_ms": {p: us / 1000 for p, us in paquetes},
+                        "modulos": top,
+                    },
+                    ensure_ascii=False,
+                    indent=2,
+                )
+            )
+        else:
+            for fase in FASES:
+                if fase not in tiempos:
+                    continue
+                modulos_fase, propio_us = por_fase.get(fase, (0, 0))
+                self.stdout.write(
+                    f"{fase:<8} {tiempos[fase] * 1000:>9.1f} ms  "
+                    f"{modulos_fase:>5} módulos nuevos ({propio_us / 1000:.1f} ms importando)"
+                )
+            if tiempos.get("status"):
+                self.stdout.write(f"status del request: {tiempos['status']}")
+            self.stdout.write(f"{'total':<8} {tiempos['total'] * 1000:>9.1f} ms\n")
+
+            self.stdout.write(f"{'paquete':<40} {'propio ms':>10}")
+            for paquete, us in paquetes:
+                self.stdout.write(f"{paquete[:40]:<40} {us / 1000:>10.1f}")
+            self.stdout.write("")
+            self.stdout.write(f"{'módulo':<56} {'fase':<8} {'propio ms':>10} {'acum ms':>10}")
+            for m in top:
+                self.stdout.write(
+                    f"{m['modulo'][:56]:<56} {(m['fase'] or '-'):<8} {m['propio_ms']:>10.1f} {m['acumulado_ms']:>10.1f}"
+                )
+
+        presupuesto = options.get("presupuesto_ms")
+        if presupuesto is not None and arranque_ms > presupuesto:
+            raise CommandError(f"Arranque de {arranque_ms:.0f} ms excede el presupuesto de {presupuesto:.0f} ms.")
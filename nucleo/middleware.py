@@ -1,9 +1,28 @@
 import logging
+import random
 import time
+from contextlib import ExitStack, contextmanager
+
+import structlog
 from django.conf import settings
+from django.db import connections
 
 logger = logging.getLogger('api_logger')
 
+# Registros de perfilado: una línea JSON por request en ``api_profiling.log``
+# (ver ``LOGGING``). Se envuelve el logger de stdlib en lugar de llamar a
+# ``structlog.configure`` para no cambiar la salida de ningún otro logger.
+perfil_logger = structlog.wrap_logger(
+    logging.getLogger('api_profiling'),
+    processors=[
+        structlog.processors.TimeStamper(fmt='iso', utc=True),
+        structlog.processors.JSONRenderer(ensure_ascii=False),
+    ],
+)
+
+# Largo máximo del SQL de la consulta más lenta que se guarda en el registro.
+MAX_SQL_REGISTRO = 500
+
 def get_client_ip(request):
     if getattr(settings, "IS_VERCEL", False) or str(getattr(settings, "ENVIRONMENT", "") or "").lower() == "production":
         forwarded_for = (request.META.get("HTTP_X_FORWARDED_FOR") or "").strip()
@@ -11,10 +30,74 @@ def get_client_ip(request):
             return forwarded_for.split(",")[0].strip()
     return (request.META.get("REMOTE_ADDR") or "").strip()
 
+class PerfilConsultas:
+    """
+    ``execute_wrapper`` que cuenta las consultas SQL de un request.
+
+    Acumula número de consultas, tiempo total en BD y la consulta más lenta
+    (SQL truncado, sin parámetros: los parámetros pueden traer datos de
+    clientes y no deben terminar en un log). Se instala en todas las
+    conexiones de ``DATABASES`` mientras dura el request.
+    """
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.mas_lenta_ms = 0.0
+        self.mas_lenta_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.consultas += 1
+            self.tiempo_db += duracion
+            if duracion * 1000 > self.mas_lenta_ms:
+                self.mas_lenta_ms = duracion * 1000
+                self.mas_lenta_sql = str(sql)[:MAX_SQL_REGISTRO]
+
+
+@contextmanager
+def consultas_perfiladas(perfil):
+    """Instala ``perfil`` como ``execute_wrapper`` en todas las conexiones del hilo actual."""
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(perfil))
+        yield
+
+
+def nombre_vista(request):
+    """
+    Nombre de la ruta resuelta (``api:pedido-list``). Django usa la ruta
+    Python de la vista cuando la URL no tiene ``name``.
+    """
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else None
+
+
+def _perfilar():
+    if not getattr(settings, 'API_PROFILING', False):
+        return False
+    muestra = getattr(settings, 'API_PROFILING_MUESTRA', 1.0)
+    return muestra >= 1 or random.random() < muestra
+
+
 class APILoggingMiddleware:
     """
     Middleware to log all API requests to a separate log file.
     Captures: Method, Path, User, Status Code, Duration.
+
+    Con ``API_PROFILING`` además escribe un registro estructurado por request
+    en ``api_profiling.log``: vista resuelta, consultas SQL, tiempo en BD y la
+    consulta más lenta. ``API_PROFILING_MUESTRA`` (0-1) perfila sólo una
+    fracción de los requests. ``manage.py perfil_api`` lo agrega en p50/p95/p99
+    por vista para encontrar los N+1.
+
+    En un ``StreamingHttpResponse`` las consultas ocurren mientras el servidor
+    itera el cuerpo, ya fuera de este ``__call__``: el perfil se reinstala en
+    cada pedazo (en el hilo que lo pide) y el registro se escribe al cerrar la
+    respuesta, con la duración total.
     """
     def __init__(self, get_response):
         self.get_response = get_response
@@ -24,10 +107,15 @@ class APILoggingMiddleware:
         if not request.path.startswith('/api/'):
             return self.get_response(request)
 
+        perfil = PerfilConsultas() if _perfilar() else None
         start_time = time.time()
         
         # Process request
-        response = self.get_response(request)
+        if perfil is None:
+            response = self.get_response(request)
+        else:
+            with consultas_perfiladas(perfil):
+                response = self.get_response(request)
         
         duration = time.time() - start_time
         
@@ -45,21 +133,65 @@ class APILoggingMiddleware:
         else:
             logger.error(log_message)
 
+        if perfil is not None:
+            if response.streaming and not response.is_async:
+                response.streaming_content = self._contenido_perfilado(
+                    response.streaming_content, request, response, user, perfil, start_time
+                )
+            else:
+                self._registrar_perfil(request, response, user, perfil, duration)
+
         return response
 
+    def _contenido_perfilado(self, contenido, request, response, user, perfil, start_time):
+        iterador = iter(contenido)
+        try:
+            while True:
+                with consultas_perfiladas(perfil):
+                    parte = next(iterador, None)
+                if parte is None:
+                    return
+                yield parte
+        finally:
+            # Corre al agotarse o al cerrarse la respuesta (close() del servidor).
+            self._registrar_perfil(request, response, user, perfil, time.time() - start_time)
+
+    def _registrar_perfil(self, request, response, user, perfil, duration):
+        perfil_logger.info(
+            'api_request',
+            vista=nombre_vista(request),
+            metodo=request.method,
+            ruta=request.path,
+            status=response.status_code,
+            usuario=getattr(user, 'pk', None),
+            duracion_ms=round(duration * 1000, 2),
+            consultas=perfil.consultas,
+            db_ms=round(perfil.tiempo_db * 1000, 2),
+            consulta_mas_lenta_ms=round(perfil.mas_lenta_ms, 2),
+            consulta_mas_lenta=perfil.mas_lenta_sql,
+        )
+
 class NoCacheMiddleware:
     """
     Middleware para deshabilitar el caché en todas las respuestas de la API.
     Añade headers: Cache-Control: no-store, no-cache, must-revalidate, max-age=0
+
+    Excepción: las rutas de ``NO_CACHE_RUTAS_EXENTAS`` (catálogos servidos
+    desde nucleo/api/cache.py) conservan el ``Cache-Control``/``ETag`` que
+    puso la vista, para que el navegador pueda revalidar con 304. Si la vista
+    no puso ninguno (escrituras, detalle), se aplica no-store como siempre.
     """
     def __init__(self, get_response):
         self.get_response = get_response
+        self.exentas = tuple(getattr(settings, 'NO_CACHE_RUTAS_EXENTAS', ()))
 
     def __call__(self, request):
         response = self.get_response(request)
         
         # Aplicar solo a rutas de API
         if request.path.startswith('/api/'):
+            if self.exentas and request.path.startswith(self.exentas) and response.has_header('Cache-Control'):
+                return response
             response['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
             response['Pragma'] = 'no-cache'
             response['Expires'] = '0'
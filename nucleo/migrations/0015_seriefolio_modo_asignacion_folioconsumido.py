@@ -0,0 +1,41 @@
+# Generated by Django 6.0.7 on 2026-10-17 12:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nucleo', '0014_remove_departamento_departament_empresa_4c7874_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seriefolio',
+            name='modo_asignacion',
+            field=models.CharField(choices=[('FILA', 'Fila bloqueada (consecutivo estricto)'), ('SECUENCIA', 'Secuencia PostgreSQL (sin bloqueo, con huecos)')], default='FILA', help_text="FILA bloquea esta fila hasta el commit del documento. SECUENCIA toma el consecutivo de una secuencia de Postgres: no serializa, pero un documento que hace rollback deja hueco (ver comando huecos_folios). Para volver a FILA correr antes 'huecos_folios --sincronizar'.", max_length=20),
+        ),
+        migrations.AddField(
+            model_name='seriefolio',
+            name='tamano_bloque',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Folios que cada conexión reserva de golpe en modo SECUENCIA (CACHE de la secuencia).'),
+        ),
+        migrations.CreateModel(
+            name='FolioConsumido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('secuencia', models.CharField(max_length=63)),
+                ('consecutivo', models.PositiveIntegerField()),
+                ('folio', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('serie_folio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='folios_consumidos', to='nucleo.seriefolio')),
+            ],
+            options={
+                'verbose_name': 'Folio consumido',
+                'verbose_name_plural': 'Folios consumidos',
+                'db_table': 'folios_consumidos',
+                'indexes': [models.Index(fields=['serie_folio', 'secuencia', 'consecutivo'], name='folios_cons_serie_f_ef8c84_idx')],
+            },
+        ),
+    ]
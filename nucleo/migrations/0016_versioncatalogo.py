@@ -0,0 +1,29 @@
+# Generated by Django 6.0.7 on 2026-10-17 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nucleo', '0015_seriefolio_modo_asignacion_folioconsumido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('catalogo', models.CharField(max_length=60)),
+                ('ambito', models.CharField(max_length=40)),
+                ('token', models.CharField(max_length=32)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Versión de catálogo',
+                'verbose_name_plural': 'Versiones de catálogo',
+                'db_table': 'versiones_catalogo',
+                'constraints': [models.UniqueConstraint(fields=('catalogo', 'ambito'), name='uq_version_catalogo_ambito')],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 6.0.7 on 2026-10-17 18:10
+
+import unicodedata
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def normalizar_busqueda(*partes):
+    # Copia congelada de ``nucleo.models.normalizar_busqueda`` al crear la
+    # columna: la migración no debe cambiar si la función del modelo cambia.
+    texto = " ".join(str(p) for p in partes if p)
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+
+def llenar_busqueda(apps, schema_editor):
+    for nombre in ("SatClaveProdServ", "SatClaveUnidad"):
+        modelo = apps.get_model("nucleo", nombre)
+        filas = []
+        for fila in modelo.objects.only("pk", "codigo", "descripcion").iterator(chunk_size=2000):
+            fila.busqueda = normalizar_busqueda(fila.codigo, fila.descripcion)
+            filas.append(fila)
+        modelo.objects.bulk_update(filas, ["busqueda"], batch_size=2000)
+
+
+# (tabla, índice de trigramas, índice de prefijo). Fuera del estado de los
+# modelos: ``gin_trgm_ops`` y ``varchar_pattern_ops`` sólo existen en Postgres.
+INDICES = (
+    ("sat_clave_prodserv", "sat_prodserv_busqueda_trgm", "sat_prodserv_codigo_prefijo"),
+    ("sat_clave_unidad", "sat_unidad_busqueda_trgm", "sat_unidad_codigo_prefijo"),
+)
+
+
+def crear_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    qn = schema_editor.quote_name
+    for tabla, trigramas, prefijo in INDICES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {qn(trigramas)} ON {qn(tabla)} USING gin (busqueda gin_trgm_ops)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {qn(prefijo)} ON {qn(tabla)} (codigo varchar_pattern_ops)"
+        )
+
+
+def borrar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    qn = schema_editor.quote_name
+    for _, trigramas, prefijo in INDICES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {qn(trigramas)}")
+        schema_editor.execute(f"DROP INDEX IF EXISTS {qn(prefijo)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nucleo", "0016_versioncatalogo"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="satclaveprodserv",
+            name="busqueda",
+            field=models.TextField(default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="satclaveunidad",
+            name="busqueda",
+            field=models.TextField(default="", editable=False),
+        ),
+        migrations.RunPython(llenar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
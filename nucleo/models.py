@@ -1,4 +1,6 @@
-from django.db import models, transaction
+import unicodedata
+
+from django.db import IntegrityError, ProgrammingError, connection, models, transaction
 from nucleo.choices import StatusChoices
 
 class StatusLifecycleModel(models.Model):
@@ -206,6 +208,10 @@ class Departamento(StatusLifecycleModel):
     def perform_destroy(self, instance):
         instance.soft_delete()
 
+class ModoAsignacionFolio(models.TextChoices):
+    FILA = "FILA", "Fila bloqueada (consecutivo estricto)"
+    SECUENCIA = "SECUENCIA", "Secuencia PostgreSQL (sin bloqueo, con huecos)"
+
 class SerieFolio(StatusLifecycleModel):
     id_serie_folio = models.BigAutoField(primary_key=True)
 
@@ -231,6 +237,23 @@ class SerieFolio(StatusLifecycleModel):
     reiniciar_anual = models.BooleanField(default=False, help_text="Reiniciar el consecutivo al cambiar de año")
     ultimo_anio = models.PositiveSmallIntegerField(blank=True, null=True, help_text="Último año registrado (2 dígitos)")
 
+    # Asignación del consecutivo
+    modo_asignacion = models.CharField(
+        max_length=20,
+        choices=ModoAsignacionFolio.choices,
+        default=ModoAsignacionFolio.FILA,
+        help_text=(
+            "FILA bloquea esta fila hasta el commit del documento. SECUENCIA toma el "
+            "consecutivo de una secuencia de Postgres: no serializa, pero un documento "
+            "que hace rollback deja hueco (ver comando huecos_folios). Para volver a "
+            "FILA correr antes 'huecos_folios --sincronizar'."
+        ),
+    )
+    tamano_bloque = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Folios que cada conexión reserva de golpe en modo SECUENCIA (CACHE de la secuencia).",
+    )
+
     activo = models.BooleanField(default=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -254,22 +277,47 @@ class SerieFolio(StatusLifecycleModel):
     def __str__(self):
         return f"{self.tipo_documento} {self.serie}"
 
-    def get_siguiente_folio(self):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._tamano_bloque_guardado = instancia.__dict__.get("tamano_bloque")
+        return instancia
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        anterior = getattr(self, "_tamano_bloque_guardado", None)
+        cambio_bloque = (
+            anterior is not None
+            and anterior != self.tamano_bloque
+            and (update_fields is None or "tamano_bloque" in update_fields)
+        )
+        super().save(*args, **kwargs)
+        if cambio_bloque:
+            self.ajustar_cache_secuencia()
+        if update_fields is None or "tamano_bloque" in update_fields:
+            self._tamano_bloque_guardado = self.tamano_bloque
+
+    @staticmethod
+    def _anio_actual():
         import datetime
-        anio_actual = int(datetime.datetime.now().strftime('%y'))  # 24, 25, 26
+        return int(datetime.datetime.now().strftime('%y'))  # 24, 25, 26
+
+    def _siguiente_consecutivo(self, anio_actual):
+        """Consecutivo que tocaría según ``folio_actual`` (modo FILA y arranque de la secuencia)."""
         if self.reiniciar_anual and self.ultimo_anio != anio_actual:
-            nuevo_consecutivo = self.folio_inicial or 1
-        else:
-            if self.folio_actual and self.folio_actual > 0:
-                nuevo_consecutivo = self.folio_actual + 1
-            else:
-                nuevo_consecutivo = self.folio_inicial or 1
-        if self.folio_final is not None and nuevo_consecutivo > self.folio_final:
+            return self.folio_inicial or 1
+        if self.folio_actual and self.folio_actual > 0:
+            return self.folio_actual + 1
+        return self.folio_inicial or 1
+
+    def formatear_folio(self, consecutivo, anio_actual):
+        """Folio formateado (prefijo, serie, relleno, año, sufijo) para un consecutivo."""
+        if self.folio_final is not None and consecutivo > self.folio_final:
             raise ValueError("Rango de folios agotado")
         if self.relleno_ceros > 0:
-            numero_str = str(nuevo_consecutivo).zfill(self.relleno_ceros)
+            numero_str = str(consecutivo).zfill(self.relleno_ceros)
         else:
-            numero_str = str(nuevo_consecutivo)
+            numero_str = str(consecutivo)
         partes = []
         if self.prefijo:
             partes.append(self.prefijo)
@@ -279,9 +327,150 @@ class SerieFolio(StatusLifecycleModel):
             partes.append(str(anio_actual))
         if self.sufijo:
             partes.append(self.sufijo)
-        folio_formateado = self.separador.join(partes)
+        return self.separador.join(partes)
+
+    def get_siguiente_folio(self):
+        anio_actual = self._anio_actual()
+        nuevo_consecutivo = self._siguiente_consecutivo(anio_actual)
+        folio_formateado = self.formatear_folio(nuevo_consecutivo, anio_actual)
+        return folio_formateado, nuevo_consecutivo, anio_actual
+
+    # ---- Modo SECUENCIA ----
+    #
+    # En modo FILA cada consumo hace select_for_update sobre esta fila y el
+    # bloqueo dura hasta el commit de la transacción del documento (picking,
+    # transferencia, pedido...): todos los usuarios de la sucursal hacen fila
+    # detrás del primero. En modo SECUENCIA el consecutivo sale de nextval(), que
+    # no bloquea ni se revierte; con ``tamano_bloque`` > 1 la secuencia usa CACHE
+    # y cada conexión se reserva un bloque. El precio son huecos (rollback del
+    # documento, bloque de una conexión que se cierra) y, con CACHE, folios que
+    # no salen en orden entre conexiones. Cada consumo queda en FolioConsumido
+    # dentro de la transacción del documento, así que los huecos se pueden
+    # reportar: lo asignado por la secuencia que no llegó a commit.
+    #
+    # Con ``reiniciar_anual`` hay una secuencia por año, de modo que el reinicio
+    # no necesita coordinar un ALTER SEQUENCE entre conexiones.
+
+    @property
+    def usa_secuencia(self):
+        return (
+            self.modo_asignacion == ModoAsignacionFolio.SECUENCIA
+            and connection.vendor == "postgresql"
+        )
+
+    def nombre_secuencia(self, anio_actual):
+        if self.reiniciar_anual:
+            return f"series_folios_{self.pk}_{anio_actual}"
+        return f"series_folios_{self.pk}"
+
+    def _crear_secuencia(self, nombre, anio_actual):
+        """Crea la secuencia si falta, arrancando donde se quedó ``folio_actual``."""
+        inicio = self._siguiente_consecutivo(anio_actual)
+        cache = max(1, self.tamano_bloque or 1)
+        try:
+            # Savepoint: si otra transacción la creó a la vez, Postgres responde
+            # con violación de unicidad en el catálogo; basta con usar la suya.
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"CREATE SEQUENCE IF NOT EXISTS {connection.ops.quote_name(nombre)} "
+                        f"START WITH {int(inicio)} CACHE {int(cache)}"
+                    )
+        except (IntegrityError, ProgrammingError):
+            pass
+
+    def ajustar_cache_secuencia(self, anio_actual=None):
+        """Aplica ``tamano_bloque`` al CACHE de la secuencia vigente (si existe).
+
+        ``_crear_secuencia`` sólo fija el CACHE al crearla; sin esto, cambiar
+        ``tamano_bloque`` después no tenía efecto. Las conexiones que ya
+        reservaron un bloque lo terminan de usar con el tamaño anterior.
+        """
+        if connection.vendor != "postgresql":
+            return False
+        anio_actual = anio_actual or self._anio_actual()
+        estado = self.estado_secuencia(anio_actual)
+        if estado is None:
+            return False
+        cache = max(1, self.tamano_bloque or 1)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER SEQUENCE {connection.ops.quote_name(estado[0])} CACHE {int(cache)}")
+        return True
+
+    def estado_secuencia(self, anio_actual=None):
+        """``(nombre, last_value, is_called)`` de la secuencia, o ``None`` si aún no existe."""
+        anio_actual = anio_actual or self._anio_actual()
+        nombre = self.nombre_secuencia(anio_actual)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [nombre])
+            if cursor.fetchone()[0] is None:
+                return None
+            cursor.execute(
+                f"SELECT last_value, is_called FROM {connection.ops.quote_name(nombre)}"
+            )
+            last_value, is_called = cursor.fetchone()
+        return nombre, last_value, is_called
+
+    def _consumir_de_secuencia(self):
+        anio_actual = self._anio_actual()
+        nombre = self.nombre_secuencia(anio_actual)
+        if self.estado_secuencia(anio_actual) is None:
+            self._crear_secuencia(nombre, anio_actual)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s)", [nombre])
+            consecutivo = cursor.fetchone()[0]
+        folio_formateado = self.formatear_folio(consecutivo, anio_actual)
+        FolioConsumido.objects.create(
+            serie_folio=self,
+            secuencia=nombre,
+            consecutivo=consecutivo,
+            folio=folio_formateado,
+        )
+        return folio_formateado, consecutivo, anio_actual
+
+    def consumir(self):
+        """Consume el siguiente folio de esta serie: ``(folio, consecutivo, anio)``.
+
+        Punto único para cualquier llamador que ya resolvió su ``SerieFolio``.
+        En modo FILA toma el bloqueo de la fila aquí (no hace falta que el
+        llamador la haya leído con select_for_update); en modo SECUENCIA no
+        bloquea nada. Lanza ``ValueError`` si el rango está agotado.
+        """
+        if self.usa_secuencia:
+            return self._consumir_de_secuencia()
+
+        with transaction.atomic():
+            serie = type(self).objects.select_for_update().get(pk=self.pk)
+            folio_formateado, nuevo_consecutivo, anio_actual = serie.get_siguiente_folio()
+            serie.folio_actual = nuevo_consecutivo
+            serie.ultimo_anio = anio_actual
+            serie.save(update_fields=["folio_actual", "ultimo_anio", "updated_at"])
+        self.folio_actual = nuevo_consecutivo
+        self.ultimo_anio = anio_actual
         return folio_formateado, nuevo_consecutivo, anio_actual
 
+    def sincronizar_desde_secuencia(self):
+        """Lleva ``folio_actual`` al último valor entregado por la secuencia.
+
+        Necesario antes de volver una serie a modo FILA (si no, repetiría
+        folios) y útil para que el admin muestre un consecutivo real.
+        """
+        anio_actual = self._anio_actual()
+        estado = self.estado_secuencia(anio_actual)
+        if estado is None:
+            return False
+        _, last_value, is_called = estado
+        ultimo = last_value if is_called else last_value - 1
+        with transaction.atomic():
+            serie = type(self).objects.select_for_update().get(pk=self.pk)
+            if ultimo > (serie.folio_actual or 0) or serie.ultimo_anio != anio_actual:
+                serie.folio_actual = ultimo
+                serie.ultimo_anio = anio_actual
+                serie.save(update_fields=["folio_actual", "ultimo_anio", "updated_at"])
+        self.folio_actual = serie.folio_actual
+        self.ultimo_anio = serie.ultimo_anio
+        return True
+
     @classmethod
     def resolve(cls, empresa_id, sucursal_id, tipos_documento, *, lock=False):
         """Busca SerieFolio activa probando uno o varios ``tipo_documento`` en orden.
@@ -321,7 +510,7 @@ class SerieFolio(StatusLifecycleModel):
         *,
         descripcion_documento=None,
     ):
-        """Resolve + lock TX + consume folio y persiste el consecutivo.
+        """Resolve + consume folio (``SerieFolio.consumir``) según el modo de la serie.
 
         Lanza ``django.core.exceptions.ValidationError`` si:
         - No existe ninguna SerieFolio activa para esos tipos_documento
@@ -329,7 +518,8 @@ class SerieFolio(StatusLifecycleModel):
         """
         from django.core.exceptions import ValidationError as DjangoValidationError
 
-        serie_folio = cls.resolve(empresa_id, sucursal_id, tipos_documento, lock=True)
+        # Sin lock aquí: ``consumir`` bloquea la fila sólo en modo FILA.
+        serie_folio = cls.resolve(empresa_id, sucursal_id, tipos_documento, lock=False)
         if serie_folio is None:
             from django.utils.functional import Promise
 
@@ -345,13 +535,9 @@ class SerieFolio(StatusLifecycleModel):
             )
 
         try:
-            folio_formateado, nuevo_consecutivo, anio_actual = serie_folio.get_siguiente_folio()
+            folio_formateado, _, _ = serie_folio.consumir()
         except ValueError as e:
             raise DjangoValidationError(str(e))
-
-        serie_folio.folio_actual = nuevo_consecutivo
-        serie_folio.ultimo_anio = anio_actual
-        serie_folio.save(update_fields=["folio_actual", "ultimo_anio", "updated_at"])
         return folio_formateado
 
     @classmethod
@@ -360,8 +546,23 @@ class SerieFolio(StatusLifecycleModel):
         serie_folio = cls.resolve(empresa_id, sucursal_id, tipos_documento, lock=False)
         if serie_folio is None:
             return None
+        return serie_folio.siguiente_folio_preview()
+
+    def siguiente_folio_preview(self):
+        """Siguiente folio de esta serie sin consumirlo. ``None`` si no se puede calcular.
+
+        En modo SECUENCIA es aproximado: con CACHE otra conexión puede tener ya
+        reservado el siguiente valor. Un preview nunca garantizó el folio final.
+        """
         try:
-            folio_formateado, _, _ = serie_folio.get_siguiente_folio()
+            if self.usa_secuencia:
+                anio_actual = self._anio_actual()
+                estado = self.estado_secuencia(anio_actual)
+                if estado is not None:
+                    _, last_value, is_called = estado
+                    siguiente = last_value + 1 if is_called else last_value
+                    return self.formatear_folio(siguiente, anio_actual)
+            folio_formateado, _, _ = self.get_siguiente_folio()
         except Exception:
             return None
         return folio_formateado
@@ -379,6 +580,57 @@ class SerieFolio(StatusLifecycleModel):
         self.save()
         return folio_formateado, nuevo_consecutivo, anio_actual
 
+class FolioConsumido(models.Model):
+    """Folio entregado por una serie en modo SECUENCIA.
+
+    Se inserta en la transacción del documento que lo usa: si el documento hace
+    rollback, el registro desaparece con él y el consecutivo queda como hueco
+    (asignado por la secuencia y sin registro). Sólo inserción, sin bloqueos.
+    """
+
+    serie_folio = models.ForeignKey(SerieFolio, on_delete=models.CASCADE, related_name="folios_consumidos")
+    secuencia = models.CharField(max_length=63)
+    consecutivo = models.PositiveIntegerField()
+    folio = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "folios_consumidos"
+        verbose_name = "Folio consumido"
+        verbose_name_plural = "Folios consumidos"
+        indexes = [
+            models.Index(fields=["serie_folio", "secuencia", "consecutivo"]),
+        ]
+
+    def __str__(self):
+        return self.folio
+
+
+class VersionCatalogo(models.Model):
+    """Versión vigente de un catálogo cacheado por ámbito (``nucleo/api/cache.py``).
+
+    Vive en la BD y no en el caché: con ``LocMemCache`` cada worker tiene su
+    propio caché y sólo así todos ven la invalidación en el siguiente request.
+    El token cambia (no se incrementa) en cada alta, cambio o baja del
+    catálogo; las respuestas cacheadas con el token anterior dejan de usarse.
+    """
+
+    catalogo = models.CharField(max_length=60)
+    ambito = models.CharField(max_length=40)
+    token = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "versiones_catalogo"
+        verbose_name = "Versión de catálogo"
+        verbose_name_plural = "Versiones de catálogo"
+        constraints = [
+            models.UniqueConstraint(fields=["catalogo", "ambito"], name="uq_version_catalogo_ambito"),
+        ]
+
+    def __str__(self):
+        return f"{self.catalogo}@{self.ambito}: {self.token}"
+
 # =========================
 # CATÁLOGOS SAT (Globales)
 # =========================
@@ -428,7 +680,46 @@ class SatFormaPago(models.Model):
     def __str__(self):
         return f"{self.codigo} - {self.descripcion}"
 
-class SatClaveProdServ(models.Model):
+def normalizar_busqueda(*partes):
+    """Texto de búsqueda: minúsculas, sin acentos y con espacios simples.
+
+    ``"Camisón de ALGODÓN"`` -> ``"camison de algodon"``. Se aplica igual a la
+    columna ``busqueda`` y al ``?q=`` para que "algodon" encuentre "Algodón".
+    """
+    texto = " ".join(str(p) for p in partes if p)
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+
+class SatClaveBuscable(models.Model):
+    """Catálogo SAT con columna ``busqueda`` (código + descripción normalizados).
+
+    En PostgreSQL la columna tiene un índice GIN ``gin_trgm_ops``
+    (``pg_trgm``): un ``LIKE '%texto%'`` sobre ella usa el índice en vez de
+    recorrer las ~52k claves de Prod/Serv. ``codigo`` lleva además un índice
+    ``varchar_pattern_ops`` para el ``LIKE 'prefijo%'`` de las búsquedas por
+    número. Ninguno de los dos está en ``Meta.indexes``: sólo existen en
+    Postgres y los crea la migración ``0017_sat_busqueda_trigram``, así que
+    la BD de pruebas en SQLite migra sin ellos. ``save`` recalcula la
+    columna; las cargas masivas (``cargar_catalogo_sat``) la calculan al
+    insertar.
+    """
+
+    busqueda = models.TextField(default="", editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.busqueda = normalizar_busqueda(self.codigo, self.descripcion)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"codigo", "descripcion"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"busqueda"}
+        super().save(*args, **kwargs)
+
+
+class SatClaveProdServ(SatClaveBuscable):
     id_sat_prodserv = models.BigAutoField(primary_key=True)
     codigo = models.CharField(max_length=20, unique=True)
     descripcion = models.CharField(max_length=255)
@@ -442,7 +733,7 @@ class SatClaveProdServ(models.Model):
     def __str__(self):
         return f"{self.codigo} - {self.descripcion}"
 
-class SatClaveUnidad(models.Model):
+class SatClaveUnidad(SatClaveBuscable):
     id_sat_unidad = models.BigAutoField(primary_key=True)
     codigo = models.CharField(max_length=10, unique=True)
     descripcion = models.CharField(max_length=255)
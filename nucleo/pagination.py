@@ -0,0 +1,221 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import F, Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorPaginacion(BasePagination):
+    """Paginación keyset por defecto del proyecto: ``(created_at, pk)`` descendente.
+
+    Cada página es un solo ``SELECT ... WHERE (fecha, pk) < cursor ORDER BY
+    fecha DESC, pk DESC LIMIT n+1``: no hay ``COUNT(*)`` ni ``OFFSET``, así que
+    el costo no crece con la página pedida ni con el tamaño de la tabla, y un
+    alta concurrente no desplaza renglones entre páginas.
+
+    - La fecha es ``created_at`` si el modelo la tiene; una vista puede elegir
+      otra con ``cursor_ordering`` (p.ej. ``"fecha_oc"`` o
+      ``"packing__created_at"``). Sin ninguna, se ordena sólo por pk.
+    - La fecha puede ser NULL (varias columnas ``created_at`` se agregaron
+      nullable): los NULL van al final (``nulls_last``, igual que los
+      ``order_by`` de los listados) y el cursor los recorre por pk.
+    - Reemplaza el ``order_by`` del queryset: el orden de la página lo fija el
+      cursor. Los listados ya ordenaban por esa misma fecha descendente.
+    - Un queryset ya recortado (``qs[:limit]``, p.ej. existencias) o un
+      ``list`` no se paginan: se devuelven completos como antes.
+
+    Catálogos chicos se excluyen con ``pagination_class = None`` en su vista.
+
+    Respuesta: ``{"next": url|null, "previous": url|null, "results": [...]}``.
+    """
+
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        try:
+            valor = int(raw) if raw else self.page_size
+        except (TypeError, ValueError):
+            valor = self.page_size
+        return max(1, min(valor, self.max_page_size))
+
+    # ---- campo de orden ----
+
+    def _campo_orden(self, model, view):
+        ruta = getattr(view, "cursor_ordering", None)
+        if ruta is None:
+            try:
+                model._meta.get_field("created_at")
+                ruta = "created_at"
+            except FieldDoesNotExist:
+                ruta = None
+        return ruta
+
+    @staticmethod
+    def _campo_modelo(model, ruta):
+        campo = None
+        for parte in ruta.split("__"):
+            campo = model._meta.get_field(parte)
+            if campo.is_relation:
+                model = campo.related_model
+        return campo
+
+    @staticmethod
+    def _valor(instancia, ruta):
+        valor = instancia
+        for parte in ruta.split("__"):
+            if valor is None:
+                return None
+            valor = getattr(valor, parte)
+        return valor
+
+    # ---- cursor ----
+
+    def _codificar(self, valor, pk, reverso):
+        if valor is not None and hasattr(valor, "isoformat"):
+            valor = valor.isoformat()
+        elif valor is not None:
+            valor = str(valor)
+        crudo = json.dumps({"v": valor, "p": pk, "r": reverso}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii")
+
+    def _decodificar(self, request, campo):
+        crudo = request.query_params.get(self.cursor_query_param)
+        if not crudo:
+            return None
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(crudo.encode("ascii")).decode("utf-8"))
+            valor = datos["v"]
+            if valor is not None and campo is not None:
+                valor = campo.to_python(valor)
+            return valor, datos["p"], bool(datos.get("r"))
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError, DjangoValidationError):
+            raise NotFound("Cursor inválido.")
+
+    # ---- keyset ----
+
+    @staticmethod
+    def _mas_viejos(ruta, valor, pk):
+        """Renglones que van después de ``(valor, pk)`` en orden DESC NULLS LAST."""
+        if ruta is None:
+            return Q(pk__lt=pk)
+        if valor is None:
+            return Q(**{f"{ruta}__isnull": True, "pk__lt": pk})
+        return (
+            Q(**{f"{ruta}__lt": valor})
+            | Q(**{ruta: valor, "pk__lt": pk})
+            | Q(**{f"{ruta}__isnull": True})
+        )
+
+    @staticmethod
+    def _mas_nuevos(ruta, valor, pk):
+        """Renglones que van antes de ``(valor, pk)`` en orden DESC NULLS LAST."""
+        if ruta is None:
+            return Q(pk__gt=pk)
+        if valor is None:
+            return Q(**{f"{ruta}__isnull": False}) | Q(**{f"{ruta}__isnull": True, "pk__gt": pk})
+        return Q(**{f"{ruta}__gt": valor}) | Q(**{ruta: valor, "pk__gt": pk})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not isinstance(queryset, QuerySet) or queryset.query.is_sliced:
+            return None
+
+        self.request = request
+        self.tamano = self.get_page_size(request)
+        self.ruta = self._campo_orden(queryset.model, view)
+        campo = self._campo_modelo(queryset.model, self.ruta) if self.ruta else None
+        cursor = self._decodificar(request, campo)
+
+        if self.ruta:
+            desc = (F(self.ruta).desc(nulls_last=True), "-pk")
+            asc = (F(self.ruta).asc(nulls_first=True), "pk")
+        else:
+            desc, asc = ("-pk",), ("pk",)
+
+        reverso = bool(cursor and cursor[2])
+        if cursor is None:
+            qs = queryset.order_by(*desc)
+        elif reverso:
+            qs = queryset.filter(self._mas_nuevos(self.ruta, cursor[0], cursor[1])).order_by(*asc)
+        else:
+            qs = queryset.filter(self._mas_viejos(self.ruta, cursor[0], cursor[1])).order_by(*desc)
+
+        filas = list(qs[: self.tamano + 1])
+        hay_mas = len(filas) > self.tamano
+        filas = filas[: self.tamano]
+        if reverso:
+            filas.reverse()
+
+        # Hacia atrás, "hay más" habla de la página anterior; hacia adelante,
+        # de la siguiente. El otro sentido existe siempre que se llegó con cursor.
+        self.hay_siguiente = (not reverso and hay_mas) or reverso
+        self.hay_anterior = (reverso and hay_mas) or (cursor is not None and not reverso)
+        self.primero = filas[0] if filas else None
+        self.ultimo = filas[-1] if filas else None
+        return filas
+
+    def _url(self, instancia, reverso):
+        url = self.request.build_absolute_uri()
+        cursor = self._codificar(self._valor(instancia, self.ruta) if self.ruta else None, instancia.pk, reverso)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.hay_siguiente or self.ultimo is None:
+            return None
+        return self._url(self.ultimo, reverso=False)
+
+    def get_previous_link(self):
+        if not self.hay_anterior:
+            return None
+        if self.primero is None:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self._url(self.primero, reverso=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Cursor opaco devuelto en next/previous.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Renglones por página (máx. {self.max_page_size}).",
+                "schema": {"type": "integer"},
+            },
+        ]
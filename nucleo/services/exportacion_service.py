@@ -0,0 +1,136 @@
+import csv
+import tempfile
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+#: Primer carácter con el que Excel/LibreOffice interpretan una celda de texto
+#: como fórmula (inyección de fórmulas en CSV/XLSX).
+PREFIJOS_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+
+class _Eco:
+    """Pseudo-archivo para ``csv.writer``: ``write`` devuelve la línea en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+class ExportacionService:
+    """Descarga de reportes como CSV o XLSX sin armar el archivo en memoria.
+
+    ``filas`` es un iterable de dicts (el mismo renglón que devuelve el JSON
+    del reporte) que se consume mientras se envía la respuesta:
+
+    - CSV: cada renglón se escribe y se envía en cuanto sale del iterable.
+    - XLSX: ``openpyxl`` en modo ``write_only`` va escribiendo los renglones a
+      un archivo temporal en disco (no los guarda en memoria); al terminar
+      se empaqueta el ``.xlsx`` y se envía en bloques de ``BLOQUE`` bytes.
+
+    En ambos casos la memoria del worker no crece con el número de renglones.
+    Las columnas de ``numericas`` (cantidades y costos, que el JSON manda
+    como texto) se escriben como número en el XLSX. Un texto que empieza como
+    fórmula (``=``, ``+``, ``-``, ``@``) y no es un número se escribe con un
+    apóstrofo delante: un nombre de producto capturado como
+    ``=HYPERLINK(...)`` no se ejecuta al abrir el archivo.
+    """
+
+    BLOQUE = 64 * 1024
+
+    @staticmethod
+    def formato(request, parametro="exportar"):
+        """``csv``/``xlsx`` si se pidió exportar, ``None`` para la respuesta JSON."""
+        valor = (request.query_params.get(parametro) or "").strip().lower()
+        if not valor:
+            return None
+        if valor not in FORMATOS:
+            raise ValidationError({parametro: f"Formato no soportado. Usa: {', '.join(FORMATOS)}."})
+        return valor
+
+    @classmethod
+    def respuesta(cls, formato, nombre, columnas, filas, numericas=()):
+        """``StreamingHttpResponse`` con ``filas`` en ``formato``.
+
+        ``columnas``: ``[(clave, encabezado), ...]`` en el orden del archivo.
+        """
+        if formato == "xlsx":
+            contenido = cls._xlsx(nombre, columnas, filas, set(numericas))
+        else:
+            contenido = cls._csv(columnas, filas)
+        response = StreamingHttpResponse(contenido, content_type=FORMATOS[formato])
+        response["Content-Disposition"] = f'attachment; filename="{nombre}.{formato}"'
+        return response
+
+    @staticmethod
+    def _texto_seguro(valor):
+        if not isinstance(valor, str) or not valor.startswith(PREFIJOS_FORMULA):
+            return valor
+        try:
+            # "-3.5000" es una cantidad, no una fórmula.
+            Decimal(valor)
+            return valor
+        except InvalidOperation:
+            return "'" + valor
+
+    @classmethod
+    def _celda_csv(cls, valor):
+        if isinstance(valor, datetime):
+            return timezone.localtime(valor).isoformat() if timezone.is_aware(valor) else valor.isoformat()
+        return "" if valor is None else cls._texto_seguro(valor)
+
+    @classmethod
+    def _csv(cls, columnas, filas):
+        escritor = csv.writer(_Eco())
+        # BOM: Excel abre el CSV como UTF-8 y respeta los acentos.
+        yield "\ufeff" + escritor.writerow([encabezado for _, encabezado in columnas])
+        for fila in filas:
+            yield escritor.writerow([cls._celda_csv(fila.get(clave)) for clave, _ in columnas])
+
+    @classmethod
+    def _celda_xlsx(cls, valor, numerica):
+        if valor is None:
+            return None
+        if isinstance(valor, datetime):
+            # Excel no admite zona horaria: se escribe la hora local.
+            return timezone.localtime(valor).replace(tzinfo=None) if timezone.is_aware(valor) else valor
+        if numerica:
+            try:
+                return Decimal(str(valor))
+            except InvalidOperation:
+                pass
+        return cls._texto_seguro(valor)
+
+    @classmethod
+    def _xlsx(cls, nombre, columnas, filas, numericas):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise ValidationError({"exportar": "Dependencia faltante para escribir Excel (openpyxl)."})
+
+        libro = Workbook(write_only=True)
+        hoja = libro.create_sheet(title=nombre[:31])
+        return cls._xlsx_bloques(libro, hoja, columnas, filas, numericas)
+
+    @classmethod
+    def _xlsx_bloques(cls, libro, hoja, columnas, filas, numericas):
+        hoja.append([encabezado for _, encabezado in columnas])
+        for fila in filas:
+            hoja.append([cls._celda_xlsx(fila.get(clave), clave in numericas) for clave, _ in columnas])
+
+        with tempfile.TemporaryFile() as archivo:
+            libro.save(archivo)
+            archivo.seek(0)
+            while True:
+                bloque = archivo.read(cls.BLOQUE)
+                if not bloque:
+                    break
+                yield bloque
@@ -0,0 +1,170 @@
+import csv
+import io
+from functools import reduce
+from operator import and_
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from rest_framework.exceptions import ValidationError
+
+from nucleo.api.cache import invalidar_catalogo
+from nucleo.models import normalizar_busqueda
+
+#: Palabras más cortas no filtran: ``pg_trgm`` no puede usar el índice con
+#: menos de tres letras y casi todas las descripciones contienen "de" o "y".
+MIN_LETRAS_FILTRO = 3
+
+
+class SatCatalogoService:
+    """Búsqueda y carga masiva de los catálogos SAT de claves (Prod/Serv, Unidad).
+
+    Búsqueda (``buscar``): el ``?q=`` se normaliza igual que la columna
+    ``busqueda`` (minúsculas, sin acentos) y cada palabra se filtra con
+    ``busqueda LIKE '%palabra%'``, que resuelve el índice GIN de trigramas.
+    El resultado viene ordenado (código exacto, prefijo de código, luego
+    ``word_similarity`` contra la descripción) y recortado a ``limite``: el
+    autocompletado pide las primeras N claves, no las miles que contienen
+    "servicio".
+
+    Fuera de PostgreSQL (la BD de pruebas en SQLite) no hay ``pg_trgm``: el
+    filtro es el mismo ``icontains`` por palabra, sin índice, y el orden
+    después del código es alfabético en lugar de ``word_similarity``.
+
+    Carga (``cargar``): ``COPY`` de las filas a una tabla temporal y un solo
+    ``INSERT ... ON CONFLICT (codigo) DO UPDATE`` hacia el catálogo, en vez de
+    un ``get_or_create`` por clave.
+    """
+
+    LIMITE = 20
+    LIMITE_MAX = 100
+
+    @classmethod
+    def limite(cls, valor):
+        """``?limit=`` acotado a ``[1, LIMITE_MAX]``; ``LIMITE`` si no viene o no es número."""
+        try:
+            limite = int(valor) if valor not in (None, "") else cls.LIMITE
+        except (TypeError, ValueError):
+            limite = cls.LIMITE
+        return max(1, min(limite, cls.LIMITE_MAX))
+
+    @classmethod
+    def buscar(cls, queryset, q, limite=None):
+        """Las ``limite`` claves de ``queryset`` que mejor coinciden con ``q``."""
+        limite = limite or cls.LIMITE
+        texto = normalizar_busqueda(q)
+        if not texto:
+            return queryset.none()
+
+        codigo = q.strip().upper()
+        postgres = connection.vendor == "postgresql"
+        contiene = "busqueda__contains" if postgres else "busqueda__icontains"
+        palabras = [p for p in texto.split() if len(p) >= MIN_LETRAS_FILTRO]
+        if palabras:
+            por_texto = reduce(and_, [Q(**{contiene: p}) for p in palabras])
+        else:
+            # Sólo palabras cortas ("kg", "h8"): prefijo del texto completo.
+            por_texto = Q(busqueda__startswith=texto)
+
+        queryset = queryset.filter(Q(codigo__startswith=codigo) | por_texto).annotate(
+            rango=Case(
+                When(codigo=codigo, then=Value(0)),
+                When(codigo__startswith=codigo, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            )
+        )
+        if not postgres:
+            return queryset.order_by("rango", "codigo")[:limite]
+        return queryset.annotate(similitud=TrigramWordSimilarity(texto, "busqueda")).order_by(
+            "rango", "-similitud", "codigo"
+        )[:limite]
+
+    # ------------------------------------------------------------------
+    # Carga masiva
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _filas_validas(modelo, filas):
+        max_codigo = modelo._meta.get_field("codigo").max_length
+        max_descripcion = modelo._meta.get_field("descripcion").max_length
+        for numero, (codigo, descripcion) in enumerate(filas, start=1):
+            codigo = (codigo or "").strip()
+            descripcion = " ".join((descripcion or "").split())
+            if not codigo:
+                continue
+            if len(codigo) > max_codigo:
+                raise ValidationError({"codigo": f"Fila {numero}: '{codigo}' excede {max_codigo} caracteres."})
+            yield codigo, descripcion[:max_descripcion], normalizar_busqueda(codigo, descripcion)
+
+    @staticmethod
+    def _copiar(cursor, tabla, filas):
+        """``COPY`` de ``filas`` a ``tabla``; devuelve cuántas se copiaron."""
+        total = 0
+        crudo = cursor.cursor
+        sql = f"COPY {tabla} (codigo, descripcion, busqueda) FROM STDIN"
+        if hasattr(crudo, "copy"):
+            # psycopg 3
+            with crudo.copy(sql) as copia:
+                for fila in filas:
+                    copia.write_row(fila)
+                    total += 1
+            return total
+        # psycopg2: el COPY lee un CSV en memoria.
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for fila in filas:
+            escritor.writerow(fila)
+            total += 1
+        buffer.seek(0)
+        crudo.copy_expert(f"{sql} WITH (FORMAT csv)", buffer)
+        return total
+
+    @classmethod
+    def cargar(cls, modelo, filas, catalogo_cache, desactivar_faltantes=False):
+        """Inserta o actualiza ``filas`` (``(codigo, descripcion)``) en ``modelo``.
+
+        Una clave repetida en el archivo se queda con su última descripción.
+        Las claves que ya estaban igual no se reescriben. Con
+        ``desactivar_faltantes`` las claves activas que no vienen en el archivo
+        quedan ``activo=False`` (el SAT da de baja claves entre versiones; los
+        productos que las usan conservan la FK).
+
+        Devuelve ``{"leidas", "escritas", "desactivadas"}``.
+        """
+        qn = connection.ops.quote_name
+        tabla = qn(modelo._meta.db_table)
+        temporal = qn(f"_carga_{modelo._meta.db_table}")
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {temporal} "
+                "(orden bigserial, codigo text, descripcion text, busqueda text) ON COMMIT DROP"
+            )
+            leidas = cls._copiar(cursor, temporal, cls._filas_validas(modelo, filas))
+            cursor.execute(
+                f"""
+                INSERT INTO {tabla} AS t (codigo, descripcion, busqueda, activo)
+                SELECT DISTINCT ON (codigo) codigo, descripcion, busqueda, TRUE
+                  FROM {temporal}
+                 ORDER BY codigo, orden DESC
+                ON CONFLICT (codigo) DO UPDATE
+                   SET descripcion = EXCLUDED.descripcion,
+                       busqueda = EXCLUDED.busqueda,
+                       activo = TRUE
+                 WHERE (t.descripcion, t.busqueda, t.activo)
+                       IS DISTINCT FROM (EXCLUDED.descripcion, EXCLUDED.busqueda, TRUE)
+                """
+            )
+            escritas = cursor.rowcount
+            desactivadas = 0
+            if desactivar_faltantes and leidas:
+                cursor.execute(
+                    f"""
+                    UPDATE {tabla} AS t SET activo = FALSE
+                     WHERE t.activo
+                       AND NOT EXISTS (SELECT 1 FROM {temporal} c WHERE c.codigo = t.codigo)
+                    """
+                )
+                desactivadas = cursor.rowcount
+            # Sin señales de por medio: la invalidación del caché va a mano.
+            transaction.on_commit(lambda: invalidar_catalogo(catalogo_cache))
+        return {"leidas": leidas, "escritas": escritas, "desactivadas": desactivadas}
@@ -0,0 +1,734 @@
+"""Tests de ``nucleo``: asignación de folios (``SerieFolio``: modos FILA y
+SECUENCIA, huecos, caché de la secuencia), perfilado de la API
+(``APILoggingMiddleware`` con ``API_PROFILING`` y ``manage.py perfil_api``),
+caché de catálogos (``nucleo/api/cache.py``), búsqueda y carga de los
+catálogos SAT de claves (``SatCatalogoService``, ``cargar_catalogo_sat``),
+exportación de reportes a CSV/XLSX (``ExportacionService``), vistas con import
+diferido (``nucleo/vistas_diferidas.py``) y ``manage.py perfil_arranque``.
+
+Ejecutar SIEMPRE con una BD desechable; el ``.env`` del repo apunta a Supabase
+de producción. Ejemplo con un settings de override a SQLite en memoria (los
+tests de SECUENCIA y de la carga con COPY se saltan fuera de Postgres):
+
+    python manage.py test nucleo --settings=sqlite_settings
+"""
+
+import csv
+import json
+import sys
+import tempfile
+import time
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import path, resolve, reverse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from nucleo.api.cache import AMBITO_GLOBAL, AMBITO_TODAS, respuesta_cacheada, versiones
+from nucleo.management.commands.cargar_catalogo_sat import Command as CargarCatalogoSat
+from nucleo.management.commands.perfil_arranque import parsear_importtime
+from nucleo.middleware import APILoggingMiddleware, NoCacheMiddleware
+from nucleo.models import (
+    Empresa,
+    FolioConsumido,
+    ModoAsignacionFolio,
+    Moneda,
+    SatClaveProdServ,
+    SerieFolio,
+    Sucursal,
+    VersionCatalogo,
+)
+from nucleo.services.exportacion_service import ExportacionService
+from nucleo.services.sat_catalogo_service import SatCatalogoService
+from nucleo.vistas_diferidas import VistaDiferida, vista_diferida
+from usuarios.models import Usuario
+
+
+class SerieFolioTests(TestCase):
+    """Consumo de folios en modo FILA y SECUENCIA, huecos y sincronización."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="fol", razon_social="Folios SA")
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, codigo="MTY", nombre="MTY")
+
+    def _serie(self, modo=ModoAsignacionFolio.FILA, **extra):
+        return SerieFolio.objects.create(
+            empresa=self.empresa, sucursal=self.sucursal, tipo_documento="Pedido",
+            serie="PED", folio_actual=5, relleno_ceros=4, modo_asignacion=modo, **extra,
+        )
+
+    def test_fila_consume_consecutivos_sin_registrar_consumidos(self):
+        serie = self._serie()
+
+        self.assertEqual(serie.consumir()[:2], ("PED-0006", 6))
+        self.assertEqual(serie.consumir()[:2], ("PED-0007", 7))
+
+        serie.refresh_from_db()
+        self.assertEqual(serie.folio_actual, 7)
+        self.assertFalse(FolioConsumido.objects.exists())
+
+    @skipUnless(connection.vendor == "postgresql", "El modo SECUENCIA requiere PostgreSQL.")
+    def test_secuencia_arranca_en_folio_actual_y_registra_cada_consumo(self):
+        serie = self._serie(ModoAsignacionFolio.SECUENCIA)
+
+        folios = [serie.consumir()[0] for _ in range(2)]
+
+        self.assertEqual(folios, ["PED-0006", "PED-0007"])
+        self.assertEqual(
+            list(FolioConsumido.objects.filter(serie_folio=serie).order_by("consecutivo").values_list("consecutivo", flat=True)),
+            [6, 7],
+        )
+        # La secuencia no toca la fila: folio_actual sigue donde estaba.
+        serie.refresh_from_db()
+        self.assertEqual(serie.folio_actual, 5)
+
+    @skipUnless(connection.vendor == "postgresql", "El modo SECUENCIA requiere PostgreSQL.")
+    def test_rollback_deja_hueco_reportado_y_sincronizar_lo_salta(self):
+        serie = self._serie(ModoAsignacionFolio.SECUENCIA)
+        serie.consumir()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                serie.consumir()  # 7: nextval no se revierte
+                raise RuntimeError("rollback del documento")
+        serie.consumir()
+
+        self.assertEqual(
+            set(FolioConsumido.objects.filter(serie_folio=serie).values_list("consecutivo", flat=True)),
+            {6, 8},
+        )
+        salida = StringIO()
+        call_command("huecos_folios", serie=serie.pk, sincronizar=True, stdout=salida)
+        self.assertIn("huecos 1 [7]", salida.getvalue())
+
+        serie.refresh_from_db()
+        self.assertEqual(serie.folio_actual, 8)
+        serie.modo_asignacion = ModoAsignacionFolio.FILA
+        serie.save(update_fields=["modo_asignacion", "updated_at"])
+        self.assertEqual(serie.consumir()[1], 9)
+
+    @skipUnless(connection.vendor == "postgresql", "El modo SECUENCIA requiere PostgreSQL.")
+    def test_cambiar_tamano_bloque_ajusta_el_cache_de_la_secuencia(self):
+        serie = self._serie(ModoAsignacionFolio.SECUENCIA)
+        serie.consumir()
+        serie = SerieFolio.objects.get(pk=serie.pk)
+
+        serie.tamano_bloque = 20
+        serie.save()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT cache_size FROM pg_sequences WHERE sequencename = %s",
+                [serie.nombre_secuencia(serie._anio_actual())],
+            )
+            self.assertEqual(cursor.fetchone()[0], 20)
+
+
+def _consulta():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def _lenta(execute, sql, params, many, context):
+    """``execute_wrapper`` interno: hace lenta sólo la consulta marcada."""
+    if "lenta" in sql:
+        time.sleep(0.03)
+    return execute(sql, params, many, context)
+
+
+@override_settings(API_PROFILING=True, API_PROFILING_MUESTRA=1.0)
+class PerfilConsultasMiddlewareTests(TestCase):
+    """Registro por request de ``APILoggingMiddleware`` con ``API_PROFILING``."""
+
+    def _request(self, ruta="/api/v1/prueba/"):
+        request = RequestFactory().get(ruta)
+        request.user = AnonymousUser()
+        return request
+
+    def _registros(self, perfil_logger):
+        return [llamada.kwargs for llamada in perfil_logger.info.call_args_list]
+
+    @patch("nucleo.middleware.perfil_logger")
+    def test_registra_consultas_duracion_y_la_consulta_mas_lenta(self, perfil_logger):
+        def vista(request):
+            with connection.execute_wrapper(_lenta):
+                for _ in range(3):
+                    _consulta()
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 2 AS lenta")
+            return HttpResponse("ok")
+
+        APILoggingMiddleware(vista)(self._request())
+
+        [registro] = self._registros(perfil_logger)
+        self.assertEqual(registro["consultas"], 4)
+        self.assertEqual(registro["status"], 200)
+        self.assertGreaterEqual(registro["duracion_ms"], 30)
+        self.assertGreaterEqual(registro["db_ms"], 30)
+        self.assertGreaterEqual(registro["consulta_mas_lenta_ms"], 30)
+        self.assertIn("lenta", registro["consulta_mas_lenta"])
+
+    @patch("nucleo.middleware.perfil_logger")
+    def test_streaming_cuenta_las_consultas_del_cuerpo_y_registra_al_cerrar(self, perfil_logger):
+        def cuerpo():
+            for i in range(3):
+                _consulta()
+                yield f"fila {i}\n"
+
+        def vista(request):
+            _consulta()
+            return StreamingHttpResponse(cuerpo())
+
+        response = APILoggingMiddleware(vista)(self._request())
+        self.assertEqual(self._registros(perfil_logger), [])
+
+        self.assertEqual(b"".join(response.streaming_content), b"fila 0\nfila 1\nfila 2\n")
+        response.close()
+
+        [registro] = self._registros(perfil_logger)
+        self.assertEqual(registro["consultas"], 4)
+        # Entre pedazos y al terminar el perfil no queda instalado en la conexión.
+        self.assertEqual(connection.execute_wrappers, [])
+
+    @patch("nucleo.middleware.perfil_logger")
+    def test_fuera_de_api_no_perfila(self, perfil_logger):
+        APILoggingMiddleware(lambda request: HttpResponse("ok"))(self._request("/QA/"))
+
+        self.assertEqual(self._registros(perfil_logger), [])
+
+
+class PerfilApiCommandTests(TestCase):
+    """``manage.py perfil_api`` sobre un ``api_profiling.log`` sembrado."""
+
+    def _log(self, registros):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        archivo = Path(directorio.name) / "api_profiling.log"
+        lineas = [json.dumps({"event": "api_request", **r}) for r in registros]
+        archivo.write_text("\n".join(lineas + ["no es json"]) + "\n", encoding="utf-8")
+        return archivo
+
+    def test_agrega_percentiles_consultas_y_la_consulta_mas_lenta_por_vista(self):
+        registros = [
+            {"vista": "api:pedido-list", "duracion_ms": float(ms), "consultas": 12, "db_ms": 5.0,
+             "status": 200, "consulta_mas_lenta_ms": 1.0, "consulta_mas_lenta": "SELECT rapida"}
+            for ms in range(1, 101)
+        ]
+        registros.append(
+            {"vista": "api:pedido-list", "duracion_ms": 900.0, "consultas": 250, "db_ms": 800.0,
+             "status": 500, "consulta_mas_lenta_ms": 750.0, "consulta_mas_lenta": "SELECT lenta"}
+        )
+        registros.append({"vista": "api:moneda-list", "duracion_ms": 3.0, "consultas": 1, "status": 200})
+        salida = StringIO()
+
+        call_command("perfil_api", archivo=str(self._log(registros)), json=True, stdout=salida)
+
+        resumen = json.loads(salida.getvalue())
+        self.assertEqual(list(resumen), ["api:pedido-list", "api:moneda-list"])
+        pedidos = resumen["api:pedido-list"]
+        self.assertEqual(pedidos["requests"], 101)
+        self.assertEqual(pedidos["errores"], 1)
+        self.assertEqual(pedidos["p50"], 51.0)
+        self.assertEqual(pedidos["p95"], 96.0)
+        self.assertEqual(pedidos["consultas_max"], 250)
+        self.assertEqual(pedidos["consulta_mas_lenta"], "SELECT lenta")
+
+    def test_filtra_por_vista(self):
+        registros = [
+            {"vista": "api:pedido-list", "duracion_ms": 10.0, "consultas": 2, "status": 200},
+            {"vista": "api:moneda-list", "duracion_ms": 3.0, "consultas": 1, "status": 200},
+        ]
+        salida = StringIO()
+
+        call_command("perfil_api", archivo=str(self._log(registros)), vista="moneda", json=True, stdout=salida)
+
+        self.assertEqual(list(json.loads(salida.getvalue())), ["api:moneda-list"])
+
+
+class CatalogoCacheTests(TestCase):
+    """Versiones en BD, llave por ámbito, invalidación al confirmar y 304."""
+
+    MONEDAS_URL = "/api/v1/nucleo/monedas/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="cat", razon_social="Catálogos SA")
+        cls.otra_empresa = Empresa.objects.create(codigo="cat2", razon_social="Otra SA")
+        cls.usuario = Usuario.objects.create(username="catalogos", empresa=cls.empresa)
+
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get(self.MONEDAS_URL)
+
+    def _cacheada(self, ambitos, datos):
+        llamadas = []
+
+        def generar():
+            llamadas.append(1)
+            return Response(datos)
+
+        response = respuesta_cacheada(self.request, ["monedas"], ambitos, generar)
+        return response.data, len(llamadas)
+
+    def test_llave_separa_ambitos_aunque_los_tokens_coincidan(self):
+        self.assertEqual(self._cacheada([AMBITO_GLOBAL, "1"], ["MXN"]), (["MXN"], 1))
+        self.assertEqual(self._cacheada([AMBITO_GLOBAL, "1"], ["otra"]), (["MXN"], 0))
+        # Ninguno de los dos ámbitos tiene versión: ambos valen "0".
+        self.assertEqual(self._cacheada([AMBITO_GLOBAL, "2"], ["USD"]), (["USD"], 1))
+
+    def test_invalida_al_confirmar_y_sin_limpiar_el_cache_local(self):
+        self._cacheada([AMBITO_GLOBAL, str(self.empresa.pk)], ["viejo"])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Moneda.objects.create(empresa=self.empresa, codigo_iso="EUR", nombre="Euro")
+            self.assertEqual(versiones(["monedas"], [str(self.empresa.pk)]), ["0"])
+        self.assertEqual(len(callbacks), 1)
+
+        # El caché local sigue teniendo la respuesta vieja (como otro worker),
+        # pero el token de la BD ya no la alcanza.
+        self.assertEqual(
+            self._cacheada([AMBITO_GLOBAL, str(self.empresa.pk)], ["nuevo"]), (["nuevo"], 1)
+        )
+        self.assertEqual(versiones(["monedas"], [AMBITO_GLOBAL]), ["0"])
+        self.assertNotEqual(versiones(["monedas"], [AMBITO_TODAS]), ["0"])
+
+    def test_cambiar_de_empresa_invalida_el_ambito_anterior_y_el_nuevo(self):
+        moneda = Moneda.objects.create(empresa=self.empresa, codigo_iso="EUR", nombre="Euro")
+        VersionCatalogo.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moneda.empresa = self.otra_empresa
+            moneda.save()
+
+        self.assertEqual(
+            set(VersionCatalogo.objects.values_list("ambito", flat=True)),
+            {str(self.empresa.pk), str(self.otra_empresa.pk), AMBITO_TODAS},
+        )
+
+    def test_ruta_exenta_conserva_etag_y_revalida_con_304(self):
+        Moneda.objects.create(codigo_iso="MXN", nombre="Peso")
+        client = APIClient()
+        client.force_authenticate(self.usuario)
+
+        response = client.get(self.MONEDAS_URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        revalidada = client.get(self.MONEDAS_URL, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidada.status_code, 304)
+
+    def test_no_store_fuera_de_las_exentas_o_sin_cache_control_de_la_vista(self):
+        def con_cabecera(request):
+            response = HttpResponse("ok")
+            response["Cache-Control"] = "private, no-cache"
+            return response
+
+        middleware = NoCacheMiddleware(con_cabecera)
+        exenta = middleware(RequestFactory().get(self.MONEDAS_URL))
+        no_exenta = middleware(RequestFactory().get("/api/v1/ventas/pedidos/"))
+        sin_cabecera = NoCacheMiddleware(lambda request: HttpResponse("ok"))(
+            RequestFactory().post(self.MONEDAS_URL)
+        )
+
+        self.assertEqual(exenta["Cache-Control"], "private, no-cache")
+        self.assertIn("no-store", no_exenta["Cache-Control"])
+        self.assertIn("no-store", sin_cabecera["Cache-Control"])
+
+
+class SatCatalogoBusquedaTests(TestCase):
+    """``SatCatalogoService.buscar``: filtro por palabras, orden y límite.
+
+    Corre igual en SQLite (``icontains``, orden alfabético tras el código) y
+    en Postgres (trigramas); los casos no dependen del ``word_similarity``.
+    """
+
+    URL = "/api/v1/nucleo/sat/prod-serv/"
+
+    @classmethod
+    def setUpTestData(cls):
+        for codigo, descripcion, activo in (
+            ("43211500", "Computadoras", True),
+            ("43211501", "Servidores de computadoras", True),
+            ("43211507", "Computadoras de escritorio", True),
+            ("53101602", "Camisón de ALGODÓN", True),
+            ("10101500", "Animales vivos de granja", True),
+            ("43211508", "Computadoras portátiles", False),
+        ):
+            SatClaveProdServ.objects.create(codigo=codigo, descripcion=descripcion, activo=activo)
+        cls.usuario = Usuario.objects.create(
+            username="sat", empresa=Empresa.objects.create(codigo="sat", razon_social="SAT SA")
+        )
+
+    def _codigos(self, q, limite=None):
+        qs = SatClaveProdServ.objects.filter(activo=True)
+        return [c.codigo for c in SatCatalogoService.buscar(qs, q, limite)]
+
+    def test_codigo_exacto_y_prefijo_van_primero(self):
+        self.assertEqual(self._codigos("43211501")[0], "43211501")
+        self.assertEqual(self._codigos("4321150"), ["43211500", "43211501", "43211507"])
+
+    def test_sin_acentos_ni_mayusculas_y_cada_palabra_filtra(self):
+        self.assertEqual(self._codigos("camison algodon"), ["53101602"])
+        self.assertEqual(self._codigos("Camisón de Algodón"), ["53101602"])
+        self.assertEqual(self._codigos("camison seda"), [])
+        self.assertEqual(self._codigos("computadoras escritorio"), ["43211507"])
+
+    def test_limite_y_texto_vacio(self):
+        self.assertEqual(len(self._codigos("computadoras", limite=2)), 2)
+        self.assertEqual(self._codigos("   "), [])
+        self.assertEqual(SatCatalogoService.limite("500"), SatCatalogoService.LIMITE_MAX)
+        self.assertEqual(SatCatalogoService.limite("0"), 1)
+        self.assertEqual(SatCatalogoService.limite("abc"), SatCatalogoService.LIMITE)
+
+    def test_save_recalcula_la_columna_busqueda(self):
+        clave = SatClaveProdServ.objects.get(codigo="10101500")
+        clave.descripcion = "Gallinas ponedoras"
+        clave.save(update_fields=["descripcion"])
+
+        self.assertEqual(self._codigos("ponedoras"), ["10101500"])
+        self.assertEqual(self._codigos("granja"), [])
+
+    def test_endpoint_devuelve_lista_recortada_sin_inactivas(self):
+        client = APIClient()
+        client.force_authenticate(user=self.usuario)
+
+        response = client.get(self.URL, {"q": "computadoras portatiles"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+        response = client.get(self.URL, {"q": "computadoras", "limit": 1})
+        self.assertEqual([c["codigo"] for c in response.json()], ["43211500"])
+
+
+class CargarCatalogoSatCommandTests(TestCase):
+    """``manage.py cargar_catalogo_sat``: lectura del archivo y carga con COPY."""
+
+    def _csv(self, renglones):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ruta = Path(carpeta.name) / "c_ClaveProdServ.csv"
+        ruta.write_text("\n".join(",".join(r) for r in renglones), encoding="utf-8-sig")
+        return ruta
+
+    def _cargar(self, ruta, *opciones):
+        salida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("cargar_catalogo_sat", str(ruta), "--catalogo", "prodserv", *opciones, stdout=salida)
+        return salida.getvalue()
+
+    def test_filas_salta_el_titulo_y_ubica_columnas_sin_acentos(self):
+        renglones = [
+            ["Catálogo de productos/servicios", ""],
+            ["Versión", "1.0"],
+            ["Descripcion", "C_CLAVEPRODSERV"],
+            ["Computadoras", 43211500.0],
+            ["", ""],
+            ["Sin clave", ""],
+        ]
+        filas = list(CargarCatalogoSat._filas(renglones, "c_ClaveProdServ", "Descripción"))
+        self.assertEqual(filas, [("43211500", "Computadoras")])
+
+    def test_sin_encabezado_o_formato_no_soportado(self):
+        with self.assertRaises(CommandError):
+            list(CargarCatalogoSat._filas([["a", "b"]], "c_ClaveProdServ", "Descripción"))
+        if connection.vendor == "postgresql":
+            with self.assertRaisesMessage(CommandError, "Formato no soportado"):
+                call_command("cargar_catalogo_sat", __file__, "--catalogo", "prodserv")
+
+    @skipUnless(connection.vendor != "postgresql", "Sólo aplica fuera de PostgreSQL.")
+    def test_fuera_de_postgres_rechaza_la_carga(self):
+        with self.assertRaisesMessage(CommandError, "COPY"):
+            call_command("cargar_catalogo_sat", __file__, "--catalogo", "prodserv")
+
+    @skipUnless(connection.vendor == "postgresql", "La carga usa COPY de PostgreSQL.")
+    def test_carga_inserta_actualiza_y_desactiva_faltantes(self):
+        SatClaveProdServ.objects.create(codigo="43211500", descripcion="Computadora vieja")
+        SatClaveProdServ.objects.create(codigo="99999999", descripcion="Dada de baja")
+        version = versiones(["sat_prodserv"], [AMBITO_GLOBAL])
+
+        salida = self._cargar(
+            self._csv(
+                [
+                    ["Catálogo c_ClaveProdServ"],
+                    ["c_ClaveProdServ", "Descripción"],
+                    ["43211500", "Computadoras"],
+                    ["53101602", "Camisón de algodón"],
+                    ["53101602", "Camisón de ALGODÓN"],
+                ]
+            ),
+            "--desactivar-faltantes",
+        )
+
+        self.assertIn("3 leídas, 2 nuevas o cambiadas, 1 desactivadas", salida)
+        claves = {c.codigo: c for c in SatClaveProdServ.objects.all()}
+        self.assertEqual(claves["43211500"].descripcion, "Computadoras")
+        # La repetida se queda con su última descripción, ya normalizada.
+        self.assertEqual(claves["53101602"].busqueda, "53101602 camison de algodon")
+        self.assertFalse(claves["99999999"].activo)
+        self.assertNotEqual(versiones(["sat_prodserv"], [AMBITO_GLOBAL]), version)
+
+        # Recargar lo mismo no reescribe nada.
+        salida = self._cargar(self._csv([["c_ClaveProdServ", "Descripción"], ["43211500", "Computadoras"]]))
+        self.assertIn("1 leídas, 0 nuevas o cambiadas, 0 desactivadas", salida)
+
+
+class ExportacionServiceTests(SimpleTestCase):
+    """``ExportacionService``: el cuerpo se arma al iterar y escapa lo necesario."""
+
+    COLUMNAS = [("nombre", "Nombre"), ("cantidad", "Cantidad"), ("nota", "Nota")]
+
+    def _filas(self, consumidas):
+        filas = [
+            {"nombre": 'Tela, "cruda"', "cantidad": "-3.5000", "nota": "línea 1\nlínea 2"},
+            {"nombre": '=HYPERLINK("http://x","clic")', "cantidad": "10.0000", "nota": "@SUM(A1)"},
+            {"nombre": "Hilo; rojo", "cantidad": None, "nota": "+52 81 0000"},
+        ]
+        for fila in filas:
+            consumidas.append(fila)
+            yield fila
+
+    def test_formato(self):
+        request = RequestFactory().get("/", {"exportar": " XLSX "})
+        self.assertEqual(ExportacionService.formato(Request(request)), "xlsx")
+        self.assertIsNone(ExportacionService.formato(Request(RequestFactory().get("/"))))
+        with self.assertRaises(ValidationError):
+            ExportacionService.formato(Request(RequestFactory().get("/", {"exportar": "pdf"})))
+
+    def test_csv_se_genera_al_iterar_y_escapa_separadores_y_formulas(self):
+        consumidas = []
+        response = ExportacionService.respuesta("csv", "reporte", self.COLUMNAS, self._filas(consumidas))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="reporte.csv"')
+        self.assertEqual(consumidas, [])
+
+        partes = []
+        for parte in response.streaming_content:
+            partes.append(parte)
+            # Cada renglón sale en cuanto se lee, no al final.
+            self.assertLessEqual(len(consumidas), len(partes))
+        cuerpo = b"".join(partes).decode("utf-8")
+
+        self.assertTrue(cuerpo.startswith("\ufeff"))
+        renglones = list(csv.reader(StringIO(cuerpo[1:])))
+        self.assertEqual(
+            renglones,
+            [
+                ["Nombre", "Cantidad", "Nota"],
+                ['Tela, "cruda"', "-3.5000", "línea 1\nlínea 2"],
+                ['\'=HYPERLINK("http://x","clic")', "10.0000", "'@SUM(A1)"],
+                ["Hilo; rojo", "", "'+52 81 0000"],
+            ],
+        )
+
+    @skipUnless(find_spec("openpyxl"), "Requiere openpyxl.")
+    def test_xlsx_numericas_como_numero_y_formulas_como_texto(self):
+        from openpyxl import load_workbook
+
+        consumidas = []
+        response = ExportacionService.respuesta(
+            "xlsx", "reporte", self.COLUMNAS, self._filas(consumidas), numericas=("cantidad",)
+        )
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="reporte.xlsx"')
+        self.assertEqual(consumidas, [])
+
+        libro = load_workbook(BytesIO(b"".join(response.streaming_content)))
+        hoja = libro["reporte"]
+        renglones = [list(r) for r in hoja.iter_rows(values_only=True)]
+
+        self.assertEqual(len(renglones), 4)
+        self.assertEqual(renglones[0], ["Nombre", "Cantidad", "Nota"])
+        self.assertEqual(renglones[1][:2], ['Tela, "cruda"', -3.5])
+        self.assertEqual(renglones[2][0], '\'=HYPERLINK("http://x","clic")')
+        self.assertEqual(hoja["A3"].data_type, "s")
+        self.assertEqual(renglones[3][1:], [None, "'+52 81 0000"])
+
+
+# Vistas de prueba para ``vista_diferida``; ``urlpatterns`` hace de este módulo
+# el URLconf de ``VistaDiferidaTests`` (``ROOT_URLCONF="nucleo.tests"``).
+def vista_funcion(request, pk=None):
+    return HttpResponse(f"funcion {request.method} {pk}")
+
+
+@csrf_exempt
+def vista_funcion_exenta(request):
+    return HttpResponse("exenta")
+
+
+class VistaClase(View):
+    saludo = "hola"
+
+    def get(self, request):
+        return HttpResponse(self.saludo)
+
+    def post(self, request):
+        return HttpResponse("post")
+
+
+urlpatterns = [
+    path("funcion/<int:pk>/", vista_diferida("nucleo.tests.vista_funcion"), name="prueba_funcion"),
+    path("exenta/", vista_diferida("nucleo.tests.vista_funcion_exenta", csrf_exempt=True), name="prueba_exenta"),
+    path("clase/", vista_diferida("nucleo.tests.VistaClase", as_view=True, saludo="adiós"), name="prueba_clase"),
+]
+
+
+@override_settings(ROOT_URLCONF="nucleo.tests")
+class VistaDiferidaTests(SimpleTestCase):
+    """``vista_diferida``: la ruta existe sin importar su módulo hasta el primer request."""
+
+    # Vistas diferidas de ERP/urls.py, QA/urls.py e ia/: (nombre, módulo).
+    DIFERIDAS = [
+        ("ai_chat", "ia.api.views"),
+        ("google_gmail_send", "ia.api.views"),
+        ("ia_creator", "ia.views"),
+        ("qa_scanner_rfid_receive", "QA.views"),
+        ("simulation_get_scans", "QA.views"),
+        ("schema", "drf_spectacular.views"),
+    ]
+
+    @override_settings(ROOT_URLCONF="ERP.urls")
+    def test_reverse_y_resolve_no_importan_el_modulo(self):
+        modulos = {modulo for _, modulo in self.DIFERIDAS}
+        with patch.dict(sys.modules):
+            for modulo in modulos:
+                sys.modules.pop(modulo, None)
+
+            rutas = {nombre: reverse(nombre) for nombre, _ in self.DIFERIDAS}
+            match = resolve(rutas["ai_chat"])
+
+            self.assertEqual(modulos & set(sys.modules), set())
+        self.assertEqual(rutas["ai_chat"], "/api/v1/ai/chat/")
+        # El middleware de logging ve la ruta real de la vista.
+        self.assertEqual(match._func_path, "ia.api.views.AIAssistantAPIView")
+
+    def test_despacho_de_vista_funcion(self):
+        response = self.client.get(reverse("prueba_funcion", args=[7]))
+
+        self.assertEqual(response.content, b"funcion GET 7")
+
+    def test_despacho_de_vista_de_clase_con_initkwargs(self):
+        self.assertEqual(self.client.get("/clase/").content, "adiós".encode("utf-8"))
+
+    def test_la_vista_se_importa_una_sola_vez(self):
+        diferida = vista_diferida("nucleo.tests.vista_funcion")
+        request = RequestFactory().get("/")
+
+        with patch("nucleo.vistas_diferidas.import_string", return_value=vista_funcion) as importar:
+            diferida(request)
+            diferida(request)
+
+        importar.assert_called_once_with("nucleo.tests.vista_funcion")
+
+    def test_csrf_exempt_se_lee_antes_de_importar(self):
+        client = Client(enforce_csrf_checks=True)
+
+        self.assertEqual(client.post("/exenta/").status_code, 200)
+        self.assertEqual(client.post("/clase/").status_code, 403)
+
+    def test_csrf_exempt_que_no_coincide_falla(self):
+        request = RequestFactory().get("/")
+        casos = [
+            vista_diferida("nucleo.tests.vista_funcion", csrf_exempt=True),
+            vista_diferida("nucleo.tests.vista_funcion_exenta"),
+            vista_diferida("ia.api.views.AIAssistantAPIView", as_view=True),
+        ]
+        for diferida in casos:
+            with self.subTest(diferida=diferida):
+                with self.assertRaises(ImproperlyConfigured):
+                    diferida(request)
+
+    def test_atributos_privados_no_importan(self):
+        diferida = VistaDiferida("nucleo.tests.vista_funcion")
+
+        with patch("nucleo.vistas_diferidas.import_string") as importar:
+            self.assertFalse(hasattr(diferida, "view_class"))
+            self.assertFalse(hasattr(diferida, "_is_coroutine"))
+
+        importar.assert_not_called()
+
+
+@skipUnless(find_spec("drf_spectacular"), "Requiere drf-spectacular.")
+class EsquemaVistasDiferidasTests(TestCase):
+    """drf-spectacular resuelve ``cls``/``initkwargs`` de la vista diferida."""
+
+    def test_el_esquema_lista_los_endpoints_diferidos(self):
+        from drf_spectacular.generators import SchemaGenerator
+
+        esquema = SchemaGenerator().get_schema(request=None, public=True)
+
+        for ruta in (
+            "/api/v1/ai/chat/",
+            "/api/v1/ai/google/calendar/events/",
+            "/api/v1/ai/google/gmail/messages/{msg_id}/",
+        ):
+            self.assertIn(ruta, esquema["paths"])
+        self.assertIn("post", esquema["paths"]["/api/v1/ai/chat/"])
+
+
+class PerfilArranqueTests(SimpleTestCase):
+    SALIDA = "\n".join(
+        [
+            "#fase wsgi",
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   django.utils",
+            "import time:      3000 |       3120 | django",
+            "#fase urls",
+            "import time:       500 |        900 |     nucleo.vistas_diferidas",
+            "renglón ajeno",
+        ]
+    )
+
+    def test_parsear_importtime_atribuye_la_fase(self):
+        self.assertEqual(
+            list(parsear_importtime(self.SALIDA)),
+            [
+                ("wsgi", "django.utils", 120, 120, 1),
+                ("wsgi", "django", 3000, 3120, 0),
+                ("urls", "nucleo.vistas_diferidas", 500, 900, 2),
+            ],
+        )
+
+    def test_proceso_que_falla_reporta_su_ultimo_error(self):
+        fallido = SimpleNamespace(
+            returncode=1,
+            stdout="",
+            stderr="#fase wsgi\nimport time: 1 | 1 | os\nModuleNotFoundError: No module named 'x'\n",
+        )
+
+        with patch("nucleo.management.commands.perfil_arranque.subprocess.run", return_value=fallido):
+            with self.assertRaisesMessage(CommandError, "No module named 'x'"):
+                call_command("perfil_arranque")
+
+    def test_arranque_no_importa_las_vistas_diferidas(self):
+        """Mide un arranque real: ni wsgi ni el URLconf importan los módulos diferidos."""
+        salida = StringIO()
+
+        call_command("perfil_arranque", "--json", "--limite", "100000", stdout=salida)
+
+        perfil = json.loads(salida.getvalue())
+        self.assertEqual(set(perfil["tiempos_ms"]), {"wsgi", "urls", "total"})
+        importados = {m["modulo"] for m in perfil["modulos"] if m["fase"] in ("wsgi", "urls")}
+        self.assertIn("nucleo.vistas_diferidas", importados)
+        for modulo in ("ia.api.views", "ia.views", "QA.views", "drf_spectacular.views"):
+            self.assertNotIn(modulo, importados)
+
+        with self.assertRaises(CommandError):
+            call_command("perfil_arranque", "--presupuesto-ms", "0.001", stdout=StringIO())
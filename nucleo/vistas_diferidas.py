@@ -0,0 +1,67 @@
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class VistaDiferida:
+    """Vista que importa su módulo hasta el primer request que la usa.
+
+    ``path("x/", vista_diferida("QA.views.index"))`` deja la ruta registrada
+    (``reverse`` y ``{% url %}`` sólo necesitan el patrón y el nombre) sin
+    importar ``QA.views`` al cargar el URLconf. Así un arranque en frío de
+    gunicorn o de Vercel no paga los módulos grandes que casi nadie visita
+    (workspaces QA, asistente IA, integraciones de Google, documentación de
+    la API) antes de responder el primer request.
+
+    - ``as_view=True`` para vistas de clase; ``initkwargs`` van a ``as_view``.
+    - ``csrf_exempt`` se declara aquí porque ``CsrfViewMiddleware`` lo lee del
+      callback antes de que exista la vista real (las ``APIView`` de DRF son
+      exentas y hacen su propia validación en ``SessionAuthentication``). Si no
+      coincide con la vista real se lanza ``ImproperlyConfigured`` en el primer
+      request en vez de relajar o endurecer CSRF en silencio.
+    - Cualquier otro atributo público (``cls``, ``initkwargs``, que lee
+      drf-spectacular al generar el esquema) se resuelve importando la vista.
+    """
+
+    def __init__(self, ruta, as_view=False, csrf_exempt=False, **initkwargs):
+        self.ruta = ruta
+        self.as_view = as_view
+        self.initkwargs = initkwargs
+        self.csrf_exempt = csrf_exempt
+        self.__module__, _, self.__name__ = ruta.rpartition(".")
+        self.__qualname__ = self.__name__
+        self._vista = None
+        self._candado = threading.Lock()
+
+    def vista(self):
+        if self._vista is None:
+            with self._candado:
+                if self._vista is None:
+                    vista = import_string(self.ruta)
+                    if self.as_view:
+                        vista = vista.as_view(**self.initkwargs)
+                    if bool(getattr(vista, "csrf_exempt", False)) != self.csrf_exempt:
+                        raise ImproperlyConfigured(
+                            f"{self.ruta}: csrf_exempt={self.csrf_exempt} no coincide con la vista real."
+                        )
+                    self._vista = vista
+        return self._vista
+
+    def __call__(self, request, *args, **kwargs):
+        return self.vista()(request, *args, **kwargs)
+
+    def __getattr__(self, nombre):
+        # ``view_class`` y los atributos privados (``_is_coroutine`` de
+        # asgiref, por ejemplo) los consulta Django al armar el resolver y al
+        # despachar; responderlos importando la vista anularía el diferimiento.
+        if nombre.startswith("_") or nombre == "view_class":
+            raise AttributeError(nombre)
+        return getattr(self.vista(), nombre)
+
+    def __repr__(self):
+        return f"<VistaDiferida {self.ruta}>"
+
+
+def vista_diferida(ruta, as_view=False, csrf_exempt=False, **initkwargs):
+    return VistaDiferida(ruta, as_view=as_view, csrf_exempt=csrf_exempt, **initkwargs)
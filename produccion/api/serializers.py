@@ -137,7 +137,8 @@ class OrdenProduccionDetalleSerializer(serializers.ModelSerializer):
         fields = '__all__'
         # 'bom' ya no es parte del contrato del cliente: se resuelve en el
         # servidor a partir del BOM activo de cada producto_variante.
-        read_only_fields = ['activo', 'op', 'bom']
+        # 'cantidad_recibida' la mueven las recepciones, no el cliente.
+        read_only_fields = ['activo', 'op', 'bom', 'cantidad_recibida']
 
 class OrdenProduccionListSerializer(serializers.ModelSerializer):
     """Serializer minimalista para el LISTADO de OP.
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.db.models import Prefetch, prefetch_related_objects
 from django.db import transaction
 from rest_framework import status, viewsets, mixins
@@ -8,8 +10,10 @@ from rest_framework.exceptions import ValidationError
 
 from ventas.models import Pedido, PedidoDetalleTalla
 from usuarios.models import Usuario
+from nucleo.models import Sucursal
 
 from produccion.services.common import config_como_dict, pendientes_por_linea
+from produccion.services.mrp_service import MrpService
 
 from produccion.models import (
     ListaMaterialBom,
@@ -292,6 +296,46 @@ class ListaMaterialBomViewSet(viewsets.ModelViewSet):
 
         return Response(BomBulkItemSerializer(result, many=True).data)
 
+    @action(detail=False, methods=['get'], url_path='mrp')
+    def mrp(self, request):
+        """Necesidades netas de material de varios pedidos (ver ``MrpService``)."""
+        raw = request.query_params.get('pedido_ids', '').strip()
+        try:
+            pedido_ids = [int(v.strip()) for v in raw.split(',') if v.strip()]
+        except ValueError:
+            raise ValidationError({'pedido_ids': 'All values must be integers.'})
+        if not pedido_ids:
+            raise ValidationError({'pedido_ids': 'This parameter is required.'})
+
+        sucursal_id = request.query_params.get('sucursal_id')
+        if sucursal_id is not None:
+            try:
+                sucursal_id = int(sucursal_id)
+            except ValueError:
+                raise ValidationError({'sucursal_id': 'Must be an integer.'})
+
+        empresa = getattr(request.user, 'empresa', None)
+        if empresa is None:
+            return Response({}, status=status.HTTP_200_OK)
+
+        if sucursal_id is not None:
+            user = request.user
+            es_staff = getattr(user, 'is_superuser', False) or getattr(user, 'is_admin_empresa', False)
+            if not Sucursal.objects.filter(pk=sucursal_id, empresa=empresa).exists() or (
+                not es_staff and sucursal_id not in user.sucursales_permitidas()
+            ):
+                raise ValidationError({'sucursal_id': 'You do not have access to this branch.'})
+
+        plan = MrpService.planear(empresa, pedido_ids, sucursal=sucursal_id)
+
+        def como_texto(fila):
+            return {k: str(v) if isinstance(v, Decimal) else v for k, v in fila.items()}
+
+        for llave in ('productos_terminados', 'componentes', 'faltantes'):
+            plan[llave] = [como_texto(fila) for fila in plan[llave]]
+        return Response(plan)
+
+
 class BomDetalleViewSet(viewsets.ModelViewSet):
     serializer_class = BomDetalleSerializer
 
@@ -309,6 +353,7 @@ class BomDetalleViewSet(viewsets.ModelViewSet):
 class OrdenProduccionViewSet(viewsets.ModelViewSet):
     queryset = OrdenProduccion.objects.all()
     serializer_class = OrdenProduccionSerializer
+    cursor_ordering = "fecha_inicio"  # mismo orden que get_queryset
 
     def get_serializer_class(self):
         if getattr(self, "action", None) == "list":
@@ -476,6 +521,7 @@ class ProductoTerminadoEntradasViewSet(viewsets.ModelViewSet):
 class OrdenBordadoViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.CreateModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, GenericViewSet):
     queryset = OrdenesBordado.objects.filter()
     serializer_class = OrdenBordadoSerializer
+    cursor_ordering = "fecha_inicio"  # mismo orden que get_queryset
 
     def get_serializer_class(self):
         action = getattr(self, "action", None)
@@ -806,6 +852,7 @@ class OrdenReflejanteViewSet(
     ):
     queryset = OrdenesReflejante.objects.all()
     serializer_class = OrdenReflejanteSerializer
+    cursor_ordering = "fecha_inicio"  # mismo orden que get_queryset
 
     def get_queryset(self):
         """Aislamiento multi-tenant: empresa + sucursal.
@@ -1047,6 +1094,7 @@ class OrdenesCorteMangaViewSet(
     ):
     queryset = OrdenesCorteManga.objects.all()
     serializer_class = OrdenesCorteMangaSerializer
+    cursor_ordering = "fecha_inicio"  # mismo orden que get_queryset
 
     def get_queryset(self):
         """Aislamiento multi-tenant: empresa + sucursal.
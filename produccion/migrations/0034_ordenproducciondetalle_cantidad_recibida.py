@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-17 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("produccion", "0033_ordenbordadodetalle_tipos_servicio"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ordenproducciondetalle",
+            name="cantidad_recibida",
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=18),
+        ),
+    ]
@@ -101,6 +101,9 @@ class OrdenProduccionDetalle(models.Model):
     observaciones = models.TextField(blank=True, null=True)
     pedido_detalle = models.ForeignKey(PedidoDetalle, on_delete=models.CASCADE, null=True, blank=True)
     producto_variante = models.ForeignKey(ProductoVariante, on_delete=models.CASCADE, null=True, blank=True)
+    # Recibido en almacén vía ``Recepcion`` (mismo contador que
+    # ``OrdenCompraDetalle.cantidad_recibida``).
+    cantidad_recibida = models.DecimalField(max_digits=18, decimal_places=4, default=0)
 
     activo = models.BooleanField(default=True)
 
@@ -109,6 +112,18 @@ class OrdenProduccionDetalle(models.Model):
         verbose_name = 'Orden Produccion Detalle'
         verbose_name_plural = 'Ordenes Produccion Detalles'
 
+    def save(self, *args, **kwargs):
+        # Mismo criterio que ``OrdenCompraDetalle.save``: el contador no se
+        # reescribe desde una instancia posiblemente vieja.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                campo.attname
+                for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != "cantidad_recibida"
+            ]
+            self.refresh_from_db(fields=["cantidad_recibida"])
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return str(self.op_detalle_id)
 
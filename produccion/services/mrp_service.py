@@ -0,0 +1,338 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+
+from catalogo.models import Producto, ProductoVariante
+from inventarios.models import Almacen
+from produccion.models import BomDetalle, ListaMaterialBom, OrdenProduccion, OrdenProduccionDetalle
+from ventas.models import PedidoDetalleTalla
+from wms.services.existencia_service import ExistenciaService
+
+QTY_PRECISION = Decimal("0.0001")
+CERO = Decimal("0")
+
+#: OP que todavía van a entregar producto terminado (las mismas que acepta la
+#: recepción de compras).
+ESTATUS_OP_ABIERTA = (
+    OrdenProduccion.EstatusOrdenProduccion.PENDIENTE,
+    OrdenProduccion.EstatusOrdenProduccion.PREPARACION,
+    OrdenProduccion.EstatusOrdenProduccion.BORDANDO,
+    OrdenProduccion.EstatusOrdenProduccion.REVISION,
+)
+
+#: Nodos del plan: producto terminado (por variante, que es como se llaman los
+#: BOM) y componente (por producto, que es lo que referencia ``BomDetalle``).
+VARIANTE = "V"
+COMPONENTE = "P"
+
+
+def _q(valor):
+    return Decimal(valor).quantize(QTY_PRECISION, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True, slots=True)
+class LineaBom:
+    componente_id: int
+    #: Por unidad del padre, ya con desperdicio: ``cantidad * (1 + desperdicio/100)``.
+    cantidad: Decimal
+
+
+class ExplosionBom:
+    """BOM de un solo nivel por ``(variante, version)``, memorizados.
+
+    Cada variante usa su BOM activo de mayor versión. Un componente tiene BOM
+    propio (sub-ensamble) si alguna variante de su producto lo tiene; si son
+    varias, manda la de menor pk. Las cargas van por lote: una consulta de
+    BOM y una de renglones por nivel del árbol, no por pedido.
+
+    Los renglones quedan memorizados por ``(variante, version)``, así que una
+    instancia puede reutilizarse entre corridas: ``nueva_corrida`` olvida qué
+    versión está vigente (eso se vuelve a consultar, es barato) pero conserva
+    los renglones ya explotados. Un cambio de renglones sin subir ``version``
+    no se vería.
+    """
+
+    def __init__(self, empresa_id):
+        self.empresa_id = empresa_id
+        self._version = {}  # variante_id -> (version, bom_id) | None
+        self._lineas = {}  # (variante_id, version) -> tuple[LineaBom]
+        self._sub_ensamble = {}  # producto_id -> variante_id | None
+
+    def nueva_corrida(self):
+        self._version.clear()
+        self._sub_ensamble.clear()
+
+    def _boms(self, **filtros):
+        return (
+            ListaMaterialBom.objects.filter(empresa_id=self.empresa_id, activo=True, **filtros)
+            .order_by("producto_variante_id", "-version", "-bom_id")
+            .values_list("producto_variante_id", "producto_variante__producto_id", "version", "bom_id")
+        )
+
+    def _cargar_lineas(self, boms):
+        """``boms``: ``{(variante_id, version): bom_id}`` que aún no están en el memo."""
+        if not boms:
+            return
+        por_bom = defaultdict(list)
+        for bom_id, componente_id, cantidad, desperdicio in (
+            BomDetalle.objects.filter(bom_id__in=list(boms.values()), activo=True, componente__isnull=False)
+            .order_by("bom_detalle_id")
+            .values_list("bom_id", "componente_id", "cantidad", "desperdicio")
+        ):
+            factor = Decimal("1") + Decimal(str(desperdicio or 0)) / Decimal("100")
+            por_bom[bom_id].append(LineaBom(componente_id, Decimal(str(cantidad or 0)) * factor))
+        for llave, bom_id in boms.items():
+            self._lineas[llave] = tuple(por_bom.get(bom_id, ()))
+
+    def cargar_variantes(self, variante_ids):
+        faltantes = [v for v in set(variante_ids) if v not in self._version]
+        if not faltantes:
+            return
+        nuevos = {}
+        for variante_id, _, version, bom_id in self._boms(producto_variante_id__in=faltantes):
+            if variante_id in self._version:
+                continue
+            self._version[variante_id] = (version, bom_id)
+            if (variante_id, version) not in self._lineas:
+                nuevos[(variante_id, version)] = bom_id
+        for variante_id in faltantes:
+            self._version.setdefault(variante_id, None)
+        self._cargar_lineas(nuevos)
+
+    def cargar_componentes(self, producto_ids):
+        faltantes = [p for p in set(producto_ids) if p not in self._sub_ensamble]
+        if not faltantes:
+            return
+        candidatos = {}
+        for variante_id, producto_id, _, _ in self._boms(producto_variante__producto_id__in=faltantes):
+            if producto_id not in candidatos or variante_id < candidatos[producto_id]:
+                candidatos[producto_id] = variante_id
+        for producto_id in faltantes:
+            self._sub_ensamble[producto_id] = candidatos.get(producto_id)
+        self.cargar_variantes(candidatos.values())
+
+    def version(self, variante_id):
+        """``version`` del BOM vigente de la variante, o ``None`` si no tiene."""
+        vigente = self._version.get(variante_id)
+        return vigente[0] if vigente else None
+
+    def lineas(self, variante_id):
+        vigente = self._version.get(variante_id)
+        if vigente is None:
+            return ()
+        return self._lineas[(variante_id, vigente[0])]
+
+    def hijos(self, nodo):
+        """Renglones de un nodo ya cargado: ``[(nodo_hijo, cantidad_por_unidad)]``."""
+        tipo, pk = nodo
+        variante_id = pk if tipo == VARIANTE else self._sub_ensamble.get(pk)
+        if variante_id is None:
+            return []
+        return [((COMPONENTE, linea.componente_id), linea.cantidad) for linea in self.lineas(variante_id)]
+
+
+class MrpService:
+    """Necesidades netas de material para un conjunto de pedidos.
+
+    1. Demanda bruta: ``PedidoDetalleTalla.cantidad`` por variante. Las tallas
+       sin variante no se pueden explotar (el BOM es por variante) y se
+       cuentan aparte.
+    2. Explosión multinivel con ``ExplosionBom``: un componente con BOM propio
+       se explota a su vez, con el desperdicio de cada renglón aplicado.
+    3. Neteo por nivel bajo (*low-level code*): un artículo se netea una sola
+       vez, cuando ya se acumuló toda su demanda bruta de todos los padres, y
+       sólo su faltante baja al siguiente nivel.
+       ``neto = max(0, bruto - disponible - programado)``, donde ``disponible``
+       es física menos reservas activas (``ExistenciaService``, clave exacta:
+       un componente es ``(producto, None)``) en los almacenes de la empresa o
+       sucursal. Las reservas de los mismos pedidos no se restan: su cantidad
+       ya está completa en el bruto, y restarlas contaría dos veces lo que
+       esos pedidos tienen apartado. ``programado`` es lo que las OP abiertas de esos pedidos
+       aún no entregan. Las OP no suman demanda de insumos: los descuentan al
+       crearse (``OrdenProduccionService.save_orden_produccion``).
+
+    El número de consultas depende de la profundidad del árbol, no de cuántos
+    pedidos o renglones entren.
+    """
+
+    @staticmethod
+    def _demanda(empresa_id, pedido_ids):
+        bruto = defaultdict(lambda: CERO)
+        producto_de = {}
+        sin_variante = 0
+        for variante_id, producto_id, total in (
+            PedidoDetalleTalla.objects.filter(
+                pedido_detalle__pedido_id__in=pedido_ids,
+                pedido_detalle__pedido__empresa_id=empresa_id,
+            )
+            .values("variante_id", "pedido_detalle__producto_id")
+            .annotate(total=Sum("cantidad"))
+            .values_list("variante_id", "pedido_detalle__producto_id", "total")
+        ):
+            if not total:
+                continue
+            if variante_id is None:
+                sin_variante += total
+                continue
+            bruto[(VARIANTE, variante_id)] += Decimal(total)
+            producto_de[variante_id] = producto_id
+        return bruto, producto_de, sin_variante
+
+    @staticmethod
+    def _programado(empresa_id, pedido_ids):
+        programado = defaultdict(lambda: CERO)
+        for variante_id, cantidad, recibido in (
+            OrdenProduccionDetalle.objects.filter(
+                op__pedido_id__in=pedido_ids,
+                op__empresa_id=empresa_id,
+                op__activo=True,
+                op__estatus_op__in=ESTATUS_OP_ABIERTA,
+                activo=True,
+                producto_variante__isnull=False,
+            )
+            .values("producto_variante_id")
+            .annotate(cantidad=Sum("cantidad"), recibido=Sum("cantidad_recibida"))
+            .values_list("producto_variante_id", "cantidad", "recibido")
+        ):
+            pendiente = Decimal(str(cantidad or 0)) - Decimal(str(recibido or 0))
+            if pendiente > CERO:
+                programado[(VARIANTE, variante_id)] += pendiente
+        return programado
+
+    @staticmethod
+    def _niveles(raices, explosion):
+        """Carga el árbol nivel por nivel y devuelve ``{nodo: nivel_bajo}``.
+
+        El nivel bajo de un nodo es la mayor profundidad a la que aparece. Un
+        ciclo (un componente que termina requiriéndose a sí mismo) es un BOM
+        mal capturado y se rechaza.
+        """
+        frontera = set(raices)
+        vistos = set()
+        while frontera:
+            explosion.cargar_variantes(pk for tipo, pk in frontera if tipo == VARIANTE)
+            explosion.cargar_componentes(pk for tipo, pk in frontera if tipo == COMPONENTE)
+            vistos |= frontera
+            frontera = {hijo for nodo in frontera for hijo, _ in explosion.hijos(nodo)} - vistos
+
+        nivel = {}
+        en_curso = set()
+
+        def profundidad(nodo, actual, camino):
+            if nodo in en_curso:
+                raise ValidationError(
+                    {"bom": f"La lista de materiales tiene un ciclo: {' -> '.join(f'{t}{pk}' for t, pk in camino)}."}
+                )
+            if nivel.get(nodo, -1) >= actual:
+                return
+            nivel[nodo] = actual
+            en_curso.add(nodo)
+            for hijo, _ in explosion.hijos(nodo):
+                profundidad(hijo, actual + 1, camino + [hijo])
+            en_curso.discard(nodo)
+
+        for raiz in sorted(raices):
+            profundidad(raiz, 0, [raiz])
+        return nivel
+
+    @staticmethod
+    def _disponible(empresa_id, sucursal_id, claves, pedido_ids):
+        """``{clave: max(0, física - reservada)}`` sumando los almacenes del alcance.
+
+        ``reservada`` excluye las reservas de ``pedido_ids``.
+        """
+        almacenes = Almacen.objects.filter(empresa_id=empresa_id)
+        if sucursal_id:
+            almacenes = almacenes.filter(sucursal_id=sucursal_id)
+        almacen_ids = list(almacenes.values_list("pk", flat=True))
+        fisica = ExistenciaService._sum_existencia_por_almacen(almacen_ids, claves)
+        reservada = ExistenciaService._sum_reservas_por_almacen(
+            almacen_ids, claves, excluir_pedido_ids=pedido_ids
+        )
+        return {
+            clave: max(
+                CERO,
+                sum((fisica[a][clave] for a in almacen_ids), CERO)
+                - sum((reservada[a][clave] for a in almacen_ids), CERO),
+            )
+            for clave in claves
+        }
+
+    @classmethod
+    def planear(cls, empresa, pedidos, sucursal=None, explosion=None):
+        """Corre el MRP sobre ``pedidos`` (instancias o pks) de ``empresa``.
+
+        ``explosion`` permite reutilizar un ``ExplosionBom`` entre corridas.
+        Pedidos de otra empresa se ignoran. Devuelve ``{"productos_terminados",
+        "componentes", "faltantes", "tallas_sin_variante", "niveles"}``; cada
+        renglón trae ``bruto``, ``disponible``, ``programado``, ``neto``,
+        ``nivel`` y ``tiene_bom`` (Decimal).
+        """
+        empresa_id = getattr(empresa, "pk", empresa)
+        sucursal_id = getattr(sucursal, "pk", sucursal)
+        pedido_ids = [getattr(p, "pk", p) for p in pedidos]
+        if explosion is None:
+            explosion = ExplosionBom(empresa_id)
+        else:
+            explosion.nueva_corrida()
+
+        bruto, producto_de, sin_variante = cls._demanda(empresa_id, pedido_ids)
+        programado = cls._programado(empresa_id, pedido_ids)
+        nivel = cls._niveles(list(bruto), explosion)
+
+        def clave_stock(nodo):
+            tipo, pk = nodo
+            return (producto_de.get(pk), pk) if tipo == VARIANTE else (pk, None)
+
+        disponible = cls._disponible(empresa_id, sucursal_id, list({clave_stock(n) for n in nivel}), pedido_ids)
+
+        filas = {}
+        for nodo in sorted(nivel, key=lambda n: (nivel[n], n)):
+            requerido = bruto.get(nodo, CERO)
+            stock = disponible[clave_stock(nodo)]
+            en_proceso = programado.get(nodo, CERO)
+            neto = max(CERO, requerido - stock - en_proceso)
+            for hijo, cantidad in explosion.hijos(nodo):
+                bruto[hijo] += _q(neto * cantidad)
+            filas[nodo] = {
+                "nivel": nivel[nodo],
+                "bruto": _q(requerido),
+                "disponible": _q(stock),
+                "programado": _q(en_proceso),
+                "neto": _q(neto),
+                "tiene_bom": bool(explosion.hijos(nodo)),
+            }
+
+        variantes = {
+            v.pk: v for v in ProductoVariante.objects.filter(pk__in=[pk for t, pk in filas if t == VARIANTE])
+        }
+        productos = dict(
+            Producto.objects.filter(pk__in=[pk for t, pk in filas if t == COMPONENTE]).values_list("pk", "nombre")
+        )
+        terminados, componentes = [], []
+        for (tipo, pk), fila in filas.items():
+            if tipo == VARIANTE:
+                variante = variantes.get(pk)
+                terminados.append(
+                    dict(
+                        fila,
+                        producto_variante_id=pk,
+                        sku=getattr(variante, "sku", None),
+                        bom_version=explosion.version(pk),
+                    )
+                )
+            else:
+                componentes.append(dict(fila, producto_id=pk, nombre=productos.get(pk)))
+
+        componentes.sort(key=lambda c: (c["nivel"], c["producto_id"]))
+        return {
+            "productos_terminados": terminados,
+            "componentes": componentes,
+            # Con ``tiene_bom`` el faltante se fabrica; sin él, se compra.
+            "faltantes": [c for c in componentes if c["neto"] > CERO],
+            "tallas_sin_variante": sin_variante,
+            "niveles": max(nivel.values(), default=-1) + 1,
+        }
@@ -6,6 +6,7 @@ from rest_framework.exceptions import ValidationError
 from auditoria.models import AuditoriaEvento
 from catalogo.models import ProductoVariante
 from inventarios.models import Existencia, MovimientoInventario, MovimientoInventarioDetalle, TipoMovimiento
+from inventarios.services.kardex_service import KardexService
 from produccion.models import (
     ConsumoProduccion,
     ConsumoProduccionDetalle,
@@ -156,6 +157,7 @@ class OrdenProduccionService:
                         "cantidad_before": cantidad_actual,
                         "cantidad_after": cantidad_nueva,
                         "cantidad_consumida": cantidad_consumida,
+                        "delta": -cantidad_consumida,
                     }
                 )
                 restante -= cantidad_consumida
@@ -220,6 +222,11 @@ class OrdenProduccionService:
                 for item in consumos
             ]
         )
+        KardexService.registrar(
+            [KardexService.renglon_de_item(item) for item in consumos],
+            movimiento,
+            TipoMovimiento.SALIDA,
+        )
         return movimiento
 
     @staticmethod
@@ -13,17 +13,22 @@ de producción. Ejemplo con un settings de override a SQLite en memoria:
     python manage.py test produccion --settings=sqlite_settings
 """
 
+from decimal import Decimal
+
 from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
 from django.test.utils import CaptureQueriesContext
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.test import APIClient
 
-from catalogo.models import Producto, Talla
-from nucleo.models import Empresa, Moneda, SerieFolio, Sucursal
+from catalogo.models import Color, Producto, ProductoVariante, Talla
+from inventarios.models import Almacen, Existencia, inventario_reservas
+from nucleo.models import Empresa, Moneda, SerieFolio, Sucursal, UnidadMedida
 from produccion.models import (
+    BomDetalle,
     BordadoAvances,
     BordadoIncidencias,
+    ListaMaterialBom,
     OrdenBordadoDetalle,
     OrdenesBordado,
     OrdenCorteMangaDetalle,
@@ -34,6 +39,7 @@ from produccion.models import (
     ReflejanteIncidencias,
 )
 from produccion.services.common import config_como_dict
+from produccion.services.mrp_service import ExplosionBom, MrpService
 from produccion.services.orden_bordado_service import (
     OrdenBordadoDuplicada409,
     OrdenBordadoService,
@@ -578,7 +584,7 @@ class SatelitesScopeTenantTests(TestCase):
             with self.subTest(cfg["nombre"]):
                 resp = client.get(cfg["url"])
                 self.assertEqual(resp.status_code, 200)
-                ids = [row["id"] for row in resp.json()]
+                ids = [row["id"] for row in resp.json()["results"]]
                 self.assertEqual(ids, [self.registros[(cfg["nombre"], "a")].pk])
 
     def test_retrieve_de_otra_empresa_devuelve_404(self):
@@ -637,13 +643,13 @@ class SatelitesScopeTenantTests(TestCase):
             with self.subTest(cfg["nombre"]):
                 resp = client.get(cfg["url"])
                 self.assertEqual(resp.status_code, 200)
-                self.assertEqual(resp.json(), [])
+                self.assertEqual(resp.json()["results"], [])
 
     def test_superuser_ve_ambas_empresas(self):
         client = self._client(self.superuser)
         for cfg in SATELITES:
             with self.subTest(cfg["nombre"]):
-                ids = [row["id"] for row in client.get(cfg["url"]).json()]
+                ids = [row["id"] for row in client.get(cfg["url"]).json()["results"]]
                 self.assertCountEqual(
                     ids,
                     [
@@ -666,7 +672,7 @@ class SatelitesScopeTenantTests(TestCase):
         client = self._client(forastero)
         for cfg in SATELITES:
             with self.subTest(cfg["nombre"]):
-                self.assertEqual(client.get(cfg["url"]).json(), [])
+                self.assertEqual(client.get(cfg["url"]).json()["results"], [])
 
 
 class SatelitesSuperficieEscribibleTests(TestCase):
@@ -1186,7 +1192,7 @@ class OrdenReflejanteListShapeTests(TestCase):
     def test_list_expone_empresa_y_sucursal_con_id_y_nombre(self):
         """Aditivo: los ids crudos siguen, más las etiquetas legibles."""
         self._crear_orden(1)
-        fila = self._client().get("/api/v1/produccion/orden-reflejante/").json()[0]
+        fila = self._client().get("/api/v1/produccion/orden-reflejante/").json()["results"][0]
 
         self.assertEqual(fila["empresa"], self.empresa.pk)
         self.assertEqual(fila["empresa_nombre"], "ACME SA")
@@ -1210,7 +1216,7 @@ class OrdenReflejanteListShapeTests(TestCase):
         for i in range(3):
             self._crear_orden(i)
 
-        filas = self._client().get("/api/v1/produccion/orden-reflejante/").json()
+        filas = self._client().get("/api/v1/produccion/orden-reflejante/").json()["results"]
 
         self.assertEqual(len(filas), 3)
         for fila in filas:
@@ -1248,7 +1254,7 @@ class OrdenReflejanteListShapeTests(TestCase):
         with CaptureQueriesContext(connection) as ctx:
             resp = client.get("/api/v1/produccion/orden-reflejante/")
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(len(resp.json()), 3)
+        self.assertEqual(len(resp.json()["results"]), 3)
         queries_con_3 = len(ctx.captured_queries)
 
         # Cuádruple de órdenes y el doble de renglones por orden.
@@ -1256,7 +1262,7 @@ class OrdenReflejanteListShapeTests(TestCase):
             self._crear_orden(i, n_detalles=4)
         with CaptureQueriesContext(connection) as ctx:
             resp = client.get("/api/v1/produccion/orden-reflejante/")
-        self.assertEqual(len(resp.json()), 12)
+        self.assertEqual(len(resp.json()["results"]), 12)
         queries_con_12 = len(ctx.captured_queries)
 
         # Constante: mismo nº de queries con 3 y con 12 órdenes.
@@ -1330,7 +1336,7 @@ class OrdenBordadoListQueriesTests(TestCase):
     def test_list_expone_usuario_nombre(self):
         """Campo nuevo: aparece en el list con el fallback get_full_name()/email."""
         self._crear_orden(1)
-        fila = self._client().get("/api/v1/produccion/orden-bordado/").json()[0]
+        fila = self._client().get("/api/v1/produccion/orden-bordado/").json()["results"][0]
 
         self.assertIn("usuario_nombre", fila)
         self.assertEqual(fila["usuario_nombre"], self.usuario.get_full_name().strip() or self.usuario.email)
@@ -1346,7 +1352,7 @@ class OrdenBordadoListQueriesTests(TestCase):
     def test_list_expone_empresa_y_sucursal_con_id_y_nombre(self):
         """Aditivo: los ids crudos siguen, más las etiquetas legibles."""
         self._crear_orden(1)
-        fila = self._client().get("/api/v1/produccion/orden-bordado/").json()[0]
+        fila = self._client().get("/api/v1/produccion/orden-bordado/").json()["results"][0]
 
         self.assertEqual(fila["empresa"], self.empresa.pk)
         self.assertEqual(fila["empresa_nombre"], "ACME SA")
@@ -1380,14 +1386,14 @@ class OrdenBordadoListQueriesTests(TestCase):
         with CaptureQueriesContext(connection) as ctx:
             resp = client.get("/api/v1/produccion/orden-bordado/")
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(len(resp.json()), 3)
+        self.assertEqual(len(resp.json()["results"]), 3)
         queries_con_3 = len(ctx.captured_queries)
 
         for i in range(3, 12):
             self._crear_orden(i, n_detalles=4)
         with CaptureQueriesContext(connection) as ctx:
             resp = client.get("/api/v1/produccion/orden-bordado/")
-        self.assertEqual(len(resp.json()), 12)
+        self.assertEqual(len(resp.json()["results"]), 12)
         queries_con_12 = len(ctx.captured_queries)
 
         self.assertEqual(queries_con_3, queries_con_12)
@@ -1456,7 +1462,7 @@ class OrdenesCorteMangaListQueriesTests(TestCase):
     def test_list_expone_empresa_y_sucursal_con_id_y_nombre(self):
         """Aditivo: los ids crudos siguen, más las etiquetas legibles."""
         self._crear_orden(1)
-        fila = self._client().get("/api/v1/produccion/orden-corte-manga/").json()[0]
+        fila = self._client().get("/api/v1/produccion/orden-corte-manga/").json()["results"][0]
 
         self.assertEqual(fila["empresa"], self.empresa.pk)
         self.assertEqual(fila["empresa_nombre"], "ACME SA")
@@ -1488,14 +1494,14 @@ class OrdenesCorteMangaListQueriesTests(TestCase):
         with CaptureQueriesContext(connection) as ctx:
             resp = client.get("/api/v1/produccion/orden-corte-manga/")
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(len(resp.json()), 3)
+        self.assertEqual(len(resp.json()["results"]), 3)
         queries_con_3 = len(ctx.captured_queries)
 
         for i in range(3, 12):
             self._crear_orden(i, n_detalles=4)
         with CaptureQueriesContext(connection) as ctx:
             resp = client.get("/api/v1/produccion/orden-corte-manga/")
-        self.assertEqual(len(resp.json()), 12)
+        self.assertEqual(len(resp.json()["results"]), 12)
         queries_con_12 = len(ctx.captured_queries)
 
         self.assertEqual(queries_con_3, queries_con_12)
@@ -3467,3 +3473,173 @@ class OnboardingReflejanteConfigCrudoTests(TestCase):
             set(lineas[0].keys()),
             CLAVES_LINEA_ONBOARDING_BASE | {"reflejante_config"},
         )
+
+
+class MrpServiceTests(TestCase):
+    """Explosión multinivel y neteo de ``MrpService``.
+
+    Playera (variante) = 2 paneles + 1 hilo; panel (sub-ensamble con BOM
+    propio) = 0.5 tela con 10% de desperdicio.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="acme", razon_social="ACME SA")
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, codigo="MTY", nombre="Monterrey")
+        cls.moneda = Moneda.objects.create(codigo_iso="MXN", nombre="Peso")
+        cls.cliente = Cliente.objects.create(empresa=cls.empresa, nombre="Cliente 1")
+        pieza = UnidadMedida.objects.create(clave="PZA", nombre="Pieza")
+        color = Color.objects.create(nombre="Negro", codigo="NEG", codigo_hex="#000000")
+        cls.talla = Talla.objects.create(nombre="M")
+
+        def producto(nombre):
+            return Producto.objects.create(empresa=cls.empresa, nombre=nombre)
+
+        def variante(prod, sku):
+            return ProductoVariante.objects.create(
+                producto=prod, empresa=cls.empresa, color=color, talla=cls.talla, sku=sku, precio_base=1
+            )
+
+        cls.playera = producto("Playera")
+        cls.panel = producto("Panel")
+        cls.hilo = producto("Hilo")
+        cls.tela = producto("Tela")
+        cls.playera_m = variante(cls.playera, "PLA-M")
+        cls.panel_u = variante(cls.panel, "PAN-U")
+
+        def bom(var, renglones):
+            lista = ListaMaterialBom.objects.create(empresa=cls.empresa, producto_variante=var)
+            for componente, cantidad, desperdicio in renglones:
+                BomDetalle.objects.create(
+                    bom=lista, componente=componente, cantidad=cantidad, unidad=pieza, desperdicio=desperdicio
+                )
+            return lista
+
+        bom(cls.playera_m, [(cls.panel, 2, 0), (cls.hilo, 1, 0)])
+        cls.bom_panel = bom(cls.panel_u, [(cls.tela, Decimal("0.5"), 10)])
+
+        cls.almacen = Almacen.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, codigo="A1", nombre="Almacén"
+        )
+        cls.existencias = {
+            prod.pk: Existencia.objects.create(
+                producto=prod, producto_variante=var, almacen=cls.almacen, cantidad=Decimal(cantidad), stock=cantidad
+            )
+            for prod, var, cantidad in (
+                (cls.playera, cls.playera_m, 2),
+                (cls.panel, None, 4),
+                (cls.tela, None, 3),
+            )
+        }
+        cls.usuario = Usuario.objects.create(
+            username="planeador", email="planeador@acme.test", empresa=cls.empresa
+        )
+
+        cls.pedidos = []
+        for cantidad in (10, 5):
+            pedido = Pedido.objects.create(
+                empresa=cls.empresa,
+                sucursal=cls.sucursal,
+                cliente=cls.cliente,
+                moneda=cls.moneda,
+                persona_pagos="Pagos",
+                correo_facturas="pagos@acme.test",
+                telefono_pagos="8100000000",
+                forma_pago="03",
+                metodo_pago="PUE",
+                uso_cfdi="G03",
+            )
+            detalle = PedidoDetalle.objects.create(pedido=pedido, producto=cls.playera)
+            PedidoDetalleTalla.objects.create(
+                pedido_detalle=detalle, talla=cls.talla, cantidad=cantidad, variante=cls.playera_m
+            )
+            cls.pedidos.append(pedido)
+
+    def test_explota_sub_ensambles_y_netea_por_nivel(self):
+        plan = MrpService.planear(self.empresa, self.pedidos)
+
+        (terminado,) = plan["productos_terminados"]
+        self.assertEqual((terminado["bruto"], terminado["disponible"], terminado["neto"]), (15, 2, 13))
+        componentes = {c["producto_id"]: c for c in plan["componentes"]}
+        # Panel: 13 playeras x 2 = 26, menos 4 en stock; sólo esos 22 se explotan.
+        self.assertEqual(componentes[self.panel.pk]["neto"], Decimal("22"))
+        self.assertTrue(componentes[self.panel.pk]["tiene_bom"])
+        self.assertEqual(componentes[self.hilo.pk]["neto"], Decimal("13"))
+        # Tela: 22 x 0.5 x 1.10 = 12.1, menos 3.
+        self.assertEqual(componentes[self.tela.pk]["bruto"], Decimal("12.1"))
+        self.assertEqual(componentes[self.tela.pk]["neto"], Decimal("9.1"))
+        self.assertEqual(componentes[self.tela.pk]["nivel"], 2)
+        self.assertEqual(plan["niveles"], 3)
+        self.assertEqual({c["producto_id"] for c in plan["faltantes"]}, {self.panel.pk, self.hilo.pk, self.tela.pk})
+
+    def test_reutiliza_la_explosion_memorizada(self):
+        explosion = ExplosionBom(self.empresa.pk)
+        MrpService.planear(self.empresa, self.pedidos, explosion=explosion)
+        with CaptureQueriesContext(connection) as consultas:
+            MrpService.planear(self.empresa, self.pedidos, explosion=explosion)
+        tabla = BomDetalle._meta.db_table
+        self.assertFalse(any(f'FROM "{tabla}"' in q["sql"] for q in consultas.captured_queries))
+
+    def test_ciclo_en_el_bom_se_rechaza(self):
+        BomDetalle.objects.create(
+            bom=self.bom_panel, componente=self.panel, cantidad=1, unidad=self.bom_panel.materia_prima_detalle.first().unidad
+        )
+        with self.assertRaises(DRFValidationError):
+            MrpService.planear(self.empresa, self.pedidos)
+
+    def _reservar_playeras(self, pedido, cantidad):
+        detalle_talla = PedidoDetalleTalla.objects.select_related("pedido_detalle").get(
+            pedido_detalle__pedido=pedido
+        )
+        inventario_reservas.objects.create(
+            empresa=self.empresa,
+            sucursal=self.sucursal,
+            pedido_detalle=detalle_talla.pedido_detalle,
+            pedido_detalle_talla=detalle_talla,
+            existencia=self.existencias[self.playera.pk],
+            almacen=self.almacen,
+            cantidad=Decimal(cantidad),
+            usuario=self.usuario,
+        )
+
+    def test_reservas_de_los_mismos_pedidos_no_se_restan_dos_veces(self):
+        # Las 2 playeras en stock están apartadas para el primer pedido, cuya
+        # cantidad completa (10) ya está en el bruto.
+        self._reservar_playeras(self.pedidos[0], 2)
+
+        (terminado,) = MrpService.planear(self.empresa, self.pedidos)["productos_terminados"]
+
+        self.assertEqual((terminado["bruto"], terminado["disponible"], terminado["neto"]), (15, 2, 13))
+
+    def test_reservas_de_otros_pedidos_si_se_restan(self):
+        self._reservar_playeras(self.pedidos[0], 2)
+
+        (terminado,) = MrpService.planear(self.empresa, self.pedidos[1:])["productos_terminados"]
+
+        self.assertEqual((terminado["bruto"], terminado["disponible"], terminado["neto"]), (5, 0, 5))
+
+    def _mrp(self, user, sucursal_id):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        ids = ",".join(str(p.pk) for p in self.pedidos)
+        return client.get(f"/api/v1/produccion/lista-material/mrp/?pedido_ids={ids}&sucursal_id={sucursal_id}")
+
+    def test_mrp_valida_la_sucursal_contra_el_usuario(self):
+        otra = Sucursal.objects.create(empresa=self.empresa, codigo="GDL", nombre="Guadalajara")
+        ajena = Sucursal.objects.create(
+            empresa=Empresa.objects.create(codigo="otra", razon_social="Otra SA"), codigo="CDMX", nombre="CDMX"
+        )
+        self.usuario.sucursales.add(self.sucursal)
+
+        respuesta = self._mrp(self.usuario, self.sucursal.pk)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()["productos_terminados"][0]["disponible"], "2.0000")
+
+        self.assertEqual(self._mrp(self.usuario, otra.pk).status_code, 400)
+        self.assertEqual(self._mrp(self.usuario, ajena.pk).status_code, 400)
+
+        admin = Usuario.objects.create(
+            username="admin-acme", email="admin@acme.test", empresa=self.empresa, is_admin_empresa=True
+        )
+        self.assertEqual(self._mrp(admin, otra.pk).status_code, 200)
+        self.assertEqual(self._mrp(admin, ajena.pk).status_code, 400)
@@ -30,6 +30,7 @@ class RolViewSet(viewsets.ModelViewSet):
     """
     queryset = Rol.objects.all()
     serializer_class = RolSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
     permission_classes = [IsSuperUserOrReadOnly]
 
     def get_queryset(self):
@@ -67,6 +68,7 @@ class RolViewSet(viewsets.ModelViewSet):
 class PermisoViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Permiso.objects.all().order_by('modulo', 'clave')
     serializer_class = PermisoSerializer
+    pagination_class = None  # catálogo chico: respuesta completa, sin cursor
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -90,6 +90,7 @@ class ClienteViewSet(viewsets.ModelViewSet):
 class ProveedorViewSet(viewsets.ModelViewSet):
     queryset = Proveedor.objects.filter(activo=True)
     serializer_class = ProveedorSerializer
+    cursor_ordering = "fecha_alta"  # mismo orden que get_queryset
 
     def get_queryset(self):
         user = self.request.user
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from seguridad.models import Rol, UsuarioRol
 from ..models import Usuario
+from ..permisos import invalidar_usuario, olvidar
 
 class UsuarioSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False)
@@ -45,27 +46,7 @@ class UsuarioSerializer(serializers.ModelSerializer):
     def get_permisos(self, obj):
         if getattr(obj, "is_superuser", False) or getattr(obj, "is_admin_empresa", False):
             return []
-
-        qs_roles = UsuarioRol.objects.filter(
-            usuario=obj,
-            rol__estatus="activo",
-        ).values_list("rol__permisos__clave", flat=True)
-        permisos_roles = set(filter(None, qs_roles))
-
-        permisos_grant = set()
-        permisos_deny = set()
-        overrides = obj.overrides_permisos.select_related("permiso").all()
-        for ov in overrides:
-            clave = getattr(getattr(ov, "permiso", None), "clave", None)
-            if not clave:
-                continue
-            if ov.tipo == "grant":
-                permisos_grant.add(clave)
-            elif ov.tipo == "deny":
-                permisos_deny.add(clave)
-
-        permisos_efectivos = (permisos_roles | permisos_grant) - permisos_deny
-        return sorted(list(permisos_efectivos))
+        return sorted(obj.permisos_efectivos())
 
     def validate(self, data):
         """
@@ -114,6 +95,9 @@ class UsuarioSerializer(serializers.ModelSerializer):
         UsuarioRol.objects.bulk_create(
             [UsuarioRol(usuario=user, rol=rol, empresa=user.empresa) for rol in roles_qs]
         )
+        # bulk_create no dispara post_save: el caché de permisos se invalida a mano.
+        invalidar_usuario(user.pk)
+        olvidar(user)
 
     def create(self, validated_data):
         password = validated_data.pop('password', None)
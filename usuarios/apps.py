@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UsuariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'usuarios'
+
+    def ready(self):
+        from usuarios.permisos import conectar_invalidacion
+
+        conectar_invalidacion()
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-17 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0007_historicalusuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='permisos_version',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+    ]
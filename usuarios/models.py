@@ -60,10 +60,15 @@ class Usuario(AbstractUser):
     avatar_url = models.URLField(blank=True, null=True)
     preferencias_json = models.JSONField(default=dict, blank=True)
 
+    # Versión de roles, overrides, sucursales y banderas para el caché de
+    # permisos compilados (``usuarios.permisos``). Se reemplaza por un token
+    # nuevo en cada cambio; no se versiona en el histórico.
+    permisos_version = models.CharField(max_length=32, blank=True, default="", editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=["permisos_version"])
 
     class Meta:
         db_table = "usuarios"
@@ -86,6 +91,12 @@ class Usuario(AbstractUser):
     def __str__(self):
         return self.username
 
+    def permisos_compilados(self):
+        """Permisos efectivos y sucursales compilados (ver ``usuarios.permisos``)."""
+        from usuarios.permisos import permisos_compilados
+
+        return permisos_compilados(self)
+
     def sucursales_permitidas(self):
         """Sucursales a las que el usuario tiene acceso operativo: el M2M
         ``sucursales`` unido a ``sucursal_default``.
@@ -96,11 +107,19 @@ class Usuario(AbstractUser):
         usuario cuyo único acceso fuera ``sucursal_default`` (M2M vacío) podía
         crear un documento con esa sucursal pero no volver a verlo, porque el
         lado de lectura sólo consultaba el M2M.
+
+        Sale del conjunto compilado: sin consultas en régimen estable. Se
+        devuelve una copia para que el llamador pueda modificarla.
         """
-        sucursal_ids = set(self.sucursales.values_list("pk", flat=True))
-        if self.sucursal_default_id:
-            sucursal_ids.add(self.sucursal_default_id)
-        return sucursal_ids
+        return set(self.permisos_compilados().sucursales)
+
+    def permisos_efectivos(self):
+        """Claves de permiso efectivas: ``(roles activos | GRANT) - DENY``.
+
+        No aplica el atajo de superuser/``is_admin_empresa`` (ver
+        ``tiene_permiso``).
+        """
+        return self.permisos_compilados().permisos
 
     def tiene_permiso(self, clave_permiso):
         """
@@ -112,6 +131,9 @@ class Usuario(AbstractUser):
         2. Override DENY -> False
         3. Roles -> True
         4. Override GRANT -> True
+
+        Los pasos 2-4 ya vienen resueltos en ``permisos_efectivos()``, que se
+        compila una vez por usuario y versión (ver ``usuarios.permisos``).
         """
         # 1. Superuser global siempre tiene acceso
         if self.is_superuser:
@@ -121,21 +143,4 @@ class Usuario(AbstractUser):
         if self.is_admin_empresa:
             return True
 
-        # 3. Revisar Overrides (UsuarioPermiso)
-        # Consultamos si existe algún override para este permiso
-        qs_overrides = self.overrides_permisos.filter(permiso__clave=clave_permiso)
-        
-        # Si existe un DENY explícito, denegar acceso inmediatamente
-        if qs_overrides.filter(tipo="deny").exists():
-            return False
-
-        # 4. Verificar roles asignados
-        tiene_por_rol = self.asignaciones_roles.filter(
-            rol__estatus="activo",
-            rol__permisos__clave=clave_permiso
-        ).exists()
-        
-        if tiene_por_rol:
-            return True
-        # 5. Si no tiene por rol, verificar si tiene un GRANT explícito
-        return qs_overrides.filter(tipo="grant").exists()
+        return clave_permiso in self.permisos_efectivos()
@@ -0,0 +1,201 @@
+"""Permisos efectivos y sucursales de un usuario, compilados y en caché.
+
+``Usuario.tiene_permiso`` hacía hasta tres consultas por verificación (DENY,
+roles, GRANT) y ``sucursales_permitidas()`` una por llamada, y ambas se
+llaman varias veces por request (servicios de WMS, ``get_queryset`` de
+producción...). Aquí se compila una vez por usuario:
+
+- ``permisos``: ``(roles activos | GRANT) - DENY``, la misma regla que
+  ``tiene_permiso`` y que el ``get_permisos`` del serializer.
+- ``sucursales``: M2M ``sucursales`` + ``sucursal_default``.
+
+La compilación se guarda en el caché de Django bajo una llave que incluye dos
+versiones: la del usuario (sus roles, overrides, sucursales y banderas) y una
+global (permisos de los roles, estatus del rol, claves del catálogo). Las
+versiones viven en la BD, no en el caché: la del usuario en
+``Usuario.permisos_version`` y la global en ``nucleo.VersionCatalogo``
+(``permisos@global``); ambas se leen en una sola consulta. Con ``LocMemCache``
+cada worker tiene su propio caché, pero todos leen la misma versión: una
+revocación vale desde el siguiente request en cualquier worker. Una señal
+cambia el token de la versión afectada dentro de la transacción que escribe;
+si ésta hace rollback el token anterior vuelve y el nuevo no se reusa nunca.
+
+Además queda memorizado en la instancia del usuario. DRF y el middleware de
+auth cargan una instancia por request, así que en régimen estable el request
+cuesta una consulta (las versiones) y un viaje al caché, y cada verificación
+ninguno. Las escrituras
+masivas (``bulk_create``/``update``) no disparan señales: quien las haga llama
+``invalidar_usuario`` / ``invalidar_global``.
+"""
+
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+_PREFIJO = "permisos"
+# Renglón de ``nucleo.VersionCatalogo`` con la versión global.
+_CATALOGO_GLOBAL = "permisos"
+_AMBITO_GLOBAL = "global"
+_ATRIBUTO_MEMO = "_permisos_compilados"
+
+
+@dataclass(frozen=True, slots=True)
+class PermisosCompilados:
+    permisos: frozenset
+    sucursales: frozenset
+
+
+def _cache():
+    return caches[getattr(settings, "PERMISOS_CACHE_ALIAS", "default")]
+
+
+def _nuevo_token():
+    return format(time.time_ns(), "x")
+
+
+def _versiones(usuario_id):
+    """``[global, usuario]`` leídos de la BD en una consulta."""
+    from nucleo.models import VersionCatalogo
+    from usuarios.models import Usuario
+
+    version_global = VersionCatalogo.objects.filter(
+        catalogo=_CATALOGO_GLOBAL, ambito=_AMBITO_GLOBAL
+    ).values("token")[:1]
+    fila = (
+        Usuario.objects.filter(pk=usuario_id)
+        .annotate(version_global=Subquery(version_global))
+        .values_list("version_global", "permisos_version")
+        .first()
+    )
+    return [str(valor or "0") for valor in (fila or (None, None))]
+
+
+def _compilar(usuario):
+    from seguridad.models import UsuarioPermiso, UsuarioRol
+
+    # Un rol sin permisos trae una fila con clave NULL (LEFT JOIN).
+    por_rol = set(
+        filter(
+            None,
+            UsuarioRol.objects.filter(usuario_id=usuario.pk, rol__estatus="activo").values_list(
+                "rol__permisos__clave", flat=True
+            ),
+        )
+    )
+    otorgados, denegados = set(), set()
+    for tipo, clave in UsuarioPermiso.objects.filter(usuario_id=usuario.pk).values_list(
+        "tipo", "permiso__clave"
+    ):
+        if tipo == UsuarioPermiso.TIPO_DENY:
+            denegados.add(clave)
+        elif tipo == UsuarioPermiso.TIPO_GRANT:
+            otorgados.add(clave)
+
+    sucursales = set(usuario.sucursales.values_list("pk", flat=True))
+    if usuario.sucursal_default_id:
+        sucursales.add(usuario.sucursal_default_id)
+    return PermisosCompilados(
+        permisos=frozenset((por_rol | otorgados) - denegados),
+        sucursales=frozenset(sucursales),
+    )
+
+
+def permisos_compilados(usuario):
+    """``PermisosCompilados`` del usuario: memo → caché → BD, en ese orden."""
+    memo = getattr(usuario, _ATRIBUTO_MEMO, None)
+    if memo is not None:
+        return memo
+
+    llave = f"{_PREFIJO}:{usuario.pk}:" + ":".join(_versiones(usuario.pk))
+    cache = _cache()
+    compilado = cache.get(llave)
+    if compilado is None:
+        compilado = _compilar(usuario)
+        cache.set(llave, compilado, timeout=getattr(settings, "PERMISOS_CACHE_SEGUNDOS", 3600))
+    setattr(usuario, _ATRIBUTO_MEMO, compilado)
+    return compilado
+
+
+def olvidar(usuario):
+    """Descarta el memo de esta instancia (la siguiente verificación relee el caché)."""
+    if usuario is not None:
+        usuario.__dict__.pop(_ATRIBUTO_MEMO, None)
+
+
+def invalidar_usuario(*usuario_ids):
+    from usuarios.models import Usuario
+
+    Usuario.objects.filter(pk__in=usuario_ids).update(permisos_version=_nuevo_token())
+
+
+def invalidar_global():
+    from nucleo.models import VersionCatalogo
+
+    VersionCatalogo.objects.bulk_create(
+        [VersionCatalogo(catalogo=_CATALOGO_GLOBAL, ambito=_AMBITO_GLOBAL, token=_nuevo_token())],
+        update_conflicts=True,
+        unique_fields=["catalogo", "ambito"],
+        update_fields=["token", "updated_at"],
+    )
+
+
+# ----------------------------------------------------------------------
+# Señales
+# ----------------------------------------------------------------------
+def _por_asignacion(sender, instance, **kwargs):
+    """``UsuarioRol`` / ``UsuarioPermiso``: sólo cambia el usuario dueño."""
+    invalidar_usuario(instance.usuario_id)
+    olvidar(instance._state.fields_cache.get("usuario"))
+
+
+def _por_usuario(sender, instance, created=False, update_fields=None, **kwargs):
+    # El login sólo actualiza ``last_login``: no cambia nada de lo compilado.
+    if created or (update_fields is not None and set(update_fields) <= {"last_login"}):
+        return
+    invalidar_usuario(instance.pk)
+    olvidar(instance)
+
+
+def _por_sucursales(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        invalidar_usuario(instance.pk)
+        olvidar(instance)
+    elif pk_set:
+        invalidar_usuario(*pk_set)
+    else:
+        # ``sucursal.usuarios_permitidos.clear()``: no hay pk_set, se invalida todo.
+        invalidar_global()
+
+
+def _global(sender, **kwargs):
+    """Permisos de un rol, estatus del rol o clave del catálogo: afecta a muchos."""
+    # m2m_changed llega también con ``pre_*``: sólo cuenta lo ya escrito.
+    if kwargs.get("action", "post_").startswith("post_"):
+        invalidar_global()
+
+
+def conectar_invalidacion():
+    from seguridad.models import Permiso, Rol, RolPermiso, UsuarioPermiso, UsuarioRol
+    from usuarios.models import Usuario
+
+    for modelo in (UsuarioRol, UsuarioPermiso):
+        uid = f"{_PREFIJO}:{modelo._meta.label_lower}"
+        post_save.connect(_por_asignacion, sender=modelo, dispatch_uid=uid + ":save")
+        post_delete.connect(_por_asignacion, sender=modelo, dispatch_uid=uid + ":delete")
+
+    post_save.connect(_por_usuario, sender=Usuario, dispatch_uid=f"{_PREFIJO}:usuario:save")
+    m2m_changed.connect(
+        _por_sucursales, sender=Usuario.sucursales.through, dispatch_uid=f"{_PREFIJO}:usuario:sucursales"
+    )
+
+    for modelo in (RolPermiso, Rol, Permiso):
+        uid = f"{_PREFIJO}:{modelo._meta.label_lower}"
+        post_save.connect(_global, sender=modelo, dispatch_uid=uid + ":save")
+        post_delete.connect(_global, sender=modelo, dispatch_uid=uid + ":delete")
+    m2m_changed.connect(_global, sender=Rol.permisos.through, dispatch_uid=f"{_PREFIJO}:rol:permisos")
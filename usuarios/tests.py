@@ -0,0 +1,100 @@
+"""Tests del caché de permisos compilados (``usuarios.permisos``).
+
+La versión de los permisos vive en la BD: una revocación debe valer desde el
+siguiente request (una instancia nueva del usuario, como la que carga la
+autenticación) aunque cada worker tenga su propio ``LocMemCache``.
+
+Ejecutar SIEMPRE con una BD desechable; el ``.env`` del repo apunta a Supabase
+de producción. Ejemplo con un settings de override a SQLite en memoria:
+
+    python manage.py test usuarios --settings=sqlite_settings
+"""
+
+from django.core.cache import caches
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from nucleo.models import Empresa, Sucursal
+from seguridad.models import Permiso, Rol, RolPermiso, UsuarioPermiso, UsuarioRol
+from usuarios.models import Usuario
+
+CACHES_POR_WORKER = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "worker_a": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "worker-a"},
+    "worker_b": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "worker-b"},
+}
+
+CLAVE = "ventas.pedidos.leer"
+
+
+@override_settings(CACHES=CACHES_POR_WORKER)
+class PermisosCompiladosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="perm", razon_social="Permisos SA")
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, codigo="MTY", nombre="MTY")
+        cls.permiso = Permiso.objects.create(clave=CLAVE, nombre="Leer pedidos")
+        cls.rol = Rol.objects.create(empresa=cls.empresa, codigo="VEND", nombre="Vendedor")
+        RolPermiso.objects.create(rol=cls.rol, permiso=cls.permiso)
+        cls.usuario = Usuario.objects.create(
+            username="vendedor", email="vendedor@perm.test", empresa=cls.empresa
+        )
+
+    def setUp(self):
+        for alias in CACHES_POR_WORKER:
+            caches[alias].clear()
+        self.asignacion = UsuarioRol.objects.create(
+            usuario=self.usuario, rol=self.rol, empresa=self.empresa
+        )
+
+    def _request(self, worker="default"):
+        """Permisos vistos por un request nuevo atendido por ``worker``."""
+        with self.settings(PERMISOS_CACHE_ALIAS=worker):
+            return Usuario.objects.get(pk=self.usuario.pk).permisos_compilados()
+
+    def test_revocar_el_rol_vale_en_el_siguiente_request(self):
+        self.assertIn(CLAVE, self._request().permisos)
+
+        self.asignacion.delete()
+
+        self.assertNotIn(CLAVE, self._request().permisos)
+
+    def test_otro_worker_con_su_propio_cache_ve_la_revocacion(self):
+        self.assertIn(CLAVE, self._request("worker_a").permisos)
+        self.assertIn(CLAVE, self._request("worker_b").permisos)
+
+        # La revocación la atiende el worker A; el caché de B nunca se toca.
+        with self.settings(PERMISOS_CACHE_ALIAS="worker_a"):
+            UsuarioPermiso.objects.create(
+                usuario=self.usuario, permiso=self.permiso, tipo=UsuarioPermiso.TIPO_DENY
+            )
+
+        self.assertNotIn(CLAVE, self._request("worker_b").permisos)
+
+    def test_quitar_el_permiso_al_rol_invalida_a_todos_sus_usuarios(self):
+        self.assertIn(CLAVE, self._request("worker_b").permisos)
+
+        self.rol.permisos.remove(self.permiso)
+
+        self.assertNotIn(CLAVE, self._request("worker_b").permisos)
+
+    def test_sucursales_se_releen_tras_cambiar_el_m2m(self):
+        self.assertEqual(self._request().sucursales, frozenset())
+
+        self.usuario.sucursales.add(self.sucursal)
+
+        self.assertEqual(self._request("worker_b").sucursales, {self.sucursal.pk})
+
+    def test_rollback_restaura_la_version_anterior_sin_reusar_la_nueva(self):
+        version = Usuario.objects.values_list("permisos_version", flat=True).get(pk=self.usuario.pk)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.asignacion.delete()
+                self.assertNotIn(CLAVE, self._request().permisos)
+                raise RuntimeError("rollback")
+
+        self.assertEqual(
+            Usuario.objects.values_list("permisos_version", flat=True).get(pk=self.usuario.pk),
+            version,
+        )
+        self.assertIn(CLAVE, self._request().permisos)
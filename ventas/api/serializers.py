@@ -1,5 +1,6 @@
 from decimal import Decimal, InvalidOperation
 from rest_framework import serializers
+from nucleo.api.campos import CamposDinamicosMixin
 from ventas.models import (
     Cotizacion,
     CotizacionDetalle,
@@ -28,7 +29,7 @@ class CotizacionSerializer(serializers.ModelSerializer):
             'uso_cfdi': {'required': False, 'allow_null': True, 'allow_blank': True},
         }
 
-class CotizacionDashboardItemSerializer(serializers.ModelSerializer):
+class CotizacionDashboardItemSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     estatus_label = serializers.CharField(source="get_estatus_display", read_only=True)
     tipo_pedido_label = serializers.CharField(
         source="get_tipo_pedido_display", read_only=True
@@ -247,7 +248,7 @@ class PedidoDetalleReadSerializer(serializers.ModelSerializer):
     def get_cantidad_total(self, obj):
         return sum(int(t.cantidad or 0) for t in obj.tallas.all())
 
-class PedidoListSerializer(serializers.ModelSerializer):
+class PedidoListSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer minimalista para el LISTADO de pedidos.
 
     Devuelve sólo los campos escalares que consume la tabla del frontend, sin
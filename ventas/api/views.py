@@ -21,6 +21,7 @@ from inventarios.models import (
     MovimientoInventarioDetalle,
     TipoMovimiento,
 )
+from inventarios.services.kardex_service import KardexService
 from ventas.models import (
     Cotizacion,
     CotizacionDetalle,
@@ -60,6 +61,7 @@ from produccion.models import (
 
 from ventas.utils.helpers import _save_cotizacion_detalle, _save_servicios_extras
 from ventas.services.pedido_field_filter_service import filtrar_campos_contabilidad_pedido
+from wms.services.existencia_service import ExistenciaService
 
 logger = logging.getLogger(__name__)
 QTY_PRECISION = Decimal("0.0001")
@@ -224,9 +226,10 @@ class CotizacionViewSet(viewsets.ModelViewSet):
     def _asignar_folio_pedido(self, pedido, empresa):
         if pedido.folio:
             return
+        # Sin select_for_update: ``SerieFolio.consumir`` bloquea la fila sólo
+        # cuando la serie está en modo FILA.
         serie_folio = (
-            SerieFolio.objects.select_for_update()
-            .filter(
+            SerieFolio.objects.filter(
                 empresa=empresa,
                 sucursal=pedido.sucursal,
                 tipo_documento__iexact="PEDIDO",
@@ -242,14 +245,9 @@ class CotizacionViewSet(viewsets.ModelViewSet):
                 }
             )
         try:
-            folio_formateado, nuevo_consecutivo, anio_actual = (
-                serie_folio.get_siguiente_folio()
-            )
+            folio_formateado, nuevo_consecutivo, _ = serie_folio.consumir()
         except Exception:
             raise ValidationError({"folio": "No se pudo generar el folio del pedido."})
-        serie_folio.folio_actual = nuevo_consecutivo
-        serie_folio.ultimo_anio = anio_actual
-        serie_folio.save(update_fields=["folio_actual", "ultimo_anio", "updated_at"])
         pedido.serie_folio = serie_folio
         pedido.folio = folio_formateado
         pedido.folio_consecutivo = nuevo_consecutivo
@@ -460,11 +458,20 @@ class CotizacionViewSet(viewsets.ModelViewSet):
                 )
         return salidas, entradas
 
-    def _update_existencia_quantity(self, existencia, nueva_cantidad):
+    def _set_existencia_quantity(self, existencia, nueva_cantidad):
+        """Fija el saldo de la fila en memoria; se persiste con ``_guardar_existencias``."""
         nueva_cantidad = self._to_decimal_inventory(nueva_cantidad)
         existencia.cantidad = nueva_cantidad
         existencia.stock = max(int(nueva_cantidad), 0)
-        existencia.save(update_fields=["cantidad", "stock", "fecha_actualizacion"])
+        # bulk_update no dispara auto_now: la fecha se pone a mano.
+        existencia.fecha_actualizacion = timezone.now()
+
+    def _guardar_existencias(self, existencias):
+        existencias = list(existencias)
+        if existencias:
+            Existencia.objects.bulk_update(
+                existencias, ["cantidad", "stock", "fecha_actualizacion"]
+            )
 
     def _get_request_meta(self, request=None):
         if request is None:
@@ -481,14 +488,11 @@ class CotizacionViewSet(viewsets.ModelViewSet):
         sucursal,
         producto_id,
         producto_variante_id=None,
-        for_update=False,
     ):
         queryset = Existencia.objects.filter(
             almacen__empresa_id=empresa.pk,
             almacen__sucursal_id=sucursal.pk,
         )
-        if for_update:
-            queryset = queryset.select_for_update()
         if producto_variante_id:
             return queryset.filter(producto_variante_id=producto_variante_id)
         return queryset.filter(
@@ -520,8 +524,50 @@ class CotizacionViewSet(viewsets.ModelViewSet):
             return int(value)
         return float(value)
 
-    def _get_pedido_inventory_location_balance(self, pedido, producto_id, producto_variante_id):
-        balance = {}
+    def _pedido_tiene_movimientos_previos_al_kardex(self, pedido):
+        inicio_kardex = KardexService.inicio()
+        if inicio_kardex is None:
+            return True
+        return AuditoriaEvento.objects.filter(
+            modulo="inventarios",
+            tabla="existencias",
+            id_registro=str(pedido.pk),
+            created_at__lt=inicio_kardex,
+        ).exists()
+
+    def _get_pedido_inventory_location_balances(self, pedido, claves):
+        # Lo que el pedido sacó (y ya devolvió) por ubicación sale de un GROUP BY
+        # sobre el kardex, ligado al pedido por su MovimientoInventario, para
+        # todas las claves a la vez. Los pedidos que se descontaron antes de
+        # existir el kardex sólo tienen ese historial en el JSON de auditoría y
+        # se siguen reconstruyendo de ahí. Devuelve ``{clave: [destinos]}``.
+        claves = list(dict.fromkeys(claves))
+        if not self._pedido_tiene_movimientos_previos_al_kardex(pedido):
+            balances = {
+                clave: {key: -delta for key, delta in balance.items()}
+                for clave, balance in KardexService.saldo_por_ubicacion_pedido(pedido, claves).items()
+            }
+        else:
+            balances = self._get_pedido_inventory_location_balance_auditoria(pedido, claves)
+
+        return {
+            clave: [
+                {
+                    "almacen_id": almacen_id,
+                    "ubicacion_id": ubicacion_id,
+                    "cantidad_disponible_retorno": cantidad,
+                }
+                for (almacen_id, ubicacion_id), cantidad in sorted(
+                    balance.items(),
+                    key=lambda entry: (-entry[1], entry[0][0] or 0, entry[0][1] or 0),
+                )
+                if cantidad > 0
+            ]
+            for clave, balance in balances.items()
+        }
+
+    def _get_pedido_inventory_location_balance_auditoria(self, pedido, claves):
+        balances = {clave: {} for clave in claves}
         eventos = AuditoriaEvento.objects.filter(
             modulo="inventarios",
             tabla="existencias",
@@ -531,9 +577,10 @@ class CotizacionViewSet(viewsets.ModelViewSet):
         for evento in eventos:
             payload = evento.despues_json or {}
             for item in payload.get("items", []):
-                if item.get("producto_id") != producto_id:
-                    continue
-                if item.get("producto_variante_id") != producto_variante_id:
+                balance = balances.get(
+                    (item.get("producto_id"), item.get("producto_variante_id"))
+                )
+                if balance is None:
                     continue
                 key = (
                     item.get("almacen_id"),
@@ -541,42 +588,40 @@ class CotizacionViewSet(viewsets.ModelViewSet):
                 )
                 balance.setdefault(key, Decimal("0.0000"))
                 balance[key] += -self._to_decimal_inventory(item.get("delta", 0))
-
-        return [
-            {
-                "almacen_id": almacen_id,
-                "ubicacion_id": ubicacion_id,
-                "cantidad_disponible_retorno": cantidad,
-            }
-            for (almacen_id, ubicacion_id), cantidad in sorted(
-                balance.items(),
-                key=lambda entry: (-entry[1], entry[0][0] or 0, entry[0][1] or 0),
-            )
-            if cantidad > 0
-        ]
+        return balances
 
 
     def _discount_existencias_pedido(self, plan, empresa, sucursal):
+        # Las filas de todas las claves del plan se leen y bloquean en un solo
+        # SELECT ... FOR UPDATE (en orden de pk), el reparto se calcula en
+        # memoria y se persiste con un solo bulk_update. Antes cada renglón
+        # hacía su propio SELECT bloqueante y un UPDATE por fila tocada: un
+        # pedido de 300 renglones eran cientos de viajes a la BD con los locks
+        # ya tomados.
+        filas_por_clave = ExistenciaService.get_existencia_rows_por_clave(
+            [(item["producto_id"], item["producto_variante_id"]) for item in plan],
+            lock=True,
+            almacen__empresa_id=empresa.pk,
+            almacen__sucursal_id=sucursal.pk,
+        )
         consumos = []
+        tocadas = {}
 
         for item in plan:
             producto = item["producto"]
-            producto_variante_id = item["producto_variante_id"]
             cantidad_requerida = item["cantidad"].quantize(
                 QTY_PRECISION, rounding=ROUND_HALF_UP
             )
 
-            existencias = (
-                self._get_existencias_queryset(
-                    empresa=empresa,
-                    sucursal=sucursal,
-                    producto_id=producto.pk,
-                    producto_variante_id=producto_variante_id,
-                    for_update=True,
-                )
-                .order_by("-cantidad", "id")
+            # Mismo criterio de consumo que antes: primero la fila con más
+            # existencia, desempate por pk.
+            existencias = sorted(
+                filas_por_clave[(item["producto_id"], item["producto_variante_id"])],
+                key=lambda existencia: (
+                    -self._to_decimal_inventory(existencia.cantidad),
+                    existencia.pk,
+                ),
             )
-            existencias = list(existencias)
 
             disponible = sum(
                 (
@@ -611,7 +656,8 @@ class CotizacionViewSet(viewsets.ModelViewSet):
                     QTY_PRECISION, rounding=ROUND_HALF_UP
                 )
 
-                self._update_existencia_quantity(existencia, cantidad_nueva)
+                self._set_existencia_quantity(existencia, cantidad_nueva)
+                tocadas[existencia.pk] = existencia
 
                 consumos.append(
                     {
@@ -630,30 +676,56 @@ class CotizacionViewSet(viewsets.ModelViewSet):
                 )
                 restante -= cantidad_consumida
 
+        self._guardar_existencias(tocadas.values())
         return consumos
 
     def _restore_existencias_pedido(self, pedido, plan):
-        entradas = []
-
+        # Primero se resuelven los destinos de todo el plan (un solo GROUP BY
+        # sobre el kardex, sin bloqueo) y después se bloquean de una sola vez
+        # las filas de todas las claves en los almacenes destino. Igual que el
+        # descuento, el saldo se calcula en memoria y se persiste al final:
+        # bulk_create para las ubicaciones que ya no tenían fila y bulk_update
+        # para el resto.
+        targets_por_clave = self._get_pedido_inventory_location_balances(
+            pedido,
+            [(item["producto_id"], item["producto_variante_id"]) for item in plan],
+        )
+        destinos = []
         for item in plan:
-            producto = item["producto"]
-            producto_id = item["producto_id"]
-            producto_variante_id = item["producto_variante_id"]
-            restante = self._to_decimal_inventory(item["cantidad"])
-            targets = self._get_pedido_inventory_location_balance(
-                pedido=pedido,
-                producto_id=producto_id,
-                producto_variante_id=producto_variante_id,
-            )
-
+            targets = targets_por_clave[(item["producto_id"], item["producto_variante_id"])]
             if not targets:
                 raise ValidationError(
                     {
                         "inventario": (
-                            f"No se pudo determinar la ubicación para devolver existencias de {producto.nombre}."
+                            f"No se pudo determinar la ubicación para devolver existencias de {item['producto'].nombre}."
                         )
                     }
                 )
+            destinos.append((item, targets))
+
+        filas_por_clave = ExistenciaService.get_existencia_rows_por_clave(
+            [(item["producto_id"], item["producto_variante_id"]) for item in plan],
+            lock=True,
+            almacen_id__in={
+                target["almacen_id"] for _, targets in destinos for target in targets
+            },
+        )
+        fila_por_ubicacion = {}
+        for clave, filas in filas_por_clave.items():
+            for fila in filas:
+                fila_por_ubicacion.setdefault(
+                    (clave, fila.almacen_id, fila.ubicacion_id), fila
+                )
+
+        entradas = []
+        tocadas = {}
+        nuevas = []
+        for item, targets in destinos:
+            producto = item["producto"]
+            producto_id = item["producto_id"]
+            producto_variante_id = item["producto_variante_id"]
+            clave = (producto_id, producto_variante_id)
+            restante = self._to_decimal_inventory(item["cantidad"])
 
             for target in targets:
                 if restante <= 0:
@@ -668,18 +740,13 @@ class CotizacionViewSet(viewsets.ModelViewSet):
                 cantidad_retorno = min(capacidad, restante).quantize(
                     QTY_PRECISION, rounding=ROUND_HALF_UP
                 )
-                existencia = (
-                    Existencia.objects.select_for_update()
-                    .filter(
-                        producto_id=producto_id,
-                        producto_variante_id=producto_variante_id,
-                        almacen_id=target["almacen_id"],
-                        ubicacion_id=target["ubicacion_id"],
-                    )
-                    .first()
-                )
+                # Los destinos son uno por clave: dos renglones del plan con la
+                # misma clave comparten la capacidad de cada ubicación.
+                target["cantidad_disponible_retorno"] = capacidad - cantidad_retorno
+                llave = (clave, target["almacen_id"], target["ubicacion_id"])
+                existencia = fila_por_ubicacion.get(llave)
                 if existencia is None:
-                    existencia = Existencia.objects.create(
+                    existencia = Existencia(
                         producto_id=producto_id,
                         producto_variante_id=producto_variante_id,
                         almacen_id=target["almacen_id"],
@@ -687,26 +754,32 @@ class CotizacionViewSet(viewsets.ModelViewSet):
                         cantidad=Decimal("0.0000"),
                         stock=0,
                     )
+                    fila_por_ubicacion[llave] = existencia
+                    nuevas.append(existencia)
 
                 cantidad_actual = self._to_decimal_inventory(existencia.cantidad)
                 cantidad_nueva = (cantidad_actual + cantidad_retorno).quantize(
                     QTY_PRECISION, rounding=ROUND_HALF_UP
                 )
-                self._update_existencia_quantity(existencia, cantidad_nueva)
+                self._set_existencia_quantity(existencia, cantidad_nueva)
+                if existencia.pk is not None:
+                    tocadas[existencia.pk] = existencia
 
                 entradas.append(
-                    {
-                        "producto": producto,
-                        "producto_id": producto_id,
-                        "producto_variante_id": producto_variante_id,
-                        "existencia_id": existencia.pk,
-                        "almacen_id": existencia.almacen_id,
-                        "ubicacion_id": existencia.ubicacion_id,
-                        "cantidad_before": cantidad_actual,
-                        "cantidad_after": cantidad_nueva,
-                        "cantidad_movimiento": cantidad_retorno,
-                        "delta": cantidad_retorno,
-                    }
+                    (
+                        existencia,
+                        {
+                            "producto": producto,
+                            "producto_id": producto_id,
+                            "producto_variante_id": producto_variante_id,
+                            "almacen_id": existencia.almacen_id,
+                            "ubicacion_id": existencia.ubicacion_id,
+                            "cantidad_before": cantidad_actual,
+                            "cantidad_after": cantidad_nueva,
+                            "cantidad_movimiento": cantidad_retorno,
+                            "delta": cantidad_retorno,
+                        },
+                    )
                 )
                 restante -= cantidad_retorno
 
@@ -720,7 +793,15 @@ class CotizacionViewSet(viewsets.ModelViewSet):
                     }
                 )
 
-        return entradas
+        if nuevas:
+            Existencia.objects.bulk_create(nuevas)
+        self._guardar_existencias(tocadas.values())
+
+        # El pk de las filas recién creadas sólo existe después del bulk_create.
+        return [
+            {**datos, "existencia_id": existencia.pk}
+            for existencia, datos in entradas
+        ]
 
     def _registrar_movimiento_inventario_pedido(
         self,
@@ -760,6 +841,11 @@ class CotizacionViewSet(viewsets.ModelViewSet):
                 for item in items
             ]
         )
+        KardexService.registrar(
+            [KardexService.renglon_de_item(item) for item in items],
+            movimiento,
+            tipo_movimiento,
+        )
         return movimiento
 
     def _registrar_auditoria_inventario_pedido(
@@ -2133,16 +2219,13 @@ class PedidoViewSet(viewsets.ModelViewSet):
         if pedido.folio:
             return
 
+        # Sin select_for_update: ``SerieFolio.consumir`` bloquea la fila sólo
+        # cuando la serie está en modo FILA.
         if pedido.serie_folio_id:
-            serie_folio = (
-                SerieFolio.objects.select_for_update()
-                .filter(pk=pedido.serie_folio_id)
-                .first()
-            )
+            serie_folio = SerieFolio.objects.filter(pk=pedido.serie_folio_id).first()
         else:
             serie_folio = (
-                SerieFolio.objects.select_for_update()
-                .filter(
+                SerieFolio.objects.filter(
                     empresa=empresa,
                     sucursal=pedido.sucursal,
                     tipo_documento__iexact="PEDIDO",
@@ -2160,16 +2243,10 @@ class PedidoViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            folio_formateado, nuevo_consecutivo, anio_actual = (
-                serie_folio.get_siguiente_folio()
-            )
+            folio_formateado, nuevo_consecutivo, _ = serie_folio.consumir()
         except Exception:
             raise ValidationError({"folio": "No se pudo generar el folio del pedido."})
 
-        serie_folio.folio_actual = nuevo_consecutivo
-        serie_folio.ultimo_anio = anio_actual
-        serie_folio.save(update_fields=["folio_actual", "ultimo_anio", "updated_at"])
-
         pedido.serie_folio = serie_folio
         pedido.folio = folio_formateado
         pedido.folio_consecutivo = nuevo_consecutivo
@@ -1,4 +1,4 @@
-"""Tests del scope multi-tenant de ``PedidoViewSet``.
+"""Tests del scope multi-tenant de ``PedidoViewSet`` y del inventario del pedido.
 
 Ejecutar SIEMPRE con una BD desechable; el ``.env`` del repo apunta a Supabase
 de producción. Ejemplo con un settings de override a SQLite en memoria:
@@ -6,13 +6,22 @@ de producción. Ejemplo con un settings de override a SQLite en memoria:
     python manage.py test ventas --settings=sqlite_settings
 """
 
+from decimal import Decimal
+from importlib import import_module
+from unittest import skipUnless
+
+from django.db import connection
 from django.test import TestCase
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APIClient
 
 from catalogo.models import Producto, Talla
+from inventarios.models import Almacen, Existencia, MovimientoKardex, TipoMovimiento, Ubicacion
+from inventarios.services.kardex_service import KardexService
 from nucleo.models import Empresa, Moneda, Sucursal
 from terceros.models import Cliente
 from usuarios.models import Usuario
+from ventas.api.views import CotizacionViewSet
 from ventas.models import Cotizacion, Pedido, PedidoDetalle, PedidoDetalleTalla
 
 PEDIDOS_URL = "/api/v1/ventas/pedidos/"
@@ -76,7 +85,7 @@ class PedidoViewSetScopeTenantTests(TestCase):
         client.force_authenticate(user=user)
         resp = client.get(url)
         self.assertEqual(resp.status_code, 200)
-        return [row["id"] for row in resp.json()]
+        return [row["id"] for row in resp.json()["results"]]
 
     # --- el branch roto -------------------------------------------------------
 
@@ -187,7 +196,7 @@ class PedidoMisPedidosFilterTests(TestCase):
         client.force_authenticate(user=user)
         resp = client.get(url)
         self.assertEqual(resp.status_code, 200)
-        return [row["id"] for row in resp.json()]
+        return [row["id"] for row in resp.json()["results"]]
 
     # --- el filtro nuevo ------------------------------------------------------
 
@@ -250,6 +259,89 @@ class PedidoMisPedidosFilterTests(TestCase):
         )
 
 
+class PedidoListPaginacionTests(TestCase):
+    """Paginación keyset por defecto (``CursorPaginacion``) y ``?fields=``.
+
+    Dos pedidos comparten ``created_at`` a propósito: el desempate por pk es lo
+    que impide que una página repita o se salte renglones en el corte.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.moneda = Moneda.objects.create(codigo_iso="MXN", nombre="Peso")
+        cls.empresa = Empresa.objects.create(codigo="acme", razon_social="ACME SA")
+        cls.sucursal = Sucursal.objects.create(
+            empresa=cls.empresa, codigo="MTY", nombre="MTY"
+        )
+        cliente = Cliente.objects.create(empresa=cls.empresa, nombre="Cliente ACME")
+        cls.usuario = Usuario.objects.create(
+            username="pag", email="pag@acme.test", empresa=cls.empresa, is_admin_empresa=True
+        )
+        cls.pedidos = [
+            Pedido.objects.create(
+                empresa=cls.empresa,
+                sucursal=cls.sucursal,
+                cliente=cliente,
+                moneda=cls.moneda,
+                folio=f"PED-{i}",
+                persona_pagos="Pagos",
+                correo_facturas="pagos@acme.test",
+                telefono_pagos="8100000000",
+                forma_pago="03",
+                metodo_pago="PUE",
+                uso_cfdi="G03",
+            )
+            for i in range(5)
+        ]
+        Pedido.objects.filter(pk=cls.pedidos[2].pk).update(
+            created_at=cls.pedidos[1].created_at
+        )
+
+    def _client(self):
+        client = APIClient()
+        client.force_authenticate(user=self.usuario)
+        return client
+
+    def _esperados(self):
+        return list(
+            Pedido.objects.filter(empresa=self.empresa)
+            .order_by("-created_at", "-id")
+            .values_list("id", flat=True)
+        )
+
+    def test_next_recorre_todas_las_paginas_sin_repetir(self):
+        client = self._client()
+        url = f"{PEDIDOS_URL}?page_size=2"
+        vistos = []
+        while url:
+            data = client.get(url).json()
+            self.assertLessEqual(len(data["results"]), 2)
+            vistos.extend(row["id"] for row in data["results"])
+            url = data["next"]
+        self.assertEqual(vistos, self._esperados())
+
+    def test_previous_regresa_a_la_pagina_anterior(self):
+        client = self._client()
+        primera = client.get(f"{PEDIDOS_URL}?page_size=2").json()
+        self.assertIsNone(primera["previous"])
+        segunda = client.get(primera["next"]).json()
+        regreso = client.get(segunda["previous"]).json()
+        self.assertEqual(
+            [row["id"] for row in regreso["results"]],
+            [row["id"] for row in primera["results"]],
+        )
+
+    def test_cursor_invalido_devuelve_404(self):
+        resp = self._client().get(f"{PEDIDOS_URL}?cursor=no-es-un-cursor")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_fields_recorta_las_llaves_del_listado(self):
+        data = self._client().get(f"{PEDIDOS_URL}?fields=id,folio").json()
+        self.assertTrue(data["results"])
+        for row in data["results"]:
+            self.assertEqual(set(row), {"id", "folio"})
+
+
 class PedidoDetalleScopeTenantTests(TestCase):
     """``PedidoDetalleViewSet``/``PedidoDetalleTallaViewSet``: aislamiento tenant.
 
@@ -315,7 +407,7 @@ class PedidoDetalleScopeTenantTests(TestCase):
     def _ids(self, user, url):
         resp = self._client(user).get(url)
         self.assertEqual(resp.status_code, 200)
-        return [row["id"] for row in resp.json()]
+        return [row["id"] for row in resp.json()["results"]]
 
     # --- PedidoDetalle --------------------------------------------------------
 
@@ -478,3 +570,270 @@ class PedidoDetalleScopeTenantTests(TestCase):
             self._ids(self.superuser, PEDIDO_DETALLE_TALLA_URL),
             [self.a["talla_row"].pk, self.b["talla_row"].pk],
         )
+
+
+@skipUnless(connection.vendor == "postgresql", "La restricción NULLS NOT DISTINCT es de Postgres.")
+class FusionExistenciasDuplicadasTests(TestCase):
+    """Migración ``inventarios.0022``: fusiona las existencias con la misma clave.
+
+    La restricción única de 0023 ya está en la BD de pruebas, así que se quita
+    dentro de la transacción del test (el DDL de Postgres es transaccional y el
+    rollback la restaura) para poder sembrar los duplicados que la migración
+    encontraba en producción.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="dup", razon_social="Duplicados SA")
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, codigo="MTY", nombre="MTY")
+        cls.almacen = Almacen.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, codigo="PT", nombre="PT"
+        )
+        cls.ubicacion = Ubicacion.objects.create(almacen=cls.almacen, pasillo="A")
+        cls.producto = Producto.objects.create(empresa=cls.empresa, nombre="Playera", codigo="DUP01")
+
+    def test_duplicados_se_consolidan_en_la_fila_de_menor_pk(self):
+        from django.apps import apps
+
+        migracion = import_module("inventarios.migrations.0022_fusionar_existencias_duplicadas")
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE existencias DROP CONSTRAINT uq_existencia_clave_ubicacion")
+
+        duplicadas = [
+            Existencia.objects.create(
+                producto=self.producto, almacen=self.almacen, cantidad=Decimal(n), stock=n
+            )
+            for n in (2, 3, 4)
+        ]
+        aparte = Existencia.objects.create(
+            producto=self.producto, almacen=self.almacen, ubicacion=self.ubicacion,
+            cantidad=Decimal("7"), stock=7,
+        )
+        renglon = MovimientoKardex.objects.create(
+            existencia=duplicadas[2], almacen=self.almacen, producto=self.producto,
+            tipo_movimiento=TipoMovimiento.ENTRADA, delta=Decimal("4"), saldo=Decimal("4"),
+        )
+
+        migracion.fusionar_existencias_duplicadas(apps, None)
+
+        superviviente = Existencia.objects.get(
+            almacen=self.almacen, producto=self.producto, ubicacion__isnull=True
+        )
+        self.assertEqual(superviviente.pk, duplicadas[0].pk)
+        self.assertEqual(superviviente.cantidad, Decimal("9"))
+        self.assertEqual(superviviente.stock, 9)
+        self.assertFalse(Existencia.objects.filter(pk__in=[d.pk for d in duplicadas[1:]]).exists())
+        # El kardex de una fila borrada queda en la superviviente, no en NULL.
+        renglon.refresh_from_db()
+        self.assertEqual(renglon.existencia_id, superviviente.pk)
+        # Otra ubicación es otra clave: no se toca.
+        aparte.refresh_from_db()
+        self.assertEqual(aparte.cantidad, Decimal("7"))
+
+
+class PedidoKardexTests(TestCase):
+    """Descuento y reintegro de inventario del pedido contra el kardex.
+
+    Se llama directo a los helpers de ``CotizacionViewSet``: lo que interesa es
+    qué renglones deja cada movimiento y que el reintegro resuelva las
+    ubicaciones desde el kardex y no desde el JSON de auditoría.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.moneda = Moneda.objects.create(codigo_iso="MXN", nombre="Peso")
+        cls.empresa = Empresa.objects.create(codigo="acme", razon_social="ACME SA")
+        cls.sucursal = Sucursal.objects.create(
+            empresa=cls.empresa, codigo="MTY", nombre="MTY"
+        )
+        cls.cliente = Cliente.objects.create(empresa=cls.empresa, nombre="Cliente ACME")
+        cls.usuario = Usuario.objects.create(
+            username="kardex", email="kardex@acme.test", empresa=cls.empresa
+        )
+        cls.almacen = Almacen.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, codigo="PT", nombre="PT"
+        )
+        cls.producto = Producto.objects.create(
+            empresa=cls.empresa, nombre="Playera", codigo="PL01"
+        )
+        cls.pedido = Pedido.objects.create(
+            empresa=cls.empresa,
+            sucursal=cls.sucursal,
+            cliente=cls.cliente,
+            moneda=cls.moneda,
+            folio="PED-K",
+            persona_pagos="Pagos",
+            correo_facturas="pagos@acme.test",
+            telefono_pagos="8100000000",
+            forma_pago="03",
+            metodo_pago="PUE",
+            uso_cfdi="G03",
+        )
+
+        cls.ubicacion_a = Ubicacion.objects.create(almacen=cls.almacen, pasillo="A")
+        cls.ubicacion_b = Ubicacion.objects.create(almacen=cls.almacen, pasillo="B")
+
+    def setUp(self):
+        # Una fila por ubicación: la clave de stock es única por
+        # (almacén, ubicación, producto, variante).
+        self.fila_a = Existencia.objects.create(
+            producto=self.producto, almacen=self.almacen, ubicacion=self.ubicacion_a,
+            cantidad=Decimal("5"), stock=5,
+        )
+        self.fila_b = Existencia.objects.create(
+            producto=self.producto, almacen=self.almacen, ubicacion=self.ubicacion_b,
+            cantidad=Decimal("3"), stock=3,
+        )
+        self.view = CotizacionViewSet()
+
+    def _plan(self, cantidad):
+        return [
+            {
+                "producto": self.producto,
+                "producto_id": self.producto.pk,
+                "producto_variante_id": None,
+                "cantidad": Decimal(cantidad),
+            }
+        ]
+
+    def _descontar(self, cantidad):
+        consumos = self.view._discount_existencias_pedido(
+            self._plan(cantidad), self.empresa, self.sucursal
+        )
+        return self.view._registrar_movimiento_inventario_pedido(
+            pedido=self.pedido,
+            user=self.usuario,
+            items=consumos,
+            tipo_movimiento=TipoMovimiento.SALIDA,
+            observaciones="test",
+        )
+
+    def test_descuento_deja_un_renglon_por_fila_tocada(self):
+        movimiento = self._descontar("7")
+
+        renglones = {
+            r.existencia_id: r for r in MovimientoKardex.objects.filter(movimiento_inventario=movimiento)
+        }
+        self.assertEqual(set(renglones), {self.fila_a.pk, self.fila_b.pk})
+        self.assertEqual(renglones[self.fila_a.pk].delta, Decimal("-5"))
+        self.assertEqual(renglones[self.fila_a.pk].saldo, Decimal("0"))
+        self.assertEqual(renglones[self.fila_b.pk].delta, Decimal("-2"))
+        self.assertEqual(renglones[self.fila_b.pk].saldo, Decimal("1"))
+        self.assertTrue(
+            all(r.tipo_movimiento == TipoMovimiento.SALIDA for r in renglones.values())
+        )
+
+    def test_reintegro_resuelve_ubicaciones_desde_el_kardex(self):
+        self._descontar("7")
+
+        balance = self.view._get_pedido_inventory_location_balances(
+            self.pedido, [(self.producto.pk, None)]
+        )[(self.producto.pk, None)]
+        self.assertEqual(
+            balance,
+            [
+                {
+                    "almacen_id": self.almacen.pk,
+                    "ubicacion_id": self.ubicacion_a.pk,
+                    "cantidad_disponible_retorno": Decimal("5"),
+                },
+                {
+                    "almacen_id": self.almacen.pk,
+                    "ubicacion_id": self.ubicacion_b.pk,
+                    "cantidad_disponible_retorno": Decimal("2"),
+                },
+            ],
+        )
+
+    def test_descuento_de_varias_claves_y_reintegro(self):
+        otro = Producto.objects.create(empresa=self.empresa, nombre="Gorra", codigo="GO01")
+        fila_otro = Existencia.objects.create(
+            producto=otro, almacen=self.almacen, ubicacion=self.ubicacion_a,
+            cantidad=Decimal("4"), stock=4,
+        )
+        plan = self._plan("6") + [
+            {"producto": otro, "producto_id": otro.pk, "producto_variante_id": None, "cantidad": Decimal("4")}
+        ]
+        consumos = self.view._discount_existencias_pedido(plan, self.empresa, self.sucursal)
+        self.view._registrar_movimiento_inventario_pedido(
+            pedido=self.pedido, user=self.usuario, items=consumos,
+            tipo_movimiento=TipoMovimiento.SALIDA, observaciones="test",
+        )
+        for fila in (self.fila_a, self.fila_b, fila_otro):
+            fila.refresh_from_db()
+        self.assertEqual(
+            [self.fila_a.cantidad, self.fila_b.cantidad, fila_otro.cantidad],
+            [Decimal("0"), Decimal("2"), Decimal("0")],
+        )
+        self.assertEqual(self.fila_b.stock, 2)
+
+        # La fila de la gorra desaparece: el reintegro debe recrearla en la
+        # ubicación de la que salió.
+        fila_otro.delete()
+        entradas = self.view._restore_existencias_pedido(
+            self.pedido,
+            [
+                {"producto": self.producto, "producto_id": self.producto.pk, "producto_variante_id": None, "cantidad": Decimal("6")},
+                {"producto": otro, "producto_id": otro.pk, "producto_variante_id": None, "cantidad": Decimal("1")},
+            ],
+        )
+        self.assertTrue(all(e["existencia_id"] for e in entradas))
+        self.assertEqual(
+            Existencia.objects.get(producto=otro, ubicacion=self.ubicacion_a).cantidad,
+            Decimal("1"),
+        )
+        self.fila_a.refresh_from_db()
+        self.fila_b.refresh_from_db()
+        self.assertEqual([self.fila_a.cantidad, self.fila_b.cantidad], [Decimal("5"), Decimal("3")])
+
+    def test_descuento_insuficiente_no_toca_ninguna_fila(self):
+        with self.assertRaises(ValidationError):
+            self.view._discount_existencias_pedido(self._plan("9"), self.empresa, self.sucursal)
+        self.fila_a.refresh_from_db()
+        self.assertEqual(self.fila_a.cantidad, Decimal("5"))
+
+    def test_el_kardex_no_admite_modificaciones(self):
+        movimiento = self._descontar("1")
+        renglon = MovimientoKardex.objects.get(movimiento_inventario=movimiento)
+
+        with self.assertRaises(ValueError):
+            renglon.save()
+        with self.assertRaises(ValueError):
+            renglon.delete()
+
+    def test_el_kardex_exige_movimiento_inventario(self):
+        with self.assertRaises(ValueError):
+            KardexService.registrar(
+                [KardexService.renglon(self.fila_a, Decimal("-1"))], None, TipoMovimiento.SALIDA
+            )
+        self.assertFalse(MovimientoKardex.objects.exists())
+
+    def test_saldos_de_varias_claves_en_una_consulta_agrupada(self):
+        otro = Producto.objects.create(empresa=self.empresa, nombre="Gorra", codigo="GO01")
+        Existencia.objects.create(
+            producto=otro, almacen=self.almacen, ubicacion=self.ubicacion_b,
+            cantidad=Decimal("4"), stock=4,
+        )
+        plan = self._plan("6") + [
+            {"producto": otro, "producto_id": otro.pk, "producto_variante_id": None, "cantidad": Decimal("3")}
+        ]
+        consumos = self.view._discount_existencias_pedido(plan, self.empresa, self.sucursal)
+        self.view._registrar_movimiento_inventario_pedido(
+            pedido=self.pedido, user=self.usuario, items=consumos,
+            tipo_movimiento=TipoMovimiento.SALIDA, observaciones="test",
+        )
+        claves = [(self.producto.pk, None), (otro.pk, None)]
+
+        # Inicio del kardex, historial previo en auditoría y un solo GROUP BY,
+        # sin importar cuántas claves traiga el plan.
+        with self.assertNumQueries(3):
+            balances = self.view._get_pedido_inventory_location_balances(self.pedido, claves)
+
+        self.assertEqual(
+            [(d["ubicacion_id"], d["cantidad_disponible_retorno"]) for d in balances[(self.producto.pk, None)]],
+            [(self.ubicacion_a.pk, Decimal("5")), (self.ubicacion_b.pk, Decimal("1"))],
+        )
+        self.assertEqual(
+            [(d["ubicacion_id"], d["cantidad_disponible_retorno"]) for d in balances[(otro.pk, None)]],
+            [(self.ubicacion_b.pk, Decimal("3"))],
+        )
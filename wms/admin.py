@@ -318,7 +318,16 @@ class EtiquetaRFIDImpresionAdmin(admin.ModelAdmin):
         ),
         (
             "Contenido",
-            {"fields": ("zpl_enviado", "observaciones")},
+            {
+                "fields": (
+                    "plantilla_zpl",
+                    "datos_etiqueta",
+                    "epc_inicial",
+                    "epc_final",
+                    "zpl_enviado",
+                    "observaciones",
+                )
+            },
         ),
     )
     inlines = (EtiquetaRFIDDetalleInline,)
@@ -358,10 +367,13 @@ class RfidScanAdmin(admin.ModelAdmin):
         "reader_ip",
         "antenna",
         "rssi",
+        "lecturas",
+        "primera_lectura",
+        "ultima_lectura",
         "created_at",
     )
     list_filter = ("created_at", "antenna", "reader_ip")
     search_fields = ("epc", "reader_ip", "id")
-    readonly_fields = ("created_at",)
+    readonly_fields = ("created_at", "primera_lectura", "ultima_lectura")
     ordering = ("-created_at", "-id")
     show_full_result_count = False
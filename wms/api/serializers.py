@@ -3,7 +3,10 @@ from decimal import Decimal
 from rest_framework import serializers
 
 from catalogo.models import Producto, ProductoVariante
+from inventarios.models import Almacen
 from logistica.models import Envio
+from nucleo.api.campos import CamposDinamicosMixin
+from usuarios.models import Usuario
 from wms.models import (
     Despacho,
     DespachoDetalle,
@@ -127,7 +130,7 @@ class TransferenciaDetalleReadSerializer(serializers.ModelSerializer):
         return str(obj.ubicacion_destino) if obj.ubicacion_destino_id else None
 
 
-class TransferenciaListSerializer(serializers.ModelSerializer):
+class TransferenciaListSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Listado de transferencias (acción ``list``).
 
     Forma ligera y plana: encabezado con las FK resueltas, sin anidar renglones
@@ -278,7 +281,7 @@ class PickingOrdenTrabajoReadSerializer(serializers.ModelSerializer):
         ]
 
 
-class PickingSerializer(serializers.ModelSerializer):
+class PickingSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer compartido de picking (``list``, ``retrieve`` y respuesta del
     ``create``).
 
@@ -389,6 +392,29 @@ class PickingCreateSerializer(serializers.ModelSerializer):
             "picking_detalle",
         ]
 
+class OleadaPlanSerializer(serializers.Serializer):
+    """Parámetros del planeador de oleadas (``OleadaService``).
+
+    Sólo ``almacen`` es obligatorio: sin ``pedidos`` se planean todos los
+    pedidos autorizados del almacén; sin ``almacen_destino`` cada pedido va
+    al APARTADOS de su sucursal; sin ``operador`` se asigna a quien planea.
+    """
+
+    almacen = serializers.PrimaryKeyRelatedField(queryset=Almacen.objects.all())
+    almacen_destino = serializers.PrimaryKeyRelatedField(
+        queryset=Almacen.objects.all(), required=False, allow_null=True
+    )
+    operador = serializers.PrimaryKeyRelatedField(
+        queryset=Usuario.objects.all(), required=False, allow_null=True
+    )
+    pedidos = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_empty=True
+    )
+    max_pedidos_por_lote = serializers.IntegerField(min_value=1, max_value=50, required=False)
+    max_lineas_por_lote = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+    prioridad = serializers.ChoiceField(choices=Picking.Prioridad.choices, required=False)
+
+
 class PackingDetalleReadSerializer(serializers.ModelSerializer):
     producto = serializers.IntegerField(
         source="picking_detalle.producto_id", read_only=True
@@ -448,7 +474,7 @@ class PackingDetalleReadSerializer(serializers.ModelSerializer):
     def get_ubicacion_nombre(self, obj):
         return str(obj.picking_detalle.ubicacion) if obj.picking_detalle.ubicacion_id else None
 
-class PackingSerializer(serializers.ModelSerializer):
+class PackingSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     packing_detalle = PackingDetalleReadSerializer(many=True, read_only=True)
     pedido_folio = serializers.CharField(source="pedido.folio", read_only=True)
     picking_folio = serializers.CharField(source="picking.folio", read_only=True)
@@ -588,7 +614,7 @@ class DespachoDetalleReadSerializer(serializers.ModelSerializer):
         return str(ubicacion) if ubicacion else None
 
 
-class DespachoSerializer(serializers.ModelSerializer):
+class DespachoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     despacho_detalle = DespachoDetalleReadSerializer(many=True, read_only=True)
     packing_folio = serializers.CharField(source="packing.folio", read_only=True)
     packing_estado = serializers.CharField(source="packing.estado", read_only=True)
@@ -641,7 +667,7 @@ class EtiquetaRFIDDetalleReadSerializer(serializers.ModelSerializer):
         read_only_fields = ["impresion"]
 
 
-class EtiquetaRFIDSerializer(serializers.ModelSerializer):
+class EtiquetaRFIDSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     folio = serializers.CharField(read_only=True)
     etiquetas = EtiquetaRFIDDetalleReadSerializer(many=True, read_only=True)
     empresa = serializers.IntegerField(source="empresa_id", read_only=True)
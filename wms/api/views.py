@@ -1,14 +1,17 @@
-from django.db.models import Prefetch
+from django.db.models import F, Prefetch
+from django.http import StreamingHttpResponse
 from rest_framework import mixins, status
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
+from nucleo.api.campos import campo_solicitado
 from wms.api.serializers import (
     DespachoCreateSerializer,
     DespachoSerializer,
     EtiquetaRFIDCreateSerializer,
     EtiquetaRFIDSerializer,
+    OleadaPlanSerializer,
     PackingCreateSerializer,
     TransferenciaListSerializer,
     TransferenciaRetrieveSerializer,
@@ -32,10 +35,14 @@ from wms.models import (
     TransferenciaDetalle,
 )
 from wms.services.despacho_service import DespachoService
+from wms.services.oleada_service import OleadaService
 from wms.services.transferencia_service import TransferenciaService
 from wms.services.picking_service import PickingService
 from wms.services.packing_service import PackingService
+from wms.services.rfid_ingesta_service import RFIDIngestaService
 from wms.services.rfid_label_service import RFIDLabelService
+from wms.services.ruta_picking_service import RutaPickingService
+from wms.utils.epc import normalizar_epc
 
 
 class TransferenciaViewSet(
@@ -43,6 +50,7 @@ class TransferenciaViewSet(
 ):
     queryset = Transferencia.objects.all()
     serializer_class = TransferenciaSerializer
+    cursor_ordering = "fecha_creacion"  # mismo orden que get_queryset
 
     def get_queryset(self):
         user = self.request.user
@@ -128,20 +136,15 @@ class PickingViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericVi
         # también en el list, así que el prefetch aplica a ambas acciones.
         # ``ubicacion__almacen`` viaja en el select_related porque la etiqueta de
         # una Ubicacion se compone con ``almacen.nombre``.
-        qs = (
-            super()
-            .get_queryset()
-            .select_related(
-                "pedido",
-                "operador",
-                "almacen",
-                "almacen_destino",
-                "usuario",
-                "oleada",
-                "zona_almacen",
-                "lote",
-            )
-            .prefetch_related(
+        #
+        # Con ``?fields=`` que no incluya un anidado, su prefetch se omite: el
+        # serializer ya no lo representaría y cargarlo sería puro costo.
+        #
+        # Los renglones salen en orden de recorrido (``secuencia_recorrido``,
+        # ver RutaPickingService); los no secuenciados, al final por id.
+        prefetches = []
+        if campo_solicitado(self.request, "picking_detalle"):
+            prefetches.append(
                 Prefetch(
                     "picking_detalle",
                     queryset=PickingDetalle.objects.select_related(
@@ -153,8 +156,11 @@ class PickingViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericVi
                         "ubicacion",
                         "ubicacion__almacen",
                         "operador",
-                    ).order_by("id"),
-                ),
+                    ).order_by(F("secuencia_recorrido").asc(nulls_last=True), "id"),
+                )
+            )
+        if campo_solicitado(self.request, "ordenes_trabajo"):
+            prefetches.append(
                 Prefetch(
                     "ordenes_trabajo",
                     queryset=PickingOrdenTrabajo.objects.select_related(
@@ -162,8 +168,22 @@ class PickingViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericVi
                         "orden_reflejante",
                         "orden_corte_manga",
                     ).order_by("id"),
-                ),
+                )
+            )
+        qs = (
+            super()
+            .get_queryset()
+            .select_related(
+                "pedido",
+                "operador",
+                "almacen",
+                "almacen_destino",
+                "usuario",
+                "oleada",
+                "zona_almacen",
+                "lote",
             )
+            .prefetch_related(*prefetches)
             .order_by("-created_at", "-id")
         )
 
@@ -226,6 +246,63 @@ class PickingViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericVi
         response_data["ordenes_trabajo_generadas"] = ordenes_trabajo
         return Response(response_data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=["get", "post"], url_path="oleadas", url_name="oleadas")
+    def oleadas(self, request):
+        """Planeador de oleadas: GET = preview sin escribir, POST = crear.
+
+        Agrupa los pedidos autorizados del almacén en lotes por afinidad de
+        SKUs y pasillos, y en el POST crea oleada, lotes, pickings
+        ``WAVE_PICKING`` y reservas en una sola transacción. Ver
+        ``OleadaService``.
+        """
+        datos = request.query_params if request.method == "GET" else request.data
+        if request.method == "GET" and "pedidos" in datos:
+            datos = datos.copy()
+            datos.setlist("pedidos", [p for p in ",".join(datos.getlist("pedidos")).split(",") if p])
+        serializer = OleadaPlanSerializer(data=datos)
+        serializer.is_valid(raise_exception=True)
+        opciones = dict(serializer.validated_data)
+
+        almacen = opciones.pop("almacen")
+        user = request.user
+        if not getattr(user, "is_superuser", False) and almacen.empresa_id != getattr(user, "empresa_id", None):
+            raise PermissionDenied("El almacén no pertenece a la empresa del usuario.")
+
+        parametros = {
+            "operador": opciones.get("operador"),
+            "almacen_destino": opciones.get("almacen_destino"),
+            "pedido_ids": opciones.get("pedidos") or None,
+            "max_pedidos_por_lote": opciones.get("max_pedidos_por_lote"),
+            "max_lineas_por_lote": opciones.get("max_lineas_por_lote"),
+        }
+        if request.method == "GET":
+            plan = OleadaService.planear(almacen, user, **parametros)
+            return Response(OleadaService.serializar_plan(plan))
+
+        oleada, plan = OleadaService.crear_oleada(
+            almacen, user, prioridad=opciones.get("prioridad"), **parametros
+        )
+        return Response(
+            OleadaService.serializar_plan(plan, oleada),
+            status=status.HTTP_201_CREATED if oleada else status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["get", "post"], url_path="ruta", url_name="ruta")
+    def ruta(self, request, pk=None):
+        """Recorrido del picking: GET = calcular sin guardar, POST = guardar.
+
+        Devuelve las paradas en orden con sus renglones y los pasos estimados
+        contra el orden por pk. El POST reescribe ``secuencia_recorrido``
+        (útil tras reubicar mercancía o cambiar ``orden_recorrido``).
+        """
+        picking = self.get_object()
+        paradas, resumen = RutaPickingService.secuenciar_picking(
+            picking, guardar=request.method == "POST"
+        )
+        return Response(
+            dict(resumen, picking=picking.pk, paradas_detalle=RutaPickingService.serializar_paradas(paradas))
+        )
+
 class PackingViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, GenericViewSet):
     queryset = Packing.objects.all()
     serializer_class = PackingSerializer
@@ -297,6 +374,7 @@ class PackingViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, GenericVi
 class DespachoViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, GenericViewSet):
     queryset = Despacho.objects.all()
     serializer_class = DespachoSerializer
+    cursor_ordering = "packing__created_at"  # mismo orden que get_queryset
 
     def get_queryset(self):
         user = self.request.user
@@ -384,14 +462,16 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
             super()
             .get_queryset()
             .select_related("empresa", "sucursal", "usuario", "producto", "producto_variante")
-            .prefetch_related(
+            .order_by("-created_at", "-id")
+        )
+        if self.action != "zpl":
+            # ``zpl`` lee los EPC por lotes; no hace falta cargar los detalles.
+            qs = qs.prefetch_related(
                 Prefetch(
                     "etiquetas",
                     queryset=EtiquetaRFIDDetalle.objects.order_by("id"),
                 )
             )
-            .order_by("-created_at", "-id")
-        )
 
         if getattr(user, "is_superuser", False):
             return qs
@@ -665,6 +745,17 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
     def create(self, request):
         return self.registrar_impresion(request)
 
+    @action(detail=True, methods=["get"], url_path="zpl", url_name="zpl")
+    def zpl(self, request, pk=None):
+        """Trabajo ZPL de la impresión, armado con su plantilla y enviado por bloques."""
+        impresion = self.get_object()
+        response = StreamingHttpResponse(
+            RFIDLabelService.iter_zpl_impresion(impresion),
+            content_type="text/plain; charset=utf-8",
+        )
+        response["Content-Disposition"] = f'attachment; filename="{impresion.folio}.zpl"'
+        return response
+
     # ── SCANNER / LECTOR RFID ───────────────────────────────────────────
     # Next.js NO necesita usar routes /QA/* para el scanner.
     # Consume estos 3 endpoints del V1 que ya respetan scope empresa/sucursales.
@@ -689,13 +780,13 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
         Response shape:
             {
               scans: [
-                {id, epc, timestamp, antenna, rssi, reader_ip,
+                {id, epc, timestamp, antenna, rssi, reader_ip, lecturas, ultima_lectura,
                  match_impresion: bool,
                  impresion_folio, impresion_id, producto_nombre, sku, color, talla,
                  barcode_value, serial, estado, detalle_id,
-                 match_debug: {scan_epc, scan_epc_len, variants_tried, variant_used,
-                               detalle_epc_raw, detalle_epc_len, detalle_epc_variants} |
-                              {scan_epc, scan_epc_len, variants_tried, variant_used:null,
+                 match_debug: {scan_epc, scan_epc_len, epc_normalizado,
+                               detalle_epc_raw, detalle_epc_len} |
+                              {scan_epc, scan_epc_len, epc_normalizado,
                                detalle_lookup_count:int}
                 }, ...
               ],
@@ -705,43 +796,12 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
         scans = list(
             RfidScan.objects.order_by("-created_at", "-id")[:50]
         )
-        epc_list = [s.epc for s in scans if s.epc]
-        epc_lower_set = {e.lower() for e in epc_list if e}
-
-        def _epc_variants(epc):
-            base = (epc or "").strip().lower()
-            if not base:
-                return set()
-            vars = {base}
-            vars.add(base.lstrip("0"))
-            vars.add(base.rstrip("0"))
-            vars.add(base.strip("0"))
-            if len(base) > 24:
-                vars.add(base[:24])
-                vars.add(base[-24:])
-                vars.add(base[:24].lstrip("0"))
-                vars.add(base[-24:].lstrip("0"))
-                for target_len in (28, 32):
-                    if len(base) >= target_len:
-                        vars.add(base[:target_len])
-                        vars.add(base[-target_len:])
-            elif len(base) < 24:
-                pad_left = base.rjust(24, "0")
-                pad_right = base.ljust(24, "0")
-                vars.add(pad_left)
-                vars.add(pad_right)
-                vars.add(pad_left.lstrip("0"))
-                vars.add(pad_right.rstrip("0"))
-            return {v for v in vars if len(v) >= 8}
-
-        epc_search_set = set()
-        for e in list(epc_lower_set):
-            epc_search_set |= _epc_variants(e)
-
         user = request.user
         detalle_qs = (
+            # Un IN exacto (≤50 valores) sobre la columna indexada: ambos lados
+            # guardan el EPC canónico de ``normalizar_epc``.
             EtiquetaRFIDDetalle.objects.filter(
-                epc__in=list(epc_search_set) + list({v.upper() for v in epc_search_set})
+                epc_normalizado__in={s.epc_normalizado for s in scans if s.epc_normalizado}
             )
             .select_related(
                 "impresion",
@@ -751,7 +811,7 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
                 "impresion__producto_variante__talla",
             )
             .only(
-                "epc", "barcode_value", "serial", "estado",
+                "epc", "epc_normalizado", "barcode_value", "serial", "estado",
                 "impresion__id",
                 "impresion__producto_id", "impresion__producto__nombre",
                 "impresion__producto_variante_id", "impresion__producto_variante__nombre",
@@ -772,23 +832,15 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
             if sucursales_ok:
                 detalle_qs = detalle_qs.filter(impresion__sucursal_id__in=sucursales_ok)
 
-        detalle_by_epc_variant = {}
+        detalle_by_epc = {}
         for d in detalle_qs:
-            for v in _epc_variants(d.epc):
-                detalle_by_epc_variant.setdefault(v, d)
+            detalle_by_epc.setdefault(d.epc_normalizado, d)
 
         data = []
         for scan in scans:
             epc = scan.epc or ""
             epc_lower = epc.lower()
-            detalle = None
-            variant_used = None
-            variants_tried = list(_epc_variants(epc_lower))
-            for variant in variants_tried:
-                detalle = detalle_by_epc_variant.get(variant)
-                if detalle is not None:
-                    variant_used = variant
-                    break
+            detalle = detalle_by_epc.get(scan.epc_normalizado) if scan.epc_normalizado else None
             item = {
                 "id": scan.pk,
                 "epc": epc,
@@ -796,6 +848,8 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
                 "antenna": scan.antenna,
                 "rssi": scan.rssi,
                 "reader_ip": scan.reader_ip,
+                "lecturas": scan.lecturas,
+                "ultima_lectura": scan.ultima_lectura.isoformat() if scan.ultima_lectura else None,
             }
             if detalle is not None:
                 impresion = detalle.impresion
@@ -829,11 +883,9 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
                     "match_debug": {
                         "scan_epc": epc_lower,
                         "scan_epc_len": len(epc_lower),
-                        "variants_tried": variants_tried,
-                        "variant_used": variant_used,
+                        "epc_normalizado": scan.epc_normalizado,
                         "detalle_epc_raw": detalle.epc,
                         "detalle_epc_len": len(detalle.epc or ""),
-                        "detalle_epc_variants": sorted(_epc_variants(detalle.epc)),
                     },
                 })
             else:
@@ -841,9 +893,8 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
                 item["match_debug"] = {
                     "scan_epc": epc_lower,
                     "scan_epc_len": len(epc_lower),
-                    "variants_tried": variants_tried,
-                    "variant_used": None,
-                    "detalle_lookup_count": len(detalle_by_epc_variant),
+                    "epc_normalizado": scan.epc_normalizado,
+                    "detalle_lookup_count": len(detalle_by_epc),
                 }
             data.append(item)
 
@@ -852,24 +903,22 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
         q_epc = (request.query_params.get("epc") or "").strip().lower()
         q_search_debug = None
         if q_epc:
-            q_vars = sorted(_epc_variants(q_epc))
-            hit = None
-            for v in q_vars:
-                if v in epc_all_scans_set:
-                    hit = v
-                    break
+            q_normalizado = normalizar_epc(q_epc)
+            hit = next(
+                (s.epc.lower() for s in scans if q_normalizado and s.epc_normalizado == q_normalizado),
+                None,
+            )
             q_search_debug = {
                 "query_epc": q_epc,
                 "query_epc_len": len(q_epc),
-                "variants_count": len(q_vars),
-                "variants_head5": q_vars[:5],
+                "epc_normalizado": q_normalizado,
                 "found_in_scans": bool(hit),
                 "hit_variant": hit,
             }
         debug_get = {
             "scans_returned": len(data),
             "scans_total_max_50": len(scans),
-            "lookup_detalle_count": len(detalle_by_epc_variant),
+            "lookup_detalle_count": len(detalle_by_epc),
             "unique_epc_in_50_scans_count": len(epc_all_scans_set),
             "unique_epc_prefixes_head30": sorted({e[:4] for e in epc_all_scans_lower})[:30],
             "query_epc_search": q_search_debug,
@@ -925,18 +974,9 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
 
         q_epc = (request.query_params.get("epc") or "").strip().lower()
         q_found_samples = []
-        if q_epc:
-            def _v(epc):
-                base = epc
-                vars = {base, base.lstrip("0"), base.rstrip("0"), base.strip("0")}
-                if len(base) > 24:
-                    vars |= {base[:24], base[-24:]}
-                if len(base) < 24:
-                    vars |= {base.rjust(24, "0"), base.ljust(24, "0")}
-                return vars
-            base_vars = _v(q_epc)
-            q_lookup = list(base_vars) + [v.upper() for v in base_vars]
-            qs_found = RfidScan.objects.filter(epc__in=q_lookup).order_by("-created_at")[:10]
+        q_normalizado = normalizar_epc(q_epc)
+        if q_normalizado:
+            qs_found = RfidScan.objects.filter(epc_normalizado=q_normalizado).order_by("-created_at")[:10]
             for f in qs_found:
                 q_found_samples.append({
                     "id": f.id, "epc": f.epc, "epc_len": len(f.epc or ""),
@@ -973,8 +1013,12 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
         url_name="scans_clear",
     )
     def scans_clear(self, request):
-        """Purge list: borra todos los renglones de RfidScan (lecturas).
-        Respuesta: {"status": "success", "deleted": N}
+        """Purga de lecturas según la retención (``RFID_RETENCION_HORAS``).
+
+        ``horas`` (body o query) sobreescribe la retención; ``horas=0`` borra
+        todo explícitamente. Respuesta:
+        ``{"status": "success", "deleted": N, "ultimo_id": id}``; ``ultimo_id``
+        sirve al monitor para mostrar sólo lecturas posteriores.
 
         Solo superusuario o administrador de empresa: el borrado es global
         (``RfidScan`` no tiene FK a empresa todavía).
@@ -983,5 +1027,14 @@ class EtiquetaRFIDViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, Gene
         if not (getattr(user, "is_superuser", False) or getattr(user, "is_admin_empresa", False)):
             raise PermissionDenied("No tiene permisos para realizar esta acción.")
 
-        deleted, _ = RfidScan.objects.all().delete()
-        return Response({"status": "success", "deleted": deleted})
+        horas = request.data.get("horas", request.query_params.get("horas"))
+        if horas in (None, ""):
+            horas = None
+        else:
+            try:
+                horas = float(horas)
+            except (TypeError, ValueError):
+                raise ValidationError({"horas": "Debe ser numérico."})
+        deleted = RFIDIngestaService.purgar(horas=horas)
+        ultimo = RfidScan.objects.order_by("-id").values_list("id", flat=True).first()
+        return Response({"status": "success", "deleted": deleted, "ultimo_id": ultimo or 0})
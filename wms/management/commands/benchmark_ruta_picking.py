@@ -0,0 +1,96 @@
+import random
+import statistics
+import time
+from itertools import product
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wms.models import LotePicking, Picking, PickingDetalle
+from wms.services.ruta_picking_service import MedidorRecorrido, RutaPickingService, ordenar_ubicaciones
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara los pasos del recorrido de picking en orden de pk contra la "
+        "secuencia de RutaPickingService (orden_recorrido + serpentina). Con "
+        "--picking o --lote mide documentos reales sin escribir nada; sin "
+        "ellos genera --muestras pickings sintéticos sobre una rejilla de "
+        "--pasillos x --racks (no toca la base)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--picking", type=int, action="append", help="Id de picking (repetible).")
+        parser.add_argument("--lote", type=int, action="append", help="Id de lote de picking (repetible).")
+        parser.add_argument("--pasillos", type=int, default=12, help="Pasillos de la rejilla sintética.")
+        parser.add_argument("--racks", type=int, default=20, help="Racks por pasillo.")
+        parser.add_argument("--niveles", type=int, default=4, help="Niveles por rack.")
+        parser.add_argument("--lineas", type=int, default=30, help="Renglones por picking sintético.")
+        parser.add_argument("--muestras", type=int, default=200, help="Pickings sintéticos a medir.")
+        parser.add_argument("--semilla", type=int, default=1, help="Semilla del generador.")
+
+    def handle(self, *args, **options):
+        if options.get("picking") or options.get("lote"):
+            resultados = self._reales(options.get("picking") or [], options.get("lote") or [])
+        else:
+            resultados = self._sinteticos(options)
+        if not resultados:
+            raise CommandError("No hubo recorridos que medir.")
+
+        for nombre, pk, secuenciado, ms in resultados:
+            if nombre:
+                self.stdout.write(f"{nombre:<24} pk={pk:>6} secuencia={secuenciado:>6} ({ms:.2f} ms)")
+
+        pk_total = sum(r[1] for r in resultados)
+        sec_total = sum(r[2] for r in resultados)
+        ahorros = [1 - r[2] / r[1] for r in resultados if r[1]]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(resultados)} recorrido(s): {pk_total} pasos en orden de pk, "
+                f"{sec_total} secuenciados ({(1 - sec_total / pk_total) * 100 if pk_total else 0:.1f}% menos; "
+                f"mediana por recorrido {statistics.median(ahorros) * 100 if ahorros else 0:.1f}%). "
+                f"Secuenciar: {statistics.mean(r[3] for r in resultados):.2f} ms promedio."
+            )
+        )
+
+    def _medir(self, renglones):
+        inicio = time.perf_counter()
+        _, resumen = RutaPickingService.secuenciar(renglones)
+        ms = (time.perf_counter() - inicio) * 1000
+        return resumen["pasos_orden_pk"], resumen["pasos"], ms
+
+    def _reales(self, picking_ids, lote_ids):
+        resultados = []
+        base = PickingDetalle.objects.select_related("ubicacion")
+        for picking in Picking.objects.filter(pk__in=picking_ids).order_by("pk"):
+            resultados.append((f"picking {picking.folio}", *self._medir(list(base.filter(picking=picking)))))
+        for lote in LotePicking.objects.filter(pk__in=lote_ids).order_by("pk"):
+            resultados.append((f"lote #{lote.pk}", *self._medir(list(base.filter(picking__lote=lote)))))
+        return resultados
+
+    def _sinteticos(self, options):
+        for opcion in ("pasillos", "racks", "niveles", "lineas", "muestras"):
+            if options[opcion] < 1:
+                raise CommandError(f"--{opcion} debe ser positivo.")
+        azar = random.Random(options["semilla"])
+        coordenadas = product(
+            range(1, options["pasillos"] + 1),
+            range(1, options["racks"] + 1),
+            range(1, options["niveles"] + 1),
+        )
+        rejilla = [
+            SimpleNamespace(pk=pk, pasillo=f"P{p}", rack=str(r), nivel=str(n), posicion="1", orden_recorrido=0)
+            for pk, (p, r, n) in enumerate(coordenadas, start=1)
+        ]
+        lineas = min(options["lineas"], len(rejilla))
+
+        resultados = []
+        for _ in range(options["muestras"]):
+            # El orden de captura del pedido (pk) no guarda relación con el almacén.
+            capturadas = azar.sample(rejilla, lineas)
+            inicio = time.perf_counter()
+            ordenadas, _ = ordenar_ubicaciones(capturadas)
+            ms = (time.perf_counter() - inicio) * 1000
+            medidor = MedidorRecorrido(capturadas)
+            resultados.append((None, medidor.pasos(capturadas), medidor.pasos(ordenadas), ms))
+        return resultados
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wms.models import EtiquetaRFIDImpresion
+from wms.services.rfid_label_service import RFIDLabelService
+from wms.services.zpl_plantilla_service import ETIQUETAS_POR_BLOQUE, PUERTO_ZPL, PlantillaZPL
+
+
+class Command(BaseCommand):
+    help = (
+        "Manda (o reimprime) el trabajo ZPL de una impresión RFID al puerto raw "
+        "de una impresora Zebra de la red local, por bloques: el trabajo se arma "
+        "con la plantilla y los EPC guardados, sin cargarlo completo en memoria."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("impresion", type=int, help="Id de EtiquetaRFIDImpresion (folio LAB-xxxxxx).")
+        parser.add_argument("--host", help="IP o nombre de la impresora (por omisión, printer_address).")
+        parser.add_argument("--puerto", type=int, default=PUERTO_ZPL)
+        parser.add_argument(
+            "--bloque",
+            type=int,
+            default=ETIQUETAS_POR_BLOQUE,
+            help="Etiquetas por bloque enviado.",
+        )
+
+    def handle(self, *args, **options):
+        if options["bloque"] < 1:
+            raise CommandError("--bloque debe ser positivo.")
+        impresion = (
+            EtiquetaRFIDImpresion.objects.select_related(
+                "producto",
+                "producto_variante__producto",
+                "producto_variante__color",
+                "producto_variante__talla",
+            )
+            .filter(pk=options["impresion"])
+            .first()
+        )
+        if impresion is None:
+            raise CommandError(f"No existe la impresión {options['impresion']}.")
+        host = options.get("host") or impresion.printer_address
+        if not host:
+            raise CommandError("La impresión no tiene printer_address; indica --host.")
+
+        inicio = time.perf_counter()
+        try:
+            enviados = PlantillaZPL.enviar_socket(
+                RFIDLabelService.iter_zpl_impresion(impresion, etiquetas_por_bloque=options["bloque"]),
+                host,
+                puerto=options["puerto"],
+            )
+        except OSError as exc:
+            raise CommandError(f"No se pudo enviar a {host}:{options['puerto']}: {exc}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{impresion.folio}: {enviados} bytes enviados a {host}:{options['puerto']} "
+                f"en {time.perf_counter() - inicio:.1f} s."
+            )
+        )
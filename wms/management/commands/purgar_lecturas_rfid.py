@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from wms.services.rfid_ingesta_service import RFIDIngestaService
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica la retención de lecturas RFID: borra los renglones de "
+        "rfid_scans cuya última lectura es anterior a RFID_RETENCION_HORAS "
+        "(o a --horas). Pensado para correr una vez al día."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horas", type=float, help="Retención en horas (por defecto RFID_RETENCION_HORAS).")
+        parser.add_argument("--lote", type=int, default=5000, help="Renglones por DELETE.")
+
+    def handle(self, *args, **options):
+        horas = options.get("horas")
+        if horas is not None and horas < 0:
+            raise CommandError("--horas no puede ser negativo.")
+        if options["lote"] < 1:
+            raise CommandError("--lote debe ser positivo.")
+        if horas is None:
+            horas = getattr(settings, "RFID_RETENCION_HORAS", 72)
+
+        borrados = RFIDIngestaService.purgar(horas=horas, lote=options["lote"])
+        self.stdout.write(
+            self.style.SUCCESS(f"{borrados} lectura(s) RFID con más de {horas:g} h borradas.")
+        )
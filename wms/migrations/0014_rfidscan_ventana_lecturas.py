@@ -0,0 +1,53 @@
+# Generated by Django 6.0.7 on 2026-10-17 14:10
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def llenar_ventana(apps, schema_editor):
+    # Las lecturas anteriores eran una por renglón: la ventana es su propio
+    # instante de llegada.
+    RfidScan = apps.get_model("wms", "RfidScan")
+    RfidScan.objects.filter(primera_lectura__isnull=True).update(
+        primera_lectura=F("created_at"),
+        ultima_lectura=F("created_at"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wms', '0013_add_rfidscan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rfidscan',
+            name='lecturas',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='rfidscan',
+            name='primera_lectura',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rfidscan',
+            name='ultima_lectura',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='rfidscan',
+            name='rssi',
+            field=models.FloatField(blank=True, help_text='RSSI máximo de la ventana.', null=True),
+        ),
+        migrations.RunPython(llenar_ventana, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='rfidscan',
+            index=models.Index(fields=['epc', 'primera_lectura'], name='rfid_scans_epc_3fc9d0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rfidscan',
+            index=models.Index(fields=['ultima_lectura'], name='rfid_scans_ultima__cda130_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.7 on 2026-10-17 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wms", "0015_epc_normalizado"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lotepicking",
+            name="ruta_optimizada",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="pickingdetalle",
+            name="secuencia_recorrido",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
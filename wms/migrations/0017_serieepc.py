@@ -0,0 +1,69 @@
+# Generated by Django 6.0.7 on 2026-10-17 17:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0017_historicalcategoriaproducto_historicalproducto_and_more"),
+        ("nucleo", "0016_sat_busqueda_trigram"),
+        ("wms", "0016_ruta_recorrido"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SerieEPC",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("ultimo_serial", models.PositiveBigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "empresa",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="series_epc",
+                        to="nucleo.empresa",
+                    ),
+                ),
+                (
+                    "producto",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="series_epc",
+                        to="catalogo.producto",
+                    ),
+                ),
+                (
+                    "producto_variante",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="series_epc",
+                        to="catalogo.productovariante",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Serie EPC",
+                "verbose_name_plural": "Series EPC",
+                "db_table": "rfid_series_epc",
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("producto_variante__isnull", False)),
+                        fields=("empresa", "producto_variante"),
+                        name="uniq_serie_epc_variante",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("producto_variante__isnull", True)),
+                        fields=("empresa", "producto"),
+                        name="uniq_serie_epc_producto",
+                    ),
+                ],
+            },
+        ),
+    ]
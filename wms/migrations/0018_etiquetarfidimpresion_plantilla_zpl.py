@@ -0,0 +1,28 @@
+# Generated by Django 6.0.7 on 2026-10-17 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wms", "0017_serieepc"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="etiquetarfidimpresion",
+            name="plantilla_zpl",
+            field=models.CharField(blank=True, default="", max_length=16),
+        ),
+        migrations.AddField(
+            model_name="etiquetarfidimpresion",
+            name="epc_inicial",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="etiquetarfidimpresion",
+            name="epc_final",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
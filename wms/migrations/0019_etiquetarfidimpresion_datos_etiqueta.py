@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wms", "0018_etiquetarfidimpresion_plantilla_zpl"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="etiquetarfidimpresion",
+            name="datos_etiqueta",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from simple_history.models import HistoricalRecords
 
+from wms.utils.epc import normalizar_epc
+
 class Estado(models.TextChoices):
     PENDIENTE = "PENDIENTE", "Pendiente"
     EN_PROCESO = "EN_PROCESO", "En proceso"
@@ -25,7 +27,8 @@ class LotePicking(models.Model):
     total_lineas = models.IntegerField(default=0)
 
     #estacion_sorting = models.CharField(max_length=50, blank=True, null=True)  # dónde se clasifica lo recolectado
-    #ruta_optimizada = models.JSONField(blank=True, null=True)  # secuencia de ubicaciones calculada, si aplica
+    # Paradas del recorrido del lote en orden (ver RutaPickingService).
+    ruta_optimizada = models.JSONField(blank=True, null=True)
     fecha_inicio = models.DateTimeField(blank=True, null=True)
     fecha_fin = models.DateTimeField(blank=True, null=True)
 
@@ -169,6 +172,10 @@ class PickingDetalle(models.Model):
     operador = models.ForeignKey("usuarios.Usuario", on_delete=models.CASCADE, related_name="picking_detalle", blank=True, null=True)
 
     fecha_surtido = models.DateTimeField(blank=True, null=True)
+
+    # Posición del renglón en el recorrido del picking (o del lote, si el
+    # picking es parte de uno). NULL = sin secuenciar (sin ubicación).
+    secuencia_recorrido = models.PositiveIntegerField(blank=True, null=True)
     
     diferencia = models.DecimalField(max_digits=18, decimal_places=4, default=0)
     motivo_diferencia = models.CharField(max_length=100, blank=True, null=True)
@@ -479,6 +486,14 @@ class EtiquetaRFIDImpresion(models.Model):
         max_length=16, choices=Estatus.choices, default=Estatus.PENDIENTE
     )
     zpl_enviado = models.TextField(null=True, blank=True)
+    # Referencia al trabajo en vez del ZPL completo: layout de ``PlantillaZPL``
+    # (con producto/variante de arriba) y primer/último EPC de los detalles.
+    plantilla_zpl = models.CharField(max_length=16, blank=True, default="")
+    epc_inicial = models.CharField(max_length=64, null=True, blank=True)
+    epc_final = models.CharField(max_length=64, null=True, blank=True)
+    # Textos de la etiqueta al imprimir (``zpl_plantilla_service.datos_etiqueta``):
+    # la reimpresión no depende de que el producto siga igual.
+    datos_etiqueta = models.JSONField(null=True, blank=True)
     observaciones = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -510,6 +525,8 @@ class EtiquetaRFIDDetalle(models.Model):
         related_name="etiquetas",
     )
     epc = models.CharField(max_length=64, unique=True, db_index=True)
+    # ``normalizar_epc(epc)``: contra esto se comparan las lecturas del lector.
+    epc_normalizado = models.CharField(max_length=64, blank=True, default="", db_index=True)
     barcode_value = models.CharField(max_length=128)
     serial = models.CharField(max_length=64, null=True, blank=True)
     estado = models.CharField(
@@ -524,15 +541,88 @@ class EtiquetaRFIDDetalle(models.Model):
         verbose_name_plural = "Detalles Etiquetas RFID"
         ordering = ["impresion_id", "id"]
 
+    def save(self, *args, **kwargs):
+        # Los bulk_create de RFIDLabelService lo asignan al construir la fila.
+        self.epc_normalizado = normalizar_epc(self.epc)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "epc" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "epc_normalizado"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.epc
 
 
+class SerieEPC(models.Model):
+    """Contador de seriales EPC por ``(empresa, variante)`` (o producto sin variante).
+
+    ``RFIDLabelService`` reserva un rango contiguo bloqueando el renglón
+    (``select_for_update``) y avanzando ``ultimo_serial``; dos lotes del mismo
+    artículo nunca reciben el mismo serial, así que el EPC que se arma con él
+    no puede repetirse.
+    """
+
+    empresa = models.ForeignKey(
+        "nucleo.Empresa",
+        on_delete=models.CASCADE,
+        related_name="series_epc",
+    )
+    producto = models.ForeignKey(
+        "catalogo.Producto",
+        on_delete=models.CASCADE,
+        related_name="series_epc",
+        null=True,
+        blank=True,
+    )
+    producto_variante = models.ForeignKey(
+        "catalogo.ProductoVariante",
+        on_delete=models.CASCADE,
+        related_name="series_epc",
+        null=True,
+        blank=True,
+    )
+    ultimo_serial = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "rfid_series_epc"
+        verbose_name = "Serie EPC"
+        verbose_name_plural = "Series EPC"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["empresa", "producto_variante"],
+                condition=models.Q(producto_variante__isnull=False),
+                name="uniq_serie_epc_variante",
+            ),
+            models.UniqueConstraint(
+                fields=["empresa", "producto"],
+                condition=models.Q(producto_variante__isnull=True),
+                name="uniq_serie_epc_producto",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_variante_id or self.producto_id}: {self.ultimo_serial}"
+
+
 class RfidScan(models.Model):
+    """Lecturas de un EPC por una antena dentro de una ventana de tiempo.
+
+    Un tag que se queda frente al lector se reporta decenas de veces por
+    segundo; ``RfidIngestaService`` agrega esas lecturas por ``(epc, antenna)``
+    en ventanas de ``RFID_VENTANA_SEGUNDOS`` y guarda un renglón por ventana:
+    ``lecturas`` es cuántas llegaron, ``rssi`` la más fuerte y
+    ``primera_lectura``/``ultima_lectura`` el intervalo en que se vio.
+    """
+
     epc = models.CharField(max_length=255, db_index=True)
+    epc_normalizado = models.CharField(max_length=255, blank=True, default="", db_index=True)
     reader_ip = models.GenericIPAddressField(null=True, blank=True)
     antenna = models.IntegerField(null=True, blank=True)
-    rssi = models.FloatField(null=True, blank=True)
+    rssi = models.FloatField(null=True, blank=True, help_text="RSSI máximo de la ventana.")
+    lecturas = models.PositiveIntegerField(default=1)
+    primera_lectura = models.DateTimeField(null=True, blank=True)
+    ultima_lectura = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -540,6 +630,12 @@ class RfidScan(models.Model):
         verbose_name = "Lectura RFID"
         verbose_name_plural = "Lecturas RFID"
         ordering = ["-created_at", "-id"]
+        indexes = [
+            # Ventana abierta de un EPC al vaciar el buffer.
+            models.Index(fields=["epc", "primera_lectura"]),
+            # Purga por retención.
+            models.Index(fields=["ultima_lectura"]),
+        ]
 
     def __str__(self):
         return f"{self.epc} @ {self.created_at.isoformat()}"
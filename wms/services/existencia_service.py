@@ -67,6 +67,58 @@ class ExistenciaService:
             q_cond = q_cond | condicion
         return q_cond
 
+    @classmethod
+    def _q_claves(cls, keys):
+        """Condición de ``Existencia`` que cubre varias claves de stock a la vez.
+
+        Devuelve ``(q, por_variante, sin_variante)``; los dos índices sirven para
+        regresar cada fila leída a la clave pedida que le corresponde.
+        """
+        keys_por_variante, keys_sin_variante = cls._split_keys(keys)
+        condiciones = []
+        if keys_por_variante:
+            condiciones.append(
+                Q(producto_variante_id__in=list(keys_por_variante))
+            )
+        if keys_sin_variante:
+            condiciones.append(
+                Q(
+                    producto_id__in=list(keys_sin_variante),
+                    producto_variante_id__isnull=True,
+                )
+            )
+        return cls._or_conditions(condiciones), keys_por_variante, keys_sin_variante
+
+    @classmethod
+    def get_existencia_rows_por_clave(cls, keys, lock=False, **filtros):
+        """Filas de ``Existencia`` de varias claves, agrupadas por clave, en una consulta.
+
+        ``filtros`` acota el alcance (``almacen_id=...``,
+        ``almacen__empresa_id=...``). Con ``lock=True`` todas las filas se
+        bloquean en el mismo ``SELECT ... FOR UPDATE`` y en orden de pk: dos
+        operaciones que compartan filas las toman en el mismo orden y no pueden
+        quedar esperándose en cruz. Sólo se bloquea ``existencias`` (``of=self``)
+        aunque el filtro cruce a ``almacenes``.
+
+        Cada lista viene por pk ascendente; una clave sin filas trae ``[]``.
+        """
+        resultado = {clave: [] for clave in keys}
+        q_cond, keys_por_variante, keys_sin_variante = cls._q_claves(keys)
+        if q_cond is None:
+            return resultado
+
+        qs = Existencia.objects.filter(**filtros).filter(q_cond)
+        if lock:
+            qs = qs.select_for_update(of=("self",))
+        for fila in qs.order_by("pk"):
+            if fila.producto_variante_id is not None:
+                clave = keys_por_variante.get(fila.producto_variante_id)
+            else:
+                clave = keys_sin_variante.get(fila.producto_id)
+            if clave is not None:
+                resultado[clave].append(fila)
+        return resultado
+
     @classmethod
     def get_existencia_rows(cls, almacen, producto, producto_variante, lock=False):
         """Todas las filas de ``Existencia`` de la clave en el almacén, por pk.
@@ -115,33 +167,25 @@ class ExistenciaService:
         La consulta se acota a las claves pedidas y cada fila de ``Existencia``
         aporta a una sola clave.
         """
-        resultado = defaultdict(lambda: Decimal("0"))
-        if not keys:
-            return resultado
-
         almacen_id = getattr(almacen_id, "pk", almacen_id)
-        keys_por_variante, keys_sin_variante = cls._split_keys(keys)
+        return cls._sum_existencia_por_almacen([almacen_id], keys)[almacen_id]
 
-        condiciones = []
-        if keys_por_variante:
-            condiciones.append(
-                Q(producto_variante_id__in=list(keys_por_variante))
-            )
-        if keys_sin_variante:
-            condiciones.append(
-                Q(
-                    producto_id__in=list(keys_sin_variante),
-                    producto_variante_id__isnull=True,
-                )
-            )
-        q_cond = cls._or_conditions(condiciones)
+    @classmethod
+    def _sum_existencia_por_almacen(cls, almacen_ids, keys):
+        """``{almacen_id: {clave: física}}`` de varios almacenes en una consulta."""
+        almacen_ids = [getattr(a, "pk", a) for a in almacen_ids]
+        resultado = {a: defaultdict(lambda: Decimal("0")) for a in almacen_ids}
+        if not keys or not almacen_ids:
+            return resultado
+
+        q_cond, keys_por_variante, keys_sin_variante = cls._q_claves(keys)
         if q_cond is None:
             return resultado
 
         rows = (
-            Existencia.objects.filter(almacen_id=almacen_id)
+            Existencia.objects.filter(almacen_id__in=almacen_ids)
             .filter(q_cond)
-            .values("producto_id", "producto_variante_id")
+            .values("almacen_id", "producto_id", "producto_variante_id")
             .annotate(total=Sum("cantidad"))
         )
         for row in rows:
@@ -152,7 +196,7 @@ class ExistenciaService:
                 clave = keys_sin_variante.get(row["producto_id"])
             if clave is None:
                 continue
-            resultado[clave] += cls._normalize(row["total"])
+            resultado[row["almacen_id"]][clave] += cls._normalize(row["total"])
         return resultado
 
     @classmethod
@@ -171,11 +215,22 @@ class ExistenciaService:
         - La consulta se acota a las claves pedidas: no recorre el histórico
           completo de reservas del almacén.
         """
-        resultado = defaultdict(lambda: Decimal("0"))
-        if not keys:
+        almacen_id = getattr(almacen_id, "pk", almacen_id)
+        return cls._sum_reservas_por_almacen([almacen_id], keys)[almacen_id]
+
+    @classmethod
+    def _sum_reservas_por_almacen(cls, almacen_ids, keys, excluir_pedido_ids=None):
+        """``{almacen_id: {clave: reservada}}`` de varios almacenes en una consulta.
+
+        Mismas reglas que ``_sum_reservas_por_clave``, agrupando además por
+        almacén. ``excluir_pedido_ids`` deja fuera las reservas de esos
+        pedidos (el MRP ya cuenta su cantidad completa como demanda).
+        """
+        almacen_ids = [getattr(a, "pk", a) for a in almacen_ids]
+        resultado = {a: defaultdict(lambda: Decimal("0")) for a in almacen_ids}
+        if not keys or not almacen_ids:
             return resultado
 
-        almacen_id = getattr(almacen_id, "pk", almacen_id)
         keys_por_variante, keys_sin_variante = cls._split_keys(keys)
 
         # Cada rama del pre-filtro selecciona la fila por una sola vía: las que
@@ -220,14 +275,15 @@ class ExistenciaService:
             output_field=IntegerField(),
         )
 
+        rows = inventario_reservas.objects.filter(
+            almacen_id__in=almacen_ids,
+            estado__in=cls.ESTADOS_RESERVA_BLOQUEANTES,
+        ).filter(q_cond)
+        if excluir_pedido_ids:
+            rows = rows.exclude(pedido_detalle__pedido_id__in=list(excluir_pedido_ids))
         rows = (
-            inventario_reservas.objects.filter(
-                almacen_id=almacen_id,
-                estado__in=cls.ESTADOS_RESERVA_BLOQUEANTES,
-            )
-            .filter(q_cond)
-            .annotate(clave_producto=clave_producto, clave_variante=clave_variante)
-            .values("clave_producto", "clave_variante")
+            rows.annotate(clave_producto=clave_producto, clave_variante=clave_variante)
+            .values("almacen_id", "clave_producto", "clave_variante")
             .annotate(total=Sum("cantidad"))
         )
         for row in rows:
@@ -238,7 +294,7 @@ class ExistenciaService:
                 clave = keys_sin_variante.get(row["clave_producto"])
             if clave is None:
                 continue
-            resultado[clave] += cls._normalize(row["total"])
+            resultado[row["almacen_id"]][clave] += cls._normalize(row["total"])
         return resultado
 
     @classmethod
@@ -270,46 +326,47 @@ class ExistenciaService:
         el POST son el mismo número.
         """
         almacen_id = getattr(almacen, "pk", almacen) if almacen else None
-        result = {}
         if almacen_id is None or not tallas:
-            for talla in tallas:
-                talla_id = getattr(talla, "pk", talla)
-                result[talla_id] = {
-                    "fisica": Decimal("0"),
-                    "reservada": Decimal("0"),
-                    "disponible": Decimal("0"),
-                }
-            return result
+            cero = {"fisica": Decimal("0"), "reservada": Decimal("0"), "disponible": Decimal("0")}
+            return {getattr(talla, "pk", talla): dict(cero) for talla in tallas}
+        return cls.get_existencia_batch_por_almacen([almacen_id], tallas)[almacen_id]
+
+    @classmethod
+    def get_existencia_batch_por_almacen(cls, almacenes, tallas):
+        """``get_existencia_batch`` de varios almacenes con dos consultas en total.
 
+        Retorna ``{almacen_id: {talla_id: {fisica, reservada, disponible}}}``.
+        Es lo que necesita quien compara almacenes candidatos para un pedido
+        (``picking_pipeline.asignacion``) sin una pasada por almacén.
+        """
+        almacen_ids = [getattr(a, "pk", a) for a in almacenes]
         clave_by_talla = {}
-        all_keys = set()
         for talla in tallas:
-            talla_id = getattr(talla, "pk", talla)
             detalle = getattr(talla, "pedido_detalle", None)
-            clave = (
+            clave_by_talla[getattr(talla, "pk", talla)] = (
                 getattr(detalle, "producto_id", None),
                 getattr(talla, "variante_id", None),
             )
-            clave_by_talla[talla_id] = clave
-            all_keys.add(clave)
 
-        keys = list(all_keys)
-        existencia_por_clave = cls._sum_existencia_por_clave(almacen_id, keys)
-        reservada_por_clave = cls._sum_reservas_por_clave(almacen_id, keys)
+        keys = list(set(clave_by_talla.values()))
+        existencia = cls._sum_existencia_por_almacen(almacen_ids, keys)
+        reservada = cls._sum_reservas_por_almacen(almacen_ids, keys)
 
-        for talla in tallas:
-            talla_id = getattr(talla, "pk", talla)
-            clave = clave_by_talla[talla_id]
-            fisica = cls._normalize(existencia_por_clave.get(clave))
-            reservada = cls._normalize(reservada_por_clave.get(clave))
-            disponible = fisica - reservada
-            if disponible < Decimal("0"):
-                disponible = Decimal("0")
-            result[talla_id] = {
-                "fisica": fisica,
-                "reservada": reservada,
-                "disponible": disponible,
-            }
+        result = {}
+        for almacen_id in almacen_ids:
+            por_talla = {}
+            for talla_id, clave in clave_by_talla.items():
+                fisica = cls._normalize(existencia[almacen_id].get(clave))
+                reservada_clave = cls._normalize(reservada[almacen_id].get(clave))
+                disponible = fisica - reservada_clave
+                if disponible < Decimal("0"):
+                    disponible = Decimal("0")
+                por_talla[talla_id] = {
+                    "fisica": fisica,
+                    "reservada": reservada_clave,
+                    "disponible": disponible,
+                }
+            result[almacen_id] = por_talla
         return result
 
 
@@ -332,18 +389,30 @@ class SaldoExistenciaAlmacen:
     ``filas_consumidas()``; quien sólo necesita la atribución
     (``ReservaInventarioService``) no guarda ninguna fila.
 
-    Como ambos servicios recorren las filas en el mismo orden (pk ascendente) y
-    parten del mismo estado, el reparto de la reserva y el del movimiento físico
-    coinciden fila a fila.
+    Como ambos servicios reparten con el mismo criterio (``_orden_reparto``,
+    determinista) y parten del mismo estado, el reparto de la reserva y el del
+    movimiento físico coinciden fila a fila.
+
+    ``reparto`` elige ese criterio: ``REPARTO_PK`` (por omisión) agota las
+    filas en orden de pk, como siempre lo hicieron reserva, transferencia y
+    oleada; ``REPARTO_MENOS_UBICACIONES`` lo pide explícitamente quien quiere
+    tocar el menor número de ubicaciones (``picking_pipeline.asignacion``).
     """
 
-    def __init__(self, almacen, lock=True):
+    REPARTO_PK = "pk"
+    REPARTO_MENOS_UBICACIONES = "menos_ubicaciones"
+
+    def __init__(self, almacen, lock=True, reparto=REPARTO_PK):
+        if reparto not in (self.REPARTO_PK, self.REPARTO_MENOS_UBICACIONES):
+            raise ValueError(f"Reparto desconocido: {reparto!r}")
         self.almacen = almacen
         self._lock = lock
+        self._reparto = reparto
         self._filas_por_clave = {}
         self._fila_por_pk = {}
         self._saldo_por_pk = {}
         self._consumido_por_pk = {}
+        self._ubicaciones_tocadas = set()
 
     @staticmethod
     def _clave(producto, producto_variante):
@@ -359,11 +428,46 @@ class SaldoExistenciaAlmacen:
             filas = ExistenciaService.get_existencia_rows(
                 self.almacen, clave[0], clave[1], lock=self._lock
             )
+            self.cargar({clave: filas})
+        return self._filas_por_clave[clave]
+
+    def precargar(self, claves):
+        """Lee —y bloquea— las filas de varias claves en una sola consulta.
+
+        Para operaciones que tocan muchas claves a la vez (una oleada): en
+        lugar de un ``SELECT ... FOR UPDATE`` por clave, todas las filas se
+        bloquean juntas y en orden de pk. Las claves ya leídas se omiten.
+        """
+        faltantes = [clave for clave in {self._clave(*c) for c in claves} if clave not in self._filas_por_clave]
+        if not faltantes:
+            return
+        self.cargar(
+            ExistenciaService.get_existencia_rows_por_clave(
+                faltantes, lock=self._lock, almacen_id=getattr(self.almacen, "pk", self.almacen)
+            )
+        )
+
+    def cargar(self, filas_por_clave):
+        """Siembra el saldo con filas ya leídas (``{clave: [filas por pk]}``).
+
+        No bloquea nada: es para quien ya leyó las filas de varios almacenes
+        en una consulta y sólo simula el reparto (``picking_pipeline.asignacion``).
+        """
+        for clave, filas in filas_por_clave.items():
             self._filas_por_clave[clave] = filas
             for fila in filas:
                 self._fila_por_pk[fila.pk] = fila
                 self._saldo_por_pk[fila.pk] = ExistenciaService._normalize(fila.cantidad)
-        return self._filas_por_clave[clave]
+
+    def apartar(self, fila_pk, cantidad):
+        """Descuenta del saldo de una fila lo que ya tienen reservado otros.
+
+        No cuenta como consumo de esta operación (``filas_consumidas`` no lo
+        reporta): sólo evita que ``consumir`` reparta unidades comprometidas.
+        """
+        if fila_pk in self._saldo_por_pk:
+            saldo = self._saldo_por_pk[fila_pk] - ExistenciaService._normalize(cantidad)
+            self._saldo_por_pk[fila_pk] = max(saldo, Decimal("0"))
 
     def disponible(self, producto, producto_variante):
         """Saldo restante de la clave, ya descontado lo consumido en esta operación."""
@@ -372,8 +476,32 @@ class SaldoExistenciaAlmacen:
             Decimal("0"),
         )
 
+    def _orden_reparto(self, filas, cantidad):
+        """Filas de las que se toma ``cantidad``, en el orden en que se toman.
+
+        Con ``REPARTO_PK``, las filas con saldo en orden de pk (FIFO).
+
+        Con ``REPARTO_MENOS_UBICACIONES`` (menos recorrido y menos conteos):
+
+        1. Si una sola fila alcanza, sólo esa: la de una ubicación que esta
+           operación ya visita y, entre iguales, la más antigua (pk menor,
+           FIFO).
+        2. Si no, primero las ubicaciones ya visitadas y luego las de mayor
+           saldo, para cerrar la línea con el menor número de filas.
+        """
+        con_saldo = [fila for fila in filas if self._saldo_por_pk[fila.pk] > Decimal("0")]
+        if self._reparto == self.REPARTO_PK:
+            return con_saldo
+        completas = [fila for fila in con_saldo if self._saldo_por_pk[fila.pk] >= cantidad]
+        if completas:
+            return [min(completas, key=lambda f: (f.ubicacion_id not in self._ubicaciones_tocadas, f.pk))]
+        return sorted(
+            con_saldo,
+            key=lambda f: (f.ubicacion_id not in self._ubicaciones_tocadas, -self._saldo_por_pk[f.pk], f.pk),
+        )
+
     def consumir(self, producto, producto_variante, cantidad):
-        """Reparte ``cantidad`` entre las filas de la clave, en orden de pk.
+        """Reparte ``cantidad`` entre las filas de la clave (ver ``_orden_reparto``).
 
         Devuelve ``(asignaciones, faltante)`` donde ``asignaciones`` es una lista
         de ``(fila, cantidad_tomada)``. Si el saldo no alcanza no consume nada y
@@ -388,7 +516,7 @@ class SaldoExistenciaAlmacen:
 
         asignaciones = []
         pendiente = cantidad
-        for fila in filas:
+        for fila in self._orden_reparto(filas, cantidad):
             if pendiente <= Decimal("0"):
                 break
             saldo = self._saldo_por_pk[fila.pk]
@@ -399,6 +527,7 @@ class SaldoExistenciaAlmacen:
             self._consumido_por_pk[fila.pk] = (
                 self._consumido_por_pk.get(fila.pk, Decimal("0")) + a_tomar
             )
+            self._ubicaciones_tocadas.add(fila.ubicacion_id)
             asignaciones.append((fila, a_tomar))
             pendiente -= a_tomar
         return asignaciones, Decimal("0")
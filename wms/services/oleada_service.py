@@ -0,0 +1,480 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from inventarios.models import Ubicacion, inventario_reservas
+from ventas.models import Pedido, PedidoDetalleTalla
+from wms.models import LotePicking, Oleada, Picking, PickingDetalle
+from wms.services.existencia_service import ExistenciaService, SaldoExistenciaAlmacen
+from wms.services.ruta_picking_service import RutaPickingService
+from wms.services.picking_pipeline.catalogs import sugerir_apartados_por_defecto
+from wms.services.picking_pipeline.context import validar_contexto_picking
+from wms.utils.decimales import normalizar_decimal
+from wms.utils.folios import generate_folio
+
+# Pedidos AUTORIZADA (3) y EN PROCESO (4): los que ya pueden surtirse.
+ESTATUS_PEDIDO_PLANEABLE = (3, 4)
+
+CRITERIO_ZONA_SKU = "ZONA_SKU"
+
+# Zona de las filas de Existencia sin ubicación (almacenes sin ubicaciones).
+ZONA_SIN_UBICACION = ""
+
+
+@dataclass(slots=True)
+class TomaUbicacion:
+    """Parte de una línea que se recoge de una fila de ``Existencia``."""
+
+    existencia: object
+    ubicacion: object
+    cantidad: Decimal
+
+    @property
+    def zona(self):
+        return getattr(self.ubicacion, "pasillo", None) or ZONA_SIN_UBICACION
+
+
+@dataclass(slots=True)
+class LineaOleada:
+    """Lo que una ``PedidoDetalleTalla`` aporta a la oleada."""
+
+    talla: PedidoDetalleTalla
+    pendiente: Decimal
+    tomas: list = field(default_factory=list)
+
+    @property
+    def clave(self):
+        return (self.talla.pedido_detalle.producto_id, self.talla.variante_id)
+
+    @property
+    def cantidad(self):
+        return sum((toma.cantidad for toma in self.tomas), Decimal("0"))
+
+
+@dataclass(slots=True)
+class PedidoOleada:
+    pedido: Pedido
+    almacen_destino: object
+    lineas: list = field(default_factory=list)
+
+    @property
+    def skus(self):
+        return {linea.clave for linea in self.lineas}
+
+    @property
+    def zonas(self):
+        return {toma.zona for linea in self.lineas for toma in linea.tomas}
+
+    @property
+    def total_renglones(self):
+        return sum(len(linea.tomas) for linea in self.lineas)
+
+
+@dataclass(slots=True)
+class LoteOleada:
+    pedidos: list = field(default_factory=list)
+    skus: set = field(default_factory=set)
+    zonas: set = field(default_factory=set)
+    renglones: int = 0
+    # Al persistir: el ``LotePicking`` y sus ``Picking``.
+    registro: object = None
+    pickings: list = field(default_factory=list)
+
+    def agregar(self, pedido_oleada):
+        self.pedidos.append(pedido_oleada)
+        self.skus |= pedido_oleada.skus
+        self.zonas |= pedido_oleada.zonas
+        self.renglones += pedido_oleada.total_renglones
+
+
+@dataclass(slots=True)
+class PlanOleada:
+    almacen: object
+    lotes: list = field(default_factory=list)
+    omitidos: list = field(default_factory=list)
+    sin_existencia: list = field(default_factory=list)
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class OleadaService:
+    """Planeador de oleadas (wave picking) por almacén.
+
+    Hasta ahora cada pedido se surtía con su propio ``ORDER_PICKING``: un
+    recorrido completo del almacén por pedido aunque diez pedidos pidieran la
+    misma prenda del mismo pasillo. La oleada toma **todos** los pedidos
+    autorizados del almacén y arma lotes que un solo recolector recorre una
+    vez:
+
+    1. Pendiente por ``PedidoDetalleTalla`` (pedida − asignada en pickings
+       activos), para todos los pedidos en una consulta agregada.
+    2. Stock: las filas de ``Existencia`` de todas las claves se bloquean en
+       un solo ``SELECT ... FOR UPDATE`` y se reparten con
+       ``SaldoExistenciaAlmacen``, ya descontadas las reservas activas de
+       otros documentos. Una línea sin stock suficiente se toma parcial; lo
+       que falte sigue pendiente para la siguiente oleada.
+    3. Agrupación: semilla = pedido más antiguo sin lote; se le suma el
+       pedido con mayor afinidad (Jaccard de SKUs + Jaccard de zonas) hasta
+       llenar ``max_pedidos_por_lote`` / ``max_lineas_por_lote``. La zona es
+       el ``pasillo`` de la ubicación de donde sale cada unidad.
+    4. Escritura, en **una** transacción: ``Oleada`` + ``LotePicking`` por
+       lote + un ``Picking`` ``WAVE_PICKING`` por pedido y lote (el picking
+       sigue siendo por pedido: packing y despacho no cambian) con un
+       ``PickingDetalle`` por ubicación, y la ``inventario_reservas`` de cada
+       renglón ligada a su picking.
+
+    Un pedido que no pasa ``validar_contexto_picking`` (sucursal distinta,
+    sin destino APARTADOS, etc.) se omite con su motivo en lugar de tumbar la
+    oleada completa.
+    """
+
+    MAX_PEDIDOS_POR_LOTE = 8
+    MAX_LINEAS_POR_LOTE = 60
+
+    _normalize = staticmethod(normalizar_decimal)
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    @staticmethod
+    def pedidos_planeables(almacen, pedido_ids=None, lock=False):
+        qs = Pedido.objects.filter(
+            empresa_id=almacen.empresa_id,
+            estatus__in=ESTATUS_PEDIDO_PLANEABLE,
+            activo=True,
+        )
+        if almacen.sucursal_id:
+            qs = qs.filter(sucursal_id=almacen.sucursal_id)
+        if pedido_ids:
+            qs = qs.filter(pk__in=pedido_ids)
+        if lock:
+            # Dos planeadores sobre el mismo almacén se serializan aquí: el
+            # segundo ve los pickings que creó el primero al calcular pendientes.
+            qs = qs.select_for_update(of=("self",))
+        return list(qs.select_related("empresa", "sucursal").order_by("pk"))
+
+    @classmethod
+    def lineas_pendientes(cls, pedidos):
+        """``{pedido_id: [LineaOleada]}`` con pendiente > 0, en dos consultas."""
+        if not pedidos:
+            return {}
+        tallas = list(
+            PedidoDetalleTalla.objects.filter(pedido_detalle__pedido__in=pedidos)
+            .select_related("pedido_detalle", "pedido_detalle__producto", "variante")
+            .order_by("pedido_detalle__pedido_id", "pedido_detalle_id", "id")
+        )
+        asignado = {
+            row["pedido_detalle_talla_id"]: cls._normalize(row["total"])
+            for row in PickingDetalle.objects.filter(
+                pedido_detalle__pedido__in=pedidos,
+                pedido_detalle_talla__isnull=False,
+            )
+            .exclude(picking__estado=Picking.Estado.CANCELADO)
+            .exclude(estado=PickingDetalle.EstadoLinea.CANCELADA)
+            .values("pedido_detalle_talla_id")
+            .annotate(total=Sum("cantidad_asignada"))
+        }
+        por_pedido = defaultdict(list)
+        for talla in tallas:
+            pendiente = cls._normalize(talla.cantidad) - asignado.get(talla.id, Decimal("0"))
+            if pendiente > Decimal("0"):
+                por_pedido[talla.pedido_detalle.pedido_id].append(LineaOleada(talla, pendiente))
+        return por_pedido
+
+    # ------------------------------------------------------------------
+    # Asignación de stock
+    # ------------------------------------------------------------------
+    @classmethod
+    def _saldos(cls, almacen, claves, lock):
+        """Saldo por fila ya sin reservas activas, y tope disponible por clave.
+
+        El tope cubre también las reservas sin ``existencia`` (de la clave,
+        no de una fila): ``ExistenciaService`` las cuenta al calcular el
+        disponible y aquí no deben poder repartirse.
+        """
+        saldos = SaldoExistenciaAlmacen(almacen, lock=lock)
+        saldos.precargar(claves)
+        filas = [fila for clave in claves for fila in saldos.filas(*clave)]
+        for row in (
+            inventario_reservas.objects.filter(
+                existencia_id__in=[fila.pk for fila in filas],
+                estado__in=ExistenciaService.ESTADOS_RESERVA_BLOQUEANTES,
+            )
+            .values("existencia_id")
+            .annotate(total=Sum("cantidad"))
+        ):
+            saldos.apartar(row["existencia_id"], row["total"])
+
+        fisica = ExistenciaService._sum_existencia_por_clave(almacen.pk, claves)
+        reservada = ExistenciaService._sum_reservas_por_clave(almacen.pk, claves)
+        tope = {
+            clave: max(cls._normalize(fisica.get(clave)) - cls._normalize(reservada.get(clave)), Decimal("0"))
+            for clave in claves
+        }
+        ubicaciones = Ubicacion.objects.in_bulk(
+            {fila.ubicacion_id for fila in filas if fila.ubicacion_id}
+        )
+        return saldos, tope, ubicaciones
+
+    @classmethod
+    def _asignar(cls, pedidos_oleada, saldos, tope, ubicaciones, plan):
+        """Reparte el stock por antigüedad de pedido (FIFO)."""
+        for pedido_oleada in pedidos_oleada:
+            for linea in pedido_oleada.lineas:
+                producto_id, variante_id = linea.clave
+                disponible = min(tope[linea.clave], saldos.disponible(producto_id, variante_id))
+                cantidad = min(linea.pendiente, disponible)
+                if cantidad <= Decimal("0"):
+                    plan.sin_existencia.append(
+                        {
+                            "pedido": pedido_oleada.pedido.pk,
+                            "pedido_detalle_talla": linea.talla.pk,
+                            "cantidad_pendiente": str(linea.pendiente),
+                        }
+                    )
+                    continue
+                asignaciones, _ = saldos.consumir(producto_id, variante_id, cantidad)
+                tope[linea.clave] -= cantidad
+                linea.tomas = [
+                    TomaUbicacion(fila, ubicaciones.get(fila.ubicacion_id), tomado)
+                    for fila, tomado in asignaciones
+                ]
+            pedido_oleada.lineas = [linea for linea in pedido_oleada.lineas if linea.tomas]
+
+    # ------------------------------------------------------------------
+    # Agrupación
+    # ------------------------------------------------------------------
+    @staticmethod
+    def agrupar(pedidos_oleada, max_pedidos, max_lineas):
+        """Lotes por afinidad de SKUs y zonas, respetando la capacidad.
+
+        Greedy: la semilla es el pedido más antiguo libre (nadie espera
+        indefinidamente por falta de afinidad) y se agregan candidatos por
+        afinidad descendente, desempate por antigüedad. Un pedido más grande
+        que ``max_lineas`` va solo en su lote.
+        """
+        libres = list(pedidos_oleada)
+        lotes = []
+        while libres:
+            lote = LoteOleada()
+            lote.agregar(libres.pop(0))
+            while libres and len(lote.pedidos) < max_pedidos:
+                mejor, mejor_afinidad = None, -1.0
+                for indice, candidato in enumerate(libres):
+                    if lote.renglones + candidato.total_renglones > max_lineas:
+                        continue
+                    afinidad = _jaccard(lote.skus, candidato.skus) + _jaccard(lote.zonas, candidato.zonas)
+                    if afinidad > mejor_afinidad:
+                        mejor, mejor_afinidad = indice, afinidad
+                if mejor is None:
+                    break
+                lote.agregar(libres.pop(mejor))
+            lotes.append(lote)
+        return lotes
+
+    # ------------------------------------------------------------------
+    # Plan (sin escritura)
+    # ------------------------------------------------------------------
+    @classmethod
+    def planear(
+        cls,
+        almacen,
+        user,
+        operador=None,
+        almacen_destino=None,
+        pedido_ids=None,
+        max_pedidos_por_lote=None,
+        max_lineas_por_lote=None,
+        lock=False,
+    ):
+        """Calcula la oleada sin escribir nada (sirve como preview)."""
+        operador = operador or user
+        max_pedidos = max_pedidos_por_lote or cls.MAX_PEDIDOS_POR_LOTE
+        max_lineas = max_lineas_por_lote or cls.MAX_LINEAS_POR_LOTE
+        plan = PlanOleada(almacen=almacen)
+
+        pedidos = cls.pedidos_planeables(almacen, pedido_ids=pedido_ids, lock=lock)
+        lineas = cls.lineas_pendientes(pedidos)
+
+        destinos = {}
+        pedidos_oleada = []
+        for pedido in pedidos:
+            if not lineas.get(pedido.pk):
+                continue
+            destino = almacen_destino
+            if destino is None:
+                llave = (pedido.empresa_id, pedido.sucursal_id)
+                if llave not in destinos:
+                    destinos[llave] = sugerir_apartados_por_defecto(pedido)
+                destino = destinos[llave]
+            try:
+                validar_contexto_picking(pedido, almacen, destino, operador, user)
+            except ValidationError as exc:
+                plan.omitidos.append({"pedido": pedido.pk, "folio": pedido.folio, "motivo": exc.detail})
+                continue
+            pedidos_oleada.append(PedidoOleada(pedido, destino, lineas[pedido.pk]))
+
+        if not pedidos_oleada:
+            return plan
+
+        claves = sorted({linea.clave for p in pedidos_oleada for linea in p.lineas}, key=lambda c: (c[0] or 0, c[1] or 0))
+        saldos, tope, ubicaciones = cls._saldos(almacen, claves, lock)
+        cls._asignar(pedidos_oleada, saldos, tope, ubicaciones, plan)
+
+        con_stock = [p for p in pedidos_oleada if p.lineas]
+        plan.lotes = cls.agrupar(con_stock, max_pedidos, max_lineas)
+        return plan
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    @classmethod
+    @transaction.atomic
+    def crear_oleada(cls, almacen, user, operador=None, prioridad=None, **opciones):
+        """Planea con bloqueo y persiste la oleada completa en una transacción.
+
+        Devuelve ``(oleada, plan)``; ``oleada`` es ``None`` si no hubo nada
+        que surtir (el plan trae omitidos y faltantes para explicar por qué).
+        """
+        operador = operador or user
+        plan = cls.planear(almacen, user, operador=operador, lock=True, **opciones)
+        if not plan.lotes:
+            return None, plan
+
+        ahora = timezone.now()
+        oleada = Oleada.objects.create(
+            criterio_agrupacion=CRITERIO_ZONA_SKU,
+            estado=Oleada.Estado.LIBERADA,
+            fecha_liberacion=ahora,
+            total_pedidos=sum(len(lote.pedidos) for lote in plan.lotes),
+            total_lineas=sum(lote.renglones for lote in plan.lotes),
+            usuario=user,
+        )
+
+        detalles = []
+        reservas = []
+        for lote in plan.lotes:
+            lote.registro = LotePicking.objects.create(
+                almacen=almacen,
+                operador=operador,
+                estado=LotePicking.Estado.ASIGNADO,
+                total_pedidos=len(lote.pedidos),
+                total_lineas=lote.renglones,
+                usuario=user,
+            )
+            for pedido_oleada in lote.pedidos:
+                pedido = pedido_oleada.pedido
+                picking = Picking.objects.create(
+                    folio=generate_folio(pedido.empresa, pedido.sucursal, "Picking"),
+                    empresa=pedido.empresa,
+                    sucursal=pedido.sucursal,
+                    pedido=pedido,
+                    operador=operador,
+                    almacen=almacen,
+                    almacen_destino=pedido_oleada.almacen_destino,
+                    oleada=oleada,
+                    lote=lote.registro,
+                    tipo=Picking.TipoPicking.WAVE_PICKING,
+                    prioridad=prioridad or Picking.Prioridad.MEDIA,
+                    usuario=user,
+                    total_lineas=pedido_oleada.total_renglones,
+                    total_lineas_completas=sum(
+                        1 for linea in pedido_oleada.lineas if linea.cantidad == linea.pendiente
+                    ),
+                )
+                lote.pickings.append(picking)
+                for linea in pedido_oleada.lineas:
+                    talla = linea.talla
+                    for toma in linea.tomas:
+                        detalles.append(
+                            PickingDetalle(
+                                picking=picking,
+                                pedido_detalle=talla.pedido_detalle,
+                                pedido_detalle_talla=talla,
+                                producto=talla.pedido_detalle.producto,
+                                producto_variante=talla.variante,
+                                ubicacion=toma.ubicacion,
+                                cantidad_solicitada=toma.cantidad,
+                                cantidad_asignada=toma.cantidad,
+                                operador=operador,
+                            )
+                        )
+                        reservas.append(
+                            inventario_reservas(
+                                empresa=pedido.empresa,
+                                sucursal=pedido.sucursal,
+                                pedido_detalle=talla.pedido_detalle,
+                                pedido_detalle_talla=talla,
+                                existencia=toma.existencia,
+                                almacen=almacen,
+                                ubicacion=toma.ubicacion,
+                                picking=picking,
+                                cantidad=toma.cantidad,
+                                usuario=user,
+                                observaciones=f"Reserva de oleada #{oleada.pk}.",
+                            )
+                        )
+
+        PickingDetalle.objects.bulk_create(detalles, batch_size=500)
+        inventario_reservas.objects.bulk_create(reservas, batch_size=500)
+
+        # Cada lote es un solo recorrido: se secuencia con los renglones de
+        # todos sus pickings juntos.
+        por_lote = defaultdict(list)
+        for detalle in detalles:
+            por_lote[detalle.picking.lote_id].append(detalle)
+        for lote in plan.lotes:
+            RutaPickingService.secuenciar_lote(lote.registro, renglones=por_lote[lote.registro.pk])
+        return oleada, plan
+
+    # ------------------------------------------------------------------
+    # Respuesta
+    # ------------------------------------------------------------------
+    @staticmethod
+    def serializar_plan(plan, oleada=None):
+        lotes = []
+        for indice, lote in enumerate(plan.lotes, start=1):
+            registro = lote.registro
+            pickings = {p.pedido_id: p for p in lote.pickings}
+            lotes.append(
+                {
+                    "lote": registro.pk if registro else None,
+                    "numero": indice,
+                    "total_pedidos": len(lote.pedidos),
+                    "total_lineas": lote.renglones,
+                    "zonas": sorted(lote.zonas),
+                    "skus": len(lote.skus),
+                    "pedidos": [
+                        {
+                            "pedido": p.pedido.pk,
+                            "folio": p.pedido.folio,
+                            "almacen_destino": getattr(p.almacen_destino, "pk", None),
+                            "lineas": p.total_renglones,
+                            "cantidad": str(sum((linea.cantidad for linea in p.lineas), Decimal("0"))),
+                            "picking": getattr(pickings.get(p.pedido.pk), "pk", None),
+                            "picking_folio": getattr(pickings.get(p.pedido.pk), "folio", None),
+                        }
+                        for p in lote.pedidos
+                    ],
+                }
+            )
+        return {
+            "oleada": oleada.pk if oleada else None,
+            "almacen": plan.almacen.pk,
+            "criterio_agrupacion": CRITERIO_ZONA_SKU,
+            "total_lotes": len(lotes),
+            "total_pedidos": sum(lote["total_pedidos"] for lote in lotes),
+            "total_lineas": sum(lote["total_lineas"] for lote in lotes),
+            "lotes": lotes,
+            "omitidos": plan.omitidos,
+            "sin_existencia": plan.sin_existencia,
+        }
@@ -0,0 +1,158 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from inventarios.models import Almacen, inventario_reservas
+from wms.services.existencia_service import ExistenciaService, SaldoExistenciaAlmacen
+from wms.services.picking_pipeline.pendientes import build_snapshots
+
+
+@dataclass(slots=True)
+class CoberturaAlmacen:
+    """Qué parte del pendiente de un pedido puede surtir un almacén candidato.
+
+    ``ubicaciones`` es el número de ubicaciones distintas que tocaría el
+    reparto de ``SaldoExistenciaAlmacen`` (el mismo que usan reserva,
+    transferencia y oleada), no una estimación aparte.
+    """
+
+    almacen: Almacen
+    lineas_total: int = 0
+    lineas_completas: int = 0
+    piezas_pendientes: Decimal = Decimal("0")
+    piezas_cubiertas: Decimal = Decimal("0")
+    ubicaciones: int = 0
+
+    @property
+    def completo(self):
+        return self.lineas_total > 0 and self.lineas_completas == self.lineas_total
+
+    @property
+    def orden(self):
+        """Llave de orden: mejor candidato primero.
+
+        1. Almacenes que permiten salida (``validar_contexto_picking`` rechaza
+           los demás).
+        2. Más líneas completas: el almacén que llena el pedido gana al que
+           sólo lo surte parcial.
+        3. Más piezas cubiertas.
+        4. Menos ubicaciones tocadas.
+        5. pk, para que el empate sea estable (la regla anterior).
+        """
+        return (
+            not getattr(self.almacen, "permite_salida", False),
+            -self.lineas_completas,
+            -self.piezas_cubiertas,
+            self.ubicaciones,
+            self.almacen.pk,
+        )
+
+    def como_dict(self):
+        return {
+            "almacen": self.almacen.pk,
+            "codigo": self.almacen.codigo,
+            "nombre": self.almacen.nombre,
+            "permite_salida": bool(getattr(self.almacen, "permite_salida", False)),
+            "lineas_total": self.lineas_total,
+            "lineas_completas": self.lineas_completas,
+            "piezas_pendientes": str(self.piezas_pendientes),
+            "piezas_cubiertas": str(self.piezas_cubiertas),
+            "ubicaciones": self.ubicaciones,
+            "completo": self.completo,
+        }
+
+
+def _clave(talla):
+    return (getattr(talla.pedido_detalle, "producto_id", None), talla.variante_id)
+
+
+def evaluar_almacenes(lineas, almacenes):
+    """Coberturas de ``lineas`` (``[(talla, pendiente)]``) en cada almacén.
+
+    Cuatro consultas en total, sin importar cuántos almacenes se comparen:
+    existencia y reservas por clave (``get_existencia_batch_por_almacen``),
+    las filas de ``Existencia`` de todas las claves y las reservas activas
+    por fila. No bloquea nada: es una sugerencia; la reserva real vuelve a
+    leer con ``select_for_update``.
+
+    Devuelve la lista ordenada por ``CoberturaAlmacen.orden``.
+    """
+    almacenes = list(almacenes)
+    lineas = [(talla, pendiente) for talla, pendiente in lineas if pendiente > Decimal("0")]
+    coberturas = [CoberturaAlmacen(almacen) for almacen in almacenes]
+    if not almacenes or not lineas:
+        return sorted(coberturas, key=lambda c: c.orden)
+
+    almacen_ids = [almacen.pk for almacen in almacenes]
+    tallas = [talla for talla, _ in lineas]
+    claves = list({_clave(talla) for talla in tallas})
+
+    batch = ExistenciaService.get_existencia_batch_por_almacen(almacen_ids, tallas)
+    filas_por_almacen = defaultdict(lambda: {clave: [] for clave in claves})
+    todas = []
+    for clave, filas in ExistenciaService.get_existencia_rows_por_clave(
+        claves, almacen_id__in=almacen_ids
+    ).items():
+        for fila in filas:
+            filas_por_almacen[fila.almacen_id][clave].append(fila)
+            todas.append(fila)
+    reservado_por_fila = {
+        row["existencia_id"]: row["total"]
+        for row in inventario_reservas.objects.filter(
+            existencia_id__in=[fila.pk for fila in todas],
+            estado__in=ExistenciaService.ESTADOS_RESERVA_BLOQUEANTES,
+        )
+        .values("existencia_id")
+        .annotate(total=Sum("cantidad"))
+    }
+
+    for cobertura in coberturas:
+        almacen = cobertura.almacen
+        saldos = SaldoExistenciaAlmacen(
+            almacen, lock=False, reparto=SaldoExistenciaAlmacen.REPARTO_MENOS_UBICACIONES
+        )
+        saldos.cargar(filas_por_almacen[almacen.pk])
+        for filas in filas_por_almacen[almacen.pk].values():
+            for fila in filas:
+                saldos.apartar(fila.pk, reservado_por_fila.get(fila.pk, Decimal("0")))
+
+        # Tope por clave: el disponible del onboarding, que también descuenta
+        # las reservas sin ``existencia`` (no atribuibles a una fila).
+        tope = {_clave(talla): batch[almacen.pk][talla.pk]["disponible"] for talla in tallas}
+        ubicaciones = set()
+        for talla, pendiente in lineas:
+            clave = _clave(talla)
+            cobertura.lineas_total += 1
+            cobertura.piezas_pendientes += pendiente
+            cantidad = min(pendiente, tope[clave], saldos.disponible(*clave))
+            if cantidad <= Decimal("0"):
+                continue
+            asignaciones, _ = saldos.consumir(clave[0], clave[1], cantidad)
+            tope[clave] -= cantidad
+            ubicaciones.update(fila.ubicacion_id for fila, _ in asignaciones)
+            cobertura.piezas_cubiertas += cantidad
+            if cantidad == pendiente:
+                cobertura.lineas_completas += 1
+        cobertura.ubicaciones = len(ubicaciones)
+
+    return sorted(coberturas, key=lambda c: c.orden)
+
+
+def sugerir_origen(pedido, tallas, excluir_pks=()):
+    """Mejor almacén origen de la sucursal del pedido para su pendiente.
+
+    Devuelve ``(almacen_o_None, coberturas)``. Sin stock en ningún lado el
+    orden se reduce a ``permite_salida`` y pk.
+    """
+    candidatos = (
+        Almacen.objects.filter(empresa_id=pedido.empresa_id, sucursal_id=pedido.sucursal_id)
+        .exclude(pk__in=list(excluir_pks))
+        .order_by("pk")
+    )
+    lineas = [
+        (snap.talla, snap.cantidad_pendiente) for snap in build_snapshots(tallas, pedido)
+    ]
+    coberturas = evaluar_almacenes(lineas, candidatos)
+    return (coberturas[0].almacen if coberturas else None), coberturas
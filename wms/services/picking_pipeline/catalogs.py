@@ -4,12 +4,13 @@ from rest_framework.exceptions import ValidationError
 from inventarios.models import Almacen
 from nucleo.models import SerieFolio
 from ventas.models import Pedido
+from wms.services.picking_pipeline.asignacion import sugerir_origen
 
 
 def folio_preview(empresa, sucursal, tipo_documento="Picking"):
     """Preview del siguiente folio de ``SerieFolio`` sin persistir.
 
-    Reutiliza ``SerieFolio.get_siguiente_folio()`` para coincidir con el
+    Reutiliza ``SerieFolio.siguiente_folio_preview()`` para coincidir con el
     formato real (serie, relleno_ceros, separador, incluir_anio, reinicios
     anuales, rangos). Si no existe la serie o falla el cálculo, devuelve
     ``None`` (no es bloqueante para el GET onboarding).
@@ -34,16 +35,13 @@ def folio_preview(empresa, sucursal, tipo_documento="Picking"):
             "ultimo_anio",
             "folio_inicial",
             "folio_final",
+            "modo_asignacion",
         )
         .first()
     )
     if not serie_folio:
         return None
-    try:
-        folio_formateado, _, _ = serie_folio.get_siguiente_folio()
-        return folio_formateado
-    except Exception:
-        return None
+    return serie_folio.siguiente_folio_preview()
 
 
 def resolver_apartados_safe(empresa_id, sucursal_id):
@@ -114,6 +112,7 @@ def armar_payload_vacio():
         },
         "pedido": None,
         "picking_detalle": [],
+        "cobertura_almacenes": [],
     }
 
 
@@ -213,8 +212,16 @@ def serializar_almacen(almacen):
     }
 
 
-def sugerir_almacenes(pedido, almacen_origen_actual, almacen_destino_actual):
-    """Sugiere almacén origen (menor pk != destino) y destino = APARTADOS.
+def sugerir_almacenes(pedido, almacen_origen_actual, almacen_destino_actual, tallas=None):
+    """Sugiere almacén origen (el que mejor surte el pedido) y destino = APARTADOS.
+
+    Devuelve ``(origen, destino, coberturas)``. El origen ya no es "el menor
+    pk que no sea APARTADOS": ``asignacion.sugerir_origen`` compara todos los
+    almacenes de la sucursal por líneas completas, piezas y ubicaciones
+    tocadas, de modo que el operador no arme un picking parcial desde un
+    almacén que no llena el pedido mientras otro sí. ``coberturas`` trae esa
+    comparación (vacía si no se pasaron ``tallas``) aunque el origen ya venga
+    elegido, para que el UI la muestre.
 
     Regla del GET onboarding: no exponer como sugerencia un ``origen`` igual
     al ``destino`` (APARTADOS), porque el POST rechaza ese caso con 400.
@@ -225,10 +232,14 @@ def sugerir_almacenes(pedido, almacen_origen_actual, almacen_destino_actual):
     if destino_sugerido is None:
         destino_sugerido = resolver_apartados_safe(pedido.empresa_id, pedido.sucursal_id)
 
+    exclude_pks = [destino_sugerido.pk] if destino_sugerido is not None else []
+    coberturas = []
+    if tallas is not None:
+        mejor, coberturas = sugerir_origen(pedido, tallas, excluir_pks=exclude_pks)
+        if origen_sugerido is None:
+            origen_sugerido = mejor
+
     if origen_sugerido is None:
-        exclude_pks = []
-        if destino_sugerido is not None:
-            exclude_pks.append(destino_sugerido.pk)
         origen_sugerido = (
             Almacen.objects.filter(
                 empresa_id=pedido.empresa_id,
@@ -248,7 +259,7 @@ def sugerir_almacenes(pedido, almacen_origen_actual, almacen_destino_actual):
                 .first()
             )
 
-    return origen_sugerido, destino_sugerido
+    return origen_sugerido, destino_sugerido, coberturas
 
 
 def armar_header_preview(pedido):
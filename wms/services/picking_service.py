@@ -8,6 +8,7 @@ from rest_framework.exceptions import ValidationError
 from ventas.models import PedidoDetalleTalla
 from wms.models import Picking, PickingDetalle
 from wms.services.existencia_service import ExistenciaService
+from wms.services.ruta_picking_service import RutaPickingService
 from wms.services.picking_pipeline.catalogs import (
     armar_header_preview,
     armar_payload_vacio,
@@ -156,6 +157,7 @@ class PickingService:
             },
             "pedido": None,
             "picking_detalle": [],
+            "cobertura_almacenes": [],
         }
 
         if pedido_id is None:
@@ -169,12 +171,28 @@ class PickingService:
         header_base["tracker"] = cls._armar_tracker(pedido)
         payload["header"] = header_base
 
-        if almacen_origen is None:
-            origen_sugerido, destino_sugerido = sugerir_almacenes(
-                pedido,
-                almacen_origen_actual=None,
-                almacen_destino_actual=almacen_destino,
+        tallas = list(
+            PedidoDetalleTalla.objects.filter(pedido_detalle__pedido=pedido)
+            .select_related(
+                "pedido_detalle__producto",
+                "variante",
+                "variante__talla",
+                "variante__color",
             )
+            .order_by("pedido_detalle_id", "id")
+        )
+
+        # La cobertura de cada almacén candidato se calcula aunque el origen ya
+        # venga elegido: el UI la muestra para que el operador vea si otro
+        # almacén llena el pedido completo.
+        origen_sugerido, destino_sugerido, coberturas = sugerir_almacenes(
+            pedido,
+            almacen_origen_actual=almacen_origen,
+            almacen_destino_actual=almacen_destino,
+            tallas=tallas,
+        )
+        payload["cobertura_almacenes"] = [c.como_dict() for c in coberturas]
+        if almacen_origen is None:
             if payload["almacen_origen"] is None:
                 payload["almacen_origen"] = serializar_almacen(origen_sugerido)
                 almacen_origen = origen_sugerido
@@ -188,16 +206,6 @@ class PickingService:
                 payload["almacen_destino"] = serializar_almacen(almacen_apartados)
                 almacen_destino = almacen_apartados
 
-        tallas = list(
-            PedidoDetalleTalla.objects.filter(pedido_detalle__pedido=pedido)
-            .select_related(
-                "pedido_detalle__producto",
-                "variante",
-                "variante__talla",
-                "variante__color",
-            )
-            .order_by("pedido_detalle_id", "id")
-        )
         snapshots = build_snapshots(tallas, pedido, almacen_origen=almacen_origen)
 
         detalle_payload = []
@@ -345,7 +353,11 @@ class PickingService:
         picking.total_lineas_completas = lineas_completas
         picking.save(update_fields=["total_lineas_completas", "updated_at"])
 
-        # 6. Return: ordenes_trabajo_generadas vacío (low-noise: las OT van por
+        # 6. Secuencia de recorrido: los renglones aún no tienen ubicación ni
+        #    reserva, así que se ordenan por la ubicación del stock en origen.
+        RutaPickingService.secuenciar_picking(picking)
+
+        # 7. Return: ordenes_trabajo_generadas vacío (low-noise: las OT van por
         #    módulo Produccion endpoints dedicados).
         ordenes_trabajo_generadas = []
         return picking, ordenes_trabajo_generadas
@@ -6,6 +6,7 @@ from rest_framework.exceptions import ValidationError
 
 from inventarios.models import inventario_reservas
 from wms.services.existencia_service import ExistenciaService, SaldoExistenciaAlmacen
+from wms.services.ruta_picking_service import RutaPickingService
 from wms.utils.decimales import normalizar_decimal
 
 
@@ -128,3 +129,6 @@ class ReservaInventarioService:
             reservas,
             ["picking", "transferencia", "estado", "fecha_aplicacion"],
         )
+        # Con las reservas ligadas, la ubicación de cada renglón ya es la
+        # reservada: se resecuencia el recorrido con ella.
+        RutaPickingService.secuenciar_picking(picking)
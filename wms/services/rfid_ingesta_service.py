@@ -0,0 +1,311 @@
+import atexit
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from wms.models import RfidScan
+from wms.utils.epc import normalizar_epc
+
+logger = logging.getLogger(__name__)
+
+# Filas por INSERT/UPDATE al vaciar el buffer.
+LOTE_ESCRITURA = 500
+
+# Tope de claves (epc, antena) pendientes en memoria. Si la BD no responde, el
+# buffer reintenta en el siguiente ciclo; pasado este tope ``agregar`` rechaza
+# el POST completo (BufferRFIDLleno) en vez de crecer sin límite dentro del
+# proceso web o de descartar lecturas en silencio.
+MAX_CLAVES_PENDIENTES = 50000
+
+
+class BufferRFIDLleno(Exception):
+    """El buffer no admite más claves y no se pudo vaciar: el lector debe reintentar."""
+
+
+def _ventana():
+    return timedelta(seconds=getattr(settings, "RFID_VENTANA_SEGUNDOS", 5))
+
+
+def _max_rssi(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+class AgregadoLecturas:
+    """Lecturas de una clave ``(epc, antena)`` acumuladas desde el último vaciado."""
+
+    __slots__ = ("epc", "antena", "reader_ip", "primera", "ultima", "lecturas", "rssi")
+
+    def __init__(self, epc, antena, reader_ip, instante, rssi):
+        self.epc = epc
+        self.antena = antena
+        self.reader_ip = reader_ip
+        self.primera = instante
+        self.ultima = instante
+        self.lecturas = 1
+        self.rssi = rssi
+
+    def sumar(self, instante, rssi, reader_ip=None):
+        self.primera = min(self.primera, instante)
+        self.ultima = max(self.ultima, instante)
+        self.lecturas += 1
+        self.rssi = _max_rssi(self.rssi, rssi)
+        self.reader_ip = reader_ip or self.reader_ip
+
+    def absorber(self, otro):
+        self.primera = min(self.primera, otro.primera)
+        self.ultima = max(self.ultima, otro.ultima)
+        self.lecturas += otro.lecturas
+        self.rssi = _max_rssi(self.rssi, otro.rssi)
+        self.reader_ip = otro.reader_ip or self.reader_ip
+
+
+def persistir_agregados(agregados, ventana=None):
+    """Escribe los agregados en ``RfidScan`` respetando la ventana por clave.
+
+    Una ventana empieza con la primera lectura de la clave y dura
+    ``RFID_VENTANA_SEGUNDOS``. Si en BD ya hay un renglón de la misma
+    ``(epc, antenna)`` cuya ventana sigue abierta, el agregado se suma a ése
+    (``lecturas``, ``ultima_lectura``, ``rssi`` máximo); si no, abre un renglón
+    nuevo. Así un tag que se queda diez segundos frente al lector deja dos
+    renglones y no cientos, aunque sus lecturas lleguen en varios POST, a
+    varios workers o crucen un vaciado del buffer.
+
+    Dos workers que vacían la misma clave en el mismo instante pueden abrir dos
+    renglones para una ventana: no se bloquea nada, el costo es un renglón de
+    más y no una lectura perdida.
+
+    Devuelve ``(creados, actualizados)``.
+    """
+    agregados = list(agregados)
+    if not agregados:
+        return 0, 0
+    ventana = ventana or _ventana()
+
+    desde = min(agregado.primera for agregado in agregados) - ventana
+    abiertas = {}
+    for fila in (
+        RfidScan.objects.filter(
+            epc__in={agregado.epc for agregado in agregados},
+            primera_lectura__gte=desde,
+        )
+        .only("id", "epc", "antenna", "rssi", "lecturas", "primera_lectura", "ultima_lectura")
+        .order_by("primera_lectura", "id")
+    ):
+        # Por clave se queda la ventana más reciente.
+        abiertas[(fila.epc, fila.antenna)] = fila
+
+    nuevas = []
+    actualizadas = {}
+    for agregado in agregados:
+        fila = abiertas.get((agregado.epc, agregado.antena))
+        if fila is not None and agregado.primera < fila.primera_lectura + ventana:
+            fila.lecturas += agregado.lecturas
+            fila.ultima_lectura = max(fila.ultima_lectura or agregado.ultima, agregado.ultima)
+            fila.rssi = _max_rssi(fila.rssi, agregado.rssi)
+            actualizadas[fila.pk] = fila
+            continue
+        nuevas.append(
+            RfidScan(
+                epc=agregado.epc,
+                epc_normalizado=normalizar_epc(agregado.epc),
+                reader_ip=agregado.reader_ip,
+                antenna=agregado.antena,
+                rssi=agregado.rssi,
+                lecturas=agregado.lecturas,
+                primera_lectura=agregado.primera,
+                ultima_lectura=agregado.ultima,
+            )
+        )
+
+    with transaction.atomic():
+        if actualizadas:
+            RfidScan.objects.bulk_update(
+                list(actualizadas.values()),
+                ["lecturas", "ultima_lectura", "rssi"],
+                batch_size=LOTE_ESCRITURA,
+            )
+        if nuevas:
+            RfidScan.objects.bulk_create(nuevas, batch_size=LOTE_ESCRITURA)
+    return len(nuevas), len(actualizadas)
+
+
+class BufferLecturasRFID:
+    """Buffer en memoria de lecturas RFID, vaciado por lotes en segundo plano.
+
+    ``agregar`` sólo toma el candado y suma al agregado de cada ``(epc,
+    antena)``: la respuesta al lector no espera a la BD. Un hilo daemon vacía
+    el buffer cada ``intervalo`` segundos con ``persistir_agregados`` y cierra
+    su conexión según ``CONN_MAX_AGE``; al terminar el proceso (``atexit``) se
+    hace un último vaciado.
+
+    Si el vaciado falla, los agregados regresan al buffer (sumándose a lo que
+    llegó mientras tanto) y se reintentan en el siguiente ciclo.
+
+    Lo pendiente vive sólo en memoria: un SIGKILL, un OOM o el reciclaje del
+    worker (``max_requests``) lo pierden. Por eso el modo asíncrono es opcional
+    (``RFID_INGESTA_ASINCRONA``) y no el de omisión.
+    """
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.pid = os.getpid()
+        self._candado = threading.Lock()
+        self._pendientes = {}
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def agregar(self, lecturas, reader_ip=None, instante=None):
+        """Suma ``(epc, antena, rssi)`` al buffer. Devuelve cuántas lecturas tomó.
+
+        Todo o nada: si las claves nuevas no caben bajo
+        ``MAX_CLAVES_PENDIENTES`` no se toma ninguna y se lanza
+        ``BufferRFIDLleno``.
+        """
+        lecturas = list(lecturas)
+        instante = instante or timezone.now()
+        with self._candado:
+            nuevas = {(epc, antena) for epc, antena, _ in lecturas} - self._pendientes.keys()
+            if len(self._pendientes) + len(nuevas) > MAX_CLAVES_PENDIENTES:
+                raise BufferRFIDLleno(
+                    f"{len(self._pendientes)} claves pendientes; no caben {len(nuevas)} más."
+                )
+            for epc, antena, rssi in lecturas:
+                clave = (epc, antena)
+                agregado = self._pendientes.get(clave)
+                if agregado is not None:
+                    agregado.sumar(instante, rssi, reader_ip)
+                else:
+                    self._pendientes[clave] = AgregadoLecturas(epc, antena, reader_ip, instante, rssi)
+        return len(lecturas)
+
+    def pendientes(self):
+        with self._candado:
+            return len(self._pendientes)
+
+    def vaciar(self):
+        """Persiste lo pendiente. Devuelve ``(creados, actualizados)``."""
+        with self._candado:
+            pendientes, self._pendientes = self._pendientes, {}
+        if not pendientes:
+            return 0, 0
+        try:
+            return persistir_agregados(pendientes.values())
+        except Exception:
+            with self._candado:
+                for clave, agregado in pendientes.items():
+                    actual = self._pendientes.get(clave)
+                    if actual is not None:
+                        agregado.absorber(actual)
+                    self._pendientes[clave] = agregado
+            raise
+
+    def _vaciar_seguro(self):
+        try:
+            self.vaciar()
+        except Exception:
+            logger.exception("RFID: no se pudo vaciar el buffer de lecturas; se reintenta.")
+        finally:
+            close_old_connections()
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo):
+            self._vaciar_seguro()
+
+    def iniciar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._hilo = threading.Thread(target=self._bucle, name="rfid-ingesta", daemon=True)
+        self._hilo.start()
+        atexit.register(self.detener)
+
+    def detener(self):
+        self._detener.set()
+        self._vaciar_seguro()
+
+
+class RFIDIngestaService:
+    """Punto de entrada de las lecturas del lector FX (``/QA/scanner_rfid/receive/``).
+
+    - Por omisión el agregado del POST se persiste dentro del request: el
+      lector sólo recibe 200 cuando sus lecturas ya están en BD, y si la BD
+      falla recibe un error y reintenta. La ventana por clave sigue aplicando
+      contra lo que ya está en BD.
+    - Con ``RFID_INGESTA_ASINCRONA`` las lecturas van al buffer del proceso y
+      el POST regresa de inmediato, a cambio de perder lo pendiente si el
+      worker muere. Con el buffer lleno se vacía en el request; si tampoco se
+      puede, ``BufferRFIDLleno`` (la vista responde 503).
+    """
+
+    _buffer = None
+    _candado = threading.Lock()
+
+    @classmethod
+    def asincrona(cls):
+        return getattr(settings, "RFID_INGESTA_ASINCRONA", False)
+
+    @classmethod
+    def buffer(cls):
+        # Tras un fork (gunicorn --preload) el hilo del padre no existe en el
+        # hijo: cada proceso arma su propio buffer.
+        with cls._candado:
+            if cls._buffer is None or cls._buffer.pid != os.getpid():
+                cls._buffer = BufferLecturasRFID(
+                    intervalo=getattr(settings, "RFID_FLUSH_SEGUNDOS", 1.0)
+                )
+            return cls._buffer
+
+    @classmethod
+    def registrar(cls, lecturas, reader_ip=None):
+        """Recibe ``[(epc, antena, rssi), ...]`` de un POST del lector (EPC en hex limpio)."""
+        lecturas = list(lecturas)
+        if not lecturas:
+            return 0
+        if not cls.asincrona():
+            # Buffer del request: agrupa el POST y se persiste antes de responder.
+            buffer = BufferLecturasRFID(intervalo=0)
+            tomadas = buffer.agregar(lecturas, reader_ip)
+            buffer.vaciar()
+            return tomadas
+
+        buffer = cls.buffer()
+        try:
+            tomadas = buffer.agregar(lecturas, reader_ip)
+        except BufferRFIDLleno:
+            try:
+                buffer.vaciar()
+            except Exception as exc:
+                raise BufferRFIDLleno("No se pudo vaciar el buffer de lecturas.") from exc
+            tomadas = buffer.agregar(lecturas, reader_ip)
+        buffer.iniciar()
+        return tomadas
+
+    @staticmethod
+    def purgar(horas=None, lote=5000):
+        """Borra las ventanas cuya última lectura tiene más de ``horas`` horas.
+
+        Por defecto ``RFID_RETENCION_HORAS``. Se borra por lotes de pk para no
+        sostener un ``DELETE`` gigante. Devuelve cuántos renglones se borraron.
+        """
+        if horas is None:
+            horas = getattr(settings, "RFID_RETENCION_HORAS", 72)
+        limite = timezone.now() - timedelta(hours=horas)
+        borrados = 0
+        while True:
+            pks = list(
+                RfidScan.objects.filter(ultima_lectura__lt=limite)
+                .order_by()
+                .values_list("pk", flat=True)[:lote]
+            )
+            if not pks:
+                return borrados
+            RfidScan.objects.filter(pk__in=pks).delete()
+            borrados += len(pks)
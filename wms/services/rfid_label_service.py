@@ -1,20 +1,30 @@
 import logging
-import secrets
-import time
 from decimal import Decimal
 
 from django.db import IntegrityError, transaction
-from django.template.defaultfilters import truncatechars
 from rest_framework.exceptions import APIException, ValidationError
 
 from catalogo.models import Producto, ProductoVariante
-from wms.models import EtiquetaRFIDDetalle, EtiquetaRFIDImpresion
+from nucleo.lotes import iterar_por_lotes
+from wms.models import EtiquetaRFIDDetalle, EtiquetaRFIDImpresion, SerieEPC
+from wms.services.zpl_plantilla_service import (
+    ETIQUETAS_POR_BLOQUE,
+    LAYOUT_ERP,
+    PlantillaZPL,
+    datos_etiqueta,
+)
+from wms.utils.epc import (
+    EPC_INTERNO_BITS_SERIAL,
+    SGTIN96_BITS_SERIAL,
+    TIPO_EPC_PRODUCTO,
+    TIPO_EPC_VARIANTE,
+    codificar_epc_interno,
+    codificar_sgtin96,
+    normalizar_epc,
+)
 
 logger = logging.getLogger(__name__)
 
-# Intentos de regeneración ante colisión de EPC en la rama generada por backend.
-MAX_INTENTOS_EPC = 3
-
 # Filas por INSERT. Postgres no acota ``bulk_batch_size`` (sólo sqlite y oracle lo
 # sobreescriben), así que sin esto Django manda un único INSERT con todo el lote:
 # ``EtiquetaRFIDDetalle`` inserta 7 columnas y el serializer permite ``cantidad``
@@ -23,14 +33,16 @@ MAX_INTENTOS_EPC = 3
 # así que se escapaba de los handlers de abajo y salía como 500.
 EPC_BATCH_SIZE = 1000
 
+# Tope de etiquetas por impresión (el serializer usa el mismo).
+MAX_ETIQUETAS_POR_LOTE = 10000
+
 
 def _es_colision_epc(exc):
     """¿El ``IntegrityError`` viene del índice único de ``epc``?
 
     Los handlers de abajo sólo saben traducir esa colisión. Cualquier otra
     violación —una constraint futura sobre ``(impresion, serial)``, por ejemplo—
-    se re-lanza tal cual en vez de disfrazarse de EPC duplicado y, en la rama
-    generada, de disparar tres regeneraciones que no pueden arreglarla.
+    se re-lanza tal cual en vez de disfrazarse de EPC duplicado.
     """
     return "epc" in str(exc).lower()
 
@@ -82,19 +94,127 @@ class RFIDLabelService:
         return None
 
     @staticmethod
-    def _generate_epc_base_prefix(variante=None, producto=None):
+    def _filtros_serie(empresa, variante=None, producto=None):
+        """Llave del renglón de ``SerieEPC`` del artículo."""
         if variante is not None:
-            seed = f"V{variante.pk}-{variante.sku or 'X'}"
-        elif producto is not None:
-            seed = f"P{producto.pk}-{producto.codigo or producto.cod_proscai or 'X'}"
+            return {"empresa": empresa, "producto_variante": variante, "producto": variante.producto}
+        return {"empresa": empresa, "producto_variante": None, "producto": producto}
+
+    @classmethod
+    def _reservar_seriales(cls, empresa, cantidad, serial_max, variante=None, producto=None):
+        """Reserva ``cantidad`` seriales contiguos; devuelve el primero.
+
+        El renglón de ``SerieEPC`` queda bloqueado hasta el fin de la
+        transacción: dos lotes concurrentes del mismo artículo se forman en
+        vez de leer el mismo ``ultimo_serial``. El tope ``serial_max`` se
+        revisa con el candado tomado y antes de avanzar el contador, así que
+        un lote que no cabe no consume nada. Sólo reserva el POST que
+        registra la impresión; si ésta hace rollback, el contador también.
+        """
+        with transaction.atomic():
+            serie, _ = SerieEPC.objects.select_for_update().get_or_create(
+                **cls._filtros_serie(empresa, variante=variante, producto=producto)
+            )
+            primero = serie.ultimo_serial + 1
+            if primero + cantidad - 1 > serial_max:
+                raise ValidationError(
+                    "Se agotaron los seriales EPC de este artículo."
+                )
+            serie.ultimo_serial += cantidad
+            serie.save(update_fields=["ultimo_serial", "updated_at"])
+        return primero
+
+    @classmethod
+    def _reservar_seriales_enviados(cls, empresa, etiquetas, variante=None, producto=None):
+        """Avanza el contador sobre los EPC provisionales que devuelve el cliente.
+
+        El flujo del onboarding imprime los EPC del preview y luego los manda
+        en ``etiquetas``. Un renglón cuyo ``epc`` es exactamente el que este
+        artículo codifica para su ``serial`` salió del contador, así que el
+        contador pasa a cubrirlo y el siguiente lote no lo vuelve a emitir.
+        Los EPC ajenos al esquema no tocan el contador. Si otra impresión
+        registró esos seriales antes, el índice único de ``epc`` lo reporta
+        como colisión (409).
+        """
+        try:
+            codificar, serial_max = cls._codificador_epc(
+                empresa, variante=variante, producto=producto
+            )
+        except ValidationError:
+            # Con el prefijo GS1 roto el contador no pudo emitir estos EPC.
+            return
+        mayor = 0
+        for raw in etiquetas:
+            serial = str(raw.get("serial") or "").strip()
+            if not serial.isdigit() or not 0 < int(serial) <= serial_max:
+                continue
+            if codificar(int(serial)) == (raw.get("epc") or "").strip().upper():
+                mayor = max(mayor, int(serial))
+        if not mayor:
+            return
+        with transaction.atomic():
+            serie, _ = SerieEPC.objects.select_for_update().get_or_create(
+                **cls._filtros_serie(empresa, variante=variante, producto=producto)
+            )
+            if mayor > serie.ultimo_serial:
+                serie.ultimo_serial = mayor
+                serie.save(update_fields=["ultimo_serial", "updated_at"])
+
+    @staticmethod
+    def _codificador_epc(empresa, variante=None, producto=None):
+        """Función ``serial -> EPC`` para el artículo y su límite de serial.
+
+        Variante de una empresa con ``config_json["gs1_prefijo"]``: SGTIN-96
+        con el prefijo GS1 de la empresa y el id de la variante como
+        referencia del artículo (dígito indicador 0). Un prefijo inválido o
+        que no deja lugar al id de la variante es un error de configuración:
+        se rechaza en vez de imprimir con otro esquema. Sin prefijo, o para un
+        producto sin variante: el esquema interno ``tipo + id + serial``.
+        Ambos miden 96 bits.
+        """
+        prefijo = str((empresa.config_json or {}).get("gs1_prefijo") or "").strip()
+        if variante is not None and prefijo:
+            try:
+                codificar_sgtin96(prefijo, variante.pk, 0)
+            except ValueError as exc:
+                logger.error(
+                    "Prefijo GS1 inutilizable (empresa=%s, prefijo=%s, variante=%s): %s",
+                    empresa.pk,
+                    prefijo,
+                    variante.pk,
+                    exc,
+                )
+                raise ValidationError(
+                    f"El prefijo GS1 '{prefijo}' de la empresa no sirve para la "
+                    f"variante {variante.pk}: {exc}"
+                )
+            return (
+                lambda serial: codificar_sgtin96(prefijo, variante.pk, serial),
+                (1 << SGTIN96_BITS_SERIAL) - 1,
+            )
+        if variante is not None:
+            tipo, objeto_id = TIPO_EPC_VARIANTE, variante.pk
         else:
-            seed = "G"
-        hashed = sum(ord(ch) * (i + 1) for i, ch in enumerate(seed)) & 0xFFFFFFFF
-        return f"{hashed:08X}"
+            tipo, objeto_id = TIPO_EPC_PRODUCTO, producto.pk
+        return (
+            lambda serial: codificar_epc_interno(tipo, objeto_id, serial),
+            (1 << EPC_INTERNO_BITS_SERIAL) - 1,
+        )
+
+    @staticmethod
+    def _validar_cantidad(cantidad):
+        """``cantidad`` entre 1 y ``MAX_ETIQUETAS_POR_LOTE`` (el mismo tope del
+        serializer); el GET del onboarding no pasa por el serializer."""
+        cantidad = max(1, int(cantidad))
+        if cantidad > MAX_ETIQUETAS_POR_LOTE:
+            raise ValidationError(
+                f"La cantidad máxima por impresión es {MAX_ETIQUETAS_POR_LOTE}."
+            )
+        return cantidad
 
     @classmethod
-    def _generate_epc_list(cls, cantidad, variante=None, producto=None):
-        """Genera ``cantidad`` EPCs de 24 hex (96 bits) para el lote.
+    def _generate_epc_list(cls, empresa, cantidad, variante=None, producto=None, reservar=True):
+        """Codifica ``cantidad`` EPCs de 24 hex (96 bits) para el lote.
 
         El total se mantiene en **24 hex** a propósito: 96 bits es el tamaño
         estándar del banco EPC de un tag Gen2 (SGTIN-96) y ``_build_zpl_rfid``
@@ -104,94 +224,52 @@ class RFIDLabelService:
         desperdiciada— y en este repo no hay ningún documento que fije el modelo
         de tag en uso, de modo que no es verificable desde código.
 
-        Para bajar la probabilidad de colisión se **reasigna** el presupuesto en
-        vez de crecerlo: ``ts_chunk`` cede 4 hex al sufijo aleatorio.
-
-            antes:  prefix(8) + ts_chunk(8) + idx(4) + random(4) = 24
-            ahora:  prefix(8) + ts_chunk(4) + idx(4) + random(8) = 24
+        Antes el EPC era hash aditivo + reloj de 16 bits + sufijo aleatorio y la
+        unicidad se confiaba al índice de ``epc`` con reintentos. Ahora el
+        serial sale de un rango contiguo de ``SerieEPC`` (ver
+        ``_reservar_seriales``) y el EPC es función inyectiva de
+        ``(artículo, serial)``: dos etiquetas de este generador no pueden
+        coincidir. ``serial`` en cada renglón es ese serial, en decimal.
 
-        ``ts_chunk`` baja a 16 bits, así que cicla cada ~18.2 h en vez de cada
-        ~136 años. Es un tradeoff deliberado: el modo de fallo real es el
-        reintento/doble clic **dentro del mismo segundo**, donde ``ts_chunk``
-        coincidía de todas formas y la colisión la decidía sólo el sufijo
-        aleatorio —ahí pasa de 1/65_536 a 1/4.29e9 por etiqueta—. Para dos
-        corridas separadas en el tiempo hace falta además caer en el mismo
-        bucket de ~18.2 h, con lo que el neto queda en ~1/2.8e14: despreciable.
+        Con ``reservar=False`` (el preview) no se escribe nada: son los
+        seriales que siguen en el contador, provisionales hasta que un POST
+        los registre.
         """
-        prefix = cls._generate_epc_base_prefix(variante=variante, producto=producto)
-        ts_chunk = f"{int(time.time()) & 0xFFFF:04X}"
-        result = []
-        for idx in range(1, max(1, int(cantidad)) + 1):
-            # ``idx`` se queda en 4 hex: el serializer topa ``cantidad`` en 10000
-            # (0x2710) y no cabría en menos. El donante tenía que ser ``ts_chunk``.
-            serial = f"{idx:04X}{secrets.token_hex(4).upper()}"
-            epc = f"{prefix}{ts_chunk}{serial}"
-            result.append(
-                {
-                    "n": idx,
-                    "epc": epc,
-                    "serial": f"{idx:04d}",
-                }
-            )
-        return result
-
-    @staticmethod
-    def _graphic_zpl_lines(variante=None, producto=None, barcode_value=""):
-        lines = [
-            "^XA",
-            "^PW799",
-            "^LL400",
-            "^CI28",
-            "^LH0,0",
-            "^FO40,30^A0N,34,34^FDWMS - ETIQUETA RFID^FS",
-        ]
-
-        if variante is not None:
-            prod = variante.producto
-            nombre = truncatechars((prod.nombre or "").upper(), 32)
-            sku = (variante.sku or "").upper()
-            color = getattr(variante.color, "nombre", "") or ""
-            talla = getattr(variante.talla, "nombre", "") or ""
-            secondary = " / ".join(v.upper() for v in [color, talla] if v)
-            codigo = (prod.codigo or prod.cod_proscai or "").upper()
-
-            lines.append(f"^FO40,85^A0N,32,32^FD{nombre}^FS")
-            lines.append(f"^FO40,130^A0N,28,28^FDSKU: {sku}^FS")
-            if secondary:
-                lines.append(f"^FO40,168^A0N,28,28^FD{secondary}^FS")
-            if codigo:
-                lines.append(f"^FO40,206^A0N,26,26^FDCOD: {codigo}^FS")
-            lines.append(
-                f"^FO40,245^BY3,3,90^BCN,90,Y,N,N^FD{barcode_value or sku}^FS"
+        cantidad = cls._validar_cantidad(cantidad)
+        codificar, serial_max = cls._codificador_epc(
+            empresa, variante=variante, producto=producto
+        )
+        if reservar:
+            primero = cls._reservar_seriales(
+                empresa, cantidad, serial_max, variante=variante, producto=producto
             )
-            return lines
-
-        if producto is not None:
-            nombre = truncatechars((producto.nombre or "").upper(), 32)
-            codigo_impresion = (
-                producto.codigo or producto.cod_proscai or f"PROD-{producto.pk}"
-            ).upper()
-            auxiliar = (producto.cod_proscai or "").upper()
-
-            lines.append(f"^FO40,85^A0N,32,32^FD{nombre}^FS")
-            lines.append(f"^FO40,130^A0N,28,28^FDCODIGO: {codigo_impresion}^FS")
-            if auxiliar and auxiliar != codigo_impresion:
-                lines.append(f"^FO40,168^A0N,26,26^FDPROSCAI: {auxiliar}^FS")
-            lines.append(
-                f"^FO40,245^BY3,3,90^BCN,90,Y,N,N^FD{barcode_value or codigo_impresion}^FS"
+        else:
+            ultimo = (
+                SerieEPC.objects.filter(
+                    **cls._filtros_serie(empresa, variante=variante, producto=producto)
+                )
+                .values_list("ultimo_serial", flat=True)
+                .first()
             )
-            return lines
-
-        return lines
+            primero = (ultimo or 0) + 1
+            if primero + cantidad - 1 > serial_max:
+                raise ValidationError(
+                    "Se agotaron los seriales EPC de este artículo."
+                )
+        return [
+            {
+                "n": idx,
+                "epc": codificar(serial),
+                "serial": str(serial),
+            }
+            for idx, serial in enumerate(range(primero, primero + cantidad), start=1)
+        ]
 
     @classmethod
     def _build_zpl_normal(cls, variante=None, producto=None, barcode_value=""):
-        lines = cls._graphic_zpl_lines(
-            variante=variante, producto=producto, barcode_value=barcode_value
-        )
-        lines.append("^FO40,360^A0N,22,22^FDEtiqueta generada desde ERP.^FS")
-        lines.append("^XZ")
-        return "\n".join(lines)
+        return PlantillaZPL.compilar(
+            variante=variante, producto=producto, barcode_value=barcode_value, rfid=False
+        ).etiqueta()
 
     @classmethod
     def _build_zpl_rfid(cls, epc, variante=None, producto=None, barcode_value=""):
@@ -212,41 +290,14 @@ class RFIDLabelService:
                               así si no escribió, el usuario lo nota. Param3=E= banco
                               Param4=0 compara FD último escrito vs FD actual)
       -> ZPL visual + ^XZ
+
+        La secuencia vive en ``PlantillaZPL``; para un lote conviene compilar la
+        plantilla una vez y llamar ``etiqueta(epc)`` por tag, como hace
+        ``onboarding_preview``.
         """
-        lines = cls._graphic_zpl_lines(
+        return PlantillaZPL.compilar(
             variante=variante, producto=producto, barcode_value=barcode_value
-        )
-
-        # Escritura #1 con ^RB96,,,1 (96 bits, ASCII HEX)
-        lines.append("^RB96,,,1")
-        lines.append("^RS8,E")
-        lines.append("^RFW,E")
-        lines.append(f"^FD{epc}^FS")
-
-        # Escritura #2 (redundancia - 1er RFW se pierde a veces en LAN/Wifi
-        lines.append("^RB96,,,1")
-        lines.append("^RS8,E")
-        lines.append("^RFW,E")
-        lines.append(f"^FD{epc}^FS")
-
-        # Validación POST (beep rojo si no escribió.
-        lines.append("^RB96,,,1")
-        lines.append("^RS8,E")
-        lines.append("^HV1,3,E,0")
-
-        # Texto visual del EPC
-        display = epc
-        if len(display) > 24:
-            lines.append(
-                f"^FO40,348^A0N,16,16^FDEPC: {display[:12]}...{display[-10:]}^FS"
-            )
-        else:
-            lines.append(
-                f"^FO40,360^A0N,18,18^FDEPC: {display[:16]}...{display[-8:]}^FS"
-            )
-
-        lines.append("^XZ")
-        return "\n".join(lines)
+        ).etiqueta(epc)
 
     @classmethod
     def _resolve_context(
@@ -305,9 +356,10 @@ class RFIDLabelService:
         # ver. Lo que ``es_staff`` sigue concediendo arriba es saltarse la
         # comprobación de pertenencia, no el derecho a omitir la sucursal.
         #
-        # ``onboarding_preview`` no lo activa: no escribe nada y ``sucursal`` sólo
-        # se refleja en el payload de respuesta, así que exigirla ahí rompería el
-        # preview sin ninguna ganancia.
+        # ``onboarding_preview`` no lo activa: no escribe nada (sus EPC son
+        # provisionales, no reserva seriales en ``SerieEPC``) y ``sucursal``
+        # sólo se refleja en el payload de respuesta, así que exigirla ahí
+        # rompería el preview sin ninguna ganancia.
         if exigir_sucursal and sucursal is None:
             raise ValidationError(
                 "El usuario no tiene una sucursal asignada. Configure su "
@@ -328,26 +380,34 @@ class RFIDLabelService:
             variante=variante, producto=producto, barcode_value=barcode_value
         )
 
-        etiquetas_metadata = cls._generate_epc_list(
-            cantidad, variante=variante, producto=producto
-        )
+        # El GET no escribe: con ``rfid_mode`` los EPC son los siguientes del
+        # contador, provisionales. Los reserva el POST que registra la
+        # impresión (``store_impresion``), ya sea generándolos o avanzando el
+        # contador sobre los que el cliente imprimió desde este preview.
+        cantidad = cls._validar_cantidad(cantidad)
+        if rfid_mode:
+            etiquetas_metadata = cls._generate_epc_list(
+                empresa, cantidad, variante=variante, producto=producto, reservar=False
+            )
+        else:
+            etiquetas_metadata = [
+                {"n": idx, "epc": None, "serial": None}
+                for idx in range(1, cantidad + 1)
+            ]
         for item in etiquetas_metadata:
             item["barcode_value"] = barcode_value
 
         # Armar ZPL individual por etiqueta (RFID si rfid_mode, si no normal).
         # El frontend simplemente itera esta lista y envía cada zpl a Browser Print
-        # —sin necesidad de reconstruir/reemplazar nada del ZPL—.
-        zpls_individuales = []
+        # —sin necesidad de reconstruir/reemplazar nada del ZPL—. La parte gráfica
+        # se compila una vez y por etiqueta sólo se sustituye el EPC.
         if rfid_mode:
-            for row in etiquetas_metadata:
-                zpls_individuales.append(
-                    cls._build_zpl_rfid(
-                        row["epc"],
-                        variante=variante,
-                        producto=producto,
-                        barcode_value=barcode_value,
-                    )
-                )
+            plantilla = PlantillaZPL.compilar(
+                variante=variante, producto=producto, barcode_value=barcode_value
+            )
+            zpls_individuales = [
+                plantilla.etiqueta(row["epc"]) for row in etiquetas_metadata
+            ]
         else:
             zpls_individuales = [zpl_normal] * len(etiquetas_metadata)
 
@@ -358,8 +418,9 @@ class RFIDLabelService:
         payload = {
             "empresa": empresa.pk,
             "sucursal": sucursal,
-            "cantidad": max(1, int(cantidad)),
+            "cantidad": cantidad,
             "rfid_mode": bool(rfid_mode),
+            "epc_provisional": bool(rfid_mode),
             "producto": (
                 {
                     "id": producto.pk,
@@ -423,6 +484,17 @@ class RFIDLabelService:
         preview = servicio._build_label_preview(variante=variante, producto=producto)
         barcode_value_base = preview["barcode_value"]
 
+        generated = []
+        if rfid_mode and not etiquetas_input:
+            generated = servicio._generate_epc_list(
+                empresa, cantidad, variante=variante, producto=producto
+            )
+            epcs = [row["epc"] for row in generated]
+        else:
+            epcs = [(raw.get("epc") or "").strip().upper() for raw in etiquetas_input]
+
+        # El trabajo ZPL se reconstruye con la plantilla y los EPC de los
+        # detalles (``iter_zpl_impresion``); aquí sólo queda la referencia.
         impresion = EtiquetaRFIDImpresion.objects.create(
             empresa_id=empresa.pk,
             sucursal_id=sucursal,
@@ -435,11 +507,20 @@ class RFIDLabelService:
             printer_address=printer_address,
             status=status_input,
             zpl_enviado=zpl_enviado,
+            plantilla_zpl=LAYOUT_ERP,
+            datos_etiqueta=datos_etiqueta(
+                variante=variante, producto=producto, barcode_value=barcode_value_base
+            ),
+            epc_inicial=epcs[0] if rfid_mode and epcs else None,
+            epc_final=epcs[-1] if rfid_mode and epcs else None,
             observaciones=observaciones,
         )
 
         if rfid_mode:
             if etiquetas_input:
+                servicio._reservar_seriales_enviados(
+                    empresa, etiquetas_input, variante=variante, producto=producto
+                )
                 final_rows = []
                 for idx, raw in enumerate(etiquetas_input, start=1):
                     epc = (raw.get("epc") or "").strip()
@@ -451,6 +532,7 @@ class RFIDLabelService:
                         EtiquetaRFIDDetalle(
                             impresion=impresion,
                             epc=epc.upper(),
+                            epc_normalizado=normalizar_epc(epc),
                             barcode_value=(
                                 raw.get("barcode_value") or barcode_value_base
                             ),
@@ -490,67 +572,90 @@ class RFIDLabelService:
                     )
                     raise EtiquetaRFIDColision409()
             else:
-                # Colisión en un EPC generado por backend: el cliente no mandó nada,
-                # así que devolverle un error sería culparlo de un problema nuestro.
-                # Se regenera con sufijo aleatorio nuevo y se reintenta.
-                for intento in range(1, MAX_INTENTOS_EPC + 1):
-                    generated = servicio._generate_epc_list(
-                        cantidad, variante=variante, producto=producto
-                    )
-                    try:
-                        # El ``atomic`` anidado es OBLIGATORIO, no cosmético: abre un
-                        # savepoint. Sin él, al atrapar el ``IntegrityError`` la
-                        # transacción externa queda marcada ``needs_rollback`` y el
-                        # primer query del intento siguiente reventaría con
-                        # ``TransactionManagementError`` —el modo de fallo clásico de
-                        # este patrón—. Con savepoint sólo se deshace el intento
-                        # fallido y el encabezado ya creado sobrevive.
-                        with transaction.atomic():
-                            EtiquetaRFIDDetalle.objects.bulk_create(
-                                [
-                                    EtiquetaRFIDDetalle(
-                                        impresion=impresion,
-                                        epc=row["epc"],
-                                        barcode_value=barcode_value_base,
-                                        serial=row["serial"],
-                                        estado=(
-                                            EtiquetaRFIDDetalle.Estado.IMPRESO
-                                            if status_input
-                                            == EtiquetaRFIDImpresion.Estatus.EXITO
-                                            else EtiquetaRFIDDetalle.Estado.PENDIENTE
-                                        ),
-                                    )
-                                    for row in generated
-                                ],
-                                batch_size=EPC_BATCH_SIZE,
-                            )
-                        break
-                    except IntegrityError as exc:
-                        if not _es_colision_epc(exc):
-                            raise
-                        if intento == MAX_INTENTOS_EPC:
-                            logger.error(
-                                "Colisión de EPC generado por backend agotó los %s "
-                                "intentos (impresion=%s, empresa=%s, cantidad=%s). "
-                                "Revisar entropía de _generate_epc_list.",
-                                MAX_INTENTOS_EPC,
-                                impresion.pk,
-                                empresa.pk,
-                                cantidad,
-                            )
-                            raise EtiquetaRFIDColision409(
-                                "No fue posible generar códigos EPC únicos después "
-                                f"de {MAX_INTENTOS_EPC} intentos. Reintente la "
-                                "operación."
+                try:
+                    EtiquetaRFIDDetalle.objects.bulk_create(
+                        [
+                            EtiquetaRFIDDetalle(
+                                impresion=impresion,
+                                epc=row["epc"],
+                                epc_normalizado=normalizar_epc(row["epc"]),
+                                barcode_value=barcode_value_base,
+                                serial=row["serial"],
+                                estado=(
+                                    EtiquetaRFIDDetalle.Estado.IMPRESO
+                                    if status_input == EtiquetaRFIDImpresion.Estatus.EXITO
+                                    else EtiquetaRFIDDetalle.Estado.PENDIENTE
+                                ),
                             )
-                        logger.warning(
-                            "Colisión de EPC generado por backend en el intento %s/%s "
-                            "(impresion=%s, empresa=%s, cantidad=%s): regenerando.",
-                            intento,
-                            MAX_INTENTOS_EPC,
-                            impresion.pk,
-                            empresa.pk,
-                            cantidad,
-                        )
+                            for row in generated
+                        ],
+                        batch_size=EPC_BATCH_SIZE,
+                    )
+                except IntegrityError as exc:
+                    if not _es_colision_epc(exc):
+                        raise
+                    # Los seriales reservados no se repiten entre sí; chocar aquí
+                    # sólo es posible contra un EPC que no salió del contador
+                    # (etiquetas previas al contador o mandadas por el cliente).
+                    # Regenerar no tiene caso: se reporta y se hace rollback
+                    # completo, igual que la rama del cliente.
+                    logger.error(
+                        "Colisión de EPC generado por backend contra un EPC ajeno "
+                        "al contador (impresion=%s, empresa=%s, cantidad=%s).",
+                        impresion.pk,
+                        empresa.pk,
+                        cantidad,
+                    )
+                    raise EtiquetaRFIDColision409()
 
         return impresion
+
+    @staticmethod
+    def plantilla_impresion(impresion):
+        """``PlantillaZPL`` con la que se imprimió (o se reimprime) ``impresion``.
+
+        Con ``datos_etiqueta`` salen los textos guardados al registrarla; las
+        impresiones anteriores a ese campo se arman con el producto actual.
+        """
+        layout = impresion.plantilla_zpl or LAYOUT_ERP
+        if impresion.datos_etiqueta:
+            return PlantillaZPL.compilar(
+                datos=impresion.datos_etiqueta, layout=layout, rfid=impresion.rfid_mode
+            )
+        preview = RFIDLabelService._build_label_preview(
+            variante=impresion.producto_variante, producto=impresion.producto
+        )
+        return PlantillaZPL.compilar(
+            variante=impresion.producto_variante,
+            producto=impresion.producto,
+            barcode_value=(preview or {}).get("barcode_value", ""),
+            layout=layout,
+            rfid=impresion.rfid_mode,
+        )
+
+    @classmethod
+    def iter_zpl_impresion(cls, impresion, etiquetas_por_bloque=ETIQUETAS_POR_BLOQUE):
+        """Trabajo ZPL completo de ``impresion`` en bloques de texto.
+
+        Se arma con la plantilla y los EPC de ``EtiquetaRFIDDetalle`` leídos
+        por lotes, en vez de guardar el trabajo entero en ``zpl_enviado``.
+        Sin RFID se repite la etiqueta normal ``cantidad`` veces.
+
+        Una impresión sin ``plantilla_zpl`` es anterior a las plantillas: si
+        trae ``zpl_enviado``, ése es el trabajo que se mandó y se devuelve tal
+        cual.
+        """
+        if not impresion.plantilla_zpl and impresion.zpl_enviado:
+            return iter([impresion.zpl_enviado])
+        plantilla = cls.plantilla_impresion(impresion)
+        if impresion.rfid_mode:
+            epcs = (
+                detalle["epc"]
+                for detalle in iterar_por_lotes(
+                    EtiquetaRFIDDetalle.objects.filter(impresion=impresion).values("id", "epc"),
+                    lote=EPC_BATCH_SIZE,
+                )
+            )
+        else:
+            epcs = ("" for _ in range(max(1, impresion.cantidad)))
+        return plantilla.iter_trabajo(epcs, etiquetas_por_bloque=etiquetas_por_bloque)
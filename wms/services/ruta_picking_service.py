@@ -0,0 +1,296 @@
+import re
+from collections import defaultdict
+
+from django.db import transaction
+
+from inventarios.models import Ubicacion, inventario_reservas
+from wms.models import Picking, PickingDetalle
+from wms.services.existencia_service import SaldoExistenciaAlmacen
+
+_NUMERO = re.compile(r"(\d+)")
+
+CRITERIO_ORDEN_RECORRIDO = "orden_recorrido"
+CRITERIO_SERPENTINA = "serpentina"
+CRITERIO_MIXTO = "mixto"
+
+
+def _natural(texto):
+    """Llave de orden natural: ``"A2"`` antes que ``"A10"``."""
+    partes = _NUMERO.split(str(texto or "").strip().lower())
+    return tuple((0, int(p), "") if p.isdigit() else (1, 0, p) for p in partes if p)
+
+
+def _tramo(ubicacion):
+    """Posición a lo largo del pasillo: rack, luego posición, luego nivel."""
+    return (_natural(ubicacion.rack), _natural(ubicacion.posicion), _natural(ubicacion.nivel))
+
+
+def ordenar_ubicaciones(ubicaciones):
+    """Secuencia de visita de un conjunto de ubicaciones.
+
+    - Las que tienen ``orden_recorrido`` (> 0) van primero, en ese orden: es
+      el recorrido que el almacén configuró y manda sobre cualquier heurística.
+    - El resto, en serpentina (S-shape): pasillos en orden natural y sólo los
+      que tienen paradas; el primero se recorre de ida (rack ascendente), el
+      siguiente de regreso, y así. Se entra por un extremo y se sale por el
+      otro sin volver sobre los pasos.
+
+    Devuelve ``(ordenadas, criterio)``.
+    """
+    unicas = {u.pk: u for u in ubicaciones if u is not None}.values()
+    configuradas = sorted(
+        (u for u in unicas if u.orden_recorrido),
+        key=lambda u: (u.orden_recorrido, u.pk),
+    )
+    por_pasillo = defaultdict(list)
+    for u in unicas:
+        if not u.orden_recorrido:
+            por_pasillo[u.pasillo].append(u)
+
+    serpentina = []
+    for indice, pasillo in enumerate(sorted(por_pasillo, key=_natural)):
+        tramo = sorted(por_pasillo[pasillo], key=lambda u: (_tramo(u), u.pk))
+        serpentina.extend(reversed(tramo) if indice % 2 else tramo)
+
+    if configuradas and serpentina:
+        criterio = CRITERIO_MIXTO
+    elif configuradas:
+        criterio = CRITERIO_ORDEN_RECORRIDO
+    else:
+        criterio = CRITERIO_SERPENTINA
+    return configuradas + serpentina, criterio
+
+
+class MedidorRecorrido:
+    """Pasos de un recorrido en un almacén de pasillos paralelos.
+
+    Modelo de dos pasillos transversales (frente y fondo): cada ubicación es
+    ``(x, y)`` con ``x`` = índice natural del pasillo e ``y`` = rango de su
+    tramo (rack/posición) entre las ubicaciones medidas. Dentro de un pasillo
+    se camina ``|y1 - y2|``; para cambiar de pasillo se sale por el extremo
+    más corto (frente o fondo) y se cruzan ``ANCHO_PASILLO`` pasos por
+    pasillo. El recorrido sale del andén (frente del primer pasillo) y
+    regresa a él. El número es comparativo, no metros.
+    """
+
+    ANCHO_PASILLO = 3
+
+    def __init__(self, ubicaciones):
+        unicas = {u.pk: u for u in ubicaciones if u is not None}.values()
+        pasillos = sorted({u.pasillo for u in unicas}, key=_natural)
+        tramos = sorted({_tramo(u) for u in unicas})
+        self._x = {p: i for i, p in enumerate(pasillos)}
+        self._y = {t: i + 1 for i, t in enumerate(tramos)}
+        self._fondo = len(tramos) + 1
+
+    def _punto(self, ubicacion):
+        return self._x[ubicacion.pasillo], self._y[_tramo(ubicacion)]
+
+    def distancia(self, a, b):
+        (x1, y1), (x2, y2) = a, b
+        if x1 == x2:
+            return abs(y1 - y2)
+        por_frente = y1 + y2
+        por_fondo = (self._fondo - y1) + (self._fondo - y2)
+        return min(por_frente, por_fondo) + self.ANCHO_PASILLO * abs(x1 - x2)
+
+    def pasos(self, secuencia):
+        """Pasos de andén → ubicaciones en ``secuencia`` → andén."""
+        anden = (0, 0)
+        actual = anden
+        total = 0
+        for ubicacion in secuencia:
+            if ubicacion is None:
+                continue
+            siguiente = self._punto(ubicacion)
+            total += self.distancia(actual, siguiente)
+            actual = siguiente
+        return total + self.distancia(actual, anden)
+
+
+class RutaPickingService:
+    """Secuencia de recolección de un picking o de un lote de oleada.
+
+    Los renglones llegaban en orden de pk, que es el orden de captura del
+    pedido y nada tiene que ver con el almacén: el recolector cruzaba pasillos
+    de ida y vuelta. Aquí cada renglón recibe ``secuencia_recorrido`` según
+    ``ordenar_ubicaciones`` (renglones de la misma ubicación, consecutivos) y
+    el lote guarda sus paradas en ``LotePicking.ruta_optimizada``.
+
+    La ubicación de un renglón es ``PickingDetalle.ubicacion``; si no la
+    tiene (pickings del onboarding), la de su reserva activa o aplicada; y si
+    tampoco hay reserva (pickings de pedido recién creados), la de donde se
+    tomaría el stock en el almacén origen, con el mismo reparto que
+    ``TransferenciaService``. Renglones sin ninguna (sin stock) quedan al
+    final con ``secuencia_recorrido`` NULL.
+    """
+
+    @staticmethod
+    def _ubicaciones_por_reserva(renglones):
+        faltantes = {r.pedido_detalle_talla_id for r in renglones if r.ubicacion_id is None}
+        faltantes.discard(None)
+        if not faltantes:
+            return {}
+        pickings = {r.picking_id for r in renglones}
+        resultado = {}
+        for reserva in (
+            inventario_reservas.objects.filter(
+                picking_id__in=pickings,
+                pedido_detalle_talla_id__in=faltantes,
+                ubicacion__isnull=False,
+                estado__in=(inventario_reservas.Estado.ACTIVA, inventario_reservas.Estado.APLICADA),
+            )
+            .select_related("ubicacion")
+            .order_by("pk")
+        ):
+            resultado.setdefault((reserva.picking_id, reserva.pedido_detalle_talla_id), reserva.ubicacion)
+        return resultado
+
+    @staticmethod
+    def _ubicaciones_por_existencia(renglones):
+        """Ubicación de la que saldría cada renglón según el stock del almacén origen.
+
+        Sólo lee (sin bloquear) las filas de ``Existencia`` de las claves
+        involucradas, una consulta por almacén, y reparte con
+        ``SaldoExistenciaAlmacen``: renglones de la misma clave consumen del
+        mismo saldo, así que cada uno apunta a la fila que le tocaría.
+        """
+        if not renglones:
+            return {}
+        almacen_por_picking = dict(
+            Picking.objects.filter(pk__in={r.picking_id for r in renglones}).values_list("pk", "almacen_id")
+        )
+        por_almacen = defaultdict(list)
+        for renglon in renglones:
+            por_almacen[almacen_por_picking.get(renglon.picking_id)].append(renglon)
+        por_almacen.pop(None, None)
+
+        ubicacion_id_por_renglon = {}
+        for almacen_id, filas in por_almacen.items():
+            saldo = SaldoExistenciaAlmacen(almacen_id, lock=False)
+            saldo.precargar((r.producto_id, r.producto_variante_id) for r in filas)
+            for renglon in filas:
+                asignaciones, _ = saldo.consumir(
+                    renglon.producto_id, renglon.producto_variante_id, renglon.cantidad_asignada
+                )
+                ubicaciones = [fila.ubicacion_id for fila, _ in asignaciones if fila.ubicacion_id is not None]
+                if ubicaciones:
+                    ubicacion_id_por_renglon[renglon.pk] = ubicaciones[0]
+
+        ubicaciones = Ubicacion.objects.in_bulk(set(ubicacion_id_por_renglon.values()))
+        return {
+            pk: ubicaciones[ubicacion_id]
+            for pk, ubicacion_id in ubicacion_id_por_renglon.items()
+            if ubicacion_id in ubicaciones
+        }
+
+    @classmethod
+    def secuenciar(cls, renglones):
+        """Asigna ``secuencia_recorrido`` en memoria y arma las paradas.
+
+        Devuelve ``(paradas, resumen)``: ``paradas`` es
+        ``[(ubicacion, [renglones])]`` en orden de visita; ``resumen`` trae el
+        criterio y los pasos contra el orden por pk.
+        """
+        renglones = sorted(renglones, key=lambda r: r.pk)
+        por_reserva = cls._ubicaciones_por_reserva(renglones)
+        por_existencia = cls._ubicaciones_por_existencia(
+            [
+                r
+                for r in renglones
+                if r.ubicacion_id is None and (r.picking_id, r.pedido_detalle_talla_id) not in por_reserva
+            ]
+        )
+
+        def ubicacion_de(renglon):
+            if renglon.ubicacion_id is not None:
+                return renglon.ubicacion
+            ubicacion = por_reserva.get((renglon.picking_id, renglon.pedido_detalle_talla_id))
+            return ubicacion if ubicacion is not None else por_existencia.get(renglon.pk)
+
+        por_ubicacion = defaultdict(list)
+        sin_ubicacion = []
+        for renglon in renglones:
+            ubicacion = ubicacion_de(renglon)
+            if ubicacion is None:
+                sin_ubicacion.append(renglon)
+            else:
+                por_ubicacion[ubicacion.pk].append((ubicacion, renglon))
+
+        ordenadas, criterio = ordenar_ubicaciones(u for filas in por_ubicacion.values() for u, _ in filas[:1])
+        paradas = [(u, [r for _, r in por_ubicacion[u.pk]]) for u in ordenadas]
+
+        secuencia = 0
+        for _, filas in paradas:
+            for renglon in filas:
+                secuencia += 1
+                renglon.secuencia_recorrido = secuencia
+        for renglon in sin_ubicacion:
+            renglon.secuencia_recorrido = None
+
+        medidor = MedidorRecorrido(ordenadas)
+        resumen = {
+            "criterio": criterio,
+            "paradas": len(paradas),
+            "renglones_sin_ubicacion": len(sin_ubicacion),
+            "pasos": medidor.pasos(ordenadas),
+            "pasos_orden_pk": medidor.pasos(ubicacion_de(r) for r in renglones),
+        }
+        return paradas, resumen
+
+    @staticmethod
+    def serializar_paradas(paradas):
+        return [
+            {
+                "orden": orden,
+                "ubicacion": ubicacion.pk,
+                "pasillo": ubicacion.pasillo,
+                "rack": ubicacion.rack,
+                "nivel": ubicacion.nivel,
+                "posicion": ubicacion.posicion,
+                "orden_recorrido": ubicacion.orden_recorrido or None,
+                "renglones": [
+                    {
+                        "picking": r.picking_id,
+                        "picking_detalle": r.pk,
+                        "producto": r.producto_id,
+                        "producto_variante": r.producto_variante_id,
+                        "cantidad": str(r.cantidad_asignada),
+                    }
+                    for r in filas
+                ],
+            }
+            for orden, (ubicacion, filas) in enumerate(paradas, start=1)
+        ]
+
+    @classmethod
+    def _guardar(cls, renglones):
+        PickingDetalle.objects.bulk_update(renglones, ["secuencia_recorrido"], batch_size=500)
+
+    @classmethod
+    @transaction.atomic
+    def secuenciar_picking(cls, picking, guardar=True):
+        renglones = list(picking.picking_detalle.select_related("ubicacion"))
+        paradas, resumen = cls.secuenciar(renglones)
+        if guardar:
+            cls._guardar(renglones)
+        return paradas, resumen
+
+    @classmethod
+    @transaction.atomic
+    def secuenciar_lote(cls, lote, renglones=None, guardar=True):
+        """Secuencia todos los renglones del lote como un solo recorrido.
+
+        ``renglones`` permite pasar los ``PickingDetalle`` recién creados
+        (con ``ubicacion`` ya cargada) y ahorrarse la relectura.
+        """
+        if renglones is None:
+            renglones = list(
+                PickingDetalle.objects.filter(picking__lote=lote).select_related("ubicacion")
+            )
+        paradas, resumen = cls.secuenciar(renglones)
+        if guardar:
+            cls._guardar(renglones)
+            lote.ruta_optimizada = dict(resumen, paradas_detalle=cls.serializar_paradas(paradas))
+            lote.save(update_fields=["ruta_optimizada", "updated_at"])
+        return paradas, resumen
@@ -4,7 +4,8 @@ from django.db import transaction
 from rest_framework.exceptions import ValidationError
 from auditoria.models import AuditoriaEvento
 from wms.models import Transferencia, TransferenciaDetalle
-from inventarios.models import Existencia
+from inventarios.models import Existencia, TipoMovimiento
+from inventarios.services.kardex_service import KardexService
 from wms.utils.folios import generate_folio
 from wms.services.existencia_service import ExistenciaService, SaldoExistenciaAlmacen
 from wms.services.movimiento_inventario_service import MovimientoInventarioService
@@ -98,6 +99,7 @@ class TransferenciaService:
         # etapa de reserva.
         saldos_origen = SaldoExistenciaAlmacen(almacen_origen, lock=True)
         destinos_por_clave = {}
+        entradas_por_clave = {}
 
         for row in transferencia_detalle_rows:
             producto = row.get("producto")
@@ -141,6 +143,7 @@ class TransferenciaService:
                     )
                 destinos_por_clave[clave] = existencia_destino
             destinos_por_clave[clave].cantidad += cantidad
+            entradas_por_clave[clave] = entradas_por_clave.get(clave, Decimal("0")) + cantidad
 
         # 2. Crear transferencia
         transferencia = Transferencia.objects.create(
@@ -155,16 +158,20 @@ class TransferenciaService:
         #
         # Una escritura por fila con el saldo ya acumulado de todos los renglones
         # que compartían su clave. El reparto entre ubicaciones se hizo en la fase
-        # 1, en orden de pk y sobre filas bloqueadas con select_for_update(),
-        # mismo criterio que ReservaInventarioService.create_for_picking: la
-        # reserva y el movimiento físico consumen las mismas filas en el mismo
-        # orden.
+        # 1 con SaldoExistenciaAlmacen._orden_reparto y sobre filas bloqueadas
+        # con select_for_update(), mismo criterio que
+        # ReservaInventarioService.create_for_picking: la reserva y el
+        # movimiento físico consumen las mismas filas en el mismo orden.
+        kardex = []
         for existencia_origen, saldo_final in saldos_origen.filas_consumidas():
+            delta = saldo_final - TransferenciaService._normalize(existencia_origen.cantidad)
             existencia_origen.cantidad = saldo_final
             existencia_origen.save(update_fields=["cantidad"])
+            kardex.append(KardexService.renglon(existencia_origen, delta))
 
-        for existencia_destino in destinos_por_clave.values():
+        for clave, existencia_destino in destinos_por_clave.items():
             existencia_destino.save()
+            kardex.append(KardexService.renglon(existencia_destino, entradas_por_clave[clave]))
 
         TransferenciaDetalle.objects.bulk_create(
             [
@@ -173,14 +180,15 @@ class TransferenciaService:
             ]
         )
 
-        # 4. Registrar movimientos
-        MovimientoInventarioService.handle_store_for_transferencia(
+        # 4. Registrar movimientos (formal y kardex)
+        movimiento_id = MovimientoInventarioService.handle_store_for_transferencia(
             usuario=user,
             empresa=empresa,
             sucursal=sucursal,
             transferencia=transferencia,
             transferencia_detalle_rows=transferencia_detalle_rows,
         )
+        KardexService.registrar(kardex, movimiento_id, TipoMovimiento.TRANSFERENCIA)
 
         # 5. Registrar evento de auditoría
         items_audit = []
@@ -0,0 +1,180 @@
+import socket
+
+from django.template.defaultfilters import truncatechars
+
+# Layouts de etiqueta: título de la cabecera y pie (sólo en etiquetas sin RFID,
+# en las RFID ese renglón lo ocupa el EPC visible).
+LAYOUT_ERP = "erp"
+LAYOUT_QA = "qa"
+LAYOUTS = {
+    LAYOUT_ERP: {
+        "titulo": "WMS - ETIQUETA RFID",
+        "pie_variante": "Etiqueta generada desde ERP.",
+        "pie_producto": "Etiqueta generada desde ERP.",
+    },
+    LAYOUT_QA: {
+        "titulo": "QA RFID - ETIQUETA PRUEBA",
+        "pie_variante": "Impresion QA para prueba de escaneo local.",
+        "pie_producto": "Impresion QA desde catalogo de productos.",
+    },
+}
+
+# Etiquetas por bloque al transmitir un trabajo (~1.3 KB cada una en RFID).
+ETIQUETAS_POR_BLOQUE = 200
+
+PUERTO_ZPL = 9100
+
+# Secuencia de escritura RFID (ver ``_build_zpl_rfid``): dos escrituras del banco
+# EPC y la validación. ``{epc}`` es lo único que cambia entre etiquetas.
+_BLOQUE_RFID = (
+    "^RB96,,,1\n^RS8,E\n^RFW,E\n^FD{epc}^FS\n"
+    "^RB96,,,1\n^RS8,E\n^RFW,E\n^FD{epc}^FS\n"
+    "^RB96,,,1\n^RS8,E\n^HV1,3,E,0\n"
+)
+
+
+def _escapar_formato(texto):
+    return texto.replace("{", "{{").replace("}", "}}")
+
+
+def _epc_visible(epc):
+    if len(epc) > 24:
+        return f"^FO40,348^A0N,16,16^FDEPC: {epc[:12]}...{epc[-10:]}^FS"
+    return f"^FO40,360^A0N,18,18^FDEPC: {epc[:16]}...{epc[-8:]}^FS"
+
+
+def datos_etiqueta(variante=None, producto=None, barcode_value=""):
+    """Textos que imprime la etiqueta del artículo, ya en mayúsculas.
+
+    Es lo que ``EtiquetaRFIDImpresion.datos_etiqueta`` guarda al registrar la
+    impresión: una reimpresión sale con el nombre y el código de barras de
+    entonces aunque el producto haya cambiado después.
+    """
+    if variante is not None:
+        prod = variante.producto
+        sku = (variante.sku or "").upper()
+        color = getattr(variante.color, "nombre", "") or ""
+        talla = getattr(variante.talla, "nombre", "") or ""
+        return {
+            "tipo": "variante",
+            "nombre": truncatechars((prod.nombre or "").upper(), 32),
+            "sku": sku,
+            "secundario": " / ".join(v.upper() for v in [color, talla] if v),
+            "codigo": (prod.codigo or prod.cod_proscai or "").upper(),
+            "barcode": barcode_value or sku,
+        }
+
+    if producto is not None:
+        codigo_impresion = (
+            producto.codigo or producto.cod_proscai or f"PROD-{producto.pk}"
+        ).upper()
+        auxiliar = (producto.cod_proscai or "").upper()
+        return {
+            "tipo": "producto",
+            "nombre": truncatechars((producto.nombre or "").upper(), 32),
+            "codigo": codigo_impresion,
+            "auxiliar": auxiliar if auxiliar != codigo_impresion else "",
+            "barcode": barcode_value or codigo_impresion,
+        }
+
+    return {}
+
+
+def lineas_graficas(variante=None, producto=None, barcode_value="", layout=LAYOUT_ERP, datos=None):
+    """Renglones ZPL de la parte gráfica (cabecera, textos y código de barras).
+
+    ``datos`` (de ``datos_etiqueta``) toma el lugar de ``variante``/``producto``.
+    """
+    if datos is None:
+        datos = datos_etiqueta(variante=variante, producto=producto, barcode_value=barcode_value)
+    lines = [
+        "^XA",
+        "^PW799",
+        "^LL400",
+        "^CI28",
+        "^LH0,0",
+        f"^FO40,30^A0N,34,34^FD{LAYOUTS[layout]['titulo']}^FS",
+    ]
+
+    if datos.get("tipo") == "variante":
+        lines.append(f"^FO40,85^A0N,32,32^FD{datos['nombre']}^FS")
+        lines.append(f"^FO40,130^A0N,28,28^FDSKU: {datos['sku']}^FS")
+        if datos.get("secundario"):
+            lines.append(f"^FO40,168^A0N,28,28^FD{datos['secundario']}^FS")
+        if datos.get("codigo"):
+            lines.append(f"^FO40,206^A0N,26,26^FDCOD: {datos['codigo']}^FS")
+        lines.append(f"^FO40,245^BY3,3,90^BCN,90,Y,N,N^FD{datos['barcode']}^FS")
+        return lines
+
+    if datos.get("tipo") == "producto":
+        lines.append(f"^FO40,85^A0N,32,32^FD{datos['nombre']}^FS")
+        lines.append(f"^FO40,130^A0N,28,28^FDCODIGO: {datos['codigo']}^FS")
+        if datos.get("auxiliar"):
+            lines.append(f"^FO40,168^A0N,26,26^FDPROSCAI: {datos['auxiliar']}^FS")
+        lines.append(f"^FO40,245^BY3,3,90^BCN,90,Y,N,N^FD{datos['barcode']}^FS")
+        return lines
+
+    return lines
+
+
+class PlantillaZPL:
+    """Etiqueta ZPL de un artículo con la parte gráfica ya armada.
+
+    ``compilar`` arma una sola vez (por variante o producto y layout) todo lo
+    que no cambia entre etiquetas y lo deja como un formato de ``str.format``
+    con ``{epc}`` y ``{epc_visible}`` como únicos huecos (las llaves del texto
+    del producto se escapan); ``etiqueta(epc)`` sólo los sustituye. Antes
+    cada tag reconstruía la lista de renglones completa.
+
+    ``iter_trabajo`` entrega el trabajo en bloques de ``ETIQUETAS_POR_BLOQUE``
+    etiquetas para mandarlo por ``StreamingHttpResponse`` o a un socket sin
+    juntar el trabajo completo en memoria.
+    """
+
+    def __init__(self, formato, rfid, layout):
+        self.formato = formato
+        self.rfid = rfid
+        self.layout = layout
+
+    @classmethod
+    def compilar(cls, variante=None, producto=None, barcode_value="", layout=LAYOUT_ERP, rfid=True, datos=None):
+        if datos is None:
+            datos = datos_etiqueta(variante=variante, producto=producto, barcode_value=barcode_value)
+        lines = lineas_graficas(layout=layout, datos=datos)
+        if rfid:
+            formato = _escapar_formato("\n".join(lines)) + "\n" + _BLOQUE_RFID + "{epc_visible}\n^XZ"
+        else:
+            # Sin EPC no hay nada que sustituir: el formato es la etiqueta final.
+            clave_pie = "pie_variante" if datos.get("tipo") == "variante" else "pie_producto"
+            lines.append(f"^FO40,360^A0N,22,22^FD{LAYOUTS[layout][clave_pie]}^FS")
+            lines.append("^XZ")
+            formato = "\n".join(lines)
+        return cls(formato, rfid, layout)
+
+    def etiqueta(self, epc=""):
+        """ZPL de una etiqueta; ``epc`` se ignora si la plantilla no es RFID."""
+        if not self.rfid:
+            return self.formato
+        return self.formato.format(epc=epc, epc_visible=_epc_visible(epc))
+
+    def iter_trabajo(self, epcs, etiquetas_por_bloque=ETIQUETAS_POR_BLOQUE):
+        """Bloques de texto con una etiqueta por cada elemento de ``epcs``."""
+        bloque = []
+        for epc in epcs:
+            bloque.append(self.etiqueta(epc))
+            if len(bloque) >= etiquetas_por_bloque:
+                yield "\n".join(bloque) + "\n"
+                bloque = []
+        if bloque:
+            yield "\n".join(bloque) + "\n"
+
+    @staticmethod
+    def enviar_socket(bloques, host, puerto=PUERTO_ZPL, timeout=10):
+        """Manda ``bloques`` al puerto raw de la impresora; devuelve bytes enviados."""
+        enviados = 0
+        with socket.create_connection((host, puerto), timeout=timeout) as conexion:
+            for bloque in bloques:
+                datos = bloque.encode("utf-8")
+                conexion.sendall(datos)
+                enviados += len(datos)
+        return enviados
@@ -2,23 +2,61 @@
 
 Cubren las dos capas de defensa sobre ``EtiquetaRFIDDetalle.epc`` (``unique=True``
 global): el pre-chequeo del serializer (400) y la red de seguridad del service
-(409), más el bucle acotado de regeneración para EPC generados por backend.
+(409), más el contador de seriales (``SerieEPC``) que hace únicos por
+construcción los EPC generados por backend.
+También la ingesta de lecturas del lector (ventana por ``(epc, antena)``), el
+planeador de oleadas y los cortes diarios del reporte de existencias por periodo.
 """
 
+import json
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
 from unittest.mock import patch
 
 from django.db import IntegrityError, transaction
 from django.db.transaction import TransactionManagementError
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
-
-from catalogo.models import Producto
-from nucleo.models import Empresa, Sucursal
+from rest_framework.test import APIClient
+
+from auditoria.models import AuditoriaEvento
+from catalogo.models import Color, Producto, ProductoVariante, Talla
+from compras.models import RecepcionRFIDEncuadre, RecepcionRFIDLectura
+from inventarios.models import (
+    Almacen,
+    CorteExistenciaControl,
+    CorteExistenciaDiario,
+    Existencia,
+    Ubicacion,
+    inventario_reservas,
+)
+from inventarios.services.corte_existencia_service import CorteExistenciaService
+from nucleo.models import Empresa, Moneda, SerieFolio, Sucursal
+from terceros.models import Cliente
 from usuarios.models import Usuario
 from wms.api.serializers import EtiquetaRFIDCreateSerializer
-from wms.models import EtiquetaRFIDDetalle, EtiquetaRFIDImpresion
+from ventas.models import Pedido, PedidoDetalle, PedidoDetalleTalla
+from wms.models import (
+    EtiquetaRFIDDetalle,
+    EtiquetaRFIDImpresion,
+    LotePicking,
+    Oleada,
+    Picking,
+    PickingDetalle,
+    RfidScan,
+    SerieEPC,
+)
+from wms.services.existencia_service import SaldoExistenciaAlmacen
+from wms.services.oleada_service import LineaOleada, OleadaService, PedidoOleada, TomaUbicacion
+from wms.services.picking_pipeline.asignacion import sugerir_origen
+from wms.services.reserva_service import ReservaInventarioService
+from wms.services.rfid_ingesta_service import BufferLecturasRFID, BufferRFIDLleno, RFIDIngestaService
+from wms.services.ruta_picking_service import MedidorRecorrido, RutaPickingService, ordenar_ubicaciones
+from wms.services.zpl_plantilla_service import LAYOUT_ERP, PlantillaZPL, datos_etiqueta
+from wms.utils.epc import EPC_INTERNO_BITS_SERIAL, codificar_sgtin96, normalizar_epc
 from wms.services.rfid_label_service import (
-    MAX_INTENTOS_EPC,
     EtiquetaRFIDColision409,
     RFIDLabelService,
 )
@@ -151,7 +189,7 @@ class GeneracionEPCTests(EtiquetaRFIDBaseTestCase):
     """El presupuesto de 24 hex (96 bits / SGTIN-96) es intocable."""
 
     def test_epc_generado_mide_24_hex(self):
-        generados = RFIDLabelService._generate_epc_list(5, producto=self.producto)
+        generados = RFIDLabelService._generate_epc_list(self.empresa, 5, producto=self.producto)
 
         self.assertEqual(len(generados), 5)
         for row in generados:
@@ -159,14 +197,15 @@ class GeneracionEPCTests(EtiquetaRFIDBaseTestCase):
             self.assertRegex(row["epc"], r"^[0-9A-F]{24}$")
 
     def test_epc_con_cantidad_maxima_sigue_en_24_hex(self):
-        """``cantidad`` topa en 10000 (0x2710): el idx de 4 hex no se desborda."""
-        generados = RFIDLabelService._generate_epc_list(10000, producto=self.producto)
+        """``cantidad`` topa en 10000: los 10000 EPC miden 24 hex y son distintos."""
+        generados = RFIDLabelService._generate_epc_list(self.empresa, 10000, producto=self.producto)
 
         self.assertEqual(len(generados[-1]["epc"]), 24)
+        self.assertEqual(len({row["epc"] for row in generados}), 10000)
 
     def test_zpl_rfid_escribe_el_epc_completo(self):
         """``^RFW,E`` debe llevar el EPC íntegro, sin recortes."""
-        epc = RFIDLabelService._generate_epc_list(1, producto=self.producto)[0]["epc"]
+        epc = RFIDLabelService._generate_epc_list(self.empresa, 1, producto=self.producto)[0]["epc"]
 
         zpl = RFIDLabelService._build_zpl_rfid(epc, producto=self.producto)
 
@@ -174,8 +213,297 @@ class GeneracionEPCTests(EtiquetaRFIDBaseTestCase):
         self.assertIn(f"^FD{epc}^FS", zpl)
 
 
+class SerieEPCTests(EtiquetaRFIDBaseTestCase):
+    """Rangos contiguos por artículo: los EPC generados no pueden repetirse."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        color = Color.objects.create(nombre="Negro", codigo="NEG", codigo_hex="#000000")
+        talla = Talla.objects.create(nombre="M")
+        cls.variante = ProductoVariante.objects.create(
+            producto=cls.producto,
+            empresa=cls.empresa,
+            color=color,
+            talla=talla,
+            sku="PB01-NEG-M",
+            precio_base=Decimal("199.00"),
+        )
+
+    def test_lotes_sucesivos_reciben_rangos_contiguos_sin_traslape(self):
+        primero = RFIDLabelService._generate_epc_list(self.empresa, 3, variante=self.variante)
+        segundo = RFIDLabelService._generate_epc_list(self.empresa, 2, variante=self.variante)
+
+        self.assertEqual([r["serial"] for r in primero + segundo], ["1", "2", "3", "4", "5"])
+        self.assertEqual(len({r["epc"] for r in primero + segundo}), 5)
+        self.assertEqual(
+            SerieEPC.objects.get(producto_variante=self.variante).ultimo_serial, 5
+        )
+
+    def test_variante_y_producto_llevan_contadores_y_epc_distintos(self):
+        de_variante = RFIDLabelService._generate_epc_list(self.empresa, 1, variante=self.variante)
+        de_producto = RFIDLabelService._generate_epc_list(self.empresa, 1, producto=self.producto)
+
+        self.assertEqual(de_variante[0]["serial"], de_producto[0]["serial"])
+        self.assertNotEqual(de_variante[0]["epc"], de_producto[0]["epc"])
+        self.assertEqual(SerieEPC.objects.count(), 2)
+
+    def test_empresa_con_prefijo_gs1_genera_sgtin96(self):
+        self.empresa.config_json = {"gs1_prefijo": "7501234"}
+        self.empresa.save(update_fields=["config_json"])
+
+        generados = RFIDLabelService._generate_epc_list(self.empresa, 2, variante=self.variante)
+
+        self.assertEqual(
+            [r["epc"] for r in generados],
+            [codificar_sgtin96("7501234", self.variante.pk, s) for s in (1, 2)],
+        )
+        self.assertTrue(generados[0]["epc"].startswith("30"))
+
+    def test_lote_que_no_cabe_no_consume_seriales(self):
+        serial_max = (1 << EPC_INTERNO_BITS_SERIAL) - 1
+        SerieEPC.objects.create(
+            empresa=self.empresa,
+            producto=self.producto,
+            producto_variante=self.variante,
+            ultimo_serial=serial_max - 2,
+        )
+
+        with self.assertRaises(ValidationError):
+            RFIDLabelService._generate_epc_list(self.empresa, 5, variante=self.variante)
+
+        self.assertEqual(
+            SerieEPC.objects.get(producto_variante=self.variante).ultimo_serial,
+            serial_max - 2,
+        )
+
+    def test_preview_sin_rfid_no_reserva_seriales(self):
+        payload = RFIDLabelService.onboarding_preview(
+            self.usuario, variante_id=self.variante.pk, cantidad=3, rfid_mode=False
+        )
+
+        self.assertEqual(len(payload["zpl_individual"]), 3)
+        self.assertFalse(SerieEPC.objects.exists())
+
+    def test_preview_muestra_epc_provisionales_sin_reservar(self):
+        payload = RFIDLabelService.onboarding_preview(
+            self.usuario, variante_id=self.variante.pk, cantidad=3
+        )
+
+        self.assertTrue(payload["epc_provisional"])
+        self.assertEqual([r["serial"] for r in payload["etiquetas"]], ["1", "2", "3"])
+        self.assertFalse(SerieEPC.objects.exists())
+        # Otro preview ve los mismos: nada quedó apartado.
+        otro = RFIDLabelService.onboarding_preview(
+            self.usuario, variante_id=self.variante.pk, cantidad=3
+        )
+        self.assertEqual(otro["etiquetas"], payload["etiquetas"])
+
+    def test_post_sin_etiquetas_reserva_y_el_preview_sigue_despues(self):
+        impresion = RFIDLabelService.store_impresion(
+            {"producto_variante": self.variante, "cantidad": 2, "rfid_mode": True},
+            self.usuario,
+        )
+
+        self.assertEqual(
+            list(impresion.etiquetas.order_by("id").values_list("serial", flat=True)),
+            ["1", "2"],
+        )
+        payload = RFIDLabelService.onboarding_preview(
+            self.usuario, variante_id=self.variante.pk, cantidad=1
+        )
+        self.assertEqual(payload["etiquetas"][0]["serial"], "3")
+
+    def test_post_con_los_epc_del_preview_avanza_el_contador(self):
+        preview = RFIDLabelService.onboarding_preview(
+            self.usuario, variante_id=self.variante.pk, cantidad=3
+        )
+        etiquetas = [
+            {"epc": r["epc"], "serial": r["serial"], "barcode_value": r["barcode_value"]}
+            for r in preview["etiquetas"]
+        ]
+
+        RFIDLabelService.store_impresion(
+            {
+                "producto_variante": self.variante,
+                "cantidad": 3,
+                "rfid_mode": True,
+                "etiquetas": etiquetas,
+            },
+            self.usuario,
+        )
+
+        self.assertEqual(
+            SerieEPC.objects.get(producto_variante=self.variante).ultimo_serial, 3
+        )
+        generados = RFIDLabelService._generate_epc_list(self.empresa, 1, variante=self.variante)
+        self.assertEqual(generados[0]["serial"], "4")
+
+        # El mismo preview registrado otra vez choca contra el índice único.
+        with self.assertRaises(EtiquetaRFIDColision409):
+            RFIDLabelService.store_impresion(
+                {
+                    "producto_variante": self.variante,
+                    "cantidad": 3,
+                    "rfid_mode": True,
+                    "etiquetas": etiquetas,
+                },
+                self.usuario,
+            )
+
+    def test_epc_ajenos_del_cliente_no_mueven_el_contador(self):
+        RFIDLabelService.store_impresion(
+            {
+                "producto_variante": self.variante,
+                "cantidad": 1,
+                "rfid_mode": True,
+                "etiquetas": [{"epc": "1111222233334444AAAA0001", "serial": "500"}],
+            },
+            self.usuario,
+        )
+
+        self.assertFalse(SerieEPC.objects.exists())
+
+    def test_prefijo_gs1_inutilizable_se_rechaza(self):
+        self.empresa.config_json = {"gs1_prefijo": "12345"}
+        self.empresa.save(update_fields=["config_json"])
+
+        with self.assertLogs("wms.services.rfid_label_service", "ERROR"):
+            with self.assertRaises(ValidationError) as ctx:
+                RFIDLabelService._generate_epc_list(self.empresa, 1, variante=self.variante)
+
+        self.assertIn("12345", str(ctx.exception.detail))
+        self.assertFalse(SerieEPC.objects.exists())
+
+    def test_preview_rechaza_cantidad_sobre_el_tope_sin_reservar(self):
+        with self.assertRaises(ValidationError):
+            RFIDLabelService.onboarding_preview(
+                self.usuario, variante_id=self.variante.pk, cantidad=300000000000
+            )
+
+        self.assertFalse(SerieEPC.objects.exists())
+
+    def test_sgtin96_coincide_con_el_ejemplo_del_estandar(self):
+        """Ejemplo del GS1 EPC Tag Data Standard: ``sgtin-96:3.0614141.812345.6789``."""
+        self.assertEqual(
+            codificar_sgtin96("0614141", 812345, 6789, filtro=3),
+            "3074257BF7194E4000001A85",
+        )
+
+
+class PlantillaZPLTests(EtiquetaRFIDBaseTestCase):
+    """La parte gráfica se compila una vez; por etiqueta sólo cambia el EPC."""
+
+    def test_etiqueta_de_plantilla_sustituye_solo_el_epc(self):
+        plantilla = PlantillaZPL.compilar(producto=self.producto, barcode_value="PB01")
+        uno = plantilla.etiqueta("A" * 24)
+        otro = plantilla.etiqueta("B" * 24)
+
+        self.assertEqual(uno.count("^FD" + "A" * 24 + "^FS"), 2)
+        self.assertEqual(uno.replace("A", "B"), otro.replace("A", "B"))
+        self.assertEqual(uno.split("^RB96")[0], otro.split("^RB96")[0])
+        self.assertTrue(uno.startswith("^XA") and uno.endswith("^XZ"))
+
+    def test_llaves_en_el_nombre_no_rompen_la_plantilla(self):
+        self.producto.nombre = "Playera {edición}"
+        plantilla = PlantillaZPL.compilar(producto=self.producto)
+
+        self.assertIn("PLAYERA {EDICIÓN}", plantilla.etiqueta("C" * 24))
+
+    def test_trabajo_sale_por_bloques(self):
+        plantilla = PlantillaZPL.compilar(producto=self.producto)
+        epcs = [f"{i:024X}" for i in range(5)]
+
+        bloques = list(plantilla.iter_trabajo(epcs, etiquetas_por_bloque=2))
+
+        self.assertEqual(len(bloques), 3)
+        self.assertEqual("".join(bloques).count("^XZ"), 5)
+
+    def test_impresion_guarda_referencia_y_rango_no_el_zpl(self):
+        impresion = RFIDLabelService.store_impresion(
+            {
+                "producto": self.producto,
+                "producto_variante": None,
+                "cantidad": 3,
+                "rfid_mode": True,
+                "status": EtiquetaRFIDImpresion.Estatus.EXITO,
+            },
+            self.usuario,
+        )
+        epcs = list(impresion.etiquetas.order_by("id").values_list("epc", flat=True))
+
+        self.assertEqual(impresion.plantilla_zpl, LAYOUT_ERP)
+        self.assertEqual((impresion.epc_inicial, impresion.epc_final), (epcs[0], epcs[-1]))
+        self.assertIsNone(impresion.zpl_enviado)
+
+        trabajo = "".join(RFIDLabelService.iter_zpl_impresion(impresion))
+        for epc in epcs:
+            self.assertIn(f"^FD{epc}^FS", trabajo)
+
+    def test_trabajo_lee_los_epc_por_lotes_en_orden(self):
+        impresion = RFIDLabelService.store_impresion(
+            {
+                "producto": self.producto,
+                "producto_variante": None,
+                "cantidad": 5,
+                "rfid_mode": True,
+                "status": EtiquetaRFIDImpresion.Estatus.EXITO,
+            },
+            self.usuario,
+        )
+        epcs = list(impresion.etiquetas.order_by("id").values_list("epc", flat=True))
+
+        with patch("wms.services.rfid_label_service.EPC_BATCH_SIZE", 2):
+            trabajo = "".join(RFIDLabelService.iter_zpl_impresion(impresion))
+
+        posiciones = [trabajo.index(f"^FD{epc}^FS") for epc in epcs]
+        self.assertEqual(posiciones, sorted(posiciones))
+        self.assertEqual(trabajo.count("^XZ"), 5)
+
+
+    def test_reimpresion_conserva_los_textos_de_la_impresion(self):
+        impresion = RFIDLabelService.store_impresion(
+            {"producto": self.producto, "cantidad": 1, "rfid_mode": True},
+            self.usuario,
+        )
+        original = "".join(RFIDLabelService.iter_zpl_impresion(impresion))
+        self.assertEqual(impresion.datos_etiqueta["nombre"], "PLAYERA BÁSICA")
+        self.assertEqual(impresion.datos_etiqueta["barcode"], "PB01")
+
+        Producto.objects.filter(pk=self.producto.pk).update(nombre="Playera nueva", codigo="PB02")
+        impresion = EtiquetaRFIDImpresion.objects.get(pk=impresion.pk)
+
+        self.assertEqual("".join(RFIDLabelService.iter_zpl_impresion(impresion)), original)
+
+    def test_plantilla_de_datos_es_la_misma_que_la_del_producto(self):
+        plantilla = PlantillaZPL.compilar(producto=self.producto, barcode_value="PB01")
+        guardada = PlantillaZPL.compilar(
+            datos=datos_etiqueta(producto=self.producto, barcode_value="PB01")
+        )
+
+        self.assertEqual(plantilla.formato, guardada.formato)
+
+    def test_impresion_anterior_a_plantillas_devuelve_zpl_enviado(self):
+        zpl = "^XA^FDETIQUETA HISTORICA^FS^XZ"
+        impresion = EtiquetaRFIDImpresion.objects.create(
+            empresa=self.empresa,
+            sucursal=self.sucursal,
+            producto=self.producto,
+            cantidad=1,
+            zpl_enviado=zpl,
+        )
+
+        self.assertEqual(list(RFIDLabelService.iter_zpl_impresion(impresion)), [zpl])
+
+        client = APIClient()
+        client.force_authenticate(user=self.usuario)
+        response = client.get(f"/api/v1/wms/etiquetas-rfid/{impresion.pk}/zpl/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content).decode("utf-8"), zpl)
+
+
 class LayerBServiceColisionTests(EtiquetaRFIDBaseTestCase):
-    """Capa B: la carrera y la regeneración se traducen a 409, nunca a 500."""
+    """Capa B: la carrera y las colisiones se traducen a 409, nunca a 500."""
 
     def _data(self, etiquetas=None, cantidad=1):
         data = {
@@ -201,42 +529,10 @@ class LayerBServiceColisionTests(EtiquetaRFIDBaseTestCase):
         self.assertEqual(ctx.exception.status_code, 409)
         self.assertNotIn(EPC_EXISTENTE, str(ctx.exception.detail))
 
-    def test_colision_generada_reintenta_y_termina_exitosa(self):
-        """(c) Prueba clave del savepoint anidado.
-
-        Fuerza colisión en el intento 1 y éxito en el 2. Si el ``bulk_create`` no
-        estuviera envuelto en su propio ``transaction.atomic()``, al atrapar el
-        ``IntegrityError`` la transacción externa quedaría ``needs_rollback`` y
-        este segundo intento reventaría con ``TransactionManagementError`` en vez
-        de completar. Que esta prueba pase ES la evidencia de que el savepoint
-        funciona.
-        """
-        self._crear_detalle_existente()
-        epc_bueno = "9999888877776666555500AA"
-
-        respuestas = [
-            [{"n": 1, "epc": EPC_EXISTENTE, "serial": "0001"}],
-            [{"n": 1, "epc": epc_bueno, "serial": "0001"}],
-        ]
-        with patch.object(
-            RFIDLabelService, "_generate_epc_list", side_effect=respuestas
-        ) as mock_gen:
-            impresion = RFIDLabelService.store_impresion(self._data(), self.usuario)
-
-        self.assertEqual(mock_gen.call_count, 2)
-        detalles = list(impresion.etiquetas.all())
-        self.assertEqual(len(detalles), 1)
-        self.assertEqual(detalles[0].epc, epc_bueno)
-        # El encabezado sobrevivió al intento fallido: el savepoint sólo deshizo
-        # el bulk_create, no el create() del header.
-        self.assertTrue(
-            EtiquetaRFIDImpresion.objects.filter(pk=impresion.pk).exists()
-        )
-
-    def test_colision_generada_persistente_agota_intentos_y_lanza_409(self):
-        """(c) Tras ``MAX_INTENTOS_EPC`` fallos -> 409, no TransactionManagementError."""
+    def test_colision_generada_lanza_409_sin_reintentar(self):
+        """Un EPC generado sólo choca contra uno ajeno al contador: 409, sin regenerar."""
         self._crear_detalle_existente()
-        colision = [{"n": 1, "epc": EPC_EXISTENTE, "serial": "0001"}]
+        colision = [{"n": 1, "epc": EPC_EXISTENTE, "serial": "1"}]
 
         with patch.object(
             RFIDLabelService, "_generate_epc_list", return_value=colision
@@ -244,15 +540,13 @@ class LayerBServiceColisionTests(EtiquetaRFIDBaseTestCase):
             with self.assertRaises(EtiquetaRFIDColision409) as ctx:
                 RFIDLabelService.store_impresion(self._data(), self.usuario)
 
-        self.assertEqual(mock_gen.call_count, MAX_INTENTOS_EPC)
+        self.assertEqual(mock_gen.call_count, 1)
         self.assertEqual(ctx.exception.status_code, 409)
-        # Mensaje distinto al de la colisión del cliente, para distinguirlas en logs.
-        self.assertIn("intentos", str(ctx.exception.detail))
 
     def test_colision_generada_deja_la_transaccion_usable(self):
         """El rollback del 409 no debe dejar la conexión rota ni datos huérfanos."""
         self._crear_detalle_existente()
-        colision = [{"n": 1, "epc": EPC_EXISTENTE, "serial": "0001"}]
+        colision = [{"n": 1, "epc": EPC_EXISTENTE, "serial": "1"}]
 
         with patch.object(
             RFIDLabelService, "_generate_epc_list", return_value=colision
@@ -375,12 +669,13 @@ class SucursalObligatoriaTests(EtiquetaRFIDBaseTestCase):
 
 
 class SavepointEsObligatorioTests(EtiquetaRFIDBaseTestCase):
-    """Prueba A/B de por qué el ``atomic`` anidado del retry no es cosmético.
+    """Prueba A/B de por qué atrapar un ``IntegrityError`` exige savepoint.
 
     Aísla el mecanismo puro de Django (``needs_rollback`` en
-    ``django/db/transaction.py``) para dejar constancia del modo de fallo. Si
-    alguien quita el ``with transaction.atomic()`` del bucle de reintentos en
-    ``store_impresion``, el bucle se comporta como el caso negativo de abajo.
+    ``django/db/transaction.py``) para dejar constancia del modo de fallo. Los
+    ``except IntegrityError`` de ``store_impresion`` no emiten ningún query
+    después; si alguno llegara a hacerlo sin envolver el ``bulk_create`` en un
+    ``transaction.atomic()`` anidado, se comportaría como el caso negativo.
     """
 
     def test_sin_savepoint_la_transaccion_queda_rota(self):
@@ -415,8 +710,7 @@ class SavepointEsObligatorioTests(EtiquetaRFIDBaseTestCase):
                     )
             except IntegrityError:
                 pass
-            # Con savepoint el query posterior sí corre: es exactamente lo que
-            # permite que el intento 2 del bucle de regeneración exista.
+            # Con savepoint el query posterior sí corre.
             self.assertEqual(EtiquetaRFIDDetalle.objects.count(), 1)
 
 
@@ -477,3 +771,606 @@ class RegresionFlujoFelizTests(EtiquetaRFIDBaseTestCase):
         )
 
         self.assertEqual(impresion.etiquetas.count(), 0)
+
+
+@override_settings(RFID_VENTANA_SEGUNDOS=5)
+class RfidIngestaVentanaTests(TestCase):
+    """Agregación de lecturas del lector por ``(epc, antena)`` y ventana."""
+
+    EPC = "e28011700000020a1b2c3d4e"
+
+    def setUp(self):
+        self.buffer = BufferLecturasRFID(intervalo=1)
+        self.t0 = timezone.now()
+
+    def test_lecturas_repetidas_dejan_un_renglon_por_antena(self):
+        self.buffer.agregar([(self.EPC, 1, -60.0)] * 40, "10.0.0.5", instante=self.t0)
+        self.buffer.agregar([(self.EPC, 1, -48.5), (self.EPC, 2, -70.0)], "10.0.0.5", instante=self.t0 + timedelta(seconds=1))
+
+        self.assertEqual(self.buffer.vaciar(), (2, 0))
+        ant1 = RfidScan.objects.get(epc=self.EPC, antenna=1)
+        self.assertEqual(ant1.lecturas, 41)
+        self.assertEqual(ant1.rssi, -48.5)
+        self.assertEqual(ant1.primera_lectura, self.t0)
+        self.assertEqual(ant1.ultima_lectura, self.t0 + timedelta(seconds=1))
+        self.assertEqual(self.buffer.pendientes(), 0)
+
+    def test_vaciados_siguientes_se_suman_a_la_ventana_abierta(self):
+        self.buffer.agregar([(self.EPC, 1, -60.0)], instante=self.t0)
+        self.buffer.vaciar()
+        self.buffer.agregar([(self.EPC, 1, -55.0)] * 3, instante=self.t0 + timedelta(seconds=4))
+        self.assertEqual(self.buffer.vaciar(), (0, 1))
+
+        # Pasada la ventana abre un renglón nuevo.
+        self.buffer.agregar([(self.EPC, 1, -58.0)], instante=self.t0 + timedelta(seconds=6))
+        self.assertEqual(self.buffer.vaciar(), (1, 0))
+
+        filas = list(RfidScan.objects.filter(epc=self.EPC).order_by("primera_lectura"))
+        self.assertEqual([f.lecturas for f in filas], [4, 1])
+        self.assertEqual(filas[0].rssi, -55.0)
+
+    def test_fallo_al_persistir_regresa_las_lecturas_al_buffer(self):
+        self.buffer.agregar([(self.EPC, 1, -60.0)] * 2, instante=self.t0)
+        with patch(
+            "wms.services.rfid_ingesta_service.persistir_agregados",
+            side_effect=RuntimeError("bd caída"),
+        ):
+            with self.assertRaises(RuntimeError):
+                self.buffer.vaciar()
+        self.buffer.agregar([(self.EPC, 1, -60.0)], instante=self.t0)
+
+        self.buffer.vaciar()
+        self.assertEqual(RfidScan.objects.get(epc=self.EPC).lecturas, 3)
+
+    def test_buffer_lleno_rechaza_el_post_completo(self):
+        with patch("wms.services.rfid_ingesta_service.MAX_CLAVES_PENDIENTES", 2):
+            self.buffer.agregar([(self.EPC, 1, -60.0), (self.EPC, 2, -60.0)], instante=self.t0)
+            with self.assertRaises(BufferRFIDLleno):
+                self.buffer.agregar([(self.EPC, 1, -50.0), (self.EPC, 3, -60.0)], instante=self.t0)
+
+        # Ni la clave que ya estaba se sumó: el lector reintenta el POST entero.
+        self.assertEqual(self.buffer.pendientes(), 2)
+        self.buffer.vaciar()
+        self.assertEqual(RfidScan.objects.get(epc=self.EPC, antenna=1).lecturas, 1)
+
+    def test_por_omision_se_persiste_dentro_del_request(self):
+        RFIDIngestaService.registrar([(self.EPC, 1, -60.0)] * 3, reader_ip="10.0.0.5")
+
+        self.assertEqual(RfidScan.objects.get(epc=self.EPC).lecturas, 3)
+
+    @override_settings(RFID_INGESTA_ASINCRONA=True)
+    def test_asincrono_con_buffer_lleno_vacia_dentro_del_request(self):
+        RFIDIngestaService._buffer = None
+        self.addCleanup(setattr, RFIDIngestaService, "_buffer", None)
+        with patch.object(BufferLecturasRFID, "iniciar"), patch(
+            "wms.services.rfid_ingesta_service.MAX_CLAVES_PENDIENTES", 1
+        ):
+            RFIDIngestaService.registrar([(self.EPC, 1, -60.0)])
+            self.assertFalse(RfidScan.objects.exists())
+            RFIDIngestaService.registrar([(self.EPC, 2, -60.0)])
+
+        self.assertEqual(list(RfidScan.objects.values_list("antenna", flat=True)), [1])
+        self.assertEqual(RFIDIngestaService.buffer().pendientes(), 1)
+
+    def test_receive_responde_503_si_no_puede_tomar_las_lecturas(self):
+        with patch.object(RFIDIngestaService, "registrar", side_effect=BufferRFIDLleno("lleno")):
+            respuesta = self.client.post(
+                "/QA/scanner_rfid/receive/",
+                data=json.dumps([{"epc": self.EPC, "antenna": 1}]),
+                content_type="application/json",
+            )
+
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertEqual(respuesta["Retry-After"], "1")
+
+    def test_clear_exige_staff_y_horas_positivas(self):
+        RfidScan.objects.create(epc=self.EPC, primera_lectura=self.t0, ultima_lectura=self.t0)
+        url = "/QA/scanner_rfid/clear/"
+
+        self.assertEqual(self.client.get(url, {"horas": "0"}).status_code, 401)
+        self.client.force_login(Usuario.objects.create(username="operador"))
+        self.assertEqual(self.client.get(url, {"horas": "1"}).status_code, 403)
+
+        self.client.force_login(Usuario.objects.create(username="qa", is_staff=True))
+        self.assertEqual(self.client.get(url, {"horas": "0"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"horas": "-5"}).status_code, 400)
+        respuesta = self.client.get(url, {"horas": "1"})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()["deleted"], 0)
+        self.assertTrue(RfidScan.objects.filter(epc=self.EPC).exists())
+
+    def test_purga_respeta_la_retencion(self):
+        viejo = RfidScan.objects.create(
+            epc="aaaa0001", primera_lectura=self.t0 - timedelta(hours=80),
+            ultima_lectura=self.t0 - timedelta(hours=80),
+        )
+        reciente = RfidScan.objects.create(
+            epc="aaaa0002", primera_lectura=self.t0, ultima_lectura=self.t0,
+        )
+
+        self.assertEqual(RFIDIngestaService.purgar(horas=72, lote=1), 1)
+        self.assertFalse(RfidScan.objects.filter(pk=viejo.pk).exists())
+        self.assertTrue(RfidScan.objects.filter(pk=reciente.pk).exists())
+
+
+class NormalizarEpcTests(SimpleTestCase):
+    """Forma canónica con la que se comparan lecturas del FX contra etiquetas."""
+
+    EPC = "000012e32827000147c0c5f5"
+
+    def test_mayusculas_separadores_y_ceros_a_la_izquierda(self):
+        self.assertEqual(normalizar_epc("0000-12E3:2827 0001 47C0 C5F5"), self.EPC)
+        self.assertEqual(normalizar_epc("12E32827000147C0C5F5"), self.EPC)
+
+    def test_112_bits_con_palabra_pc(self):
+        self.assertEqual(normalizar_epc("3000" + self.EPC), self.EPC)
+
+    def test_112_bits_con_crc(self):
+        self.assertEqual(normalizar_epc(self.EPC + "a1b2"), self.EPC)
+
+    def test_128_bits(self):
+        self.assertEqual(normalizar_epc(self.EPC + "00000000"), self.EPC)
+        self.assertEqual(normalizar_epc("3000" + self.EPC + "a1b2"), self.EPC)
+        epc_128 = "40001122334455667788990011223344"
+        self.assertEqual(normalizar_epc(epc_128), epc_128)
+
+    def test_128_bits_que_termina_en_ceros_no_se_recorta(self):
+        epc_128 = "40001122334455667788990000000000"
+        self.assertEqual(normalizar_epc(epc_128), epc_128)
+        sgtin = "3074257bf7194e4000001a85"
+        self.assertEqual(normalizar_epc(sgtin + "00000000"), sgtin)
+
+    def test_no_hex_o_muy_corto(self):
+        self.assertEqual(normalizar_epc("1000503G"), "")
+        self.assertEqual(normalizar_epc("abc"), "")
+        self.assertEqual(normalizar_epc(None), "")
+
+
+class EpcNormalizadoEscrituraTests(EtiquetaRFIDBaseTestCase):
+    def test_detalle_y_lectura_comparten_epc_canonico(self):
+        detalle = self._crear_detalle_existente(epc="000012E32827000147C0C5F5")
+        self.assertEqual(detalle.epc_normalizado, "000012e32827000147c0c5f5")
+
+        buffer = BufferLecturasRFID(intervalo=1)
+        buffer.agregar([("3000000012e32827000147c0c5f5", 1, -50.0)])
+        buffer.vaciar()
+
+        scan = RfidScan.objects.get()
+        self.assertEqual(
+            EtiquetaRFIDDetalle.objects.get(epc_normalizado=scan.epc_normalizado).pk,
+            detalle.pk,
+        )
+
+    def test_encuadre_detecta_repetido_por_la_columna_epc_normalizado(self):
+        almacen = Almacen.objects.create(
+            empresa=self.empresa, sucursal=self.sucursal, codigo="REC", nombre="Recibo"
+        )
+        encuadre = RecepcionRFIDEncuadre.objects.create(
+            empresa=self.empresa, sucursal=self.sucursal, almacen=almacen, usuario=self.usuario,
+        )
+        # Lectura anterior a la columna: sin ``epc_normalizado`` en metadata,
+        # sólo el valor que rellenó la migración.
+        RecepcionRFIDLectura.objects.create(
+            encuadre=encuadre, codigo_tag="000012E32827000147C0C5F5",
+            epc_normalizado="000012e32827000147c0c5f5", metadata={},
+        )
+        self.client.force_login(self.usuario)
+
+        self.client.post(
+            "/QA/rfid/recepciones/",
+            {
+                "action": "registrar_lectura",
+                "encuadre_id": encuadre.pk,
+                "codigo_tag": "3000000012e32827000147c0c5f5",
+            },
+        )
+
+        self.assertEqual(encuadre.lecturas.count(), 1)
+
+
+class OleadaAgrupacionTests(SimpleTestCase):
+    """``OleadaService.agrupar`` sin BD: afinidad, antigüedad y capacidad."""
+
+    def _pedido(self, pk, claves, pasillo):
+        lineas = []
+        for producto_id in claves:
+            talla = SimpleNamespace(
+                pk=producto_id, variante_id=None,
+                pedido_detalle=SimpleNamespace(producto_id=producto_id),
+            )
+            toma = TomaUbicacion(None, SimpleNamespace(pasillo=pasillo), Decimal("1"))
+            lineas.append(LineaOleada(talla, Decimal("1"), [toma]))
+        return PedidoOleada(SimpleNamespace(pk=pk, folio=f"P{pk}"), None, lineas)
+
+    def test_agrupa_por_afinidad_y_respeta_antiguedad(self):
+        viejo = self._pedido(1, [10, 11], "A")
+        ajeno = self._pedido(2, [20], "C")
+        afin = self._pedido(3, [10, 11], "A")
+
+        lotes = OleadaService.agrupar([viejo, ajeno, afin], max_pedidos=2, max_lineas=60)
+
+        self.assertEqual(
+            [[p.pedido.pk for p in lote.pedidos] for lote in lotes], [[1, 3], [2]]
+        )
+        self.assertEqual(lotes[0].zonas, {"A"})
+
+    def test_capacidad_de_lineas(self):
+        grande = self._pedido(1, [10, 11, 12], "A")
+        chico = self._pedido(2, [10], "A")
+
+        lotes = OleadaService.agrupar([grande, chico], max_pedidos=8, max_lineas=3)
+
+        self.assertEqual([len(lote.pedidos) for lote in lotes], [1, 1])
+
+
+class RutaPickingOrdenTests(SimpleTestCase):
+    """Secuencia de recorrido sin BD: orden configurado, serpentina y pasos."""
+
+    def _ubicacion(self, pk, pasillo, rack, orden=0):
+        return SimpleNamespace(
+            pk=pk, pasillo=pasillo, rack=rack, nivel="1", posicion="1", orden_recorrido=orden
+        )
+
+    def test_orden_recorrido_manda_sobre_la_serpentina(self):
+        libre = self._ubicacion(1, "A", "1")
+        segunda = self._ubicacion(2, "C", "9", orden=20)
+        primera = self._ubicacion(3, "B", "5", orden=10)
+
+        ordenadas, criterio = ordenar_ubicaciones([libre, segunda, primera])
+
+        self.assertEqual([u.pk for u in ordenadas], [3, 2, 1])
+        self.assertEqual(criterio, "mixto")
+
+    def test_serpentina_alterna_sentido_por_pasillo(self):
+        ubicaciones = [
+            self._ubicacion(1, "A10", "2"),
+            self._ubicacion(2, "A2", "1"),
+            self._ubicacion(3, "A2", "3"),
+            self._ubicacion(4, "A10", "12"),
+        ]
+
+        ordenadas, _ = ordenar_ubicaciones(ubicaciones)
+
+        # Orden natural de pasillos (A2 antes que A10); A10 se recorre de regreso.
+        self.assertEqual([u.pk for u in ordenadas], [2, 3, 4, 1])
+
+    def test_secuencia_agrupa_renglones_y_camina_menos_que_el_pk(self):
+        a1, b1, a2 = self._ubicacion(1, "A", "1"), self._ubicacion(2, "B", "1"), self._ubicacion(3, "A", "2")
+        renglones = [
+            SimpleNamespace(pk=pk, picking_id=1, pedido_detalle_talla_id=pk, ubicacion_id=u.pk, ubicacion=u)
+            for pk, u in enumerate([a1, b1, a2, a1], start=1)
+        ]
+
+        paradas, resumen = RutaPickingService.secuenciar(renglones)
+
+        self.assertEqual([u.pk for u, _ in paradas], [1, 3, 2])
+        self.assertEqual([r.secuencia_recorrido for r in renglones], [1, 4, 3, 2])
+        self.assertLess(resumen["pasos"], resumen["pasos_orden_pk"])
+        self.assertEqual(resumen["pasos"], MedidorRecorrido([a1, b1, a2]).pasos([a1, a2, b1]))
+
+
+class OleadaServiceTests(TestCase):
+    """Oleada completa: reservas, pickings WAVE_PICKING y stock ya reservado."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="ola", razon_social="Oleadas SA")
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, codigo="MTY", nombre="MTY")
+        SerieFolio.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, tipo_documento="Picking", serie="PK"
+        )
+        cls.usuario = Usuario.objects.create(
+            username="oleada", email="oleada@ola.test",
+            empresa=cls.empresa, sucursal_default=cls.sucursal,
+        )
+        cls.moneda = Moneda.objects.create(codigo_iso="MXN", nombre="Peso")
+        cls.cliente = Cliente.objects.create(empresa=cls.empresa, nombre="Cliente")
+        cls.talla = Talla.objects.create(nombre="M")
+        cls.origen = Almacen.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, codigo="PT", nombre="PT",
+            permite_salida=True,
+        )
+        cls.apartados = Almacen.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, codigo="AP", nombre="APARTADOS",
+            permite_entrada=True,
+        )
+        cls.pasillo_a = Ubicacion.objects.create(almacen=cls.origen, pasillo="A")
+        cls.pasillo_b = Ubicacion.objects.create(almacen=cls.origen, pasillo="B")
+        cls.playera = Producto.objects.create(empresa=cls.empresa, nombre="Playera", codigo="PL")
+        cls.gorra = Producto.objects.create(empresa=cls.empresa, nombre="Gorra", codigo="GO")
+
+    def setUp(self):
+        Existencia.objects.create(
+            producto=self.playera, almacen=self.origen, ubicacion=self.pasillo_a,
+            cantidad=Decimal("10"), stock=10,
+        )
+        Existencia.objects.create(
+            producto=self.gorra, almacen=self.origen, ubicacion=self.pasillo_b,
+            cantidad=Decimal("4"), stock=4,
+        )
+
+    def _pedido(self, folio, lineas, estatus=3):
+        pedido = Pedido.objects.create(
+            empresa=self.empresa, sucursal=self.sucursal, cliente=self.cliente,
+            moneda=self.moneda, folio=folio, estatus=estatus,
+            persona_pagos="Pagos", correo_facturas="pagos@ola.test",
+            telefono_pagos="8100000000", forma_pago="03", metodo_pago="PUE", uso_cfdi="G03",
+        )
+        for producto, cantidad in lineas:
+            detalle = PedidoDetalle.objects.create(pedido=pedido, producto=producto)
+            PedidoDetalleTalla.objects.create(pedido_detalle=detalle, talla=self.talla, cantidad=cantidad)
+        return pedido
+
+    def test_crea_oleada_con_reservas_por_ubicacion(self):
+        p1 = self._pedido("P1", [(self.playera, 3), (self.gorra, 1)])
+        p2 = self._pedido("P2", [(self.playera, 2)])
+        self._pedido("BORRADOR", [(self.playera, 1)], estatus=1)
+
+        oleada, plan = OleadaService.crear_oleada(self.origen, self.usuario)
+
+        self.assertEqual(oleada.estado, Oleada.Estado.LIBERADA)
+        self.assertEqual(oleada.total_pedidos, 2)
+        pickings = Picking.objects.filter(oleada=oleada)
+        self.assertEqual({p.pedido_id for p in pickings}, {p1.pk, p2.pk})
+        self.assertTrue(all(p.tipo == Picking.TipoPicking.WAVE_PICKING for p in pickings))
+        self.assertTrue(all(p.almacen_destino_id == self.apartados.pk for p in pickings))
+        # Los dos pedidos comparten la playera: mismo lote.
+        self.assertEqual(len({p.lote_id for p in pickings}), 1)
+
+        reservas = inventario_reservas.objects.filter(picking__oleada=oleada)
+        self.assertEqual(sum(r.cantidad for r in reservas), Decimal("6"))
+        self.assertEqual(
+            {r.ubicacion_id for r in reservas}, {self.pasillo_a.pk, self.pasillo_b.pk}
+        )
+
+        # El lote quedó secuenciado: pasillo A antes que B y la ruta guardada.
+        lote = LotePicking.objects.get(pk=pickings[0].lote_id)
+        self.assertEqual(lote.ruta_optimizada["paradas"], 2)
+        renglones = PickingDetalle.objects.filter(picking__oleada=oleada).order_by("secuencia_recorrido")
+        self.assertEqual([r.secuencia_recorrido for r in renglones], [1, 2, 3])
+        self.assertEqual(renglones.last().ubicacion_id, self.pasillo_b.pk)
+
+        # Nada queda pendiente: una segunda oleada no encuentra qué surtir.
+        segunda, _ = OleadaService.crear_oleada(self.origen, self.usuario)
+        self.assertIsNone(segunda)
+
+    def test_stock_reservado_no_se_vuelve_a_repartir(self):
+        self._pedido("P1", [(self.gorra, 3)])
+        self._pedido("P2", [(self.gorra, 3)])
+
+        oleada, plan = OleadaService.crear_oleada(self.origen, self.usuario)
+
+        reservas = inventario_reservas.objects.filter(picking__oleada=oleada)
+        self.assertEqual(sum(r.cantidad for r in reservas), Decimal("4"))
+        self.assertEqual(len(plan.sin_existencia), 0)
+        # El segundo pedido sólo alcanzó 1 de 3: lo que falta sigue pendiente
+        # y la siguiente oleada lo reporta sin existencia.
+        _, plan_siguiente = OleadaService.crear_oleada(self.origen, self.usuario)
+        self.assertEqual(len(plan_siguiente.sin_existencia), 1)
+
+    def test_picking_de_pedido_se_secuencia_sin_ubicacion_ni_reserva(self):
+        # Capturado gorra (pasillo B) antes que playera (pasillo A).
+        pedido = self._pedido("P1", [(self.gorra, 1), (self.playera, 2)])
+        picking = Picking.objects.create(
+            folio="PK-1", empresa=self.empresa, sucursal=self.sucursal, pedido=pedido,
+            operador=self.usuario, almacen=self.origen, almacen_destino=self.apartados,
+            usuario=self.usuario, total_lineas=2,
+        )
+        tallas = list(
+            PedidoDetalleTalla.objects.filter(pedido_detalle__pedido=pedido)
+            .select_related("pedido_detalle")
+            .order_by("pk")
+        )
+        PickingDetalle.objects.bulk_create(
+            PickingDetalle(
+                picking=picking, pedido_detalle=t.pedido_detalle, pedido_detalle_talla=t,
+                producto=t.pedido_detalle.producto, cantidad_solicitada=t.cantidad,
+                cantidad_asignada=t.cantidad,
+            )
+            for t in tallas
+        )
+
+        RutaPickingService.secuenciar_picking(picking)
+
+        secuencia = dict(picking.picking_detalle.values_list("producto_id", "secuencia_recorrido"))
+        self.assertEqual(secuencia, {self.playera.pk: 1, self.gorra.pk: 2})
+
+        # Al ligar las reservas se vuelve a secuenciar con la ubicación reservada.
+        PickingDetalle.objects.filter(picking=picking).update(secuencia_recorrido=None)
+        reservas = ReservaInventarioService.create_for_picking(
+            pedido, self.origen, [{"talla": t, "cantidad": t.cantidad} for t in tallas], self.usuario
+        )
+        ReservaInventarioService.apply_to_picking(reservas, picking, None)
+
+        secuencia = dict(picking.picking_detalle.values_list("producto_id", "secuencia_recorrido"))
+        self.assertEqual(secuencia, {self.playera.pk: 1, self.gorra.pk: 2})
+
+
+class RepartoExistenciaTests(SimpleTestCase):
+    """``SaldoExistenciaAlmacen.consumir``: pk por omisión, o pocas ubicaciones y FIFO entre iguales."""
+
+    def _saldos(self, *filas, reparto=SaldoExistenciaAlmacen.REPARTO_MENOS_UBICACIONES):
+        saldos = SaldoExistenciaAlmacen(None, lock=False, reparto=reparto)
+        saldos.cargar(
+            {
+                (1, None): [
+                    SimpleNamespace(pk=pk, ubicacion_id=ubicacion, cantidad=Decimal(cantidad))
+                    for pk, ubicacion, cantidad in filas
+                ]
+            }
+        )
+        return saldos
+
+    def test_por_omision_agota_en_orden_de_pk(self):
+        saldos = self._saldos(
+            (1, 10, "2"), (2, 20, "5"), (3, 30, "5"), reparto=SaldoExistenciaAlmacen.REPARTO_PK
+        )
+
+        asignaciones, _ = saldos.consumir(1, None, Decimal("4"))
+
+        self.assertEqual([(f.pk, c) for f, c in asignaciones], [(1, Decimal("2")), (2, Decimal("2"))])
+        self.assertEqual(SaldoExistenciaAlmacen(None)._reparto, SaldoExistenciaAlmacen.REPARTO_PK)
+
+    def test_una_fila_que_alcanza_gana_a_repartir_en_orden_de_pk(self):
+        saldos = self._saldos((1, 10, "2"), (2, 20, "5"), (3, 30, "5"))
+
+        asignaciones, faltante = saldos.consumir(1, None, Decimal("4"))
+
+        self.assertEqual(faltante, Decimal("0"))
+        self.assertEqual([(f.pk, c) for f, c in asignaciones], [(2, Decimal("4"))])
+
+    def test_prefiere_ubicaciones_ya_visitadas(self):
+        saldos = self._saldos((1, 10, "1"), (2, 20, "9"), (3, 30, "1"), (4, 10, "3"))
+        saldos.consumir(1, None, Decimal("1"))  # pk 1 (FIFO): visita la 10
+
+        asignaciones, _ = saldos.consumir(1, None, Decimal("3"))
+
+        self.assertEqual([f.pk for f, _ in asignaciones], [4])
+
+
+class AsignacionOrigenTests(TestCase):
+    """El origen sugerido es el almacén que llena el pedido, no el de menor pk."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="asg", razon_social="Asignación SA")
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, codigo="GDL", nombre="GDL")
+        cls.moneda = Moneda.objects.create(codigo_iso="MXN", nombre="Peso")
+        cls.cliente = Cliente.objects.create(empresa=cls.empresa, nombre="Cliente")
+        cls.talla = Talla.objects.create(nombre="G")
+        cls.playera = Producto.objects.create(empresa=cls.empresa, nombre="Playera", codigo="PL")
+        cls.parcial = Almacen.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, codigo="A1", nombre="A1", permite_salida=True,
+        )
+        cls.completo = Almacen.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, codigo="A2", nombre="A2", permite_salida=True,
+        )
+        Existencia.objects.create(producto=cls.playera, almacen=cls.parcial, cantidad=Decimal("2"), stock=2)
+        Existencia.objects.create(producto=cls.playera, almacen=cls.completo, cantidad=Decimal("8"), stock=8)
+        cls.pedido = Pedido.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, cliente=cls.cliente,
+            moneda=cls.moneda, folio="P1", estatus=3,
+            persona_pagos="Pagos", correo_facturas="pagos@asg.test",
+            telefono_pagos="8100000000", forma_pago="03", metodo_pago="PUE", uso_cfdi="G03",
+        )
+        detalle = PedidoDetalle.objects.create(pedido=cls.pedido, producto=cls.playera)
+        PedidoDetalleTalla.objects.create(pedido_detalle=detalle, talla=cls.talla, cantidad=5)
+
+    def test_sugiere_el_almacen_que_cubre_todas_las_lineas(self):
+        tallas = list(
+            PedidoDetalleTalla.objects.filter(pedido_detalle__pedido=self.pedido).select_related("pedido_detalle")
+        )
+
+        # Candidatos, pendiente histórico, existencia y reservas por clave,
+        # filas y reservas por fila: fijo, sin importar cuántos almacenes haya.
+        with self.assertNumQueries(6):
+            origen, coberturas = sugerir_origen(self.pedido, tallas)
+
+        self.assertEqual(origen, self.completo)
+        self.assertTrue(coberturas[0].completo)
+        self.assertEqual(coberturas[1].piezas_cubiertas, Decimal("2"))
+
+
+class CorteExistenciaTests(TestCase):
+    """Cortes diarios del reporte de existencias: mismos totales con y sin cortes.
+
+    Movimientos: +10 hace 5 días, -3 hace 3, +4 ayer (en el último microsegundo
+    del día, justo en ``corte_fin_dt``) y -2 hoy (en el primero). Existencia
+    actual: 9.
+    """
+
+    URL = "/api/v1/inventarios/existencias/reporte-existencias-periodo/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(codigo="cor", razon_social="Cortes SA")
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, codigo="MTY", nombre="MTY")
+        cls.almacen = Almacen.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, codigo="PT", nombre="PT"
+        )
+        cls.producto = Producto.objects.create(empresa=cls.empresa, nombre="Playera", codigo="PL")
+        cls.superuser = Usuario.objects.create(
+            username="cortes", email="cortes@cor.test", is_superuser=True
+        )
+        Existencia.objects.create(
+            producto=cls.producto, almacen=cls.almacen, cantidad=Decimal("9"), stock=9
+        )
+
+        cls.hoy = timezone.localdate()
+        cls.dias = {n: cls.hoy - timedelta(days=n) for n in (5, 3, 1)}
+        movimientos = [
+            (CorteExistenciaService.inicio_del_dia(cls.dias[5]) + timedelta(hours=10), "10"),
+            (CorteExistenciaService.inicio_del_dia(cls.dias[3]) + timedelta(hours=10), "-3"),
+            (CorteExistenciaService.fin_del_dia(cls.dias[1]), "4"),
+            (CorteExistenciaService.inicio_del_dia(cls.hoy), "-2"),
+        ]
+        for created_at, delta in movimientos:
+            evento = AuditoriaEvento.objects.create(
+                empresa=cls.empresa,
+                modulo="inventarios",
+                accion="AJUSTE",
+                tabla="existencias",
+                id_registro=str(cls.almacen.pk),
+                despues_json={
+                    "almacen_id": cls.almacen.pk,
+                    "items": [{"producto_id": cls.producto.pk, "producto_variante_id": None, "delta": delta}],
+                },
+            )
+            AuditoriaEvento.objects.filter(pk=evento.pk).update(created_at=created_at)
+
+    def _resumen(self, fecha_inicio, fecha_final):
+        client = APIClient()
+        client.force_authenticate(user=self.superuser)
+        resp = client.get(self.URL, {"fecha_inicio": str(fecha_inicio), "fecha_final": str(fecha_final)})
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return resp.data["resumen"]
+
+    def test_consolidar_acumula_por_dia_y_sumar_agrega_el_rango(self):
+        desde, hasta, dias, filas = CorteExistenciaService.consolidar()
+
+        self.assertEqual((desde, hasta, dias, filas), (self.dias[5], self.dias[1], 5, 3))
+        cortes = {
+            c.fecha: (c.entradas, c.salidas) for c in CorteExistenciaDiario.objects.all()
+        }
+        self.assertEqual(
+            cortes,
+            {
+                self.dias[5]: (Decimal("10"), Decimal("0")),
+                self.dias[3]: (Decimal("0"), Decimal("3")),
+                self.dias[1]: (Decimal("4"), Decimal("0")),
+            },
+        )
+        clave = (self.almacen.pk, self.producto.pk, None)
+        self.assertEqual(
+            CorteExistenciaService.sumar({self.almacen.pk}, self.dias[5], self.dias[1]),
+            {clave: (Decimal("14"), Decimal("3"))},
+        )
+        self.assertEqual(
+            CorteExistenciaService.sumar({self.almacen.pk}, self.dias[3], self.dias[3]),
+            {clave: (Decimal("0"), Decimal("3"))},
+        )
+        # Sin pendientes: la siguiente corrida no toca nada.
+        self.assertEqual(CorteExistenciaService.consolidar()[2], 0)
+        control = CorteExistenciaControl.objects.get()
+        self.assertEqual((control.fecha_desde, control.fecha_hasta), (self.dias[5], self.dias[1]))
+
+    def test_reporte_da_los_mismos_totales_con_y_sin_cortes(self):
+        periodos = [
+            (self.dias[3], self.dias[3]),  # dentro de la cobertura; lo posterior sale de cortes y eventos
+            (self.dias[3], self.hoy),  # cruza corte_fin_dt: cortes hasta ayer + eventos de hoy
+            (self.dias[1], self.dias[1]),  # el evento en el límite exacto del último corte
+        ]
+        sin_cortes = [self._resumen(*periodo) for periodo in periodos]
+
+        CorteExistenciaService.consolidar()
+        con_cortes = [self._resumen(*periodo) for periodo in periodos]
+
+        self.assertEqual(con_cortes, sin_cortes)
+        self.assertEqual(
+            [(r["existencia_inicial"], r["entradas"], r["salidas"], r["existencia_final"]) for r in con_cortes],
+            [
+                ("10.0000", "0.0000", "3.0000", "7.0000"),
+                ("10.0000", "4.0000", "5.0000", "9.0000"),
+                ("7.0000", "4.0000", "0.0000", "11.0000"),
+            ],
+        )
@@ -0,0 +1,148 @@
+"""Forma canónica de un EPC, para comparar lecturas del lector contra etiquetas.
+
+Lo que imprimimos (``RFIDLabelService._generate_epc_list``) es un EPC de 96
+bits: 24 hex. El FX no siempre lo devuelve así:
+
+- ``idHex`` con separadores, en mayúsculas o sin los ceros de la izquierda
+  (``12E3...`` en vez de ``000012E3...``);
+- 28 hex (112 bits): la palabra PC (4 hex) antepuesta al EPC, o el CRC-16
+  pospuesto cuando el lector reporta el banco completo;
+- 32 hex (128 bits): PC + EPC + CRC, o el EPC de 96 bits rellenado con ceros
+  a la derecha hasta 128.
+
+Antes cada consulta expandía cada EPC en ~15 variantes (con y sin ceros,
+recortes a 24/28/32, mayúsculas y minúsculas) y buscaba con un ``IN`` enorme.
+Ahora la normalización se calcula una vez al escribir (``epc_normalizado`` en
+``EtiquetaRFIDDetalle`` y ``RfidScan``) y el match es un igual exacto.
+"""
+
+import re
+
+EPC_96_HEX = 24
+
+_SEPARADORES = re.compile(r"[\s:\-]")
+_HEX = re.compile(r"^[0-9a-f]+$")
+
+# Los 5 bits altos de la palabra PC son la longitud del EPC en palabras de 16
+# bits: 6 palabras = 96 bits.
+_PALABRAS_EPC_96 = 6
+
+# Encabezados de los EPC de 96 bits que imprimimos: SGTIN-96 (``30``), el
+# esquema interno (primer nibble ``a``/``b``) y los legados con ceros a la
+# izquierda (``00`` no es un encabezado EPC asignado, así que ningún EPC de
+# 128 bits real empieza así).
+_ENCABEZADOS_96_PROPIOS = ("30", "a", "b", "00")
+
+
+def _pc_anuncia_96_bits(pc_hex):
+    return int(pc_hex, 16) >> 11 == _PALABRAS_EPC_96
+
+
+def _es_relleno_de_lector(epc):
+    """32 hex que son uno de nuestros EPC de 96 bits rellenado con ceros a la derecha."""
+    return epc.endswith("0" * 8) and epc.startswith(_ENCABEZADOS_96_PROPIOS)
+
+
+def normalizar_epc(valor):
+    """EPC canónico en hex minúsculas, o ``""`` si ``valor`` no es un EPC.
+
+    - Sin separadores y en minúsculas.
+    - Menos de 24 hex: se rellena con ceros a la izquierda hasta 24.
+    - 28 hex: si la palabra PC inicial anuncia 96 bits se quita; si no, se
+      toman los primeros 24 (EPC + CRC).
+    - 32 hex: uno de nuestros EPC de 96 bits rellenado con ceros a la derecha
+      → los primeros 24; PC de 96 bits → los 24 de en medio (PC + EPC + CRC);
+      si no, es un EPC de 128 bits y se deja completo, aunque termine en
+      ceros.
+    - Cualquier otra longitud se deja tal cual (ya sin separadores).
+
+    Un SGTIN-96 empieza con ``30`` y leído como PC también "anuncia" 96 bits:
+    para 28 hex la regla favorece PC + EPC, que es lo que manda el FX cuando
+    se activa el reporte de PC; el CRC pospuesto no lo manda ningún perfil que
+    usemos.
+    """
+    if isinstance(valor, bytes):
+        valor = valor.decode("utf-8", errors="replace")
+    epc = _SEPARADORES.sub("", str(valor or "")).lower()
+    if len(epc) < 8 or not _HEX.match(epc):
+        return ""
+
+    if len(epc) < EPC_96_HEX:
+        return epc.rjust(EPC_96_HEX, "0")
+    if len(epc) == 28:
+        return epc[4:] if _pc_anuncia_96_bits(epc[:4]) else epc[:EPC_96_HEX]
+    if len(epc) == 32:
+        if _es_relleno_de_lector(epc):
+            return epc[:EPC_96_HEX]
+        if _pc_anuncia_96_bits(epc[:4]):
+            return epc[4:28]
+    return epc
+
+
+# ----------------------------------------------------------------------
+# Codificación de los EPC que imprimimos
+# ----------------------------------------------------------------------
+SGTIN96_HEADER = 0x30
+SGTIN96_BITS_SERIAL = 38
+# Filtro 1: artículo de punto de venta (la prenda que sale en la bolsa).
+FILTRO_PUNTO_DE_VENTA = 1
+
+# Dígitos del prefijo GS1 -> (partición, bits del prefijo, bits de la referencia).
+# Prefijo + referencia (con su dígito indicador) siempre suman 13 dígitos y 44 bits.
+_PARTICIONES_SGTIN96 = {
+    12: (0, 40, 4),
+    11: (1, 37, 7),
+    10: (2, 34, 10),
+    9: (3, 30, 14),
+    8: (4, 27, 17),
+    7: (5, 24, 20),
+    6: (6, 20, 24),
+}
+
+# Esquema interno (empresa sin prefijo GS1): tipo(4) + id(36) + serial(56).
+# El primer nibble nunca es ``3``, así que no se cruza con un SGTIN-96.
+TIPO_EPC_VARIANTE = 0xA
+TIPO_EPC_PRODUCTO = 0xB
+_BITS_ID_INTERNO = 36
+EPC_INTERNO_BITS_SERIAL = 56
+
+
+def codificar_sgtin96(prefijo_empresa, referencia, serial, filtro=FILTRO_PUNTO_DE_VENTA):
+    """SGTIN-96 (GS1 EPC Tag Data Standard) en 24 hex mayúsculas.
+
+    ``prefijo_empresa``: prefijo GS1 de 6 a 12 dígitos, como texto (los ceros
+    a la izquierda cuentan para la partición). ``referencia``: dígito
+    indicador + referencia del artículo, como entero, en los
+    ``13 - len(prefijo_empresa)`` dígitos que deja el prefijo.
+    """
+    prefijo_empresa = str(prefijo_empresa or "")
+    if not prefijo_empresa.isdigit() or len(prefijo_empresa) not in _PARTICIONES_SGTIN96:
+        raise ValueError("El prefijo GS1 debe tener de 6 a 12 dígitos.")
+    particion, bits_prefijo, bits_referencia = _PARTICIONES_SGTIN96[len(prefijo_empresa)]
+    if not 0 <= referencia < 10 ** (13 - len(prefijo_empresa)):
+        raise ValueError("La referencia no cabe en los dígitos que deja el prefijo GS1.")
+    if not 0 <= serial < 1 << SGTIN96_BITS_SERIAL:
+        raise ValueError("El serial excede los 38 bits del SGTIN-96.")
+
+    valor = SGTIN96_HEADER
+    valor = (valor << 3) | filtro
+    valor = (valor << 3) | particion
+    valor = (valor << bits_prefijo) | int(prefijo_empresa)
+    valor = (valor << bits_referencia) | referencia
+    valor = (valor << SGTIN96_BITS_SERIAL) | serial
+    return f"{valor:0{EPC_96_HEX}X}"
+
+
+def codificar_epc_interno(tipo, objeto_id, serial):
+    """EPC de 96 bits para empresas sin prefijo GS1: ``tipo`` + id + serial.
+
+    Único mientras el par ``(tipo, objeto_id)`` lo sea y el serial venga del
+    contador de ``SerieEPC``.
+    """
+    if not 0 <= objeto_id < 1 << _BITS_ID_INTERNO:
+        raise ValueError("El id no cabe en el EPC interno.")
+    if not 0 <= serial < 1 << EPC_INTERNO_BITS_SERIAL:
+        raise ValueError("El serial excede los 56 bits del EPC interno.")
+    valor = (tipo << _BITS_ID_INTERNO) | objeto_id
+    valor = (valor << EPC_INTERNO_BITS_SERIAL) | serial
+    return f"{valor:0{EPC_96_HEX}X}"